@@ -0,0 +1,93 @@
+"""
+==========================================
+Load test of the documentation server
+==========================================
+
+:func:`run_doc_server <pyquickhelper.server.documentation_server.run_doc_server>`
+processes the requests one by one unless parameter *max_workers* is
+specified. The benchmark sends requests from several concurrent clients
+to both servers, one of the clients is slow and keeps
+its connection open for a while before sending its request.
+Big static files are sent with *sendfile*.
+
+"""
+
+###############################
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import urllib.request
+from time import perf_counter, sleep
+from concurrent.futures import ThreadPoolExecutor
+from pyquickhelper.server import run_doc_server
+from pyquickhelper.server.documentation_server import DocumentationHandler
+
+temp = tempfile.mkdtemp()
+with open(os.path.join(temp, "index.html"), "w", encoding="utf-8") as f:
+    f.write("<html><body>%s</body></html>" % ("<p>text</p>" * 1000))
+with open(os.path.join(temp, "big.png"), "wb") as f:
+    f.write(os.urandom(2 ** 20))
+
+N = 200
+CLIENTS = 8
+
+
+def slow_client(port, delay=0.5):
+    "Opens a connection and waits before sending the request."
+    with socket.create_connection(("localhost", port)) as s:
+        sleep(delay)
+        s.sendall(b"GET /bench/index.html HTTP/1.0\r\n\r\n")
+        while s.recv(2 ** 16):
+            pass
+
+
+def load_test(port, page):
+    url = f"http://localhost:{port}/bench/{page}"
+
+    def get(_):
+        with urllib.request.urlopen(url) as resp:
+            return len(resp.read())
+
+    slow = threading.Thread(target=slow_client, args=(port, ))
+    slow.start()
+    begin = perf_counter()
+    with ThreadPoolExecutor(CLIENTS) as ex:
+        list(ex.map(get, range(N)))
+    duration = perf_counter() - begin
+    slow.join()
+    return N / duration
+
+
+###############################
+# Sequential server against a pool of threads
+# +++++++++++++++++++++++++++++++++++++++++++
+
+results = []
+for max_workers in [None, 16]:
+    # port 0 lets the system choose a free port
+    th = run_doc_server('localhost', {"bench": temp}, True, port=0,
+                        max_workers=max_workers)
+    port = th.server.server_address[1]
+    for page in ["index.html", "big.png"]:
+        rps = load_test(port, page)
+        results.append((max_workers or 1, page, rps))
+        print(f"max_workers={max_workers} page={page}: {rps:.0f} requests/s")
+    th.shutdown()
+    th.server.server_close()
+    th.join()
+
+###############################
+# Results
+# +++++++
+
+import pandas  # noqa: E402
+df = pandas.DataFrame(results, columns=["max_workers", "page", "requests/s"])
+print(df.pivot(index="page", columns="max_workers", values="requests/s"))
+
+###############################
+# The served folder is removed.
+
+DocumentationHandler.mappings.pop("bench", None)
+shutil.rmtree(temp)
@@ -0,0 +1,52 @@
+"""
+=================================
+Benchmark of edit_distance_string
+=================================
+
+Function :func:`edit_distance_string
+<pyquickhelper.texthelper.edit_text_diff.edit_distance_string>`
+fills the matrix one anti-diagonal at a time with :epkg:`numpy`,
+:func:`edit_distance_string_loop
+<pyquickhelper.texthelper.edit_text_diff.edit_distance_string_loop>`
+computes every cell in python. Parameter *max_distance*
+restricts the computation to a band and stops as soon as
+the distance cannot be lower than the threshold.
+
+"""
+
+###############################
+from timeit import timeit
+import random
+from pyquickhelper.texthelper.edit_text_diff import (
+    edit_distance_string, edit_distance_string_loop)
+
+rnd = random.Random(0)
+
+
+def random_string(n):
+    return "".join(rnd.choice("abcdefghij ") for i in range(n))
+
+
+###############################
+# Comparison
+# ++++++++++
+
+for n in [10, 40, 100, 300]:
+    s1 = random_string(n)
+    s2 = list(s1)
+    for i in range(n // 10 + 1):
+        s2[rnd.randint(0, n - 1)] = "#"
+    s2 = "".join(s2)
+    assert edit_distance_string(s1, s2) == edit_distance_string_loop(s1, s2)
+    number = 3 if n > 100 else 10
+    t_loop = timeit(lambda: edit_distance_string_loop(s1, s2),
+                    number=number) / number
+    t_np = timeit(lambda: edit_distance_string(s1, s2),
+                  number=number) / number
+    t_band = timeit(lambda: edit_distance_string(
+        s1, s2, max_distance=n // 10 + 1), number=number) / number
+    t_stop = timeit(lambda: edit_distance_string(
+        s1, random_string(n), max_distance=2), number=number) / number
+    print(f"n={n:4d} loop={t_loop:.5f}s numpy={t_np:.5f}s "
+          f"banded={t_band:.5f}s early-exit={t_stop:.5f}s "
+          f"speedup={t_loop / t_np:.1f}")
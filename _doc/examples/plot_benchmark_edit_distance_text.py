@@ -0,0 +1,40 @@
+"""
+=========================================
+Strategies to compare texts line by line
+=========================================
+
+Function :func:`edit_distance_text
+<pyquickhelper.texthelper.edit_text_diff.edit_distance_text>`
+aligns the lines of two texts. Strategy ``'full'`` considers
+every pair of lines, ``'qgram'`` gets the same result
+but discards the pairs whose q-grams are too different,
+``'patience'`` aligns the unique identical lines first and
+only compares the lines between two anchors.
+
+"""
+
+###############################
+import inspect
+from time import perf_counter
+from pyquickhelper.texthelper import edit_text_diff
+from pyquickhelper.texthelper.edit_text_diff import edit_distance_text
+
+rows1 = inspect.getsource(edit_text_diff).split("\n")[:300]
+rows2 = list(rows1)
+for k in range(0, len(rows2), 17):
+    rows2[k] += " # changed"
+del rows2[100:105]
+rows2.insert(200, "new line")
+
+###############################
+# Comparison
+# ++++++++++
+
+for strategy in ['full', 'qgram', 'patience']:
+    begin = perf_counter()
+    d, _, __, stats = edit_distance_text(
+        rows1, rows2, strategy=strategy, return_stats=True)
+    duration = perf_counter() - begin
+    print(f"{strategy:8s} time={duration:.3f}s distance={d} "
+          f"computed={stats['computed']} skipped={stats['skipped']}/"
+          f"{stats['pairs']} anchors={stats['anchors']}")
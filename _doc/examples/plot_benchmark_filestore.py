@@ -0,0 +1,85 @@
+"""
+==========================================
+Benchmark of the sqlite3 file store
+==========================================
+
+:class:`SqlLite3FileStore
+<pyquickhelper.server.filestore_sqlite.SqlLite3FileStore>`
+keeps one connection per thread, runs in WAL mode and indexes
+the columns used to filter. The benchmark compares
+a connection opened for every insertion (the previous behaviour),
+one transaction per insertion with the pooled connection,
+and method *submit_many* which inserts everything in one transaction.
+
+"""
+
+###############################
+import os
+import shutil
+import sqlite3
+import tempfile
+from time import perf_counter
+from pyquickhelper.server.filestore_sqlite import SqlLite3FileStore
+
+N = 2000
+temp = tempfile.mkdtemp()
+records = [dict(name=f"name{i % 50}", content="a,b\n0,1\n" * 10,
+                format="df", team="team", project=f"p{i % 7}", version=i)
+           for i in range(N)]
+
+###############################
+# One connection per insertion
+# ++++++++++++++++++++++++++++
+
+store = SqlLite3FileStore(os.path.join(temp, "before.db3"), wal=False)
+begin = perf_counter()
+for r in records:
+    con = sqlite3.connect(store.path_)
+    con.execute(
+        "INSERT INTO files (name,content,format,team,project,version) "
+        "VALUES ('%s','%s','%s','%s','%s',%d)" % (
+            r['name'], r['content'], r['format'], r['team'],
+            r['project'], r['version']))
+    con.commit()
+    con.close()
+d_before = perf_counter() - begin
+store.close()
+print(f"one connection per insert: {N / d_before:.0f} inserts/s")
+
+###############################
+# Pooled connection, one transaction per insertion
+# ++++++++++++++++++++++++++++++++++++++++++++++++
+
+store = SqlLite3FileStore(os.path.join(temp, "single.db3"))
+begin = perf_counter()
+for r in records:
+    store.submit(**r)
+d_single = perf_counter() - begin
+store.close()
+print(f"submit: {N / d_single:.0f} inserts/s")
+
+###############################
+# Batch insertion
+# +++++++++++++++
+
+store = SqlLite3FileStore(os.path.join(temp, "many.db3"))
+begin = perf_counter()
+store.submit_many(records)
+d_many = perf_counter() - begin
+print(f"submit_many: {N / d_many:.0f} inserts/s")
+
+###############################
+# Query latency
+# +++++++++++++
+
+begin = perf_counter()
+for i in range(100):
+    res = list(store.enumerate(name=f"name{i % 50}", project="p3"))
+d_query = (perf_counter() - begin) / 100
+print(f"query latency: {d_query * 1000:.3f} ms, {len(res)} results")
+
+###############################
+# The databases are removed.
+
+store.close()
+shutil.rmtree(temp)
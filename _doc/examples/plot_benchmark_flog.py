@@ -0,0 +1,86 @@
+"""
+==========================================
+Benchmark of the asynchronous logging
+==========================================
+
+:func:`fLOG <pyquickhelper.loghelper.flog.fLOG>` writes every message
+into the log file and on the standard output, then flushes.
+With ``fLOG(AsyncLog=True)``, messages are queued and written by batches
+by a background thread
+(see :class:`AsyncLogSink <pyquickhelper.loghelper.async_flog.AsyncLogSink>`).
+The benchmark measures the number of messages per second
+seen by the caller.
+
+"""
+
+###############################
+import logging
+import os
+import shutil
+import tempfile
+from time import perf_counter
+from pyquickhelper.loghelper import fLOG, set_async_log
+from pyquickhelper.loghelper.flog import flog_static
+
+N = 20000
+temp = tempfile.mkdtemp()
+out = open(os.path.join(temp, "output.txt"), "w", encoding="utf-8")
+
+
+def run(n):
+    for i in range(n):
+        fLOG("iteration", i, "on file", "f%d.txt" % i, OutputStream=out)
+
+
+# the script runs within the documentation build,
+# the current log settings are restored at the end
+previous = {k: flog_static.store_log_values[k] for k in [
+    "__log_path", "__log_file_name", "__log_file", "__log_display"]}
+fLOG(OutputPrint=True, LogFile=os.path.join(temp, "log.txt"),
+     OutputStream=out)
+
+###############################
+# Synchronous logging
+# +++++++++++++++++++
+
+begin = perf_counter()
+run(N)
+d_sync = perf_counter() - begin
+print(f"synchronous: {N / d_sync:.0f} messages/s")
+
+###############################
+# Asynchronous logging, blocking policy
+# +++++++++++++++++++++++++++++++++++++
+
+fLOG(AsyncLog=True, OutputStream=out)
+begin = perf_counter()
+run(N)
+d_async = perf_counter() - begin
+fLOG(AsyncLog=False, OutputStream=out)
+d_drain = perf_counter() - begin
+print(f"asynchronous: {N / d_async:.0f} messages/s, "
+      f"{N / d_drain:.0f} messages/s including the drain")
+
+###############################
+# Asynchronous logging, messages are dropped if the queue is full
+# +++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+sink = set_async_log(policy="drop", max_queue=1000)
+begin = perf_counter()
+run(N)
+d_drop = perf_counter() - begin
+set_async_log(False)
+print(f"asynchronous, drop: {N / d_drop:.0f} messages/s, "
+      f"{sink.n_dropped} dropped messages")
+
+###############################
+# The previous log file is restored.
+
+logger = logging.getLogger("logger.pyquickhelper")
+for handler in list(logger.handlers):
+    if getattr(handler, "baseFilename", "").startswith(temp):
+        logger.removeHandler(handler)
+        handler.close()
+flog_static.store_log_values.update(previous)
+out.close()
+shutil.rmtree(temp)
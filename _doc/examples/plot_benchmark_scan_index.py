@@ -0,0 +1,86 @@
+"""
+==========================================
+Benchmark of the scan index
+==========================================
+
+:class:`FileTreeNode <pyquickhelper.filehelper.file_tree_node.FileTreeNode>`
+walks through a folder tree and calls *stat* on every file.
+:class:`ScanIndex <pyquickhelper.filehelper.scan_index.ScanIndex>`
+keeps the result of the previous scan in a :epkg:`sqlite3` database,
+a folder which did not change is not listed again.
+The benchmark runs on a synthetic tree of 2.000 files,
+*N_DIRS* and *N_FILES* can be increased to measure
+the gain on a bigger tree (1000 and 100 for 100.000 files).
+
+"""
+
+###############################
+import os
+import shutil
+import time
+import tempfile
+from time import perf_counter
+from pyquickhelper.filehelper import FileTreeNode, ScanIndex
+
+N_DIRS = 100
+N_FILES = 20
+temp = tempfile.mkdtemp()
+src = os.path.join(temp, "src")
+old = time.time() - 3600
+for d in range(N_DIRS):
+    sub = os.path.join(src, f"d{d // 10}", f"s{d}")
+    os.makedirs(sub)
+    for i in range(N_FILES):
+        with open(os.path.join(sub, f"f{i}.txt"), "w") as f:
+            f.write(str(i))
+for root, dirs, _ in os.walk(src):
+    for d in dirs:
+        os.utime(os.path.join(root, d), (old, old))
+print(f"created {N_DIRS * N_FILES} files")
+
+###############################
+# Without index
+# +++++++++++++
+
+begin = perf_counter()
+node = FileTreeNode(src)
+d_none = perf_counter() - begin
+print(f"no index: {d_none:.2f}s, {len(node)} nodes")
+
+###############################
+# First scan with an index
+# ++++++++++++++++++++++++
+
+name = os.path.join(temp, "index.db3")
+begin = perf_counter()
+with ScanIndex(name) as index:
+    node = FileTreeNode(src, index=index)
+d_first = perf_counter() - begin
+print(f"first scan: {d_first:.2f}s, {len(node)} nodes")
+
+###############################
+# No change, the files are checked
+# ++++++++++++++++++++++++++++++++
+
+begin = perf_counter()
+with ScanIndex(name) as index:
+    node = FileTreeNode(src, index=index)
+    stats = index.n_listed, index.n_skipped
+d_check = perf_counter() - begin
+print(f"no change: {d_check:.2f}s, listed={stats[0]} skipped={stats[1]}")
+
+###############################
+# No change, only the folders are checked
+# +++++++++++++++++++++++++++++++++++++++
+
+begin = perf_counter()
+with ScanIndex(name, check_files=False) as index:
+    node = FileTreeNode(src, index=index)
+d_trust = perf_counter() - begin
+print(f"no change, check_files=False: {d_trust:.2f}s")
+print(f"speed up: {d_none / d_check:.1f}x, {d_none / d_trust:.1f}x")
+
+###############################
+# The synthetic tree is removed.
+
+shutil.rmtree(temp)
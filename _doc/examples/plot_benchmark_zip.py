@@ -0,0 +1,150 @@
+"""
+==========================================
+Benchmark of zip_files and unzip_files
+==========================================
+
+:func:`zip_files <pyquickhelper.filehelper.compression_helper.zip_files>`
+can compress the members of an archive in parallel with
+parameter *processes*, the main process only writes
+the compressed data into the archive.
+:func:`unzip_files <pyquickhelper.filehelper.compression_helper.unzip_files>`
+can extract members in parallel as well. The benchmark
+compares both versions with a copy of the previous implementation
+on a synthetic archive of 16 Mb,
+*SIZE* must be increased to reach a multi-GB archive.
+
+"""
+
+###############################
+import os
+import random
+import shutil
+import tempfile
+import zipfile
+from time import perf_counter
+from pyquickhelper.filehelper import zip_files, unzip_files, enumerate_unzip_files
+
+SIZE = 2 ** 24
+N_FILES = 32
+PROCESSES = max(os.cpu_count() or 1, 2)
+temp = tempfile.mkdtemp()
+src = os.path.join(temp, "src")
+os.makedirs(src)
+rnd = random.Random(0)
+words = [bytes(rnd.randint(97, 122) for _ in range(rnd.randint(2, 10)))
+         for _ in range(1000)]
+files = []
+for i in range(N_FILES):
+    name = os.path.join(src, f"f{i}.txt")
+    with open(name, "wb") as f:
+        size = 0
+        while size < SIZE // N_FILES:
+            block = b" ".join(rnd.choices(words, k=10000))
+            f.write(block)
+            size += len(block)
+    files.append(name)
+print(f"created {N_FILES} files, {SIZE // 2 ** 20} Mb")
+
+###############################
+# Previous implementation
+# +++++++++++++++++++++++
+#
+# The previous functions wrote the members one by one,
+# every member was extracted in memory before being written.
+# The compression is added to compare the same archives.
+
+
+def zip_files_previous(filename, file_set, root=None,
+                       compression=zipfile.ZIP_STORED):
+    nb = 0
+    with zipfile.ZipFile(filename, 'w', compression=compression) as myzip:
+        for file in file_set:
+            if not os.path.exists(file):
+                continue
+            arcname = os.path.relpath(file, root) if root else None
+            myzip.write(file, arcname=arcname)
+            nb += 1
+    return nb
+
+
+def unzip_files_previous(zipf, where_to):
+    files = []
+    with zipfile.ZipFile(zipf, "r") as file:
+        for info in file.infolist():
+            tos = os.path.join(where_to, info.filename)
+            if not os.path.exists(tos):
+                data = file.read(info.filename)
+                finalfolder = os.path.split(tos)[0]
+                if not os.path.exists(finalfolder):
+                    os.makedirs(finalfolder)
+                if not info.filename.endswith("/"):
+                    with open(tos, "wb") as u:
+                        u.write(data)
+                    files.append(tos)
+    return files
+
+###############################
+# Compression
+# +++++++++++
+
+prev = os.path.join(temp, "prev.zip")
+begin = perf_counter()
+zip_files_previous(prev, files, root=src, compression=zipfile.ZIP_DEFLATED)
+d_zip_prev = perf_counter() - begin
+print(f"previous zip_files: {d_zip_prev:.2f}s, "
+      f"{os.path.getsize(prev) // 2 ** 20} Mb")
+
+seq = os.path.join(temp, "seq.zip")
+begin = perf_counter()
+zip_files(seq, files, root=src, compression=zipfile.ZIP_DEFLATED)
+d_zip = perf_counter() - begin
+print(f"zip_files: {d_zip:.2f}s, {os.path.getsize(seq) // 2 ** 20} Mb, "
+      f"speed up {d_zip_prev / d_zip:.1f}x")
+
+par = os.path.join(temp, "par.zip")
+begin = perf_counter()
+zip_files(par, files, root=src, compression=zipfile.ZIP_DEFLATED,
+          processes=PROCESSES)
+d_zip_par = perf_counter() - begin
+print(f"zip_files(processes={PROCESSES}): {d_zip_par:.2f}s, "
+      f"speed up {d_zip_prev / d_zip_par:.1f}x")
+
+###############################
+# Decompression
+# +++++++++++++
+
+begin = perf_counter()
+unzip_files_previous(seq, where_to=os.path.join(temp, "prev"))
+d_unzip_prev = perf_counter() - begin
+print(f"previous unzip_files: {d_unzip_prev:.2f}s")
+
+begin = perf_counter()
+unzip_files(seq, where_to=os.path.join(temp, "seq"))
+d_unzip = perf_counter() - begin
+print(f"unzip_files: {d_unzip:.2f}s, speed up {d_unzip_prev / d_unzip:.1f}x")
+
+begin = perf_counter()
+unzip_files(seq, where_to=os.path.join(temp, "par"), processes=PROCESSES)
+d_unzip_par = perf_counter() - begin
+print(f"unzip_files(processes={PROCESSES}): {d_unzip_par:.2f}s, "
+      f"speed up {d_unzip_prev / d_unzip_par:.1f}x")
+
+###############################
+# Streaming
+# +++++++++
+#
+# Members are read block by block, the memory
+# does not depend on the size of the members.
+
+begin = perf_counter()
+total = 0
+for name, f in enumerate_unzip_files(seq):
+    while True:
+        data = f.read(2 ** 20)
+        if not data:
+            break
+        total += len(data)
+d_stream = perf_counter() - begin
+print(f"enumerate_unzip_files: {d_stream:.2f}s, {total // 2 ** 20} Mb")
+
+shutil.rmtree(temp)
@@ -0,0 +1,155 @@
+"""
+@brief      test log(time=2s)
+@author     Xavier Dupre
+"""
+
+import os
+import unittest
+import pickle
+
+from pyquickhelper.loghelper import fLOG
+from pyquickhelper.pycode import get_temp_folder
+from pyquickhelper.benchhelper import BenchMark, BenchMarkCache, hash_params
+
+
+class ATestBenchMarkC_(BenchMark):
+
+    def init(self):
+        self.calls = []
+
+    def bench(self, **p):
+        if p["value"] == getattr(self, "fail_on", None):
+            raise RuntimeError("interrupted")
+        self.calls.append(p["value"])
+        h = "v%d" % p["value"]
+        return dict(value=p["value"], _btry=h), dict(value=p["value"], _btry=h)
+
+    def end(self):
+        pass
+
+
+class TestBenchMarkCache(unittest.TestCase):
+
+    def test_hash_params(self):
+        h1 = hash_params(dict(a=1, b="r", c=[1, 2.5]))
+        h2 = hash_params(dict(c=[1, 2.5], b="r", a=1))
+        self.assertEqual(h1, h2)
+        self.assertNotEqual(h1, hash_params(dict(a=1, b="r", c=[1, 2.6])))
+        self.assertNotEqual(h1, hash_params(
+            dict(a=1, b="r", c=[1, 2.5]), version="2"))
+        self.assertNotEqual(hash_params(dict(a=1)), hash_params(dict(a="1")))
+
+    def test_benchmark_cache_reorder(self):
+        fLOG(
+            __file__,
+            self._testMethodName,
+            OutputPrint=__name__ == "__main__")
+
+        temp = get_temp_folder(__file__, "temp_benchmark_cache_reorder")
+        cache = os.path.join(temp, "cache.pickle")
+        params = [dict(value=i) for i in range(0, 10)]
+
+        bench = ATestBenchMarkC_("TestName", fLOG=fLOG, cache_file=cache)
+        bench.run(params)
+        self.assertEqual(bench.calls, list(range(10)))
+        self.assertEqual(len(os.listdir(bench.cache_folder)), 10)
+
+        # inserts and reorders configurations
+        params2 = [dict(value=100)] + list(reversed(params))
+        bench = ATestBenchMarkC_("TestName", fLOG=fLOG, cache_file=cache)
+        metrics, meta = bench.run(params2)
+        self.assertEqual(bench.calls, [100])
+        self.assertEqual(meta[0]["nb_cached"], 10)
+        self.assertEqual([m["value"] for m in metrics],
+                         [100] + list(reversed(range(10))))
+        self.assertEqual([m["_i"] for m in metrics], list(range(11)))
+
+        # new version of the code
+        bench = ATestBenchMarkC_("TestName", fLOG=fLOG, cache_file=cache,
+                                 cache_version="2")
+        bench.run(params)
+        self.assertEqual(bench.calls, list(range(10)))
+
+    def test_benchmark_cache_resume(self):
+        fLOG(
+            __file__,
+            self._testMethodName,
+            OutputPrint=__name__ == "__main__")
+
+        temp = get_temp_folder(__file__, "temp_benchmark_cache_resume")
+        cache = os.path.join(temp, "cache.pickle")
+        params = [dict(value=i) for i in range(0, 10)]
+
+        bench = ATestBenchMarkC_("TestName", fLOG=fLOG, cache_file=cache)
+        bench.fail_on = 6
+        self.assertRaises(RuntimeError, lambda: bench.run(params))
+        self.assertEqual(bench.calls, list(range(6)))
+
+        bench = ATestBenchMarkC_("TestName", fLOG=fLOG, cache_file=cache)
+        _, meta = bench.run(params)
+        self.assertEqual(bench.calls, list(range(6, 10)))
+        self.assertEqual(meta[0]["nb_cached"], 6)
+
+        # uncache
+        class ATestBenchMarkU_(ATestBenchMarkC_):
+            def uncache(self, cache):
+                cache.remove(dict(value=3))
+
+        bench = ATestBenchMarkU_("TestName", fLOG=fLOG, cache_file=cache)
+        bench.run(params)
+        self.assertEqual(bench.calls, [3])
+
+        # uncache with the dictionary used by previous versions
+        class ATestBenchMarkL_(ATestBenchMarkC_):
+            def uncache(self, cache):
+                self.seen = sorted(p["value"] for p in cache["params_list"])
+                for k in ["params_list", "metrics", "appendix"]:
+                    cache[k] = [v for v in cache[k] if v["value"] not in (4, 7)]
+
+        bench = ATestBenchMarkL_("TestName", fLOG=fLOG, cache_file=cache)
+        bench.run(params)
+        self.assertEqual(bench.seen, list(range(10)))
+        self.assertEqual(bench.calls, [4, 7])
+
+        # no cache, the method still receives a dictionary
+        bench = ATestBenchMarkL_("TestName", fLOG=fLOG)
+        bench.run(params[:2])
+        self.assertEqual(bench.seen, [])
+
+    def test_benchmark_cache_repeated(self):
+        temp = get_temp_folder(__file__, "temp_benchmark_cache_repeated")
+        cache = os.path.join(temp, "cache.pickle")
+        params = [dict(value=1), dict(value=2), dict(value=1)]
+        bench = ATestBenchMarkC_("TestName", cache_file=cache)
+        metrics, meta = bench.run(params)
+        # the repeated configuration is retrieved from the cache
+        self.assertEqual(bench.calls, [1, 2])
+        self.assertEqual([m["_i"] for m in metrics], [0, 1, 2])
+        self.assertEqual(meta[0]["nb_cached"], 1)
+
+    def test_benchmark_cache_legacy(self):
+        temp = get_temp_folder(__file__, "temp_benchmark_cache_legacy")
+        cache = os.path.join(temp, "cache.pickle")
+        params = [dict(value=i) for i in range(0, 4)]
+        metrics = [dict(value=i, _btry="v%d" % i, _i=i) for i in range(4)]
+        appendix = [dict(value=i, _btry="v%d" % i, _i=i) for i in range(4)]
+        with open(cache, "wb") as f:
+            pickle.dump(dict(metrics=metrics, appendix=appendix,
+                             params_list=params), f)
+        for i in range(4):
+            with open(f"{cache}.v{i}.clean_cache", "w") as f:
+                f.write("-")
+
+        bench = ATestBenchMarkC_("TestName", cache_file=cache)
+        _, meta = bench.run(params)
+        self.assertEqual(bench.calls, [])
+        self.assertEqual(meta[0]["nb_cached"], 4)
+        self.assertFalse(os.path.exists(cache))
+        self.assertTrue(os.path.exists(cache + ".imported"))
+        store = BenchMarkCache(bench.cache_folder)
+        self.assertEqual(len(store), 4)
+        self.assertIn(dict(value=2), store)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,148 @@
+"""
+@brief      test log(time=3s)
+@author     Xavier Dupre
+"""
+
+import os
+import sys
+import types
+import pickle
+import unittest
+import random
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from pyquickhelper.loghelper import fLOG
+from pyquickhelper.pycode import get_temp_folder
+from pyquickhelper.benchhelper import BenchMark
+
+
+class ATestBenchMarkP_(BenchMark):
+
+    def init(self):
+        self.offset = 1000
+
+    def bench(self, **p):
+        h = random.randint(1, 10000) + self.offset
+        return dict(nb=h, value=p["value"], pid=os.getpid(), _btry=str(h)), dict(nb=h, _btry=str(h))
+
+    def end(self):
+        pass
+
+
+class ATestBenchMarkL_(ATestBenchMarkP_):
+
+    def bench(self, **p):
+        self.fLOG(f"bench {p['value']}")
+        return ATestBenchMarkP_.bench(self, **p)
+
+
+class TestBenchMarkParallel(unittest.TestCase):
+
+    def test_benchmark_parallel(self):
+        fLOG(
+            __file__,
+            self._testMethodName,
+            OutputPrint=__name__ == "__main__")
+
+        temp = get_temp_folder(__file__, "temp_benchmark_parallel")
+        cache = os.path.join(temp, "cache.pickle")
+        params = [dict(value=i) for i in range(0, 20)]
+
+        bench = ATestBenchMarkP_("TestName", fLOG=fLOG, clog=temp,
+                                 cache_file=cache)
+        metrics, meta = bench.run(params, n_jobs=2)
+        self.assertEqual(len(metrics), 20)
+        self.assertEqual([m["_i"] for m in metrics], list(range(20)))
+        self.assertEqual([m["value"] for m in metrics], list(range(20)))
+        self.assertEqual([a["_i"] for a in bench.Appendix], list(range(20)))
+        self.assertTrue(all(m["nb"] > 1000 for m in metrics))
+        self.assertNotIn(os.getpid(), set(m["pid"] for m in metrics))
+        workers = [m for m in meta if m["level"] == "BenchMark.worker"]
+        self.assertTrue(1 <= len(workers) <= 2)
+        self.assertEqual(sum(w["nb"] for w in workers), 20)
+        self.assertTrue(all(w["time"] >= 0 for w in workers))
+        df = bench.meta_to_df()
+        self.assertEqual(df.shape[0], len(meta))
+
+        # second run, everything is cached
+        bench = ATestBenchMarkP_("TestName", fLOG=fLOG, clog=temp,
+                                 cache_file=cache)
+        _, meta = bench.run(params, n_jobs=2)
+        self.assertEqual(meta[0]["nb_cached"], 20)
+        self.assertEqual(len(meta), 1)
+
+        # clear one cache
+        name = bench.Metrics[3]["_btry"]
+        os.remove(os.path.join(temp, f"cache.pickle.{name}.clean_cache"))
+        bench = ATestBenchMarkP_("TestName", fLOG=fLOG, clog=temp,
+                                 cache_file=cache)
+        metrics, meta = bench.run(params, n_jobs=2)
+        self.assertTrue(meta[0]["nb_cached"] < 20)
+        self.assertEqual([m["_i"] for m in metrics], list(range(20)))
+
+    def test_benchmark_executor(self):
+        fLOG(
+            __file__,
+            self._testMethodName,
+            OutputPrint=__name__ == "__main__")
+
+        params = [dict(value=i) for i in range(0, 10)]
+        bench = ATestBenchMarkP_("TestName", fLOG=fLOG)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            metrics, meta = bench.run(params, executor=executor)
+        self.assertEqual([m["value"] for m in metrics], list(range(10)))
+        workers = [m for m in meta if m["level"] == "BenchMark.worker"]
+        self.assertEqual(len(workers), 1)
+        self.assertEqual(workers[0]["nb"], 10)
+
+    def test_benchmark_executor_logs(self):
+        params = [dict(value=i) for i in range(0, 3)]
+        bench = ATestBenchMarkL_("TestName")
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            bench.run(params, executor=executor)
+        logs = bench._tracelogs
+        for i in range(3):
+            self.assertEqual(
+                len([line for line in logs if line.endswith(f"bench {i}")]), 1)
+            self.assertEqual(
+                len([line for line in logs if f"submit {i + 1}/3" in line]), 1)
+            self.assertEqual(
+                len([line for line in logs if f" {i + 1}/3 end" in line]), 1)
+        self.assertEqual(len([line for line in logs if "start TestName" in line]), 1)
+
+    def test_benchmark_process_executor(self):
+        params = [dict(value=i) for i in range(0, 6)]
+        bench = ATestBenchMarkL_("TestName")
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            metrics, _ = bench.run(params, executor=executor)
+        self.assertEqual([m["value"] for m in metrics], list(range(6)))
+        self.assertNotIn(os.getpid(), set(m["pid"] for m in metrics))
+        self.assertEqual(
+            len([line for line in bench._tracelogs if "bench " in line]), 6)
+
+    @unittest.skipIf(multiprocessing.get_start_method() != "fork",
+                     reason="the pickle module only exists in this process")
+    def test_benchmark_pickle_module(self):
+        calls = []
+        module = types.ModuleType("bench_pickle_counter")
+        module.dumps = lambda obj: calls.append(1) or pickle.dumps(obj)
+        module.loads = pickle.loads
+        sys.modules[module.__name__] = module
+        try:
+            params = [dict(value=i) for i in range(0, 6)]
+            bench = ATestBenchMarkP_("TestName", pickle_module=module)
+            with ProcessPoolExecutor(max_workers=2) as executor:
+                metrics, _ = bench.run(params, executor=executor, n_jobs=2)
+            self.assertEqual([m["value"] for m in metrics], list(range(6)))
+            self.assertEqual(len(calls), 1)
+
+            calls.clear()
+            bench.run(params, n_jobs=2)
+            self.assertEqual(len(calls), 1)
+        finally:
+            del sys.modules[module.__name__]
+
+
+if __name__ == "__main__":
+    unittest.main()
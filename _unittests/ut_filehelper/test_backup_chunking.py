@@ -0,0 +1,114 @@
+"""
+@brief      test log(time=3s)
+"""
+import os
+import io
+import random
+import unittest
+from pyquickhelper.pycode import get_temp_folder, ExtTestCase
+from pyquickhelper.filehelper import EncryptedBackup, FileTreeNode
+from pyquickhelper.filehelper.transfer_api import MockTransferAPI
+from pyquickhelper.filehelper.content_chunking import (
+    enumerate_cdc_chunks, cdc_cut_point, _cdc_cut_point_loop)
+
+
+class TestBackupChunking(ExtTestCase):
+
+    def test_enumerate_cdc_chunks(self):
+        data = random.Random(0).randbytes(2 ** 18)
+        chunks = list(enumerate_cdc_chunks(io.BytesIO(data), 2 ** 12))
+        self.assertEqual(b"".join(chunks), data)
+        self.assertGreater(len(chunks), 20)
+        self.assertLesser(max(len(c) for c in chunks), 2 ** 14)
+        self.assertGreater(min(len(c) for c in chunks[:-1]), 2 ** 10 - 1)
+
+        edited = data[:5000] + b"inserted" + data[5000:]
+        chunks2 = list(enumerate_cdc_chunks(io.BytesIO(edited), 2 ** 12))
+        self.assertEqual(b"".join(chunks2), edited)
+        new = [c for c in chunks2 if c not in set(chunks)]
+        self.assertLesser(len(new), 3)
+
+    def test_cdc_cut_point_loop(self):
+        rnd = random.Random(1)
+        for avg in [2 ** 6, 2 ** 10, 2 ** 14]:
+            for _ in range(20):
+                data = bytearray(rnd.randbytes(rnd.randint(0, avg * 5)))
+                for min_size in [avg // 4, 0, 3]:
+                    self.assertEqual(
+                        cdc_cut_point(data, min_size, avg, avg * 4),
+                        _cdc_cut_point_loop(data, min_size, avg, avg * 4))
+        data = bytes(2 ** 12)
+        self.assertEqual(cdc_cut_point(data, 2 ** 8, 2 ** 10, 2 ** 12),
+                         _cdc_cut_point_loop(data, 2 ** 8, 2 ** 10, 2 ** 12))
+
+    def _backup(self, temp, api, **kwargs):
+        ft = FileTreeNode(os.path.join(temp, "src"), repository=False)
+        enc = EncryptedBackup(
+            key=b"unit" * 8,
+            file_tree_node=ft,
+            transfer_api=api,
+            file_status=os.path.join(temp, "status.txt"),
+            file_map=os.path.join(temp, "mapping.txt"),
+            root_local=temp,
+            compression="zip",
+            chunking="cdc",
+            chunk_size=2 ** 13,
+            algo="AES")
+        done, issues = enc.start_transfering(**kwargs)
+        self.assertEmpty(issues)
+        return enc, done
+
+    def test_backup_chunking(self):
+        try:
+            import Cryptodome as skip_
+        except ImportError:  # pragma: no cover
+            try:
+                import Crypto as skip__
+            except ImportError:
+                raise unittest.SkipTest("pycryptodomex is missing")
+
+        temp = get_temp_folder(__file__, "temp_backup_chunking")
+        src = os.path.join(temp, "src")
+        os.mkdir(src)
+        big = os.path.join(src, "big.bin")
+        data = random.Random(0).randbytes(2 ** 20)
+        with open(big, "wb") as f:
+            f.write(data)
+        small = data[:50000]
+        for name in ["copy1.bin", "copy2.bin"]:
+            with open(os.path.join(src, name), "wb") as f:
+                f.write(small)
+
+        api = MockTransferAPI()
+        enc, done = self._backup(temp, api)
+        self.assertEqual(len(done), 3)
+        stats = enc.chunk_stats
+        # the beginning of big.bin is also the content of the copies
+        self.assertGreater(stats["dedup_bytes"], 2 * len(small) * 0.8)
+        self.assertEqual(stats["bytes"] + stats["dedup_bytes"],
+                         len(data) + 2 * len(small))
+        self.assertEqual(enc.Mapping["src/copy1.bin"].pieces,
+                         enc.Mapping["src/copy2.bin"].pieces)
+
+        # light edit
+        edited = data[:300000] + b"inserted bytes" + data[300000:]
+        with open(big, "wb") as f:
+            f.write(edited)
+        stored = len(api._storage)
+        enc, done = self._backup(temp, api, threads=2, max_pending=4)
+        self.assertEqual(done, ["src/big.bin"])
+        stats = enc.chunk_stats
+        saved = stats["dedup_bytes"] / len(edited)
+        self.assertGreater(saved, 0.95)
+        self.assertLesser(len(api._storage) - stored, 4)
+
+        self.assertEqual(enc.retrieve("src/big.bin"), edited)
+        self.assertEqual(enc.retrieve("src/copy1.bin"), small)
+        restored = enc.retrieve_all(os.path.join(temp, "restored"))
+        self.assertEqual(len(restored), 3)
+        with open(os.path.join(temp, "restored", "src", "big.bin"), "rb") as f:
+            self.assertEqual(f.read(), edited)
+
+
+if __name__ == "__main__":
+    unittest.main()
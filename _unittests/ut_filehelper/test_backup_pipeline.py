@@ -0,0 +1,81 @@
+"""
+@brief      test log(time=4s)
+"""
+import os
+import random
+import unittest
+from pyquickhelper.pycode import get_temp_folder, ExtTestCase
+from pyquickhelper.filehelper import EncryptedBackup, FileTreeNode
+from pyquickhelper.filehelper.transfer_api import MockTransferAPI
+
+
+class TestBackupPipeline(ExtTestCase):
+
+    def _backup(self, temp, name, **kwargs):
+        api = MockTransferAPI()
+        ft = FileTreeNode(os.path.join(temp, "src"), repository=False)
+        enc = EncryptedBackup(
+            key=b"unit" * 8,
+            file_tree_node=ft,
+            transfer_api=api,
+            file_status=os.path.join(temp, f"status_{name}.txt"),
+            file_map=os.path.join(temp, f"mapping_{name}.txt"),
+            root_local=temp,
+            threshold_size=3000,
+            compression="zip",
+            iv_seed=7,
+            algo="AES")
+        done, issues = enc.start_transfering(**kwargs)
+        return enc, api, done, issues
+
+    def test_backup_pipeline(self):
+        try:
+            import Cryptodome as skip_
+        except ImportError:  # pragma: no cover
+            try:
+                import Crypto as skip__
+            except ImportError:
+                raise unittest.SkipTest("pycryptodomex is missing")
+
+        temp = get_temp_folder(__file__, "temp_backup_pipeline")
+        rnd = random.Random(0)
+        for i in range(8):
+            sub = os.path.join(temp, "src", f"d{i % 2}")
+            if not os.path.exists(sub):
+                os.makedirs(sub)
+            words = [rnd.choice(["alpha", "beta", "gamma", "delta"])
+                     for _ in range(rnd.randint(0, 4000))]
+            with open(os.path.join(sub, f"f{i}.txt"), "w") as f:
+                f.write(" ".join(words))
+
+        enc1, api1, done1, issues1 = self._backup(temp, "seq")
+        enc2, api2, done2, issues2 = self._backup(
+            temp, "pipe", processes=2, threads=3, max_pending=3)
+        enc3, api3, done3, issues3 = self._backup(
+            temp, "threads", threads=2, max_pending=1)
+
+        self.assertEqual(len(done1), 8)
+        self.assertEmpty(issues1)
+        for done, issues, enc, api in [(done2, issues2, enc2, api2),
+                                       (done3, issues3, enc3, api3)]:
+            self.assertEqual(done1, done)
+            self.assertEmpty(issues)
+            self.assertEqual(
+                {k: v.pieces for k, v in enc1.Mapping.items()},
+                {k: v.pieces for k, v in enc.Mapping.items()})
+            # the mapping holds dates
+            pieces1 = {k: v for k, v in api1._storage.items()
+                       if not k.startswith("__mapping")}
+            pieces = {k: v for k, v in api._storage.items()
+                      if not k.startswith("__mapping")}
+            self.assertEqual(pieces1, pieces)
+        self.assertGreater(
+            max(len(v.pieces) for v in enc1.Mapping.values()), 2)
+
+        data = enc2.retrieve(done2[-1])
+        with open(os.path.join(temp, done2[-1]), "rb") as f:
+            self.assertEqual(data, f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+@brief      test log(time=2s)
+"""
+import os
+import io
+import hashlib
+import unittest
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.filehelper import (
+    checksum_md5, checksum_file, ScanIndex, FileTreeNode)
+from pyquickhelper.filehelper.file_info import split_checksum
+from pyquickhelper.filehelper.files_status import FilesStatus
+from pyquickhelper.filehelper.transfer_api import TransferAPI
+
+
+class TestChecksumFile(ExtTestCase):
+
+    def test_checksum_file(self):
+        temp = get_temp_folder(__file__, "temp_checksum_file")
+        name = os.path.join(temp, "data.bin")
+        data = bytes(range(256)) * 5000
+        with open(name, "wb") as f:
+            f.write(data)
+
+        self.assertEqual(checksum_md5(name), hashlib.md5(data).hexdigest())
+        self.assertEqual(checksum_file(name, buffer_size=1000),
+                         hashlib.md5(data).hexdigest())
+        self.assertEqual(checksum_file(name, "blake2b"),
+                         hashlib.blake2b(data).hexdigest())
+        self.assertEqual(checksum_file(name, "blake2b", prefix=True),
+                         "blake2b:" + hashlib.blake2b(data).hexdigest())
+        self.assertRaise(lambda: checksum_file(name, "unknown"), ValueError)
+
+        size = len(data).to_bytes(8, "little")
+        self.assertEqual(
+            checksum_file(name, partial=100),
+            hashlib.md5(size + data[:100] + data[-100:]).hexdigest())
+        self.assertTrue(checksum_file(name, partial=100,
+                                      prefix=True).startswith("pmd5:"))
+        self.assertEqual(
+            checksum_file(name, partial=len(data)),
+            hashlib.md5(size + data).hexdigest())
+
+        self.assertEqual(split_checksum("blake2b:ab"), ("blake2b", "ab"))
+        self.assertEqual(split_checksum("ab"), ("md5", "ab"))
+
+    def test_transfer_api_checksum(self):
+        data = b"abcdef" * 1000
+        self.assertEqual(TransferAPI.checksum_md5(data),
+                         hashlib.md5(data).hexdigest())
+        self.assertEqual(TransferAPI.checksum_md5(io.BytesIO(data)),
+                         hashlib.md5(data).hexdigest())
+        self.assertEqual(TransferAPI.checksum_md5(data, "sha256"),
+                         hashlib.sha256(data).hexdigest())
+
+    def test_files_status_algo(self):
+        temp = get_temp_folder(__file__, "temp_files_status_algo")
+        name = os.path.join(temp, "a.txt")
+        with open(name, "w") as f:
+            f.write("content")
+        status_file = os.path.join(temp, "status.txt")
+
+        st = FilesStatus(status_file, algo="blake2b")
+        obj = st.update_copied_file(name)
+        self.assertTrue(obj.checksum.startswith("blake2b:"))
+        st.save_dates()
+
+        st = FilesStatus(status_file)
+        self.assertTrue(st.copyFiles[name].checksum.startswith("blake2b:"))
+        os.utime(name, (1e9, 1e9))
+        self.assertEqual(st.has_been_modified_and_reason(name), (False, None))
+        # legacy status, no prefix
+        st.copyFiles[name].set_md5(hashlib.md5(b"content").hexdigest())
+        self.assertEqual(st.has_been_modified_and_reason(name), (False, None))
+        st.copyFiles[name].set_md5(hashlib.md5(b"other").hexdigest())
+        self.assertTrue(st.has_been_modified_and_reason(name)[0])
+
+    def test_scan_index_algo(self):
+        temp = get_temp_folder(__file__, "temp_scan_index_algo")
+        with ScanIndex(os.path.join(temp, "index.db")) as index:
+            index.set_hash(os.path.join(temp, "a"), "h", 1, 2, 3)
+            self.assertEqual(
+                index.get_hash(os.path.join(temp, "a"), 1, 2, 3), "h")
+            self.assertEmpty(
+                index.get_hash(os.path.join(temp, "a"), 1, 2, 3, algo="sha1"))
+
+    def test_difference_partial_hash(self):
+        temp = get_temp_folder(__file__, "temp_difference_partial_hash")
+        for sub in ["a", "b"]:
+            os.mkdir(os.path.join(temp, sub))
+        contents = {"same.txt": ("x" * 300, "x" * 300),
+                    "head.txt": ("y" + "x" * 299, "x" * 300),
+                    "middle.txt": ("x" * 150 + "y" + "x" * 149, "x" * 300)}
+        for i, (k, (c1, c2)) in enumerate(sorted(contents.items())):
+            for sub, c, t in [("a", c1, 1e9 + i), ("b", c2, 2e9 + i)]:
+                name = os.path.join(temp, sub, k)
+                with open(name, "w") as f:
+                    f.write(c)
+                os.utime(name, (t, t))
+
+        n1 = FileTreeNode(os.path.join(temp, "a"))
+        n2 = FileTreeNode(os.path.join(temp, "b"))
+        res = {r[1]: r[0] for r in n1.difference(n2, partial_hash=10)}
+        self.assertEqual(res, {"same.txt": "==", "head.txt": "<",
+                               "middle.txt": "<"})
+        self.assertEqual(n1.timings["difference.n_partial"], 3)
+        self.assertEqual(n1.timings["difference.n_hashed"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
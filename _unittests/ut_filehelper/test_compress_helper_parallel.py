@@ -0,0 +1,86 @@
+"""
+@brief      test log(time=4s)
+"""
+import os
+import random
+import unittest
+import zipfile
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.filehelper import (
+    zip_files, unzip_files, enumerate_unzip_files)
+
+
+class TestCompressHelperParallel(ExtTestCase):
+
+    def _create_files(self, temp, n=12):
+        rnd = random.Random(0)
+        src = os.path.join(temp, "src")
+        files = []
+        for i in range(n):
+            sub = os.path.join(src, f"d{i % 3}")
+            if not os.path.exists(sub):
+                os.makedirs(sub)
+            name = os.path.join(sub, f"f {i}.txt")
+            words = [rnd.choice(["alpha", "beta", "gamma"])
+                     for _ in range(rnd.randint(0, 20000))]
+            with open(name, "w") as f:
+                f.write(" ".join(words))
+            files.append(name)
+        return src, files
+
+    def test_zip_files_parallel(self):
+        temp = get_temp_folder(__file__, "temp_zip_files_parallel")
+        src, files = self._create_files(temp)
+        seq = os.path.join(temp, "seq.zip")
+        par = os.path.join(temp, "par.zip")
+        n1 = zip_files(seq, files, root=src, compression=zipfile.ZIP_DEFLATED,
+                       compresslevel=6)
+        n2 = zip_files(par, files, root=src, compression=zipfile.ZIP_DEFLATED,
+                       compresslevel=6, processes=3)
+        self.assertEqual(n1, 12)
+        self.assertEqual(n2, 12)
+        with zipfile.ZipFile(seq) as z1, zipfile.ZipFile(par) as z2:
+            self.assertIsNone(z2.testzip())
+            self.assertEqual(z1.namelist(), z2.namelist())
+            for i1, i2 in zip(z1.infolist(), z2.infolist()):
+                self.assertEqual(i1.CRC, i2.CRC)
+                self.assertEqual(i1.compress_size, i2.compress_size)
+                self.assertEqual(z1.read(i1), z2.read(i2))
+        self.assertLesser(os.path.getsize(par), os.path.getsize(seq) + 1000)
+
+        content = zip_files(None, files[:3], root=src, processes=2,
+                            compression=zipfile.ZIP_BZIP2)
+        res = unzip_files(content)
+        self.assertEqual(len(res), 3)
+        with open(files[1], "rb") as f:
+            self.assertEqual(res[1][1], f.read())
+
+    def test_unzip_files_parallel(self):
+        temp = get_temp_folder(__file__, "temp_unzip_files_parallel")
+        src, files = self._create_files(temp)
+        name = os.path.join(temp, "data.zip")
+        zip_files(name, files, root=src, compression=zipfile.ZIP_DEFLATED)
+
+        seq = unzip_files(name, where_to=os.path.join(temp, "seq"))
+        par = unzip_files(name, where_to=os.path.join(temp, "par"),
+                          processes=3)
+        self.assertEqual(len(seq), 12)
+        self.assertEqual([os.path.relpath(f, os.path.join(temp, "seq")) for f in seq],
+                         [os.path.relpath(f, os.path.join(temp, "par")) for f in par])
+        for f1, f2 in zip(seq, par):
+            self.assertNotIn(" ", f2)
+            with open(f1, "rb") as a, open(f2, "rb") as b:
+                self.assertEqual(a.read(), b.read())
+
+        names = []
+        for member, f in enumerate_unzip_files(name, fvalid=lambda n: "d1" in n):
+            names.append(member)
+            data = f.read(10)
+            self.assertEqual(len(data), 10)
+        self.assertEqual(len(names), 4)
+        res = list(unzip_files(name, streaming=True))
+        self.assertEqual(len(res), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,154 @@
+"""
+@brief      test log(time=2s)
+"""
+import os
+import csv
+import time
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.filehelper.download_helper import (
+    get_urls_content_timeout, InternetException, _hash_url)
+
+
+def _content(path):
+    return (path.encode("ascii") + b"-") * 2000
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    lock = threading.Lock()
+    connections = {}
+    running = {}
+    max_running = {}
+    ranges = []
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+        with RangeHandler.lock:
+            host = self.server.server_address
+            RangeHandler.connections[host] = RangeHandler.connections.get(
+                host, 0) + 1
+
+    def do_GET(self):
+        if self.path.startswith("/missing"):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        host = self.headers["Host"].split(":")[0]
+        with RangeHandler.lock:
+            RangeHandler.running[host] = RangeHandler.running.get(host, 0) + 1
+            RangeHandler.max_running[host] = max(
+                RangeHandler.max_running.get(host, 0), RangeHandler.running[host])
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.05)
+            data = _content(self.path)
+            rg = self.headers.get("Range", None)
+            if rg is not None:
+                RangeHandler.ranges.append(rg)
+                start = int(rg.split("=")[1].split("-")[0])
+                if start >= len(data):
+                    self.send_response(416)
+                    self.send_header("Content-Range", f"bytes */{len(data)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                self.send_response(206)
+                self.send_header(
+                    "Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+                data = data[start:]
+            else:
+                self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        finally:
+            with RangeHandler.lock:
+                RangeHandler.running[host] -= 1
+
+
+class TestDownloadUrlsConcurrent(ExtTestCase):
+
+    def setUp(self):
+        RangeHandler.connections.clear()
+        RangeHandler.running.clear()
+        RangeHandler.max_running.clear()
+        RangeHandler.ranges.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs=dict(poll_interval=0.05))
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+    def _read_summary(self, folder):
+        with open(os.path.join(folder, "summary.csv"), "r", encoding="utf-8") as f:
+            return list(csv.DictReader(f))
+
+    def test_download_concurrent(self):
+        temp = get_temp_folder(__file__, "temp_download_urls_concurrent")
+        urls = [f"http://{host}:{self.port}/slow{i}"
+                for i in range(6) for host in ["127.0.0.1", "localhost"]]
+        # a partial download
+        partial = os.path.join(temp, _hash_url(urls[0]) + ".bin")
+        with open(partial, "wb") as f:
+            f.write(_content("/slow0")[:1000])
+
+        res = get_urls_content_timeout(urls, folder=temp, max_workers=8,
+                                       max_per_host=2)
+        self.assertEqual(len(res), 12)
+        self.assertEqual(RangeHandler.ranges, ["bytes=1000-"])
+        # connections are limited and reused
+        self.assertLesser(max(RangeHandler.max_running.values()), 2)
+        self.assertLesser(sum(RangeHandler.connections.values()), 4)
+        for url in urls:
+            name = os.path.join(temp, _hash_url(url) + ".bin")
+            with open(name, "rb") as f:
+                self.assertEqual(f.read(), _content("/" + url.split("/")[-1]))
+
+        rows = self._read_summary(temp)
+        self.assertEqual(set(r["url"] for r in rows), set(urls))
+        self.assertEqual(set(int(r["size"]) for r in rows),
+                         set(len(_content(f"/slow{i}")) for i in range(6)))
+        # everything is already downloaded
+        res = get_urls_content_timeout(urls, folder=temp, max_workers=8)
+        self.assertEqual(len(res), 12)
+        self.assertEqual(len(self._read_summary(temp)), 12)
+
+    def test_download_concurrent_failure(self):
+        temp = get_temp_folder(__file__, "temp_download_urls_concurrent_failure")
+        urls = [f"http://127.0.0.1:{self.port}/page{i}" for i in range(3)]
+        urls.append(f"http://127.0.0.1:{self.port}/missing")
+        self.assertRaise(
+            lambda: get_urls_content_timeout(urls, folder=temp, max_workers=1),
+            InternetException)
+        # downloads completed before the failure are recorded
+        rows = self._read_summary(temp)
+        self.assertEqual([r["url"] for r in rows], urls[:3])
+
+        res = get_urls_content_timeout(urls, folder=temp, max_workers=2,
+                                       raise_exception=False)
+        self.assertEqual(len(res), 3)
+
+        # sequential version
+        res = get_urls_content_timeout(urls[:2], folder=temp)
+        self.assertEqual(len(res), 3)
+        temp2 = os.path.join(temp, "seq")
+        os.mkdir(temp2)
+        res = get_urls_content_timeout(urls[:2], folder=temp2, encoding=None)
+        self.assertEqual([r["url"] for r in self._read_summary(temp2)], urls[:2])
+
+
+if __name__ == "__main__":
+    unittest.main()
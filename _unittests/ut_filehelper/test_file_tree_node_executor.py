@@ -0,0 +1,91 @@
+"""
+@brief      test log(time=2s)
+"""
+
+import os
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from pyquickhelper.loghelper import noLOG
+from pyquickhelper.pycode import get_temp_folder, ExtTestCase
+from pyquickhelper.filehelper import FileTreeNode, ScanIndex, synchronize_folder
+
+
+class TestFileTreeNodeExecutor(ExtTestCase):
+
+    def _create_tree(self, folder, suffix=""):
+        for d in range(3):
+            sub = os.path.join(folder, f"d{d}", "sub")
+            os.makedirs(sub)
+            for i in range(5):
+                with open(os.path.join(sub, f"f{i}.txt"), "w") as f:
+                    f.write(f"content {d} {i % 2}{suffix if i == 2 else ''}")
+        os.makedirs(os.path.join(folder, "empty", "sub"))
+        with open(os.path.join(folder, "d0", "ignored.pyc"), "w") as f:
+            f.write("-")
+
+    def test_fill_executor(self):
+        temp = get_temp_folder(__file__, "temp_fill_executor")
+        self._create_tree(temp)
+
+        def filter(root, path, f, d):
+            return d or not f.endswith(".pyc")
+
+        node = FileTreeNode(temp, filter=filter)
+        with ThreadPoolExecutor(4) as executor:
+            node2 = FileTreeNode(temp, filter=filter, executor=executor)
+        self.assertEqual([n.name for n in node], [n.name for n in node2])
+        self.assertEqual([n.date for n in node], [n.date for n in node2])
+        self.assertEqual([n.size for n in node if n.type == "file"],
+                         [n.size for n in node2 if n.type == "file"])
+        self.assertEqual([n._level for n in node], [n._level for n in node2])
+        self.assertNotIn("empty", [n.name for n in node2])
+        self.assertEqual(node2.timings["fill.n_dirs"], 9)
+        self.assertIn("fill.scandir", node2.timings)
+        self.assertIn("fill", node2.timings)
+
+    def test_difference_executor(self):
+        temp = get_temp_folder(__file__, "temp_difference_executor")
+        src = os.path.join(temp, "src")
+        dest = os.path.join(temp, "dest")
+        self._create_tree(src, "A")
+        self._create_tree(dest, "B")
+
+        n1, n2 = FileTreeNode(src), FileTreeNode(dest)
+        expected = [(r[0], r[1]) for r in n1.difference(n2)]
+        self.assertEqual(n1.timings["difference.n_hashed"], 16)
+        with ThreadPoolExecutor(4) as executor:
+            res = n1.difference(n2, executor=executor)
+        self.assertEqual([(r[0], r[1]) for r in res], expected)
+        ops = set(r[0] for r in res if r[1].endswith(".txt"))
+        self.assertEqual(ops, {"==", "<"})
+        for k in ["dict", "compare", "hash", "sort"]:
+            self.assertIn("difference." + k, n1.timings)
+
+        # the hashes are stored in the index
+        name = os.path.join(temp, "index.db3")
+        with ScanIndex(name) as index:
+            n1 = FileTreeNode(src, index=index)
+            n2 = FileTreeNode(dest, index=index)
+            with ThreadPoolExecutor(4) as executor:
+                res = n1.difference(n2, executor=executor)
+            self.assertEqual([(r[0], r[1]) for r in res], expected)
+            f = n1.get_dict()[os.path.join("d1", "sub", "f0.txt")]
+            self.assertEqual(
+                index.get_hash(f.fullname, f.size, f._mtime_ns, f._inode),
+                f._hash_md5_readfile())
+
+    def test_synchronize_executor(self):
+        temp = get_temp_folder(__file__, "temp_synchronize_executor")
+        src = os.path.join(temp, "src")
+        dest = os.path.join(temp, "dest")
+        self._create_tree(src)
+        with ThreadPoolExecutor(4) as executor:
+            res = synchronize_folder(src, dest, create_dest=True,
+                                     executor=executor, fLOG=noLOG)
+            self.assertEqual(len(res), 16)
+            res = synchronize_folder(src, dest, executor=executor, fLOG=noLOG)
+            self.assertEqual(len(res), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,151 @@
+"""
+@brief      test log(time=3s)
+"""
+import os
+import threading
+import unittest
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.filehelper import FileTreeNode, FolderTransferFTP, TransferFTP
+from pyquickhelper.filehelper.ftp_transfer_mock import MockTransferFTP
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+except ImportError:  # pragma: no cover
+    ThreadedFTPServer = None
+
+
+class FlakyTransferFTP(MockTransferFTP):
+
+    lock = threading.Lock()
+    calls = []
+    sessions = []
+
+    def __init__(self, *args, **kwargs):
+        MockTransferFTP.__init__(self, *args, **kwargs)
+        with FlakyTransferFTP.lock:
+            FlakyTransferFTP.sessions.append(self)
+
+    def transfer(self, file, to, name, debug=False, blocksize=None, callback=None):
+        with FlakyTransferFTP.lock:
+            FlakyTransferFTP.calls.append(name)
+            first = FlakyTransferFTP.calls.count(name) == 1
+        if first and name.startswith("f1"):
+            raise ConnectionResetError("reset")
+        return True
+
+
+class StatusFolderTransferFTP(FolderTransferFTP):
+
+    def update_status(self, file, save=True):
+        res = FolderTransferFTP.update_status(self, file, save=save)
+        with open(self._ft.fileKeep, "r", encoding="utf8") as f:
+            self.saved.append(len(f.read().strip().split("\n")))
+        return res
+
+
+class TestFolderTransferPool(ExtTestCase):
+
+    def _create_tree(self, temp, n=20):
+        src = os.path.join(temp, "src")
+        for i in range(n):
+            sub = os.path.join(src, f"d{i % 3}")
+            if not os.path.exists(sub):
+                os.makedirs(sub)
+            with open(os.path.join(sub, f"f{i}.txt"), "w") as f:
+                f.write(f"content {i}\n" * (i + 1))
+        return src
+
+    def test_folder_transfer_pool_retry(self):
+        temp = get_temp_folder(__file__, "temp_folder_transfer_pool_retry")
+        src = self._create_tree(temp)
+        status = os.path.join(temp, "status.txt")
+        FlakyTransferFTP.calls.clear()
+        FlakyTransferFTP.sessions.clear()
+
+        ftp = FlakyTransferFTP("site", "login", "password")
+        fftp = FolderTransferFTP(FileTreeNode(src), ftp, status)
+        done = fftp.start_transfering(n_sessions=4, retries=2, backoff=0.01,
+                                      commit_every=5)
+        self.assertEqual(len(done), 20)
+        self.assertEqual(len(FlakyTransferFTP.sessions), 4)
+        # f1, f10, ..., f19 fail once
+        self.assertEqual(len(FlakyTransferFTP.calls), 31)
+        self.assertEqual(done, sorted(done, key=lambda f: f.filename))
+
+        fftp = FolderTransferFTP(FileTreeNode(src), ftp, status)
+        self.assertEqual(fftp.start_transfering(n_sessions=4), [])
+
+    def test_folder_transfer_pool_errors(self):
+        temp = get_temp_folder(__file__, "temp_folder_transfer_pool_errors")
+        src = self._create_tree(temp)
+        status = os.path.join(temp, "status.txt")
+        FlakyTransferFTP.calls.clear()
+
+        ftp = FlakyTransferFTP("site", "login", "password")
+        fftp = FolderTransferFTP(FileTreeNode(src), ftp, status)
+        done = fftp.start_transfering(n_sessions=3)
+        self.assertEqual(len(done), 9)
+
+        # only failed files are sent again
+        fftp = FolderTransferFTP(FileTreeNode(src), ftp, status)
+        done = fftp.start_transfering(n_sessions=3)
+        self.assertEqual(len(done), 11)
+
+    def test_folder_transfer_update_status(self):
+        temp = get_temp_folder(__file__, "temp_folder_transfer_update_status")
+        src = self._create_tree(temp, n=6)
+        status = os.path.join(temp, "status.txt")
+        FlakyTransferFTP.calls.clear()
+
+        ftp = FlakyTransferFTP("site", "login", "password")
+        fftp = StatusFolderTransferFTP(FileTreeNode(src), ftp, status)
+        fftp.saved = []
+        done = fftp.start_transfering(retries=1, backoff=0.01)
+        self.assertEqual(len(done), 6)
+        # the status is saved after every file
+        self.assertEqual(fftp.saved, [1, 2, 3, 4, 5, 6])
+
+    @unittest.skipIf(ThreadedFTPServer is None, reason="pyftpdlib is missing")
+    def test_folder_transfer_pool_ftp_server(self):
+        temp = get_temp_folder(__file__, "temp_folder_transfer_pool_server")
+        src = self._create_tree(temp)
+        remote = os.path.join(temp, "remote")
+        os.mkdir(remote)
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user("user", "pwd", remote, perm="elradfmw")
+        handler = type("Handler", (FTPHandler, ), {})
+        handler.authorizer = authorizer
+        server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+        port = server.socket.getsockname()[1]
+        th = threading.Thread(target=server.serve_forever,
+                              kwargs=dict(timeout=0.1))
+        # the server changes the current directory
+        cwd = os.getcwd()
+        th.start()
+        try:
+            ftp = TransferFTP("127.0.0.1", "user", "pwd", port=port)
+            fftp = FolderTransferFTP(FileTreeNode(src), ftp,
+                                     os.path.join(temp, "status.txt"),
+                                     root_web="www/site")
+            done = fftp.start_transfering(n_sessions=4)
+            self.assertEqual(len(done), 20)
+            self.assertEqual(ftp.dir_cache,
+                             {"www/site/d0", "www/site/d1", "www/site/d2"})
+            ftp.close()
+        finally:
+            server.close_all()
+            th.join()
+            os.chdir(cwd)
+
+        for i in range(20):
+            name = os.path.join(remote, "www", "site", f"d{i % 3}", f"f{i}.txt")
+            self.assertExists(name)
+            with open(name, "r") as f:
+                self.assertEqual(f.read(), f"content {i}\n" * (i + 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
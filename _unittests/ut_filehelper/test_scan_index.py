@@ -0,0 +1,147 @@
+"""
+@brief      test log(time=2s)
+"""
+
+import os
+import time
+import unittest
+from pyquickhelper.loghelper import noLOG
+from pyquickhelper.pycode import get_temp_folder, ExtTestCase
+from pyquickhelper.filehelper import (
+    FileTreeNode, ScanIndex, synchronize_folder)
+
+
+class TestScanIndex(ExtTestCase):
+
+    def _create_tree(self, folder):
+        for d in range(3):
+            sub = os.path.join(folder, f"d{d}", "sub")
+            os.makedirs(sub)
+            for i in range(4):
+                with open(os.path.join(sub, f"f{i}.txt"), "w") as f:
+                    f.write(f"content {d} {i}")
+        # folders modified within the racy delay are listed again
+        old = time.time() - 10
+        for root, dirs, _ in os.walk(folder):
+            for d in dirs:
+                os.utime(os.path.join(root, d), (old, old))
+        os.utime(folder, (old, old))
+
+    def test_scan_index(self):
+        temp = get_temp_folder(__file__, "temp_scan_index")
+        src = os.path.join(temp, "src")
+        self._create_tree(src)
+        name = os.path.join(temp, "index.db3")
+
+        expected = [n.name for n in FileTreeNode(src)]
+        dates = [n.date for n in FileTreeNode(src)]
+
+        with ScanIndex(name) as index:
+            node = FileTreeNode(src, index=index)
+            self.assertEqual([n.name for n in node], expected)
+            self.assertEqual([n.date for n in node], dates)
+            self.assertEqual(index.n_listed, 7)
+            self.assertEqual(index.n_skipped, 0)
+            self.assertEqual(len(index), 18)
+            h = node.get_dict()[os.path.join("d0", "sub", "f1.txt")].hash_md5_readfile()
+
+        with ScanIndex(name) as index:
+            node = FileTreeNode(src, index=index)
+            self.assertEqual([n.name for n in node], expected)
+            self.assertEqual(index.n_listed, 0)
+            self.assertEqual(index.n_skipped, 7)
+            n1 = node.get_dict()[os.path.join("d0", "sub", "f1.txt")]
+            self.assertEqual(index.get_hash(n1.fullname, n1.size,
+                                            n1._mtime_ns, n1._inode), h)
+
+        # a modified file, a new file
+        with open(os.path.join(src, "d0", "sub", "f1.txt"), "w") as f:
+            f.write("modified content")
+        with open(os.path.join(src, "d1", "sub", "new.txt"), "w") as f:
+            f.write("new")
+        with ScanIndex(name) as index:
+            node = FileTreeNode(src, index=index)
+            names = [n.name for n in node]
+            self.assertIn(os.path.join("d1", "sub", "new.txt"), names)
+            self.assertEqual(index.n_listed, 1)
+            n1 = node.get_dict()[os.path.join("d0", "sub", "f1.txt")]
+            self.assertEqual(n1.size, 16)
+            self.assertEqual(index.get_hash(n1.fullname, n1.size,
+                                            n1._mtime_ns, n1._inode), None)
+            self.assertNotEqual(n1.hash_md5_readfile(), h)
+
+        # without checking files, the index is trusted,
+        # only folders are checked
+        old = time.time() - 10
+        os.utime(os.path.join(src, "d1", "sub"), (old, old))
+        with ScanIndex(name, check_files=False) as index:
+            node = FileTreeNode(src, index=index)
+            self.assertEqual(index.n_listed, 1)
+        with ScanIndex(name, check_files=False) as index:
+            node = FileTreeNode(src, index=index)
+            self.assertEqual(len(node), 20)
+            self.assertEqual(index.n_listed, 0)
+            self.assertEqual(index.n_stat, 7)
+
+    def test_scan_index_special_names(self):
+        temp = get_temp_folder(__file__, "temp_scan_index_special_names")
+        name = os.path.join(temp, "index.db3")
+        src = os.path.join(temp, "src")
+        for sub in ["a_b", "axb", "c%d", "cxd"]:
+            os.makedirs(os.path.join(src, sub, "sub"))
+            with open(os.path.join(src, sub, "sub", "f.txt"), "w") as f:
+                f.write(sub)
+        old = time.time() - 100
+        for root, dirs, _ in os.walk(src, topdown=False):
+            for d in dirs:
+                os.utime(os.path.join(root, d), (old, old))
+        os.utime(src, (old, old))
+        with ScanIndex(name) as index:
+            FileTreeNode(src, index=index)
+            self.assertEqual(index.n_listed, 9)
+
+        # a hash stored for a folder which was never listed
+        other = os.path.join(temp, "other")
+        os.mkdir(other)
+        with open(os.path.join(other, "g.txt"), "w") as f:
+            f.write("g")
+        st = os.stat(os.path.join(other, "g.txt"))
+        with ScanIndex(name) as index:
+            index.set_hash(os.path.join(other, "g.txt"), "h", st.st_size,
+                           st.st_mtime_ns, st.st_ino)
+            self.assertEqual(len(index.listdir(other)), 1)
+            self.assertEqual(
+                index.get_hash(os.path.join(other, "g.txt"), st.st_size,
+                               st.st_mtime_ns, st.st_ino), "h")
+
+        # removing a_b and c%d must not remove axb and cxd
+        for sub in ["a_b", "c%d"]:
+            os.remove(os.path.join(src, sub, "sub", "f.txt"))
+            os.rmdir(os.path.join(src, sub, "sub"))
+            os.rmdir(os.path.join(src, sub))
+        with ScanIndex(name) as index:
+            node = FileTreeNode(src, index=index)
+            self.assertEqual(len(node), 7)
+            self.assertEqual(index.n_listed, 1)
+            self.assertEqual(index.n_skipped, 4)
+
+    def test_synchronize_scan_index(self):
+        temp = get_temp_folder(__file__, "temp_synchronize_scan_index")
+        src = os.path.join(temp, "src")
+        dest = os.path.join(temp, "dest")
+        self._create_tree(src)
+        name = os.path.join(temp, "index.db3")
+        res = synchronize_folder(src, dest, create_dest=True,
+                                 scan_index=name, fLOG=noLOG)
+        self.assertEqual(len(res), 12)
+        self.assertExists(os.path.join(dest, "d2", "sub", "f3.txt"))
+        res = synchronize_folder(src, dest, scan_index=name, fLOG=noLOG)
+        self.assertEqual(len(res), 0)
+        with open(os.path.join(src, "d2", "sub", "f3.txt"), "w") as f:
+            f.write("a longer new content")
+        res = synchronize_folder(src, dest, scan_index=name, fLOG=noLOG)
+        self.assertEqual(len(res), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
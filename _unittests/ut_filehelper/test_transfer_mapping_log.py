@@ -0,0 +1,128 @@
+"""
+@brief      test log(time=2s)
+"""
+import os
+import datetime
+import unittest
+from pyquickhelper.pycode import get_temp_folder, ExtTestCase
+from pyquickhelper.filehelper import EncryptedBackup, FileTreeNode
+from pyquickhelper.filehelper.transfer_api import (
+    MockTransferAPI, TransferAPI_FileInfo, TransferAPI_MappingLog)
+
+
+class FailingTransferAPI(MockTransferAPI):
+
+    def __init__(self):
+        MockTransferAPI.__init__(self)
+        self.fail_at = None
+        self.n_pieces = 0
+        self.down = False
+
+    def transfer(self, path, data):
+        if not path.startswith("__mapping"):
+            self.n_pieces += 1
+        if self.down or self.n_pieces == self.fail_at:
+            self.down = True
+            raise ConnectionError(f"unable to send {path!r}")
+        return MockTransferAPI.transfer(self, path, data)
+
+
+class TestTransferMappingLog(ExtTestCase):
+
+    def test_segment(self):
+        date = datetime.datetime(2020, 1, 2, 3, 4, 5)
+        entries = [TransferAPI_FileInfo("a/b.txt", ["p1", "p2"], date),
+                   TransferAPI_FileInfo("é.txt", [], date)]
+        data = TransferAPI_MappingLog.segment2bytes(entries)
+        back = TransferAPI_MappingLog.bytes2segment(data)
+        self.assertEqual([(v.name, v.pieces, v.last_update) for v in back],
+                         [(v.name, v.pieces, v.last_update) for v in entries])
+
+        api = MockTransferAPI()
+        log = TransferAPI_MappingLog(api, max_segments=2)
+        self.assertEqual(log.load(), {})
+        log.append(entries[:1])
+        log.append([TransferAPI_FileInfo("a/b.txt", ["p3"], date)])
+        self.assertTrue(log.needs_compaction())
+        mapping = TransferAPI_MappingLog(api).load()
+        self.assertEqual(mapping["a/b.txt"].pieces, ["p3"])
+        log.compact(mapping)
+        log = TransferAPI_MappingLog(api)
+        self.assertEqual(list(log.load()), ["a/b.txt"])
+        self.assertEqual(log.segments, ["segment_00000002"])
+
+        # legacy mapping
+        api = MockTransferAPI()
+        api.transfer_mapping({"a/b.txt": entries[0]}, None)
+        log = TransferAPI_MappingLog(api)
+        self.assertEqual(log.load()["a/b.txt"].pieces, ["p1", "p2"])
+        self.assertTrue(log.needs_compaction())
+
+    def _backup(self, temp, api, **kwargs):
+        ft = FileTreeNode(os.path.join(temp, "src"), repository=False)
+        return EncryptedBackup(
+            key=b"unit" * 8,
+            file_tree_node=ft,
+            transfer_api=api,
+            file_status=os.path.join(temp, "status.txt"),
+            file_map=os.path.join(temp, "mapping.txt"),
+            root_local=temp,
+            compression="zip",
+            mapping_commit=2,
+            max_segments=3,
+            algo="AES", **kwargs)
+
+    def test_backup_resume(self):
+        try:
+            import Cryptodome as skip_
+        except ImportError:  # pragma: no cover
+            try:
+                import Crypto as skip__
+            except ImportError:
+                raise unittest.SkipTest("pycryptodomex is missing")
+
+        temp = get_temp_folder(__file__, "temp_backup_resume")
+        src = os.path.join(temp, "src")
+        os.mkdir(src)
+        for i in range(5):
+            with open(os.path.join(src, f"f{i}.txt"), "w") as f:
+                f.write(f"content {i}" * 100)
+
+        api = FailingTransferAPI()
+        # fails while sending the third file
+        api.fail_at = 3
+        enc = self._backup(temp, api)
+        self.assertRaise(enc.start_transfering, ConnectionError)
+
+        # the remote location is down, only the first segment is committed
+        enc = self._backup(temp, api)
+        self.assertEqual(sorted(enc.load_mapping()), ["src/f0.txt", "src/f1.txt"])
+        with open(os.path.join(temp, "status.txt"), "r") as f:
+            self.assertEqual(len(f.read().strip().split("\n")), 2)
+
+        api.down = False
+        api.fail_at = None
+        done, issues = enc.start_transfering()
+        self.assertEqual(done, ["src/f2.txt", "src/f3.txt", "src/f4.txt"])
+        self.assertEmpty(issues)
+        self.assertEqual(len(enc.Mapping), 5)
+
+        enc = self._backup(temp, api)
+        mapping = enc.load_mapping()
+        self.assertEqual(len(mapping), 5)
+        self.assertEqual(len(enc._log.segments), 3)
+        self.assertEqual(enc.retrieve("src/f3.txt"), b"content 3" * 100)
+
+        # compaction
+        with open(os.path.join(src, "f5.txt"), "w") as f:
+            f.write("new")
+        enc = self._backup(temp, api)
+        done, issues = enc.start_transfering()
+        self.assertEqual(done, ["src/f5.txt"])
+        self.assertEqual(len(enc._log.segments), 1)
+        enc = self._backup(temp, api)
+        self.assertEqual(len(enc.load_mapping()), 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
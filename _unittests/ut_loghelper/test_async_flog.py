@@ -0,0 +1,103 @@
+"""
+@brief      test log(time=1s)
+"""
+import io
+import threading
+import time
+import unittest
+from pyquickhelper.pycode import ExtTestCase
+from pyquickhelper.loghelper import fLOG, AsyncLogSink, set_async_log
+
+
+class SlowStream(io.StringIO):
+
+    def __init__(self):
+        io.StringIO.__init__(self)
+        self.n_writes = 0
+        self.n_flushes = 0
+        self.event = threading.Event()
+
+    def write(self, s):
+        self.event.wait()
+        self.n_writes += 1
+        return io.StringIO.write(self, s)
+
+    def flush(self):
+        self.n_flushes += 1
+
+
+class TestAsyncFLOG(ExtTestCase):
+
+    def test_sink_block(self):
+        stream = SlowStream()
+        stream.event.set()
+        written = []
+        sink = AsyncLogSink(written.append, max_queue=10, batch_size=50,
+                            flush_interval=10)
+        for i in range(1000):
+            sink.put(f"m{i}\n", display=i % 2 == 0, stream=stream)
+        self.assertTrue(sink.flush())
+        self.assertEqual(len(written), 1000)
+        self.assertEqual(sink.n_dropped, 0)
+        lines = stream.getvalue().split("\n")
+        self.assertEqual(lines[:3], ["m0", "m2", "m4"])
+        self.assertEqual(len(lines), 501)
+        # messages are written by batches
+        self.assertLesser(stream.n_writes, 999)
+        sink.close()
+        self.assertRaise(lambda: sink.put("m"), RuntimeError)
+        self.assertRaise(lambda: AsyncLogSink(print, policy="wait"), ValueError)
+
+    def test_sink_drop(self):
+        stream = SlowStream()
+        sink = AsyncLogSink(lambda m: None, max_queue=5, policy="drop")
+        res = [sink.put(f"m{i}", display=True, stream=stream) for i in range(20)]
+        self.assertIn(False, res)
+        self.assertGreater(sink.n_dropped, 0)
+        stream.event.set()
+        sink.close()
+        self.assertEqual(sink.n_written + sink.n_dropped, 20)
+        self.assertEqual(len(stream.getvalue().strip().split("\n")), sink.n_written)
+
+    def test_sink_flush_interval(self):
+        stream = SlowStream()
+        stream.event.set()
+        sink = AsyncLogSink(lambda m: None, flush_interval=0.01,
+                            flush_size=10 ** 9)
+        sink.put("m", display=True, stream=stream)
+        begin = time.perf_counter()
+        while stream.n_flushes == 0 and time.perf_counter() - begin < 5:
+            time.sleep(0.01)
+        self.assertEqual(stream.getvalue(), "m\n")
+        self.assertGreater(stream.n_flushes, 0)
+        sink.close()
+
+    def test_flog_async(self):
+        stream = io.StringIO()
+        fLOG(OutputPrint=True, AsyncLog=dict(flush_interval=0.05),
+             OutputStream=stream)
+        for i in range(100):
+            fLOG("async", i, OutputStream=stream)
+        fLOG(AsyncLog=False, OutputStream=stream)
+        fLOG(OutputPrint=False)
+        lines = [line for line in stream.getvalue().split("\n")
+                 if " async " in line]
+        self.assertEqual(len(lines), 100)
+        self.assertTrue(lines[-1].endswith("async 99"))
+        self.assertNotIn("AsyncLog", stream.getvalue())
+        self.assertIsNone(set_async_log(False))
+
+    def test_flog_async_closed(self):
+        # atexit closes the sink, the logs still work after that
+        stream = io.StringIO()
+        sink = set_async_log(True)
+        sink.close()
+        self.assertTrue(sink.closed)
+        fLOG("after close", OutputPrint=True, OutputStream=stream)
+        fLOG(OutputPrint=False)
+        self.assertIn("after close", stream.getvalue())
+        self.assertIsNone(set_async_log(False))
+
+
+if __name__ == "__main__":
+    unittest.main()
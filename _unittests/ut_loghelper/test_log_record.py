@@ -0,0 +1,90 @@
+"""
+@brief      test log(time=1s)
+"""
+import io
+import os
+import json
+import time
+import unittest
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.loghelper import (
+    fLOG, fLOGFormat, CustomLog, LogRecord, enumerate_log_records,
+    set_async_log)
+from pyquickhelper.loghelper.flog import GetLogFile
+
+
+class Unprintable:
+
+    def __init__(self):
+        self.n_str = 0
+
+    def __str__(self):
+        self.n_str += 1
+        return "U"
+
+
+class TestLogRecord(ExtTestCase):
+
+    def test_record(self):
+        rec = LogRecord.from_call(time.time_ns(), ("copy", [4, 5], b"x"),
+                                  dict(size=3))
+        self.assertEqual(rec.template, "copy")
+        self.assertEqual(rec.args, ([4, 5], b"x"))
+        text = rec.render()
+        expected = fLOGFormat("\n", "copy", [4, 5], b"x", size=3)
+        self.assertEqual(text[19:], expected[19:])
+        self.assertIn(" copy [4, 5] x\n", text)
+
+        js = json.loads(rec.to_json())
+        self.assertEqual(js, {"ts": rec.timestamp_ns, "template": "copy",
+                              "args": [[4, 5], "x"], "kwargs": {"size": 3}})
+        back = LogRecord.from_json(rec.to_json(), fmt="text")
+        self.assertEqual(back.render(), rec.render())
+        self.assertEqual(str(back), rec.render())
+        self.assertEqual(LogRecord.from_call(0, (1, 2)).template, None)
+        self.assertRaise(lambda: LogRecord(0, "a", (), fmt="xml"), ValueError)
+
+    def test_flog_structured(self):
+        obj = Unprintable()
+        fLOG(LogStructured="json")
+        try:
+            # nothing is displayed or stored, nothing is rendered
+            for i in range(10):
+                fLOG("not rendered", obj)
+            self.assertEqual(obj.n_str, 0)
+
+            stream = io.StringIO()
+            fLOG(OutputPrint=True)
+            fLOG("displayed", obj, OutputStream=stream)
+            self.assertEqual(obj.n_str, 1)
+            self.assertIn(" displayed U\n", stream.getvalue())
+
+            fLOG(OutputPrint=False, AsyncLog=True)
+            fLOG("async", obj)
+            set_async_log(False)
+            self.assertEqual(obj.n_str, 2)
+        finally:
+            fLOG(LogStructured=False, OutputPrint=False)
+        self.assertRaise(lambda: fLOG(LogStructured="xml"), ValueError)
+
+    def test_custom_log_structured(self):
+        temp = get_temp_folder(__file__, "temp_custom_log_structured")
+        obj = Unprintable()
+        clog = CustomLog(temp, "log.jsonl", structured="json", buffer_size=3)
+        clog("first", 1, obj)
+        clog("second", obj, key="v")
+        self.assertEqual(obj.n_str, 0)
+        clog("third")
+        self.assertEqual(obj.n_str, 2)
+        clog("fourth")
+        clog.flush()
+        records = list(enumerate_log_records(os.path.join(temp, "log.jsonl")))
+        self.assertEqual([r.template for r in records],
+                         ["first", "second", "third", "fourth"])
+        self.assertEqual(records[0].args, (1, "U"))
+        self.assertEqual(records[1].kwargs, {"key": "v"})
+        self.assertIn(" second U\n", records[1].render())
+
+
+if __name__ == "__main__":
+    unittest.main()
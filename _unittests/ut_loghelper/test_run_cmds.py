@@ -0,0 +1,111 @@
+"""
+@brief      test log(time=3s)
+"""
+import sys
+import time
+import unittest
+from pyquickhelper.pycode import ExtTestCase
+from pyquickhelper.loghelper import run_cmd, run_cmds, RunCmdException, BufferedPrint
+
+
+def _py(code):
+    return [sys.executable, "-c", code]
+
+
+class TestRunCmds(ExtTestCase):
+
+    def test_run_cmd_streaming(self):
+        code = ("import sys,time\n"
+                "for i in range(3):\n"
+                "    print('out', i, flush=True)\n"
+                "    print('err', i, file=sys.stderr, flush=True)\n"
+                "sys.stdout.write('last')")
+        lines = []
+        out, err = run_cmd(_py(code), wait=True, communicate=False,
+                           preprocess=False, log_error=False,
+                           fLOG=lambda *args: lines.append(" ".join(args)))
+        self.assertEqual(out, "out 0\nout 1\nout 2\nlast")
+        self.assertEqual(err, "err 0\nerr 1\nerr 2")
+        self.assertIn("last", lines)
+
+        # no polling, the function returns as soon as the process ends
+        begin = time.perf_counter()
+        for i in range(5):
+            run_cmd(_py("pass"), wait=True, communicate=False, preprocess=False)
+        self.assertLesser(time.perf_counter() - begin, 10)
+
+        seen = []
+
+        def stop_running_if(out, err):
+            seen.append(out)
+            return out is not None and out.startswith("stop")
+
+        out, err = run_cmd(
+            _py("import time\nprint('stop', flush=True)\ntime.sleep(30)"),
+            wait=True, communicate=False, preprocess=False,
+            stop_running_if=stop_running_if, fLOG=lambda *a: None)
+        self.assertIn("killing process", out)
+        self.assertEqual(err, "Process killed.")
+
+    def test_run_cmds(self):
+        code = ("import time,sys\n"
+                "print('start', time.time(), flush=True)\n"
+                "time.sleep(0.5)\n"
+                "print('end', time.time(), flush=True)\n"
+                "sys.exit(int(sys.argv[1]))")
+        buf = BufferedPrint()
+        cmds = [_py(code) + [str(i % 2)] for i in range(4)]
+        res = run_cmds(cmds, max_workers=4, fLOG=buf.fprint, preprocess=False)
+        self.assertEqual([r['returncode'] for r in res], [0, 1, 0, 1])
+        starts = [float(r['out'].split("\n")[0].split()[1]) for r in res]
+        ends = [float(r['out'].split("\n")[1].split()[1]) for r in res]
+        # the commands run concurrently
+        self.assertLesser(max(starts), min(ends))
+        text = str(buf)
+        for i in range(4):
+            self.assertIn(f"[{i}] start", text)
+
+        res = run_cmds(cmds[:3], max_workers=1, preprocess=False,
+                       prefixes=["a ", "b ", "c "])
+        starts = [float(r['out'].split("\n")[0].split()[1]) for r in res]
+        ends = [float(r['out'].split("\n")[1].split()[1]) for r in res]
+        self.assertGreater(starts[1], ends[0])
+        self.assertGreater(starts[2], ends[1])
+
+        self.assertRaise(
+            lambda: run_cmds(cmds[:2], preprocess=False, raise_exception=True),
+            RunCmdException)
+        self.assertRaise(lambda: run_cmds(cmds[:2], timeout=[1]), ValueError)
+
+    def test_run_cmds_timeout(self):
+        cmds = [_py("import time\ntime.sleep(30)"), _py("print('fast')")]
+        begin = time.perf_counter()
+        res = run_cmds(cmds, timeout=[0.5, 10], preprocess=False)
+        self.assertLesser(time.perf_counter() - begin, 10)
+        self.assertTrue(res[0]['timeout'])
+        self.assertFalse(res[1]['timeout'])
+        self.assertEqual(res[1]['out'], "fast")
+        self.assertEqual(res[1]['returncode'], 0)
+
+        res = run_cmds([f'"{sys.executable}" -c "print(3)"'], shell=True)
+        self.assertEqual(res[0]['out'], "3")
+
+
+    def test_run_cmds_errors(self):
+        cmds = [_py("print(1)"), ["does-not-exist-xyz"],
+                _py("import sys\nsys.stdout.write('a' * 200000 + '\\nb')")]
+        res = run_cmds(cmds, max_workers=2, preprocess=False, timeout=60)
+        self.assertEqual(res[0]['out'], "1")
+        self.assertEqual(res[0]['returncode'], 0)
+        self.assertEmpty(res[0]['error'])
+        self.assertEmpty(res[1]['returncode'])
+        self.assertIsInstance(res[1]['error'], OSError)
+        self.assertEqual(res[2]['returncode'], 0)
+        self.assertEqual(res[2]['out'], 'a' * 200000 + '\nb')
+        self.assertRaise(
+            lambda: run_cmds(cmds[:2], preprocess=False, raise_exception=True),
+            RunCmdException)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -5,10 +5,12 @@
 import sys
 import os
 import unittest
+import zipfile
 import pandas
 
 from pyquickhelper.loghelper import fLOG
 from pyquickhelper.filehelper import is_file_string
+from pyquickhelper.pycode import get_temp_folder
 from pyquickhelper.pandashelper import read_csv
 
 
@@ -32,6 +34,37 @@ class TestPandasHelperZip(unittest.TestCase):
         full = dfs["bank-full.csv"]
         assert isinstance(full, pandas.DataFrame)
 
+    def test_zip_to_df_chunksize(self):
+        temp = get_temp_folder(__file__, "temp_zip_to_df_chunksize")
+        name = os.path.join(temp, "data.zip")
+        df = pandas.DataFrame(dict(a=list(range(1000)),
+                                   b=[f"t{i}" for i in range(1000)]))
+        with zipfile.ZipFile(name, "w", compression=zipfile.ZIP_DEFLATED) as z:
+            z.writestr("one.csv", df.to_csv(index=False))
+            z.writestr("two.csv", df.iloc[:10].to_csv(index=False))
+            z.writestr("readme.txt", "not a csv")
+
+        dfs = read_csv(name, fvalid=lambda n: n.endswith(".csv"))
+        self.assertEqual(set(dfs), {"one.csv", "two.csv", "readme.txt"})
+        self.assertEqual(dfs["readme.txt"], b"not a csv")
+        self.assertEqual(dfs["one.csv"].shape, (1000, 2))
+        self.assertEqual(list(dfs["two.csv"]["b"]), list(df["b"].iloc[:10]))
+
+        sizes = {}
+        for member, reader in read_csv(name, chunksize=300,
+                                       fvalid=lambda n: n.endswith(".csv")):
+            if isinstance(reader, bytes):
+                continue
+            sizes[member] = [chunk.shape[0] for chunk in reader]
+        self.assertEqual(sizes, {"one.csv": [300, 300, 300, 100],
+                                 "two.csv": [10]})
+
+        csv = os.path.join(temp, "data.csv")
+        df.to_csv(csv, index=False)
+        self.assertEqual(read_csv(csv).shape, (1000, 2))
+        self.assertEqual(
+            sum(c.shape[0] for c in read_csv(csv, chunksize=400)), 1000)
+
 
 if __name__ == "__main__":
     unittest.main()
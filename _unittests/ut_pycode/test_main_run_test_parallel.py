@@ -0,0 +1,115 @@
+"""
+@brief      test log(time=8s)
+"""
+
+import os
+import json
+import re
+import unittest
+from io import StringIO
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.pycode.utils_tests_private import (
+    main_run_test, schedule_longest_first, save_test_durations,
+    load_test_durations)
+
+
+TEST_CODE = '''"""
+@brief      test log(time=%ds)
+"""
+import time
+import unittest
+import warnings
+
+
+class TestMrt%s(unittest.TestCase):
+
+    def test_%s(self):
+        time.sleep(%f)
+        warnings.warn("warning from %s", UserWarning)
+        %s
+
+
+if __name__ == "__main__":
+    unittest.main()
+'''
+
+
+class TestMainRunTestParallel(ExtTestCase):
+    maxDiff = None
+
+    def test_schedule_longest_first(self):
+        self.assertEqual(
+            schedule_longest_first(["a", "b", "c", "d"],
+                                   dict(a=1, b=5, c=3)),
+            ["b", "c", "a", "d"])
+
+    def test_durations_history(self):
+        temp = get_temp_folder(__file__, "temp_durations_history")
+        name = os.path.join(temp, "durations.json")
+        self.assertEqual(load_test_durations(name), {})
+        history = {}
+        for i in range(7):
+            history = save_test_durations(name, history, dict(a=i), keep=3)
+        self.assertEqual(load_test_durations(name), dict(a=[4, 5, 6]))
+
+    def _create_tests(self, temp):
+        folder = os.path.join(temp, "_unittests", "ut_mrt")
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        tests = [("mrtquick", 1, 0.1, ""),
+                 ("mrtslow", 1, 1.0, ""),
+                 ("mrtfail", 2, 0.2, "self.assertEqual(0, 1)"),
+                 ("mrtmedium", 3, 0.5, "")]
+        for name, hint, sleep, body in tests:
+            with open(os.path.join(folder, f"test_{name}.py"), "w") as f:
+                f.write(TEST_CODE % (hint, name.capitalize(), name, sleep,
+                                     name, body))
+        return os.path.dirname(folder)
+
+    def test_main_run_test_parallel(self):
+        temp = get_temp_folder(__file__, "temp_main_run_test_parallel")
+        folder = self._create_tests(temp)
+
+        res = {}
+        outputs = {}
+        for n_workers in [None, 3]:
+            runner = unittest.TextTestRunner(verbosity=0, stream=StringIO())
+            out = StringIO()
+            res[n_workers] = main_run_test(
+                runner, path_test=folder, stdout=out, n_workers=n_workers,
+                filter_warning=lambda w: True)
+            outputs[n_workers] = out.getvalue()
+
+        seq, par = res[None], res[3]
+        self.assertEqual(list(seq["failed"]), ["ut_mrt/test_mrtfail.py"])
+        self.assertEqual(list(par["failed"]), list(seq["failed"]))
+        self.assertIn("AssertionError: 0 != 1", par["failed"]["ut_mrt/test_mrtfail.py"])
+        self.assertEqual([os.path.split(t[0])[-1] for t in par["tests"]],
+                         [os.path.split(t[0])[-1] for t in seq["tests"]])
+        self.assertEqual([t[1].testsRun for t in par["tests"]],
+                         [t[1].testsRun for t in seq["tests"]])
+        self.assertIn("errors=0 failures=1", str(par["tests"][-2][1]))
+        self.assertIn("failures=0", str(par["tests"][0][1]))
+
+        # same summary, same warnings
+        def clean_(text):
+            # a suite which has run does not keep its tests
+            text = re.sub("tests=\\[.*?\\]>", "tests=[]>", text)
+            return re.sub("[0-9.]+s", "#s", text)
+
+        self.assertEqual(clean_(outputs[3]), clean_(outputs[None]))
+        self.assertIn("warning from mrtslow", outputs[3])
+        self.assertIn("*[pyqwarning]:", par["err"])
+        self.assertEqual(clean_(par["err"]), clean_(seq["err"]))
+
+        # history
+        name = os.path.join(folder, ".test_durations.json")
+        self.assertExists(name)
+        with open(name, "r") as f:
+            history = json.load(f)
+        self.assertEqual(len(history["ut_mrt/test_mrtslow.py"]), 1)
+        self.assertGreater(history["ut_mrt/test_mrtslow.py"][0], 0.9)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+"""
+@brief      test log(time=3s)
+
+"""
+import os
+import json
+import time
+import unittest
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor
+from pyquickhelper.pycode import skipif_appveyor, ExtTestCase, get_temp_folder
+from pyquickhelper.server import run_doc_server
+from pyquickhelper.server.documentation_server import (
+    DocumentationCache, DocumentationHandler)
+
+
+class TestDocumentationCache(ExtTestCase):
+
+    def test_cache_lru(self):
+        cache = DocumentationCache(max_bytes=10)
+        cache.set("a", "aaaa", 1)
+        cache.set("b", b"bbbb", 1)
+        self.assertEqual(cache.get("a", 1), "aaaa")
+        cache.set("c", "cccc", 1)
+        # b is the least recently used
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.get("b", 1), None)
+        self.assertEqual(cache.nbytes, 8)
+        cache.set("d", "d" * 11, 1)
+        self.assertNotIn("d", cache)
+        st = cache.stats()
+        self.assertEqual(st["hits"], 1)
+        self.assertEqual(st["misses"], 1)
+        self.assertEqual(st["evictions"], 1)
+        self.assertEqual(st["entries"], 2)
+
+    def test_cache_invalidation(self):
+        temp = get_temp_folder(__file__, "temp_documentation_cache")
+        name = os.path.join(temp, "page.html")
+        with open(name, "w", encoding="utf-8") as f:
+            f.write("v1")
+        DocumentationHandler.update_cache(name, "v1")
+        self.assertEqual(DocumentationHandler.get_from_cache(name), "v1")
+        sig = DocumentationCache.signature(name)
+        with open(name, "w", encoding="utf-8") as f:
+            f.write("v22")
+        os.utime(name, ns=(sig[0] + 10 ** 9, sig[0] + 10 ** 9))
+        self.assertEqual(DocumentationHandler.get_from_cache(name), None)
+        self.assertNotIn(name, DocumentationHandler.cache)
+        self.assertNotEqual(DocumentationCache.etag(sig),
+                            DocumentationCache.etag(DocumentationCache.signature(name)))
+
+    def test_cache_threads(self):
+        cache = DocumentationCache(max_bytes=500)
+
+        def work(i):
+            for j in range(200):
+                key = str((i * 7 + j) % 50)
+                if cache.get(key, 0) is None:
+                    cache.set(key, "x" * 20, 0)
+
+        with ThreadPoolExecutor(8) as ex:
+            list(ex.map(work, range(8)))
+        st = cache.stats()
+        self.assertLesser(st["bytes"], 500)
+        self.assertEqual(st["bytes"], 20 * st["entries"])
+        self.assertEqual(st["hits"] + st["misses"], 1600)
+
+    @skipif_appveyor("does not end")
+    def test_server_etag(self):
+        path = os.path.abspath(os.path.split(__file__)[0])
+        data = os.path.join(path, "data")
+        thread = run_doc_server('localhost', {"pyquickhelper": data},
+                                True, port=8095, cache_size=2 ** 20)
+        try:
+            url = "http://localhost:8095/pyquickhelper/index.html"
+            with urllib.request.urlopen(url) as resp:
+                self.assertEqual(resp.status, 200)
+                etag = resp.headers["ETag"]
+                content = resp.read()
+            self.assertNotEmpty(content)
+            self.assertNotEmpty(etag)
+
+            req = urllib.request.Request(url, headers={"If-None-Match": etag})
+            with self.assertRaises(urllib.error.HTTPError) as e:
+                urllib.request.urlopen(req)
+            self.assertEqual(e.exception.code, 304)
+
+            req = urllib.request.Request(url, headers={"If-None-Match": '"0"'})
+            with urllib.request.urlopen(req) as resp:
+                self.assertEqual(resp.status, 200)
+                self.assertEqual(resp.read(), content)
+
+            with urllib.request.urlopen("http://localhost:8095/__stats__/") as resp:
+                stats = json.loads(resp.read())
+            self.assertEqual(stats["max_bytes"], 2 ** 20)
+            self.assertEqual(stats["entries"], 1)
+            self.assertEqual(stats["misses"], 1)
+            self.assertEqual(stats["hits"], 1)
+        finally:
+            thread.shutdown()
+        time.sleep(0.1)
+        self.assertFalse(thread.is_alive())
+
+
+if __name__ == "__main__":
+    unittest.main()
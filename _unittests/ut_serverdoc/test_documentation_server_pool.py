@@ -0,0 +1,84 @@
+"""
+@brief      test log(time=3s)
+
+"""
+import os
+import gzip
+import socket
+import unittest
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pyquickhelper.pycode import skipif_appveyor, ExtTestCase, get_temp_folder
+from pyquickhelper.server import run_doc_server
+from pyquickhelper.server.documentation_server import (
+    DocumentationPoolServer, precompress_folder)
+
+
+class TestDocumentationServerPool(ExtTestCase):
+
+    def test_precompress_folder(self):
+        temp = get_temp_folder(__file__, "temp_precompress_folder")
+        name = os.path.join(temp, "big.js")
+        with open(name, "w", encoding="utf-8") as f:
+            f.write("var x = 0;\n" * 1000)
+        with open(os.path.join(temp, "small.js"), "w", encoding="utf-8") as f:
+            f.write("var x = 0;\n")
+        created = precompress_folder(temp, brotli=False)
+        self.assertEqual(created, [name + ".gz"])
+        with open(name + ".gz", "rb") as f:
+            self.assertEqual(gzip.decompress(f.read()),
+                             b"var x = 0;\n" * 1000)
+        self.assertEqual(precompress_folder(temp, brotli=False), [])
+
+    @skipif_appveyor("does not end")
+    def test_server_pool(self):
+        temp = get_temp_folder(__file__, "temp_documentation_server_pool")
+        big = b"0123456789abcdef" * 2 ** 13
+        with open(os.path.join(temp, "index.html"), "w", encoding="utf-8") as f:
+            f.write("<html><body>index</body></html>")
+        with open(os.path.join(temp, "data.txt"), "wb") as f:
+            f.write(big)
+        with open(os.path.join(temp, "style.css"), "w", encoding="utf-8") as f:
+            f.write("body { color: black; }\n" * 100)
+        precompress_folder(temp, extensions=(".css", ), brotli=False)
+
+        thread = run_doc_server('localhost', {"pool": temp}, True,
+                                port=8096, max_workers=4)
+        try:
+            self.assertIsInstance(thread.server, DocumentationPoolServer)
+
+            # a client which never sends its request does not block the others
+            idle = socket.create_connection(("localhost", 8096))
+
+            url = "http://localhost:8096/pool/"
+            with urllib.request.urlopen(url + "data.txt", timeout=5) as resp:
+                self.assertEqual(resp.headers["Content-Length"], str(len(big)))
+                self.assertEqual(resp.read(), big)
+
+            req = urllib.request.Request(
+                url + "style.css", headers={"Accept-Encoding": "br, gzip"})
+            with urllib.request.urlopen(req, timeout=5) as resp:
+                self.assertEqual(resp.headers["Content-Encoding"], "gzip")
+                self.assertEqual(resp.headers["Content-type"], "text/css")
+                self.assertEqual(gzip.decompress(resp.read()),
+                                 b"body { color: black; }\n" * 100)
+            with urllib.request.urlopen(url + "style.css", timeout=5) as resp:
+                self.assertEqual(resp.headers["Content-Encoding"], None)
+                self.assertEqual(len(resp.read()), 2300)
+
+            def get(i):
+                page = "index.html" if i % 2 else "data.txt"
+                with urllib.request.urlopen(url + page, timeout=5) as resp:
+                    return resp.status, len(resp.read())
+
+            with ThreadPoolExecutor(8) as ex:
+                res = list(ex.map(get, range(40)))
+            self.assertEqual(set(r[0] for r in res), {200})
+            self.assertEqual(set(r[1] for r in res), {31, len(big)})
+            idle.close()
+        finally:
+            thread.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -4,9 +4,11 @@
 """
 import unittest
 import os
+import threading
 import pandas
 from pyquickhelper.pycode import ExtTestCase, get_temp_folder
-from pyquickhelper.server.filestore_sqlite import SqlLite3FileStore
+from pyquickhelper.server.filestore_sqlite import (
+    SqlLite3FileStore, LazyContent, encode_dataframe)
 
 
 class TestfileStore(ExtTestCase):
@@ -65,6 +67,119 @@ class TestfileStore(ExtTestCase):
         SqlLite3FileStore(name)
         SqlLite3FileStore(name)
 
+    def test_file_store_many(self):
+        temp = get_temp_folder(__file__, "temp_file_storage_many")
+        name = os.path.join(temp, "filestore.db3")
+        store = SqlLite3FileStore(name)
+        df = pandas.DataFrame({"A": ["un", "deux"], "B": [0.5, 0.6]})
+        res = store.submit_many([
+            dict(name="zoo's", content=df, project="p1", version=1),
+            dict(name='zo"o', content="a\\b", format="txt", team="t")])
+        self.assertEqual(len(res), 2)
+        self.assertEqual(res[0]['format'], store.df_format_)
+        self.assertNotIn('content', res[0])
+        got = list(store.enumerate_content(name="zoo's"))
+        self.assertEqual(len(got), 1)
+        self.assertEqualDataFrame(df, got[0]['content'])
+        got = list(store.enumerate_content(name='zo"o'))
+        self.assertEqual(len(got), 1)
+        self.assertEqual(got[0]['content'], "a\\b")
+        got = list(store.enumerate(project="p1", version=1))
+        self.assertEqual(len(got), 1)
+
+        store.submit_data_many([
+            dict(idfile=1, name="m1", value=0.5),
+            dict(idfile=1, name="m2", value=0.6, comment="c"),
+            dict(idfile=2, name="m1", value=0.7)])
+        self.assertEqual(len(list(store.enumerate_data(idfile=1))), 2)
+        self.assertEqual(len(list(store.enumerate_data(name="m1"))), 2)
+        res = list(store.enumerate_data(project="p1", join=True))
+        self.assertEqual(len(res), 2)
+        self.assertRaise(
+            lambda: list(store.enumerate_data(project="p1")), RuntimeError)
+
+        con = store._get_connexion()
+        indexes = set(r[0] for r in con.execute(
+            "SELECT name FROM sqlite_master WHERE type='index';"))
+        self.assertIn("idx_files_name", indexes)
+        self.assertIn("idx_data_idfile", indexes)
+        mode = con.execute("PRAGMA journal_mode;").fetchall()
+        self.assertEqual(mode, [('wal',)])
+
+    def test_file_store_threads(self):
+        temp = get_temp_folder(__file__, "temp_file_storage_threads")
+        name = os.path.join(temp, "filestore.db3")
+        store = SqlLite3FileStore(name)
+        cons = []
+
+        def f(k):
+            store.submit_many([dict(name=f"n{k}", content="c", format="txt")
+                               for _ in range(10)])
+            cons.append(id(store._get_connexion()))
+            store.close()
+
+        ths = [threading.Thread(target=f, args=(k, )) for k in range(4)]
+        for th in ths:
+            th.start()
+        for th in ths:
+            th.join()
+        self.assertEqual(len(list(store.enumerate())), 40)
+        self.assertEqual(len(list(store.enumerate(name="n2"))), 10)
+        self.assertEqual(len(cons), 4)
+
+    def test_file_store_formats(self):
+        temp = get_temp_folder(__file__, "temp_file_storage_formats")
+        df = pandas.DataFrame({"A": ["un", "deux"], "B": [0.5, 0.6],
+                               "C": [1, 2]})
+        df["D"] = pandas.to_datetime(["2021-01-01", "2021-01-02"])
+        formats = ['df', 'df-pickle-zlib']
+        try:
+            import pyarrow  # pylint: disable=W0611
+            formats.append('df-parquet')
+        except ImportError:
+            pass
+        for fmt in formats:
+            with self.subTest(format=fmt):
+                name = os.path.join(temp, f"filestore_{fmt}.db3")
+                store = SqlLite3FileStore(name, df_format=fmt)
+                store.submit(name="zoo", content=df)
+                got = list(store.enumerate_content(name="zoo"))
+                self.assertEqual(got[0]['format'], fmt)
+                content = got[0]['content']
+                if fmt == 'df':
+                    self.assertEqual(content.shape, df.shape)
+                else:
+                    self.assertEqualDataFrame(df, content)
+                    self.assertEqual(list(content.dtypes), list(df.dtypes))
+
+        # a CSV row written by a previous version
+        name = os.path.join(temp, "filestore_old.db3")
+        store = SqlLite3FileStore(name, df_format='df-pickle-zlib')
+        con = store._get_connexion()
+        con.execute(
+            "INSERT INTO files (name, format, content) VALUES (?, ?, ?)",
+            ("old", "df", encode_dataframe(df[["A", "B"]], "df")))
+        con.commit()
+        store.submit(name="new", content=df)
+        got = {r['name']: r for r in store.enumerate_content()}
+        self.assertEqualDataFrame(df[["A", "B"]], got['old']['content'])
+        self.assertEqualDataFrame(df, got['new']['content'])
+
+        # an explicit 'df' is stored as CSV
+        store.submit(name="csv", content=df[["A", "B"]], format='df')
+        got = list(store.enumerate_content(name="csv"))
+        self.assertEqual(got[0]['format'], 'df')
+        self.assertEqualDataFrame(df[["A", "B"]], got[0]['content'])
+        store.submit(name="csv", content="text", format='txt')
+        self.assertEqual(len(list(store.enumerate(format='df'))), 2)
+
+        # lazy
+        got = list(store.enumerate_content(lazy=True))
+        self.assertEqual(len(got), 4)
+        for r in got:
+            self.assertIsInstance(r['content'], LazyContent)
+        self.assertEqualDataFrame(df, got[1]['content'].load())
+
 
 if __name__ == "__main__":
     unittest.main()
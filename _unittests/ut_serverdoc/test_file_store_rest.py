@@ -10,7 +10,7 @@ from pyquickhelper.pycode import (
     skipif_azure, skipif_circleci)
 from pyquickhelper.server.filestore_fastapi import (
     create_fast_api_app, fast_api_submit, fast_api_query,
-    fast_api_content, _get_password, _post_request)
+    fast_api_content, fast_api_content_stream, _get_password, _post_request)
 from pyquickhelper.server.filestore_sqlite import SqlLite3FileStore
 
 
@@ -163,6 +163,76 @@ class TestfileStoreRest(ExtTestCase):
             self.assertIsInstance(c['content'], pandas.DataFrame)
             self.assertEqual(c['content'].shape, (3, 3))
 
+    @skipif_appveyor("There is no current event loop in thread")
+    @skipif_azure("There is no current event loop in thread")
+    @skipif_circleci("There is no current event loop in thread")
+    def test_file_store_pagination_stream(self):
+        from fastapi.testclient import TestClient  # pylint: disable=E0401
+        temp = get_temp_folder(__file__, "temp_file_storage_rest_page")
+        name = os.path.join(temp, "filestore.db3")
+        app = create_fast_api_app(name, "BBB", batch_size=3)
+        client = TestClient(app)
+
+        for i in range(7):
+            df = pandas.DataFrame(dict(A=list(range(i + 1)), B=["T"] * (i + 1)))
+            fast_api_submit(df, client, team="AA", name="BB", project="CCC",
+                            version=i, password="BBB")
+
+        # pagination
+        cursor, ids = None, []
+        while True:
+            res, cursor = fast_api_query(
+                client, project="CCC", password="BBB", cursor=cursor, limit=3)
+            ids.extend(r['id'] for r in res)
+            if cursor is None:
+                break
+        self.assertEqual(ids, list(range(1, 8)))
+
+        response = client.post(
+            "/metrics/", json=dict(password="BBB", limit=2))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Next-Cursor", response.headers)
+
+        # etag
+        cache = {}
+        res1 = fast_api_content(client, project="CCC", password="BBB",
+                                cache=cache, limit=3)
+        self.assertEqual(len(res1), 3)
+        self.assertEqual(len(cache), 1)
+        etag = list(cache.values())[0][0]
+        response = client.post(
+            "/content/", json=dict(project="CCC", password="BBB", limit=3),
+            headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        res2 = fast_api_content(client, project="CCC", password="BBB",
+                                cache=cache, limit=3)
+        self.assertIs(res1, res2)
+        response = client.post(
+            "/content/", json=dict(project="CCC", password="BBB", limit=4),
+            headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 4)
+
+        # streaming
+        res = list(fast_api_content_stream(client, project="CCC",
+                                           password="BBB"))
+        self.assertEqual([r['id'] for r in res], list(range(1, 8)))
+        for i, r in enumerate(res):
+            self.assertEqual(r['content'].shape, (i + 1, 2))
+        res = list(fast_api_content_stream(client, project="CCC",
+                                           password="BBB", limit=4))
+        self.assertEqual(len(res), 4)
+
+        response = client.post(
+            "/content/csv/", json=dict(id=7, chunksize=2, password="BBB"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.text.split("\n")[:3], ["A,B", "0,T", "1,T"])
+        self.assertEqual(len(response.text.strip().split("\n")), 8)
+        response = client.post(
+            "/content/csv/", json=dict(id=70, password="BBB"))
+        self.assertEqual(response.status_code, 404)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,179 @@
+"""
+@brief      test log(time=4s)
+"""
+import os
+import sys
+import time
+import unittest
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.helpgen import rst2html
+from pyquickhelper.sphinxext.runpython_cache import (
+    RunPythonCache, snapshot_folder, get_runpython_cache)
+
+
+class TestRunPythonCache(ExtTestCase):
+
+    def test_key(self):
+        temp = get_temp_folder(__file__, "temp_runpython_cache_key")
+        mod = os.path.join(temp, "cached_module_xyz.py")
+        with open(mod, "w", encoding="utf-8") as f:
+            f.write("A = 1\n")
+        sys.path.insert(0, temp)
+        try:
+            cache = RunPythonCache(os.path.join(temp, "cache"))
+            script = "import os\nimport cached_module_xyz\nprint(1)"
+            fp = cache.fingerprint_modules(script)
+            self.assertEqual(list(fp), ["cached_module_xyz"])
+            k1 = cache.key(script, dict(process=False))
+            self.assertEqual(k1, cache.key(script, dict(process=False)))
+            self.assertNotEqual(k1, cache.key(script, dict(process=True)))
+            self.assertNotEqual(k1, cache.key(script + " ", dict(process=False)))
+
+            with open(mod, "w", encoding="utf-8") as f:
+                f.write("A = 22\n")
+            # a new build computes the fingerprint again
+            cache2 = RunPythonCache(os.path.join(temp, "cache"))
+            self.assertNotEqual(k1, cache2.key(script, dict(process=False)))
+        finally:
+            sys.path.remove(temp)
+
+    def test_key_unresolved(self):
+        temp = get_temp_folder(__file__, "temp_runpython_cache_unresolved")
+        with open(os.path.join(temp, "cached_helper_xyz.py"), "w") as f:
+            f.write("A = 1\n")
+        cache = RunPythonCache(os.path.join(temp, "cache"))
+        script = "import cached_helper_xyz\nprint(cached_helper_xyz.A)"
+        self.assertEmpty(cache.fingerprint_modules(script))
+        self.assertEmpty(cache.key(script))
+        self.assertEqual(cache.n_uncacheable, 1)
+        self.assertIn("uncacheable=1", cache.report())
+        # the module is found with the working directory of the script
+        k1 = cache.key(script, paths=[temp])
+        self.assertNotEmpty(k1)
+        # or with the paths the script adds
+        script2 = f"import sys\nsys.path.append({temp!r})\n" + script
+        self.assertEqual(list(cache.fingerprint_modules(script2)),
+                         ["cached_helper_xyz"])
+
+        with open(os.path.join(temp, "cached_helper_xyz.py"), "w") as f:
+            f.write("A = 22\n")
+        cache2 = RunPythonCache(os.path.join(temp, "cache"))
+        self.assertNotEqual(k1, cache2.key(script, paths=[temp]))
+
+    def test_get_put_evict(self):
+        temp = get_temp_folder(__file__, "temp_runpython_cache_put")
+        cache = RunPythonCache(os.path.join(temp, "cache"), max_size=1000)
+        out_dir = os.path.join(temp, "out")
+        os.mkdir(out_dir)
+        self.assertEmpty(cache.get("k1", output_dir=out_dir))
+
+        before = snapshot_folder(out_dir)
+        with open(os.path.join(out_dir, "gen.txt"), "w") as f:
+            f.write("generated")
+        after = snapshot_folder(out_dir)
+        files = [k for k, v in after.items() if before.get(k, None) != v]
+        self.assertEqual(files, ["gen.txt"])
+        cache.put("k1", "OUT", "ERR", files=files, output_dir=out_dir)
+
+        os.remove(os.path.join(out_dir, "gen.txt"))
+        self.assertEqual(cache.get("k1", output_dir=out_dir), ("OUT", "ERR"))
+        with open(os.path.join(out_dir, "gen.txt"), "r") as f:
+            self.assertEqual(f.read(), "generated")
+        self.assertIn("hits=1 misses=1", cache.report())
+
+        # eviction by size, the least recently used entry goes first
+        cache.put("k2", "A" * 600, "", output_dir=out_dir)
+        past = time.time() - 100
+        for k in ["k1", "k2"]:
+            os.utime(os.path.join(cache.folder, k, "entry.json"), (past, past))
+        self.assertEqual(cache.get("k1", output_dir=out_dir), ("OUT", "ERR"))
+        cache.put("k3", "B" * 600, "", output_dir=out_dir)
+        self.assertEqual(cache.evict(), 1)
+        self.assertEmpty(cache.get("k2", output_dir=out_dir))
+        self.assertEqual(cache.get("k3", output_dir=out_dir)[0], "B" * 600)
+
+        # eviction by age
+        self.assertEqual(cache.evict(now=time.time() + cache.max_age + 10), 2)
+        self.assertEqual(os.listdir(cache.folder), [])
+        self.assertIn("evicted=3", cache.report())
+
+    def test_runpython_cached(self):
+        temp = get_temp_folder(__file__, "temp_runpython_cache_rst")
+        folder = os.path.join(temp, "cache")
+        counter = os.path.join(temp, "counter.txt")
+        content = """
+                    test a directive
+                    ================
+
+                    .. runpython::
+                        :showcode:
+
+                        with open(r"__COUNTER__", "a") as f:
+                            f.write("run\\n")
+                        print("cached" + "_output")
+                    """.replace("                    ", "").replace(
+            "__COUNTER__", counter)
+
+        for i in range(2):
+            text = rst2html(content, writer="rst", keep_warnings=True,
+                            runpython_cache=folder)
+            self.assertIn("cached_output", text)
+        with open(counter, "r") as f:
+            self.assertEqual(f.read(), "run\n")
+        cache = get_runpython_cache(folder)
+        self.assertEqual((cache.n_hits, cache.n_misses), (1, 1))
+
+        # option nocache forces the execution
+        text = rst2html(content.replace(":showcode:", ":showcode:\n    :nocache:"),
+                        writer="rst", keep_warnings=True,
+                        runpython_cache=folder)
+        self.assertIn("cached_output", text)
+        with open(counter, "r") as f:
+            self.assertEqual(f.read(), "run\nrun\n")
+
+
+    def test_runpython_cached_local_module(self):
+        temp = get_temp_folder(__file__, "temp_runpython_cache_local")
+        folder = os.path.join(temp, "cache")
+        helper = os.path.join(temp, "helper_local_xyz.py")
+        content = f"""
+                    test a directive
+                    ================
+
+                    .. runpython::
+
+                        import sys
+                        sys.path.append({temp!r})
+                        import helper_local_xyz
+                        print("value", helper_local_xyz.A)
+
+                    .. runpython::
+
+                        import os
+                        import sys
+                        sys.path.append(os.path.join({temp!r}))
+                        import helper_local_xyz
+                        print("other", helper_local_xyz.A)
+                    """.replace("                    ", "")
+
+        for value in [1, 22]:
+            with open(helper, "w") as f:
+                f.write(f"A = {value}\n")
+            sys.modules.pop("helper_local_xyz", None)
+            text = rst2html(content, writer="rst", keep_warnings=True,
+                            runpython_cache=folder)
+            self.assertIn(f"value {value}", text)
+            self.assertIn(f"other {value}", text)
+        cache = get_runpython_cache(folder)
+        self.assertEqual(cache.n_hits, 0)
+        text = rst2html(content, writer="rst", keep_warnings=True,
+                        runpython_cache=folder)
+        self.assertIn("value 22", text)
+        self.assertEqual(cache.n_hits, 2)
+        sys.modules.pop("helper_local_xyz", None)
+        while temp in sys.path:
+            sys.path.remove(temp)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+"""
+@brief      test log(time=4s)
+"""
+import os
+import unittest
+from pyquickhelper.pycode import ExtTestCase, get_temp_folder
+from pyquickhelper.sphinxext.sphinx_runpython_extension import (
+    run_python_script, RunPythonExecutionError)
+from pyquickhelper.sphinxext.runpython_pool import RunPythonWorkerPool
+
+
+class TestRunPythonPool(ExtTestCase):
+
+    def setUp(self):
+        self.pool = RunPythonWorkerPool(max_runs=3)
+
+    def tearDown(self):
+        self.pool.close()
+
+    def test_same_results(self):
+        scripts = ["import sys\nprint('a', 1)\nprint('b', file=sys.stderr)",
+                   "print('before')\nz = 1 / 0",
+                   "import os\nos.system('echo from_shell')",
+                   "import sys\nsys.exit('bye')"]
+        errs = []
+        for script in scripts:
+            out1, err1, _ = run_python_script(script, process=True)
+            out2, err2, _ = run_python_script(script, process=True,
+                                              pool=self.pool)
+            self.assertEqual(out1, out2)
+            self.assertEqual(err1, err2)
+            errs.append(err2)
+        self.assertIn("ZeroDivisionError", errs[1])
+        self.assertEqual(errs[3], "bye")
+
+    def test_isolation(self):
+        run_python_script(
+            "import sys\nx = 5\nsys.path.append('zzz')\nsys.myvar = 1",
+            process=True, pool=self.pool, setsysvar="other_var")
+        out, err, _ = run_python_script(
+            "import sys\nprint('x' in globals(), 'zzz' in sys.path, "
+            "hasattr(sys, 'myvar'), hasattr(sys, 'other_var'))",
+            process=True, pool=self.pool)
+        self.assertEqual(out.strip(), "False False False False")
+        self.assertEqual(self.pool.n_started, 1)
+
+        temp = get_temp_folder(__file__, "temp_runpython_pool_isolation")
+        out, err, _ = run_python_script(
+            "import os\nprint(os.getcwd())", process=True, pool=self.pool,
+            chdir=temp)
+        self.assertEqual(os.path.normcase(out.strip()), os.path.normcase(temp))
+
+    def test_recycle_and_crash(self):
+        pids = [run_python_script("import os\nprint(os.getpid())", process=True,
+                                  pool=self.pool)[0].strip()
+                for i in range(4)]
+        self.assertEqual(len(set(pids[:3])), 1)
+        self.assertNotEqual(pids[2], pids[3])
+        self.assertEqual(self.pool.n_started, 2)
+
+        temp = get_temp_folder(__file__, "temp_runpython_pool_crash")
+        counter = os.path.join(temp, "counter.txt").replace("\\", "/")
+        script = ("import os\nwith open('%s', 'a') as f:\n    f.write('run')\n"
+                  "print('crash', flush=True)\nos._exit(3)" % counter)
+        self.assertRaise(
+            lambda: run_python_script(script, process=True, pool=self.pool),
+            RunPythonExecutionError)
+        out, err, _ = run_python_script(script, process=True, pool=self.pool,
+                                        exception=True)
+        # the script does not run twice
+        with open(counter, "r") as f:
+            self.assertEqual(f.read(), "runrun")
+        self.assertEqual(out.strip(), "crash")
+        self.assertIn("stopped with code 3", err)
+        self.assertEqual(self.pool.n_crashes, 2)
+        out, err, _ = run_python_script("print('next')", process=True,
+                                        pool=self.pool)
+        self.assertEqual(out.strip(), "next")
+        self.assertEqual(self.pool.n_started, 4)
+
+    def test_worker_not_started(self):
+        # the script runs in a new process if the worker cannot receive it
+        pool = RunPythonWorkerPool()
+        worker = pool._acquire()
+        worker.proc.kill()
+        worker.proc.wait()
+        pool._release(worker)
+        out, err, _ = run_python_script("print('fallback')", process=True,
+                                        pool=pool)
+        self.assertEqual(out.strip(), "fallback")
+        self.assertEqual(pool.n_crashes, 1)
+        pool.close()
+
+    def test_store_in_file(self):
+        temp = get_temp_folder(__file__, "temp_runpython_pool_store")
+        name = os.path.join(temp, "script.py")
+        script = ("import inspect\n"
+                  "def f():\n"
+                  "    return 1\n"
+                  "print(inspect.getsource(f).strip())")
+        out, err, _ = run_python_script(script, process=True, pool=self.pool,
+                                        store_in_file=name)
+        self.assertIn("return 1", out)
+        self.assertEqual(err, "")
+
+    def test_context(self):
+        self.assertRaise(
+            lambda: run_python_script("print(1)", process=True, pool=self.pool,
+                                      context={"a": 1}),
+            RunPythonExecutionError)
+
+
+if __name__ == "__main__":
+    unittest.main()
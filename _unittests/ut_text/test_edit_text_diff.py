@@ -3,10 +3,13 @@
 @brief      test tree node (time=4s)
 """
 import unittest
+import random
 from textwrap import dedent
+import numpy
 from pyquickhelper.pycode import ExtTestCase
 from pyquickhelper.texthelper.edit_text_diff import (
-    edit_distance_string, edit_distance_text, diff2html)
+    edit_distance_string, edit_distance_string_loop,
+    edit_distance_text, diff2html)
 from pyquickhelper.texthelper.text_diff import html_diffs
 
 
@@ -261,6 +264,72 @@ class TestTextDiff(ExtTestCase):
         self.assertGreater(d, 0)
         self.assertGreater(dd[0], 0)
 
+    def test_edit_distance_string_loop(self):
+        rnd = random.Random(0)
+        for _ in range(500):
+            s1 = "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 10)))
+            s2 = "".join(rnd.choice("abc") for _ in range(rnd.randint(0, 10)))
+            cmp_cost = rnd.choice([0.5, 1., 2.])
+            exp = edit_distance_string_loop(s1, s2, cmp_cost=cmp_cost)
+            got = edit_distance_string(s1, s2, cmp_cost=cmp_cost)
+            self.assertEqual(exp, got)
+            max_distance = rnd.randint(0, 6)
+            got = edit_distance_string(s1, s2, cmp_cost=cmp_cost,
+                                       max_distance=max_distance)
+            if exp[0] <= max_distance:
+                self.assertEqual(exp, got)
+            else:
+                self.assertEqual(got, (numpy.inf, []))
+
+    def test_edit_distance_string_max_distance(self):
+        d, aligned = edit_distance_string("ABCD", "ACD", max_distance=1)
+        self.assertEqual(d, 1)
+        self.assertEqual(aligned, [(0, 0), (2, 1), (3, 2)])
+        d, aligned = edit_distance_string("ABCD", "ACD", max_distance=0)
+        self.assertEqual(d, numpy.inf)
+        self.assertEqual(aligned, [])
+        d, aligned = edit_distance_string("ABCDEF", "A", max_distance=3)
+        self.assertEqual(d, numpy.inf)
+        d, aligned = edit_distance_string(["ab", "c"], ["ab", "d"])
+        self.assertEqual(d, 1)
+        self.assertEqual(aligned, [(0, 0), (1, 1)])
+
+    def test_edit_distance_text_qgram(self):
+        rnd = random.Random(0)
+        for _ in range(100):
+            rows1 = ["".join(rnd.choice("ab c") for _ in range(rnd.randint(0, 15)))
+                     for _ in range(rnd.randint(0, 8))]
+            rows2 = [r if rnd.random() < 0.6 else r + "x" for r in rows1]
+            rows2.append("zzzz")
+            rnd.shuffle(rows2)
+            exp = edit_distance_text(rows1, rows2)
+            got = edit_distance_text(rows1, rows2, strategy="qgram")
+            self.assertEqual(exp, got)
+
+    def test_edit_distance_text_patience(self):
+        rows1 = ["def f(x):", "    a = x + 1", "    b = a * 2",
+                 "    return b", "", "def g(y):", "    return y"]
+        rows2 = ["def f(x):", "    a = x + 2", "    b = a * 2",
+                 "    c = b", "    return c", "", "def g(y):",
+                 "    return y", "# end"]
+        d, aligned, final, stats = edit_distance_text(
+            rows1, rows2, strategy="patience", return_stats=True)
+        exp = edit_distance_text(rows1, rows2)
+        self.assertEqual(d, exp[0])
+        self.assertEqual(final, exp[2])
+        self.assertEqual(len(aligned), len(exp[1]))
+        self.assertEqual(stats['pairs'], len(rows1) * len(rows2))
+        self.assertEqual(stats['skipped'], stats['pairs'] - stats['computed'])
+        self.assertGreater(stats['anchors'], 3)
+        self.assertLess(stats['computed'], 10)
+        _, __, ___, stats = edit_distance_text(
+            rows1, rows2, return_stats=True)
+        self.assertGreater(stats['computed'], 10)
+        ht = diff2html(rows1, rows2, aligned, final)
+        self.assertIn('<td style="background-color:#ABEBC6;">', ht)
+        self.assertRaise(lambda: edit_distance_text(rows1, rows2, strategy="any"),
+                         ValueError)
+
 
 if __name__ == "__main__":
     # TestTextDiff().test_edit_distance_no_align()
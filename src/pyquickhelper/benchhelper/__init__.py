@@ -4,4 +4,5 @@
 """
 
 from .benchmark import BenchMark
+from .benchmark_cache import BenchMarkCache, hash_params
 from .grid_benchmark import GridBenchMark
@@ -3,13 +3,17 @@
 @brief Helpers to benchmark something
 """
 import os
+import importlib
 from datetime import datetime
 from time import perf_counter
+from concurrent.futures import (
+    ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED)
 import pickle
 from ..loghelper import noLOG, CustomLog, fLOGFormat
 from ..loghelper.flog import get_relative_path
 from ..pandashelper import df2rst
 from ..texthelper import apply_template
+from .benchmark_cache import BenchMarkCache, _UncacheView
 
 
 class BenchMark:
@@ -20,7 +24,7 @@ class BenchMark:
 
     def __init__(self, name, clog=None, fLOG=noLOG, path_to_images=".",
                  cache_file=None, pickle_module=None, progressbar=None,
-                 **params):
+                 cache_version=None, **params):
         """
         @param      name            name of the test
         @param      clog            @see cl CustomLog or string
@@ -30,11 +34,19 @@ class BenchMark:
         @param      cache_file      cache file
         @param      pickle_module   pickle or dill if you need to serialize functions
         @param      progressbar     relies on *tqdm*, example *tnrange*
+        @param      cache_version   version of the benchmarked code, it is part
+                                    of the cache key, changing it runs everything again
 
         If *cache_file* is specified, the class will store the results of the
         method :meth:`bench <pyquickhelper.benchhelper.benchmark.GridBenchMark.bench>`.
         On a second run, the function load the cache
         and run modified or new run (in *params_list*).
+        The results are stored in folder ``cache_file + '.records'``,
+        one file per configuration, named after a hash of the parameters
+        (see @see cl BenchMarkCache). A cache created by a previous version
+        (a single pickle file) is imported the first time.
+        A result is retrieved only if the file
+        ``<cache_file>.<_btry>.clean_cache`` exists.
         """
         self._fLOG = fLOG
         self._name = name
@@ -48,6 +60,7 @@ class BenchMark:
         self._params = params
         self._path_to_images = path_to_images
         self._cache_file = cache_file
+        self._cache_version = cache_version
         self._pickle = pickle_module if pickle_module is not None else pickle
         self._progressbar = progressbar
         self._tracelogs = []
@@ -126,6 +139,13 @@ class BenchMark:
     def uncache(self, cache):
         """
         overwrite this method to uncache some previous run
+
+        @param      cache       dictionary with keys *metrics*, *appendix*,
+                                *params_list* (one element per cached configuration),
+                                removing a configuration from these lists
+                                runs it again, method *remove(params)* does the same,
+                                attribute *store* is the @see cl BenchMarkCache
+                                or None if there is no cache
         """
         pass
 
@@ -215,6 +235,21 @@ class BenchMark:
                 raise NotImplementedError(
                     "only files are allowed")  # pragma: no cover
 
+    @property
+    def cache_folder(self):
+        """
+        Returns the folder storing the cached results or None.
+        """
+        if self._cache_file is None:
+            return None
+        return self._cache_file + ".records"
+
+    def _clean_cache_name(self, btry):
+        """
+        Returns the name of the file which must exist to use a cached result.
+        """
+        return f"{self._cache_file}.{btry}.clean_cache"
+
     @property
     def Name(self):
         """
@@ -237,11 +272,63 @@ class BenchMark:
                 "\n", *args, **kwargs).strip("\n").split("\n")[0])
             br.refresh()
 
-    def run(self, params_list):
+    def __getstate__(self):
+        """
+        Removes the attributes which cannot be sent to another process
+        (log file, progress bars, logging function).
+        """
+        state = self.__dict__.copy()
+        state["_clog"] = None
+        state["_fLOG"] = noLOG
+        state["_progressbar"] = None
+        state["_progressbars"] = None
+        state["_tracelogs"] = []
+        # a module cannot be pickled
+        state["_pickle"] = self._pickle.__name__
+        return state
+
+    def __setstate__(self, state):
+        """
+        Restores the attributes removed by @see me __getstate__.
+        """
+        if isinstance(state.get("_pickle", None), str):
+            state["_pickle"] = importlib.import_module(state["_pickle"])
+        self.__dict__.update(state)
+
+    def run(self, params_list, n_jobs=None, executor=None):
         """
         Runs the benchmark.
 
         @param      params_list     list of dictionaries
+        @param      n_jobs          None or 1 to run every configuration
+                                    in this process, otherwise the number of
+                                    processes to use (-1 for all cores)
+        @param      executor        an existing :epkg:`concurrent.futures`
+                                    executor, *n_jobs* is then the number
+                                    of workers it has (1 if None)
+
+        If *n_jobs > 1* or *executor* is specified, method *bench* is
+        called in other processes. The instance is pickled after
+        method *init* was called, the logging function and the progress bar
+        are not sent. Results are gathered in the same order as
+        *params_list*, the cache behaves the same way.
+        The metadata receive one more row per worker with
+        the number of configurations it ran and the time it spent.
+        The instance is pickled with the module given to the constructor
+        (*pickle_module*). With a process executor, it is pickled once and
+        only sent along the first *n_jobs* tasks, a worker which
+        does not have it yet receives it with its next task.
+        Every configuration runs on a shallow copy of the instance.
+
+        The results of every configuration are added to the cache
+        as soon as it finishes, an interrupted run resumes
+        where it stopped. The cache is indexed by the parameters,
+        a configuration repeated in *params_list* receives the cached
+        results of its first occurrence instead of running again
+        (only if *n_jobs* is None or 1, it runs again otherwise
+        if it was not cached before the call).
+        A legacy cache file (single pickle file) is imported
+        and renamed into ``<cache_file>.imported``.
         """
         if not isinstance(params_list, list):
             raise TypeError("params_list must be a list")  # pragma: no cover
@@ -249,9 +336,13 @@ class BenchMark:
             if not isinstance(di, dict):
                 raise TypeError(  # pragma: no cover
                     "params_list must be a list of dictionaries")
+        if n_jobs is not None and n_jobs < 0:
+            n_jobs = os.cpu_count()
+        parallel = executor is not None or (
+            n_jobs is not None and n_jobs > 1)
 
         # shared variables
-        cached = {}
+        cache = None
         meta = dict(level="BenchMark", name=self.Name, nb=len(
             params_list), time_begin=datetime.now())
         self._metadata = []
@@ -261,24 +352,122 @@ class BenchMark:
         # cache
         def cache_():
             "local function"
-            if self._cache_file is not None and os.path.exists(self._cache_file):
+            nonlocal cache
+            if self._cache_file is None:
+                self.uncache(_UncacheView())
+                return
+            cache = BenchMarkCache(self.cache_folder, version=self._cache_version,
+                                   pickle_module=self._pickle)
+            if os.path.isfile(self._cache_file):
                 self.fLOG(
-                    f"[BenchMark.run] retrieve cache '{self._cache_file}'")
-                with open(self._cache_file, "rb") as f:
-                    cached.update(self._pickle.load(f))
-                self.fLOG("[BenchMark.run] number of cached run: {0}".format(
-                    len(cached["params_list"])))
-            else:
-                if self._cache_file is not None:
+                    f"[BenchMark.run] import legacy cache '{self._cache_file}'")
+                nb = cache.import_legacy(self._cache_file)
+                # the legacy file is kept but not imported again
+                os.replace(self._cache_file, self._cache_file + ".imported")
+                self.fLOG(f"[BenchMark.run] imported {nb} configurations, "
+                          f"legacy cache renamed into '{self._cache_file}.imported'")
+            self.fLOG(
+                f"[BenchMark.run] number of cached run: {len(cache)} in '{cache.folder}'")
+            view = _UncacheView(cache)
+            self.uncache(view)
+            nb = view.synchronize()
+            if nb > 0:
+                self.fLOG(f"[BenchMark.run] uncached {nb} configurations")
+
+        def retrieve_(i, di):
+            "local function, returns the cached results or None"
+            nonlocal nb_cached
+            if cache is None:
+                return None
+            results = cache.get(di)
+            if results is None:
+                return None
+
+            # checks a file is present for every result
+            for met, _ in results:
+                look = self._clean_cache_name(met["_btry"])
+                if not os.path.exists(look):
                     self.fLOG(
-                        f"[BenchMark.run] cache not found '{self._cache_file}'")
-                cached.update(dict(metrics=[], appendix=[], params_list=[]))
-            self.uncache(cached)
+                        f"[BenchMark.run] file '{look}' was not found --> run again.")
+                    return None
+            for met, app in results:
+                met["_i"] = i
+                app["_i"] = i
+            self.fLOG(
+                f"[BenchMark.run] retrieved cached {i + 1}/{len(params_list)}: {di}")
+            nb_cached += 1
+            return results
+
+        def store_(i, di, tu, dt, cl, end=None):
+            "local function, checks and caches the results of one run"
+            if isinstance(tu, tuple):
+                tus = [tu]
+            elif isinstance(tu, list):
+                tus = tu
+            else:
+                raise TypeError(  # pragma: no cover
+                    "return of method bench must be a tuple of a list")
+
+            # checkings
+            for tu in tus:
+                met, app = tu
+                if len(tu) != 2:
+                    raise TypeError(  # pragma: no cover
+                        "Method run should return a tuple with 2 elements.")
+                if "_btry" not in met:
+                    raise KeyError(  # pragma: no cover
+                        "Metrics should contain key '_btry'.")
+                if "_btry" not in app:
+                    raise KeyError(  # pragma: no cover
+                        "Appendix should contain key '_btry'.")
+
+            results = []
+            for met, app in tus:
+                met["_date"] = dt
+                dt = (datetime.now() if end is None else end) - dt
+                if not isinstance(met, dict):
+                    raise TypeError(  # pragma: no cover
+                        "metrics should be a dictionary")
+                if "_time" in met:
+                    raise KeyError(  # pragma: no cover
+                        "key _time should not be the returned metrics")
+                if "_span" in met:
+                    raise KeyError(  # pragma: no cover
+                        "key _span should not be the returned metrics")
+                if "_i" in met:
+                    raise KeyError(  # pragma: no cover
+                        "key _i should not be in the returned metrics")
+                if "_name" in met:
+                    raise KeyError(  # pragma: no cover
+                        "key _name should not be the returned metrics")
+                met["_time"] = cl
+                met["_span"] = dt
+                met["_i"] = i
+                met["_name"] = self.Name
+                app["_i"] = i
+                results.append((met, app))
+                self.fLOG(
+                    f"[BenchMark.run] {i + 1}/{len(params_list)} end {met}")
+
+            if cache is not None:
+                key = cache.set(di, results)
+                for met, _ in results:
+                    look = self._clean_cache_name(met["_btry"])
+                    with open(look, "w") as f:
+                        f.write(
+                            "Remove this file if you want to force a new run.")
+                self.fLOG(f"[BenchMark.run] cached '{key}'.")
+            return results
+
+        def append_(results):
+            "local function"
+            for met, app in results:
+                self._metrics.append(met)
+                self._appendix.append(app)
 
         # run
-        def run_(pgar):
+        def run_(pgbar):
             "local function"
-            nonlocal nb_cached
             self._metrics = []
             self._appendix = []
 
@@ -289,92 +478,111 @@ class BenchMark:
 
             for i in pgbar:
                 di = params_list[i]
+                results = retrieve_(i, di)
+                if results is None:
+                    self.fLOG(
+                        f"[BenchMark.run] {i + 1}/{len(params_list)}: {di}")
+                    dt = datetime.now()
+                    cl = perf_counter()
+                    tu = self.bench(**di)
+                    cl = perf_counter() - cl
+                    results = store_(i, di, tu, dt, cl)
+                append_(results)
+
+        def run_parallel_(pgbar):
+            "local function, same as *run_* but with processes"
+            self._metrics = []
+            self._appendix = []
 
-                # check the cache
-                if i < len(cached["params_list"]) and cached["params_list"][i] == di:
-                    can = True
-                    for v in cached.values():
-                        if i >= len(v):
-                            # cannot cache
-                            can = False
-                            break
-
-                    if can:
-                        # can, it  checks a file is present
-                        look = "{0}.{1}.clean_cache".format(
-                            self._cache_file, cached["metrics"][i]["_btry"])
-                        if not os.path.exists(look):
-                            can = False
-                            self.fLOG(
-                                f"[BenchMark.run] file '{look}' was not found --> run again.")
-                    if can:
-                        self._metrics.append(cached["metrics"][i])
-                        self._appendix.append(cached["appendix"][i])
-                        self.fLOG(
-                            f"[BenchMark.run] retrieved cached {i + 1}/{len(params_list)}: {di}")
+            self.fLOG(f"[BenchMark.run] init {self.Name} do")
+            self.init()
+            self.fLOG(f"[BenchMark.run] init {self.Name} done")
+            self.fLOG(f"[BenchMark.run] start {self.Name} (parallel)")
+
+            # The progress bar moves every time a result is available.
+            pgbar = iter(pgbar)
+            all_results = [retrieve_(i, di)
+                           for i, di in enumerate(params_list)]
+            for results in all_results:
+                if results is not None:
+                    next(pgbar, None)
+
+            if executor is None:
+                pool = ProcessPoolExecutor(
+                    max_workers=n_jobs, initializer=_bench_worker_init,
+                    initargs=(self._pickle.__name__, self._pickle.dumps(self)))
+            else:
+                pool = executor
+            token = f"{os.getpid()}-{id(self)}-{perf_counter()}"
+            state = None
+
+            def submit_(i, di, send=False):
+                "submits one configuration"
+                nonlocal state
+                if executor is None:
+                    # the instance was sent by the initializer
+                    return pool.submit(_bench_worker, None, i, di)
+                if isinstance(executor, ThreadPoolExecutor):
+                    return pool.submit(_bench_worker, self, i, di)
+                # The instance is only sent to a worker which does not
+                # know it yet and pickled once.
+                if send and state is None:
+                    state = self._pickle.__name__, self._pickle.dumps(self)
+                return pool.submit(_bench_worker_shared, token,
+                                   state if send else None, i, di)
+
+            # the first tasks are likely to start every worker
+            n_send = n_jobs if n_jobs is not None and n_jobs > 1 else 1
+            futures = {}
+            workers = {}
+            n_runs = 0
+            try:
+                for i, di in enumerate(params_list):
+                    if all_results[i] is None:
                         self.fLOG(
-                            f"[BenchMark.run] file '{look}' was found.")
-                        nb_cached += 1
-                        continue
-
-                    # cache is available
-
-                # no cache
-                self.fLOG(
-                    f"[BenchMark.run] {i + 1}/{len(params_list)}: {di}")
-                dt = datetime.now()
-                cl = perf_counter()
-                tu = self.bench(**di)
-                cl = perf_counter() - cl
-
-                if isinstance(tu, tuple):
-                    tus = [tu]
-                elif isinstance(tu, list):
-                    tus = tu
-                else:
-                    raise TypeError(  # pragma: no cover
-                        "return of method bench must be a tuple of a list")
-
-                # checkings
-                for tu in tus:
-                    met, app = tu
-                    if len(tu) != 2:
-                        raise TypeError(  # pragma: no cover
-                            "Method run should return a tuple with 2 elements.")
-                    if "_btry" not in met:
-                        raise KeyError(  # pragma: no cover
-                            "Metrics should contain key '_btry'.")
-                    if "_btry" not in app:
-                        raise KeyError(  # pragma: no cover
-                            "Appendix should contain key '_btry'.")
-
-                for met, app in tus:
-                    met["_date"] = dt
-                    dt = datetime.now() - dt
-                    if not isinstance(met, dict):
-                        raise TypeError(  # pragma: no cover
-                            "metrics should be a dictionary")
-                    if "_time" in met:
-                        raise KeyError(  # pragma: no cover
-                            "key _time should not be the returned metrics")
-                    if "_span" in met:
-                        raise KeyError(  # pragma: no cover
-                            "key _span should not be the returned metrics")
-                    if "_i" in met:
-                        raise KeyError(  # pragma: no cover
-                            "key _i should not be in the returned metrics")
-                    if "_name" in met:
-                        raise KeyError(  # pragma: no cover
-                            "key _name should not be the returned metrics")
-                    met["_time"] = cl
-                    met["_span"] = dt
-                    met["_i"] = i
-                    met["_name"] = self.Name
-                    self._metrics.append(met)
-                    app["_i"] = i
-                    self._appendix.append(app)
-                    self.fLOG(
-                        f"[BenchMark.run] {i + 1}/{len(params_list)} end {met}")
+                            f"[BenchMark.run] submit {i + 1}/{len(params_list)}: {di}")
+                        futures[submit_(i, di, send=len(futures) < n_send)] = i
+
+                pending = set(futures)
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for fut in done:
+                        res = fut.result()
+                        if res is None:
+                            # the worker needs the instance
+                            i = futures[fut]
+                            fut = submit_(i, params_list[i], send=True)
+                            futures[fut] = i
+                            pending.add(fut)
+                            continue
+                        i, tu, dt, end, cl, pid, logs = res
+                        self._tracelogs.extend(logs)
+                        all_results[i] = store_(
+                            i, params_list[i], tu, dt, cl, end=end)
+                        next(pgbar, None)
+                        n_runs += 1
+                        if pid not in workers:
+                            workers[pid] = dict(
+                                level="BenchMark.worker", name=self.Name,
+                                worker=pid, nb=0, time=0.,
+                                time_begin=dt, time_end=end)
+                        info = workers[pid]
+                        info["nb"] += 1
+                        info["time"] += cl
+                        info["time_begin"] = min(info["time_begin"], dt)
+                        info["time_end"] = max(info["time_end"], end)
+            finally:
+                if executor is None:
+                    pool.shutdown(wait=True, cancel_futures=True)
+            for _ in pgbar:
+                pass
+
+            for results in all_results:
+                append_(results)
+            for pid in sorted(workers):
+                self._metadata.append(workers[pid])
+            self.fLOG(
+                f"[BenchMark.run] {n_runs} runs on {len(workers)} workers")
 
         def graph_():
             "local function"
@@ -395,26 +603,15 @@ class BenchMark:
             meta["time_end"] = datetime.now()
             meta["nb_cached"] = nb_cached
 
-        # write information about run experiments
+        # every result is already cached
         def final_():
             "local function"
             if self._cache_file is not None:
-                self.fLOG(f"[BenchMark.run] save cache '{self._cache_file}'")
-                cached = dict(metrics=self._metrics,
-                              appendix=self._appendix, params_list=params_list)
-                with open(self._cache_file, "wb") as f:
-                    self._pickle.dump(cached, f)
-                for di in self._metrics:
-                    look = f"{self._cache_file}.{di['_btry']}.clean_cache"
-                    with open(look, "w") as f:
-                        f.write(
-                            "Remove this file if you want to force a new run.")
-                    self.fLOG(f"[BenchMark.run] wrote '{look}'.")
-
                 self.fLOG("[BenchMark.run] done.")
 
         progress = self._progressbar if self._progressbar is not None else range
-        functions = [cache_, run_, graph_, final_]
+        functions = [cache_, run_parallel_ if parallel else run_,
+                     graph_, final_]
         pgbar0 = progress(0, len(functions))
         if self._progressbar:
             self._progressbars = [pgbar0]
@@ -803,3 +1000,78 @@ class BenchMark:
                 % endfor
                 % endif
                 """.replace("                ", "")
+
+
+_bench_worker_instance = None
+_bench_worker_token = None
+
+
+def _bench_worker_load(module, data):
+    """
+    Unpickles an instance of @see cl BenchMark with the module
+    it was pickled with (see parameter *pickle_module*).
+    """
+    return importlib.import_module(module).loads(data)
+
+
+def _bench_worker_init(module, data):
+    """
+    Initializes a worker process created by
+    :meth:`BenchMark.run <pyquickhelper.benchhelper.benchmark.BenchMark.run>`,
+    the benchmark is sent only once to every process.
+
+    @param      module      name of the module which pickled the instance
+    @param      data        pickled instance
+    """
+    global _bench_worker_instance  # pylint: disable=W0603
+    _bench_worker_instance = _bench_worker_load(module, data)
+
+
+def _bench_worker_shared(token, state, i, params):
+    """
+    Runs one configuration in a worker of an executor given
+    to :meth:`BenchMark.run <pyquickhelper.benchhelper.benchmark.BenchMark.run>`.
+    The worker keeps the last instance it received.
+
+    @param      token       identifies the instance
+    @param      state       tuple *(module name, pickled instance)*
+                            or None if the worker is expected to know it
+    @param      i           index of the configuration
+    @param      params      parameters
+    @return                 see @see fn _bench_worker, None if the worker
+                            does not know the instance and *state* is None
+    """
+    global _bench_worker_instance, _bench_worker_token  # pylint: disable=W0603
+    if token != _bench_worker_token:
+        if state is None:
+            return None
+        _bench_worker_instance = _bench_worker_load(*state)
+        _bench_worker_token = token
+    return _bench_worker(None, i, params)
+
+
+def _bench_worker(bench, i, params):
+    """
+    Runs one configuration in a worker.
+
+    @param      bench       instance of @see cl BenchMark or None to use
+                            the instance received by the initializer
+    @param      i           index of the configuration
+    @param      params      parameters
+    @return                 tuple *(i, results, begin, end, duration, pid, logs)*
+
+    The configuration runs on a shallow copy of the instance
+    to collect its own logs, several threads may share the same instance.
+    """
+    if bench is None:
+        bench = _bench_worker_instance
+    # copy.copy would call __getstate__ and remove the logging function
+    local = bench.__class__.__new__(bench.__class__)
+    local.__dict__.update(bench.__dict__)
+    bench = local
+    bench._tracelogs = []
+    dt = datetime.now()
+    cl = perf_counter()
+    tu = bench.bench(**params)
+    cl = perf_counter() - cl
+    return i, tu, dt, datetime.now(), cl, os.getpid(), bench._tracelogs
@@ -0,0 +1,228 @@
+"""
+@file
+@brief Cache for the results of a benchmark,
+one file per configuration.
+"""
+import os
+import hashlib
+import pickle
+
+
+def hash_params(params, version=None):
+    """
+    Computes a stable hash for a dictionary of parameters.
+    The hash does not depend on the order of the keys.
+
+    @param      params      dictionary
+    @param      version     optional version of the code, it is added to the hash
+    @return                 hexadecimal string
+
+    Values which are not a number, a string, a container
+    or None are pickled.
+    """
+    def _canonical(obj):
+        if obj is None or isinstance(obj, (bool, int, float, complex, str, bytes)):
+            return repr(obj)
+        if isinstance(obj, dict):
+            items = sorted(((_canonical(k), _canonical(v))
+                            for k, v in obj.items()))
+            return "{%s}" % ",".join(f"{k}:{v}" for k, v in items)
+        if isinstance(obj, (list, tuple)):
+            return "%s[%s]" % (type(obj).__name__,
+                               ",".join(_canonical(o) for o in obj))
+        if isinstance(obj, (set, frozenset)):
+            return "set[%s]" % ",".join(sorted(_canonical(o) for o in obj))
+        try:
+            data = pickle.dumps(obj, protocol=4)
+        except Exception as e:  # pragma: no cover
+            raise TypeError(
+                f"Unable to hash a parameter of type {type(obj)!r}.") from e
+        return "%s.%s(%s)" % (type(obj).__module__, type(obj).__qualname__,
+                              hashlib.sha256(data).hexdigest())
+
+    text = _canonical(params) + "|" + _canonical(version)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BenchMarkCache:
+    """
+    Stores the results of a benchmark, one file per configuration.
+    Every file is named after a hash of the parameters
+    (see @see fn hash_params) and is written as soon as the configuration
+    has run. Inserting or reordering configurations does not invalidate
+    the other results.
+    """
+
+    def __init__(self, folder, version=None, pickle_module=None):
+        """
+        @param      folder          folder which receives the records (created if it does not exist)
+        @param      version         version of the code, it is part of the key,
+                                    changing it invalidates every result
+        @param      pickle_module   pickle or dill if you need to serialize functions
+        """
+        self.folder = folder
+        self.version = version
+        self._pickle = pickle_module if pickle_module is not None else pickle
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+
+    def key(self, params):
+        """
+        Returns the key associated to a configuration.
+        """
+        return hash_params(params, self.version)
+
+    def _filename(self, key):
+        return os.path.join(self.folder, key + ".pkl")
+
+    def __contains__(self, params):
+        return os.path.exists(self._filename(self.key(params)))
+
+    def __len__(self):
+        return len(self.keys())
+
+    def keys(self):
+        """
+        Returns all stored keys.
+        """
+        return [name[:-4] for name in os.listdir(self.folder)
+                if name.endswith(".pkl")]
+
+    def get(self, params):
+        """
+        Returns the results stored for a configuration.
+
+        @param      params      dictionary
+        @return                 list of tuple *(metrics, appendix)* or None
+        """
+        name = self._filename(self.key(params))
+        if not os.path.exists(name):
+            return None
+        try:
+            with open(name, "rb") as f:
+                record = self._pickle.load(f)
+        except (EOFError, pickle.UnpicklingError):  # pragma: no cover
+            # A truncated file, the configuration will run again.
+            return None
+        return record["results"]
+
+    def set(self, params, results):
+        """
+        Stores the results for one configuration.
+        The file is replaced in one operation, an interrupted
+        write does not corrupt an existing record.
+
+        @param      params      dictionary
+        @param      results     list of tuple *(metrics, appendix)*
+        @return                 key
+        """
+        key = self.key(params)
+        record = dict(key=key, version=self.version,
+                      params=params, results=results)
+        name = self._filename(key)
+        tmp = name + ".tmp"
+        with open(tmp, "wb") as f:
+            self._pickle.dump(record, f)
+        os.replace(tmp, name)
+        return key
+
+    def remove(self, params):
+        """
+        Removes the results of a configuration.
+
+        @param      params      dictionary
+        @return                 True if a record was removed
+        """
+        name = self._filename(self.key(params))
+        if os.path.exists(name):
+            os.remove(name)
+            return True
+        return False
+
+    def items(self):
+        """
+        Iterates on all records, yields *(params, results)*.
+        """
+        for key in self.keys():
+            with open(self._filename(key), "rb") as f:
+                record = self._pickle.load(f)
+            yield record["params"], record["results"]
+
+    def import_legacy(self, filename):
+        """
+        Imports a cache produced by older versions of
+        @see cl BenchMark (a single pickle file with keys
+        *metrics*, *appendix*, *params_list*).
+
+        @param      filename    pickle file
+        @return                 number of imported configurations
+        """
+        with open(filename, "rb") as f:
+            cached = self._pickle.load(f)
+        results = {}
+        for met, app in zip(cached["metrics"], cached["appendix"]):
+            i = met.get("_i", None)
+            if i is None or i >= len(cached["params_list"]):
+                continue
+            results.setdefault(i, []).append((met, app))
+        for i, res in results.items():
+            self.set(cached["params_list"][i], res)
+        return len(results)
+
+
+class _UncacheView(dict):
+    """
+    Dictionary received by :meth:`BenchMark.uncache
+    <pyquickhelper.benchhelper.benchmark.BenchMark.uncache>`,
+    it keeps the format used by the previous versions
+    (keys *metrics*, *appendix*, *params_list*, one element per
+    configuration) and gives access to the cache
+    (attribute *store*, method *remove*).
+    A configuration removed from the lists is removed from the cache.
+    """
+
+    def __init__(self, store=None):
+        dict.__init__(self, metrics=[], appendix=[], params_list=[])
+        self.store = store
+        self._initial = []
+        if store is None:
+            return
+        for params, results in store.items():
+            if not results:
+                continue  # pragma: no cover
+            self["params_list"].append(params)
+            self["metrics"].append(results[0][0])
+            self["appendix"].append(results[0][1])
+            self._initial.append(params)
+
+    def remove(self, params):
+        """
+        Removes the results of a configuration.
+
+        @param      params      dictionary
+        @return                 True if a record was removed
+        """
+        if params in self["params_list"]:
+            i = self["params_list"].index(params)
+            for k in ["params_list", "metrics", "appendix"]:
+                if i < len(self[k]):
+                    del self[k][i]
+        return self.store is not None and self.store.remove(params)
+
+    def synchronize(self):
+        """
+        Removes from the cache every configuration the user removed
+        from the lists, a configuration without metrics or appendix
+        is removed as well.
+
+        @return                 number of removed configurations
+        """
+        if self.store is None:
+            return 0
+        n = min(len(self.get(k, [])) for k in ["params_list", "metrics", "appendix"])
+        kept = self.get("params_list", [])[:n]
+        removed = 0
+        for params in self._initial:
+            if params not in kept and self.store.remove(params):
+                removed += 1
+        return removed
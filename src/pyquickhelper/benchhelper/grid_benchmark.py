@@ -15,7 +15,8 @@ class GridBenchMark(BenchMark):
     """
 
     def __init__(self, name, datasets, clog=None, fLOG=noLOG, path_to_images=".",
-                 cache_file=None, repetition=1, progressbar=None, **params):
+                 cache_file=None, repetition=1, progressbar=None,
+                 cache_version=None, **params):
         """
         @param      name            name of the test
         @param      datasets        list of dictionary of dataframes
@@ -26,6 +27,7 @@ class GridBenchMark(BenchMark):
         @param      cache_file      cache file
         @param      repetition      repetition of the experiment (to get confidence interval)
         @param      progressbar     relies on *tqdm*, example *tnrange*
+        @param      cache_version   version of the code, part of the cache key
 
         If *cache_file* is specified, the class will store the results of the
         method :meth:`bench <pyquickhelper.benchhelper.benchmark.GridBenchMark.bench>`.
@@ -41,6 +43,7 @@ class GridBenchMark(BenchMark):
         BenchMark.__init__(self, name=name, datasets=datasets, clog=clog,
                            fLOG=fLOG, path_to_images=path_to_images,
                            cache_file=cache_file, progressbar=progressbar,
+                           cache_version=cache_version,
                            **params)
 
         if not isinstance(datasets, list):
@@ -92,9 +95,14 @@ class GridBenchMark(BenchMark):
         """
         pass  # pragma: no cover
 
-    def run(self, params_list):
+    def run(self, params_list, n_jobs=None, executor=None):
         """
         Runs the benchmark.
+
+        @param      params_list     list of dictionaries
+        @param      n_jobs          number of processes, see
+                                    :meth:`BenchMark.run <pyquickhelper.benchhelper.benchmark.BenchMark.run>`
+        @param      executor        an existing executor
         """
         self.init_main()
         self.fLOG("[MlGridBenchmark.bench] start")
@@ -129,7 +137,8 @@ class GridBenchMark(BenchMark):
                 full_list.append(pc)
 
         # Runs the bench
-        res = BenchMark.run(self, full_list)
+        res = BenchMark.run(self, full_list, n_jobs=n_jobs,
+                            executor=executor)
 
         self.fLOG("[MlGridBenchmark.bench] end")
         return res
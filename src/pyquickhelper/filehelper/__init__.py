@@ -6,17 +6,19 @@ import os
 from .anyfhelper import change_file_status, read_content_ufs
 from .compression_helper import (
     zip_files, gzip_files, zip7_files, unzip_files, ungzip_files,
-    un7zip_files, unrar_files, untar_files)
+    un7zip_files, unrar_files, untar_files, enumerate_unzip_files)
 from .download_helper import (
     get_url_content_timeout, get_urls_content_timeout,
     InternetException, local_url)
 from .encrypted_backup import EncryptedBackup
 from .encryption import decrypt_stream, encrypt_stream
-from .file_info import FileInfo, is_file_string, checksum_md5, is_url_string
+from .file_info import (
+    FileInfo, is_file_string, checksum_md5, checksum_file, is_url_string)
 from .ftp_transfer import TransferFTP
 from .ftp_transfer_files import FolderTransferFTP
 from .file_tree_node import FileTreeNode
 from .internet_helper import download, read_url
+from .scan_index import ScanIndex
 from .synchelper import explore_folder, synchronize_folder, has_been_updated, remove_folder
 from .synchelper import explore_folder_iterfile, explore_folder_iterfile_repo, walk
 from .transfer_api import TransferAPI
@@ -7,9 +7,14 @@ import os
 import zipfile
 import datetime
 import gzip
+import shutil
 import sys
+import tempfile
 import warnings
 import tarfile
+import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
 from ..loghelper.flog import noLOG, run_cmd
@@ -18,7 +23,90 @@ from ..texthelper.diacritic_helper import remove_diacritics
 from .synchelper import explore_folder
 
 
-def zip_files(filename, file_set, root=None, fLOG=noLOG):
+def _check_zip_timestamp(file, fLOG=noLOG):
+    "Zip format does not support dates before 1980."
+    a1980 = datetime.datetime(1980, 1, 1)
+    st = os.stat(file)
+    atime = datetime.datetime.fromtimestamp(st.st_atime)
+    mtime = datetime.datetime.fromtimestamp(st.st_mtime)
+    if atime < a1980 or mtime < a1980:  # pragma: no cover
+        new_mtime = st.st_mtime + (4 * 3600)  # new modification time
+        while datetime.datetime.fromtimestamp(new_mtime) < a1980:
+            new_mtime += (4 * 3600)  # new modification time
+
+        fLOG(
+            f"[zip_files] changing time timestamp for file '{file}'")
+        os.utime(file, (st.st_atime, new_mtime))
+
+
+def _compress_member(file, temp_folder, compression, compresslevel,
+                     buffer_size=2 ** 20):
+    """
+    Compresses a file into a temporary file
+    (it runs in another process for @see fn zip_files).
+
+    @param      file            file to compress
+    @param      temp_folder     folder receiving the compressed data
+    @param      compression     compression type (see :epkg:`zipfile`)
+    @param      compresslevel   compression level
+    @param      buffer_size     size of the blocks read from disk
+    @return                     temporary file, crc, size, compressed size
+    """
+    compressor = zipfile._get_compressor(  # pylint: disable=W0212
+        compression, compresslevel)
+    crc = 0
+    size = 0
+    fd, temp = tempfile.mkstemp(dir=temp_folder)
+    with os.fdopen(fd, "wb") as fo:
+        with open(file, "rb") as fi:
+            while True:
+                data = fi.read(buffer_size)
+                if not data:
+                    break
+                size += len(data)
+                crc = zlib.crc32(data, crc)
+                if compressor is not None:
+                    data = compressor.compress(data)
+                fo.write(data)
+        if compressor is not None:
+            fo.write(compressor.flush())
+        csize = fo.tell()
+    return temp, crc, size, csize
+
+
+def _write_compressed_member(myzip, file, arcname, res, compression,
+                             compresslevel):
+    """
+    Appends a member compressed by @see fn _compress_member
+    to a zip file, zipfile does not expose that feature.
+    """
+    temp, crc, size, csize = res
+    zinfo = zipfile.ZipInfo.from_file(file, arcname)
+    zinfo.compress_type = compression
+    if hasattr(zinfo, "_compresslevel"):
+        zinfo._compresslevel = compresslevel  # pylint: disable=W0212
+    zinfo.CRC = crc
+    zinfo.file_size = size
+    zinfo.compress_size = csize
+    myzip._writecheck(zinfo)  # pylint: disable=W0212
+    myzip._didModify = True  # pylint: disable=W0212
+    zinfo.header_offset = myzip.fp.tell()
+    zip64 = size > zipfile.ZIP64_LIMIT or csize > zipfile.ZIP64_LIMIT
+    if zip64 and not myzip._allowZip64:  # pylint: disable=W0212
+        raise zipfile.LargeZipFile(  # pragma: no cover
+            f"File '{file}' requires ZIP64 extensions.")
+    myzip.fp.write(zinfo.FileHeader(zip64))
+    with open(temp, "rb") as f:
+        shutil.copyfileobj(f, myzip.fp, 2 ** 20)
+    os.remove(temp)
+    myzip.filelist.append(zinfo)
+    myzip.NameToInfo[zinfo.filename] = zinfo
+    myzip.start_dir = myzip.fp.tell()
+
+
+def zip_files(filename, file_set, root=None, fLOG=noLOG,
+              compression=zipfile.ZIP_STORED, compresslevel=None,
+              processes=None):
     """
     Zips all files from an iterator.
 
@@ -26,41 +114,200 @@ def zip_files(filename, file_set, root=None, fLOG=noLOG):
     @param      file_set        iterator on file to add
     @param      root            if not None, all path are relative to this path
     @param      fLOG            logging function
+    @param      compression     compression type (see :epkg:`zipfile`),
+                                files are only stored by default
+    @param      compresslevel   compression level
+    @param      processes       if not None and more than one, members are compressed
+                                in parallel by *processes* processes, the main process
+                                writes them into the archive in the same order
     @return                     number of added files (or content if filename is None)
 
     *filename* can be None, the function compresses
     into bytes without saving the results.
     """
     nb = 0
-    a1980 = datetime.datetime(1980, 1, 1)
     if filename is None:
         filename = BytesIO()
-    with zipfile.ZipFile(filename, 'w') as myzip:
-        for file in file_set:
-            if not os.path.exists(file):
+    with zipfile.ZipFile(filename, 'w', compression=compression,
+                         compresslevel=compresslevel) as myzip:
+        if processes is None or processes <= 1:
+            for file in file_set:
+                if not os.path.exists(file):
+                    continue
+                if fLOG:
+                    fLOG(f"[zip_files] '{file}'")
+                _check_zip_timestamp(file, fLOG)
+                arcname = os.path.relpath(file, root) if root else None
+                myzip.write(file, arcname=arcname)
+                nb += 1
+        else:
+            max_pending = processes * 2
+            temp_folder = tempfile.mkdtemp()
+            pending = deque()
+            try:
+                with ProcessPoolExecutor(max_workers=processes) as executor:
+                    for file in file_set:
+                        if not os.path.exists(file) or os.path.isdir(file):
+                            continue
+                        _check_zip_timestamp(file, fLOG)
+                        arcname = os.path.relpath(file, root) if root else None
+                        pending.append((file, arcname, executor.submit(
+                            _compress_member, file, temp_folder,
+                            compression, compresslevel)))
+                        while len(pending) >= max_pending or (
+                                pending and pending[0][2].done()):
+                            file, arcname, fut = pending.popleft()
+                            if fLOG:
+                                fLOG(f"[zip_files] '{file}'")
+                            _write_compressed_member(
+                                myzip, file, arcname, fut.result(),
+                                compression, compresslevel)
+                            nb += 1
+                    while pending:
+                        file, arcname, fut = pending.popleft()
+                        if fLOG:
+                            fLOG(f"[zip_files] '{file}'")
+                        _write_compressed_member(
+                            myzip, file, arcname, fut.result(),
+                            compression, compresslevel)
+                        nb += 1
+            finally:
+                shutil.rmtree(temp_folder, ignore_errors=True)
+    return filename.getvalue() if isinstance(filename, BytesIO) else nb
+
+
+def _clean_zip_name(name, where_to, remove_space):
+    "Returns the local name of a member."
+    clean = remove_diacritics(name)
+    if remove_space:
+        clean = clean.replace(" ", "").replace("'", "").replace(",", "_") \
+                     .replace("(", "_").replace(")", "_")
+    return os.path.join(where_to, clean)
+
+
+def _unzip_member(file, info, tos, where_to, fLOG=noLOG, fail_if_error=True):
+    """
+    Extracts one member of a zip file on disk.
+
+    @param      file            opened *ZipFile*
+    @param      info            *ZipInfo*
+    @param      tos             destination
+    @param      where_to        destination folder
+    @param      fLOG            logging function
+    @param      fail_if_error   fails if an error is encountered
+    @return                     local name or None if it is not a file
+    """
+    # check encoding to avoid characters not allowed in paths
+    if os.path.exists(tos):
+        if not tos.endswith("/"):  # pragma: no cover
+            return tos
+        return None  # pragma: no cover
+    if sys.platform.startswith("win"):
+        tos = tos.replace("/", "\\")
+    finalfolder = os.path.split(tos)[0]
+    if not os.path.exists(finalfolder):
+        fLOG("[unzip_files]    creating folder (zip)",
+             os.path.abspath(finalfolder))
+        try:
+            os.makedirs(finalfolder, exist_ok=True)
+        except FileNotFoundError as e:  # pragma: no cover
+            mes = "Unexpected error\ninfo.filename={0}\ntos={1}\nfinalfolder={2}\nlen(nfinalfolder)={3}".format(
+                info.filename, tos, finalfolder, len(finalfolder))
+            raise FileNotFoundError(mes) from e
+    if info.filename.endswith("/"):
+        return None
+    try:
+        try:
+            with file.open(info, "r") as fi:
+                with open(tos, "wb") as u:
+                    shutil.copyfileobj(fi, u, 2 ** 20)
+        except FileNotFoundError as e:  # pragma: no cover
+            # probably an issue in the path name
+            # the next lines are just here to distinguish
+            # between the two cases
+            if not os.path.exists(finalfolder):
+                raise e
+            newname = info.filename.replace(
+                " ", "_").replace(",", "_")
+            if sys.platform.startswith("win"):
+                newname = newname.replace("/", "\\")
+            tos = os.path.join(where_to, newname)
+            finalfolder = os.path.split(tos)[0]
+            if not os.path.exists(finalfolder):
+                fLOG("[unzip_files]    creating folder (zip)",
+                     os.path.abspath(finalfolder))
+                os.makedirs(finalfolder, exist_ok=True)
+            with file.open(info, "r") as fi:
+                with open(tos, "wb") as u:
+                    shutil.copyfileobj(fi, u, 2 ** 20)
+    except zipfile.BadZipFile as e:  # pragma: no cover
+        if os.path.exists(tos):
+            os.remove(tos)
+        if fail_if_error:
+            raise zipfile.BadZipFile(
+                f"Unable to extract '{info.filename}' due to {e}") from e
+        warnings.warn(
+            f"Unable to extract '{info.filename}' due to {e}", UserWarning)
+        return None
+    fLOG("[unzip_files]    unzipped ", info.filename, " to ", tos)
+    return tos
+
+
+def _unzip_members(zipf, members, where_to, fail_if_error):
+    """
+    Extracts a subset of the members of a zip file
+    (it runs in another process for @see fn unzip_files).
+
+    @param      zipf            zip file
+    @param      members         list of (position, member name, destination)
+    @param      where_to        destination folder
+    @param      fail_if_error   fails if an error is encountered
+    @return                     list of (position, local name)
+    """
+    res = []
+    with zipfile.ZipFile(zipf, "r") as file:
+        for pos, name, tos in members:
+            tos = _unzip_member(file, file.getinfo(name), tos, where_to,
+                                fail_if_error=fail_if_error)
+            if tos is not None:
+                res.append((pos, tos))
+    return res
+
+
+def enumerate_unzip_files(zipf, fLOG=noLOG, fvalid=None):
+    """
+    Enumerates the members of a zip archive without
+    loading them in memory.
+
+    @param      zipf            archive (or bytes or BytesIO)
+    @param      fLOG            logging function
+    @param      fvalid          function which takes one path (zip name) and returns True if the file
+                                must be unzipped, False otherwise, if None, the default answer is True
+    @return                     iterator on (member name, binary file-like object)
+
+    Every file-like object must be read before the next
+    member is requested, it is closed by then.
+    """
+    if isinstance(zipf, bytes):
+        zipf = BytesIO(zipf)
+    try:
+        file = zipfile.ZipFile(zipf, "r")
+    except zipfile.BadZipFile as e:  # pragma: no cover
+        if isinstance(zipf, BytesIO):
+            raise e
+        raise IOError(f"Unable to read file '{zipf}'") from e
+    with file:
+        for info in file.infolist():
+            if info.is_dir() or (fvalid and not fvalid(info.filename)):
                 continue
             if fLOG:
-                fLOG(f"[zip_files] '{file}'")
-            st = os.stat(file)
-            atime = datetime.datetime.fromtimestamp(st.st_atime)
-            mtime = datetime.datetime.fromtimestamp(st.st_mtime)
-            if atime < a1980 or mtime < a1980:  # pragma: no cover
-                new_mtime = st.st_mtime + (4 * 3600)  # new modification time
-                while datetime.datetime.fromtimestamp(new_mtime) < a1980:
-                    new_mtime += (4 * 3600)  # new modification time
-
-                fLOG(
-                    f"[zip_files] changing time timestamp for file '{file}'")
-                os.utime(file, (st.st_atime, new_mtime))
-
-            arcname = os.path.relpath(file, root) if root else None
-            myzip.write(file, arcname=arcname)
-            nb += 1
-    return filename.getvalue() if isinstance(filename, BytesIO) else nb
+                fLOG(f"[enumerate_unzip_files] unzip '{info.filename}'")
+            with file.open(info, "r") as f:
+                yield info.filename, f
 
 
 def unzip_files(zipf, where_to=None, fLOG=noLOG, fvalid=None, remove_space=True,
-                fail_if_error=True):
+                fail_if_error=True, streaming=False, processes=None):
     """
     Unzips files from a zip archive.
 
@@ -73,21 +320,35 @@ def unzip_files(zipf, where_to=None, fLOG=noLOG, fvalid=None, remove_space=True,
     @param      fail_if_error   fails if an error is encountered
                                 (typically a weird character in a filename),
                                 otherwise a warning is thrown.
+    @param      streaming       only if *where_to* is None, the function returns
+                                an iterator on (member name, file-like object),
+                                see @see fn enumerate_unzip_files
+    @param      processes       if not None and more than one, members are extracted
+                                on disk by *processes* processes,
+                                *zipf* must be a filename
     @return                     list of unzipped files
     """
+    if streaming:
+        if where_to is not None:
+            raise ValueError(  # pragma: no cover
+                "streaming=True requires where_to=None.")
+        return enumerate_unzip_files(
+            zipf, fLOG=fLOG, fvalid=None if fvalid is None else (
+                lambda name: fvalid(name, None)))
+
     if isinstance(zipf, bytes):
         zipf = BytesIO(zipf)
 
     try:
-        with zipfile.ZipFile(zipf, "r"):
-            pass
+        file = zipfile.ZipFile(zipf, "r")
     except zipfile.BadZipFile as e:  # pragma: no cover
         if isinstance(zipf, BytesIO):
             raise e
         raise IOError(f"Unable to read file '{zipf}'") from e
 
     files = []
-    with zipfile.ZipFile(zipf, "r") as file:
+    todo = []
+    with file:
         for info in file.infolist():
             if fLOG:
                 fLOG(f"[unzip_files] unzip '{info.filename}'")
@@ -102,68 +363,45 @@ def unzip_files(zipf, where_to=None, fLOG=noLOG, fvalid=None, remove_space=True,
                         f"Unable to extract '{info.filename}' due to {e}", UserWarning)
                     continue
                 files.append((info.filename, content))
-            else:
-                clean = remove_diacritics(info.filename)
-                if remove_space:
-                    clean = clean.replace(" ", "").replace("'", "").replace(",", "_") \
-                                 .replace("(", "_").replace(")", "_")
-                tos = os.path.join(where_to, clean)
-                if not os.path.exists(tos):
-                    if fvalid and not fvalid(info.filename, tos):
-                        fLOG("[unzip_files]    skipping", info.filename)
-                        continue
-                    try:
-                        data = file.read(info.filename)
-                    except zipfile.BadZipFile as e:  # pragma: no cover
-                        if fail_if_error:
-                            raise zipfile.BadZipFile(
-                                f"Unable to extract '{info.filename}' due to {e}") from e
-                        warnings.warn(
-                            f"Unable to extract '{info.filename}' due to {e}", UserWarning)
-                        continue
-                    # check encoding to avoid characters not allowed in paths
-                    if not os.path.exists(tos):
-                        if sys.platform.startswith("win"):
-                            tos = tos.replace("/", "\\")
-                        finalfolder = os.path.split(tos)[0]
-                        if not os.path.exists(finalfolder):
-                            fLOG("[unzip_files]    creating folder (zip)",
-                                 os.path.abspath(finalfolder))
-                            try:
-                                os.makedirs(finalfolder)
-                            except FileNotFoundError as e:  # pragma: no cover
-                                mes = "Unexpected error\ninfo.filename={0}\ntos={1}\nfinalfolder={2}\nlen(nfinalfolder)={3}".format(
-                                    info.filename, tos, finalfolder, len(finalfolder))
-                                raise FileNotFoundError(mes) from e
-                        if not info.filename.endswith("/"):
-                            try:
-                                with open(tos, "wb") as u:
-                                    u.write(data)
-                            except FileNotFoundError as e:  # pragma: no cover
-                                # probably an issue in the path name
-                                # the next lines are just here to distinguish
-                                # between the two cases
-                                if not os.path.exists(finalfolder):
-                                    raise e
-                                newname = info.filename.replace(
-                                    " ", "_").replace(",", "_")
-                                if sys.platform.startswith("win"):
-                                    newname = newname.replace("/", "\\")
-                                tos = os.path.join(where_to, newname)
-                                finalfolder = os.path.split(tos)[0]
-                                if not os.path.exists(finalfolder):
-                                    fLOG("[unzip_files]    creating folder (zip)",
-                                         os.path.abspath(finalfolder))
-                                    os.makedirs(finalfolder)
-                                with open(tos, "wb") as u:
-                                    u.write(data)
-                            files.append(tos)
-                            fLOG("[unzip_files]    unzipped ",
-                                 info.filename, " to ", tos)
-                    elif not tos.endswith("/"):  # pragma: no cover
-                        files.append(tos)
-                elif not info.filename.endswith("/"):  # pragma: no cover
+                continue
+
+            tos = _clean_zip_name(info.filename, where_to, remove_space)
+            if os.path.exists(tos):
+                if not info.filename.endswith("/"):  # pragma: no cover
                     files.append(tos)
+                continue
+            if fvalid and not fvalid(info.filename, tos):
+                fLOG("[unzip_files]    skipping", info.filename)
+                continue
+            if processes is None or processes <= 1 or not isinstance(zipf, str):
+                tos = _unzip_member(file, info, tos, where_to, fLOG=fLOG,
+                                    fail_if_error=fail_if_error)
+                if tos is not None:
+                    files.append(tos)
+                continue
+            if info.filename.endswith("/"):
+                if not os.path.exists(tos):
+                    os.makedirs(tos)
+                continue
+            todo.append((len(files), info, tos))
+            files.append(None)
+
+    if todo:
+        # balances the compressed sizes between processes
+        batches = [[] for i in range(processes)]
+        sizes = [0 for i in range(processes)]
+        for pos, info, tos in sorted(todo, key=lambda t: -t[1].compress_size):
+            i = sizes.index(min(sizes))
+            batches[i].append((pos, info.filename, tos))
+            sizes[i] += info.compress_size
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(_unzip_members, zipf, batch, where_to,
+                                       fail_if_error)
+                       for batch in batches if batch]
+            for fut in futures:
+                for pos, tos in fut.result():
+                    files[pos] = tos
+        files = [f for f in files if f is not None]
     return files
 
 
@@ -3,12 +3,17 @@
 @brief A function to download the content of a url.
 """
 import os
+import csv
 from datetime import datetime
 import socket
 import gzip
+import shutil
+import threading
 import warnings
 import hashlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import urllib.error as urllib_error
+import urllib.parse as urllib_parse
 import urllib.request as urllib_request
 import http.client as http_client
 try:
@@ -150,14 +155,222 @@ def get_url_content_timeout(url, timeout=10, output=None, encoding="utf8",
     return content
 
 
+class HostConnectionPool:
+    """
+    Keeps connections alive to reuse them for the next request
+    to the same host and limits the number of simultaneous
+    connections to every host.
+
+    :param max_per_host: maximum number of connections to a host
+    :param timeout: timeout of every connection, None for no timeout
+
+    Attributes *n_created* and *n_reused* count the connections
+    opened and the requests sent through an existing connection.
+    """
+
+    def __init__(self, max_per_host=2, timeout=10):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.n_created = 0
+        self.n_reused = 0
+        self._lock = threading.Lock()
+        self._semaphores = {}
+        self._idle = {}
+
+    def acquire(self, scheme, netloc):
+        """
+        Returns a connection to a host, it waits if *max_per_host*
+        connections are already in use.
+
+        :param scheme: ``'http'`` or ``'https'``
+        :param netloc: host and port
+        :return: connection, True if it was already used
+        """
+        key = scheme, netloc
+        with self._lock:
+            sem = self._semaphores.get(key, None)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.max_per_host)
+                self._semaphores[key] = sem
+        sem.acquire()
+        with self._lock:
+            idle = self._idle.get(key, None)
+            if idle:
+                self.n_reused += 1
+                return idle.pop(), True
+            self.n_created += 1
+        if scheme == "https":
+            conn = http_client.HTTPSConnection(netloc, timeout=self.timeout)
+        elif scheme == "http":
+            conn = http_client.HTTPConnection(netloc, timeout=self.timeout)
+        else:
+            sem.release()
+            raise InvalidURL(f"Unsupported scheme {scheme!r}.")
+        return conn, False
+
+    def release(self, scheme, netloc, conn, reuse):
+        """
+        Gives back a connection acquired with @see me acquire.
+
+        :param scheme: ``'http'`` or ``'https'``
+        :param netloc: host and port
+        :param conn: connection
+        :param reuse: keep it for the next request or close it
+        """
+        key = scheme, netloc
+        with self._lock:
+            if reuse:
+                self._idle.setdefault(key, []).append(conn)
+            sem = self._semaphores[key]
+        if not reuse:
+            conn.close()
+        sem.release()
+
+    def close(self):
+        """
+        Closes every idle connection.
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+def download_with_resume(pool, url, dest, chunk=None, max_redirects=5):
+    """
+    Downloads a url into a file. If the file exists, it is considered
+    as a partial download and the function only requests the missing bytes
+    with a `Range <https://developer.mozilla.org/en-US/docs/Web/HTTP/Range_requests>`_
+    header. The file is entirely downloaded again if the server
+    does not support it.
+
+    :param pool: @see cl HostConnectionPool
+    :param url: url
+    :param dest: destination
+    :param chunk: size of the blocks written to disk
+    :param max_redirects: maximum number of redirections
+    :return: size of the file
+    """
+    block = chunk or 2 ** 16
+    for _ in range(max_redirects + 1):
+        size = os.path.getsize(dest) if os.path.exists(dest) else 0
+        parsed = urllib_parse.urlsplit(url)
+        path = parsed.path or "/"
+        if parsed.query:
+            path += "?" + parsed.query
+        headers = {"Accept-Encoding": "identity"}
+        if size > 0:
+            headers["Range"] = f"bytes={size}-"
+
+        conn, reused = pool.acquire(parsed.scheme, parsed.netloc)
+        reuse = False
+        try:
+            try:
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+            except (http_client.RemoteDisconnected, ConnectionResetError,
+                    BrokenPipeError):
+                if not reused:
+                    raise
+                # the server closed an idle connection
+                conn.close()
+                conn.request("GET", path, headers=headers)
+                resp = conn.getresponse()
+
+            if resp.status in (301, 302, 303, 307, 308):
+                location = resp.getheader("Location")
+                resp.read()
+                reuse = not resp.will_close
+                if location is None:
+                    raise InternetException(  # pragma: no cover
+                        f"Redirection without location for url='{url}'.")
+                url = urllib_parse.urljoin(url, location)
+                continue
+            if resp.status == 416:
+                # the range cannot be satisfied
+                resp.read()
+                reuse = not resp.will_close
+                total = (resp.getheader("Content-Range") or "").split("/")[-1]
+                if total.isdigit() and int(total) == size:
+                    return size
+                os.remove(dest)
+                continue
+            if resp.status not in (200, 206):
+                resp.read()
+                reuse = not resp.will_close
+                raise InternetException(
+                    f"Unable to retrieve content url='{url}', "
+                    f"status={resp.status} {resp.reason}.")
+            with open(dest, "ab" if resp.status == 206 else "wb") as f:
+                while True:
+                    data = resp.read(block)
+                    if not data:
+                        break
+                    f.write(data)
+            reuse = not resp.will_close
+            return os.path.getsize(dest)
+        finally:
+            pool.release(parsed.scheme, parsed.netloc, conn, reuse)
+    raise InternetException(  # pragma: no cover
+        f"Too many redirections for url='{url}'.")
+
+
 def _hash_url(url):
     m = hashlib.sha256()
     m.update(url.encode('utf-8'))
     return m.hexdigest()[:25]
 
 
+_summary_columns = ['url', 'size', 'date', 'dest']
+
+
+def _read_summary(summary):
+    "Reads the summary, skips incomplete lines."
+    all_obs = []
+    if not os.path.exists(summary):
+        return all_obs
+    with open(summary, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            if any(row.get(c, None) in (None, "") for c in _summary_columns):
+                # interrupted while writing
+                continue
+            try:
+                row['size'] = int(row['size'])
+            except ValueError:  # pragma: no cover
+                continue
+            all_obs.append({c: row[c] for c in _summary_columns})
+    return all_obs
+
+
+def _append_summary(summary, obs):
+    "Appends one record to the summary, it is immediately flushed."
+    new = not os.path.exists(summary) or os.path.getsize(summary) == 0
+    with open(summary, "a", encoding="utf-8", newline="") as f:
+        if not new:
+            f.seek(0, os.SEEK_END)
+        writer = csv.writer(f)
+        if new:
+            writer.writerow(_summary_columns)
+        writer.writerow([obs[c] for c in _summary_columns])
+
+
+def _gunzip_file(name):
+    "Decompresses a file if it is compressed with gzip."
+    with open(name, "rb") as f:
+        if f.read(2) != b"\x1f\x8B":
+            return os.path.getsize(name)
+    with gzip.open(name, "rb") as fi:
+        with open(name + ".tmp", "wb") as fo:
+            shutil.copyfileobj(fi, fo)
+    os.replace(name + ".tmp", name)
+    return os.path.getsize(name)
+
+
 def get_urls_content_timeout(urls, timeout=10, folder=None, encoding=None,
-                             raise_exception=True, chunk=None, fLOG=None):
+                             raise_exception=True, chunk=None, fLOG=None,
+                             max_workers=None, max_per_host=2):
     """
     Downloads data from urls (by default, it assumes
     it is text information, otherwise, encoding should be None).
@@ -169,58 +382,93 @@ def get_urls_content_timeout(urls, timeout=10, folder=None, encoding=None,
     :param raise_exception: True to raise an exception, False to send a warnings
     :param chunk: save data every chunk (only if output is not None)
     :param fLOG: logging function (only applies when chunk is not None)
+    :param max_workers: if not None, urls are downloaded by a pool of
+        *max_workers* threads, connections are kept alive and reused,
+        a partial file is resumed (see @see fn download_with_resume),
+        the content is saved as it is received (*encoding* is ignored)
+    :param max_per_host: maximum number of simultaneous connections
+        to the same host (only if *max_workers* is not None)
     :return: list of downloaded content
 
     If the function automatically detects that the downloaded data is in gzip
     format, it will decompress it.
 
+    Every download is recorded in ``summary.csv`` as soon as it is complete,
+    the urls already recorded are skipped when the function is called again.
+
     The function raises the exception @see cl InternetException.
     """
-    import pandas
-    import pandas.errors
     if not isinstance(urls, list):
         raise TypeError("urls must be a list")
     if folder is None:
         raise ValueError("folder should not be None")
     summary = os.path.join(folder, "summary.csv")
-    if os.path.exists(summary):
-        try:
-            df = pandas.read_csv(summary)
-        except pandas.errors.EmptyDataError:
-            df = None
-    else:
-        df = None
-    if df is not None:
-        all_obs = [dict(url=df.loc[i, 'url'],  # pylint: disable=E1101
-                        size=df.loc[i, 'size'],  # pylint: disable=E1101
-                        date=df.loc[i, 'date'],  # pylint: disable=E1101
-                        dest=df.loc[i, 'dest'])  # pylint: disable=E1101
-                   for i in range(df.shape[0])]  # pylint: disable=E1101
-        done = set(d['dest'] for d in all_obs)
-    else:
-        all_obs = []
-        done = set()
-    for i, url in enumerate(urls):
-        dest = _hash_url(url)
-        if dest in done:
-            continue
-        full_dest = os.path.join(folder, dest + '.bin')
-        content = get_url_content_timeout(url, timeout=timeout, output=full_dest,
-                                          encoding=encoding, chunk=chunk,
-                                          raise_exception=raise_exception)
-        if content is None:
-            continue
+    all_obs = _read_summary(summary)
+    done = set(d['dest'] for d in all_obs)
+
+    def record(i, url, dest, size):
         if fLOG is not None:
             fLOG("{}/{} downloaded {} bytes from '{}' to '{}'.".format(
-                i + 1, len(urls), len(content), url, dest + '.bin'))
-
-        obs = dict(url=url, size=len(content), date=datetime.now(),
-                   dest=dest)
+                i + 1, len(urls), size, url, dest + '.bin'))
+        obs = dict(url=url, size=size, date=datetime.now(), dest=dest)
+        _append_summary(summary, obs)
         all_obs.append(obs)
-        done.add(dest)
 
-    new_df = pandas.DataFrame(all_obs)
-    new_df.to_csv(summary, index=False)
+    if max_workers is None:
+        for i, url in enumerate(urls):
+            dest = _hash_url(url)
+            if dest in done:
+                continue
+            full_dest = os.path.join(folder, dest + '.bin')
+            content = get_url_content_timeout(url, timeout=timeout, output=full_dest,
+                                              encoding=encoding, chunk=chunk,
+                                              raise_exception=raise_exception)
+            if content is None:
+                continue
+            record(i, url, dest, len(content))
+            done.add(dest)
+        return all_obs
+
+    todo = {}
+    for i, url in enumerate(urls):
+        dest = _hash_url(url)
+        if dest not in done and dest not in todo:
+            todo[dest] = i, url
+
+    def download(url, dest):
+        full_dest = os.path.join(folder, dest + '.bin')
+        size = download_with_resume(pool, url, full_dest, chunk=chunk)
+        if chunk is None:
+            size = _gunzip_file(full_dest)
+        return size
+
+    pool = HostConnectionPool(max_per_host=max_per_host,
+                              timeout=None if timeout == -1 else timeout)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(download, url, dest): (i, url, dest)
+                       for dest, (i, url) in todo.items()}
+            try:
+                for fut in as_completed(futures):
+                    i, url, dest = futures[fut]
+                    try:
+                        size = fut.result()
+                    except (InternetException, OSError, http_client.HTTPException,
+                            InvalidURL, ValueError) as e:
+                        if raise_exception:
+                            raise InternetException(
+                                f"Unable to retrieve content url='{url}'") from e
+                        warnings.warn(
+                            f"Unable to retrieve content from '{url}' because of {e}",
+                            ResourceWarning)
+                        continue
+                    record(i, url, dest, size)
+            except BaseException:
+                for fut in futures:
+                    fut.cancel()
+                raise
+    finally:
+        pool.close()
     return all_obs
 
 
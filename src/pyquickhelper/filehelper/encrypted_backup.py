@@ -5,12 +5,17 @@
 import re
 import os
 import datetime
+import hashlib
+import random
 import zlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from io import BytesIO as StreamIO
 from .files_status import FilesStatus
 from ..loghelper.flog import noLOG
-from .transfer_api import TransferAPI_FileInfo
+from .transfer_api import TransferAPI, TransferAPI_FileInfo, TransferAPI_MappingLog
 from .encryption import encrypt_stream, decrypt_stream
+from .content_chunking import enumerate_cdc_chunks
 
 
 class EncryptedBackupError(Exception):
@@ -20,6 +25,36 @@ class EncryptedBackupError(Exception):
     pass
 
 
+def compress_data(data, compression):
+    """
+    Compresses data.
+
+    @param      data            binary data
+    @param      compression     ``'lzma'``, ``'zip'`` or None
+    @return                     binary data
+    """
+    if compression == "zip":
+        return zlib.compress(data)
+    elif compression == "lzma":
+        # delay import
+        try:
+            import lzma
+        except ImportError:  # pragma: no cover
+            import pylzma as lzma
+        return lzma.compress(data)
+    elif compression is None:
+        return data
+    else:
+        raise ValueError(  # pragma: no cover
+            f"Unexpected compression algorithm '{compression}'.")
+
+
+def _compress_encrypt(data, key, algo, compression, iv):
+    "Compresses and encrypts a piece, it runs in a separate process."
+    return encrypt_stream(key, compress_data(data, compression),
+                          chunksize=None, algo=algo, iv=iv)
+
+
 class EncryptedBackup:
 
     """
@@ -81,13 +116,24 @@ class EncryptedBackup:
 
                 dest=os.path.join(this, "_temp")
                 enc.retrieve_all(dest)
+
+    With ``chunking='cdc'``, files are cut into chunks whose boundaries
+    depend on the content (see @see fn enumerate_cdc_chunks).
+    Every chunk is stored once under a name derived from a keyed
+    hash of its content, the mapping of every file refers to
+    its chunks. A chunk already stored is never sent again, a modified file
+    only uploads the chunks around the modification, identical files
+    share the same chunks. Attribute *chunk_stats* counts the chunks
+    and the bytes uploaded or skipped by the last backup.
     """
 
     def __init__(self, key, file_tree_node, transfer_api,
                  file_status, file_map, root_local=None,
                  root_remote=None, filter_out=None,
                  threshold_size=2 ** 24, algo="AES",
-                 compression="lzma", fLOG=noLOG):
+                 compression="lzma", iv_seed=None, chunking=None,
+                 chunk_size=2 ** 20, mapping_commit=100, max_segments=64,
+                 fLOG=noLOG):
         """
         constructor
 
@@ -102,6 +148,17 @@ class EncryptedBackup:
         @param      threshold_size      above that size, big files are split
         @param      algo                encrypting algorithm
         @param      compression         kind of compression ``'lzma'`` or ``'zip'``
+        @param      iv_seed             seed of the generator of initialization vectors (AES),
+                                        two backups with the same seed produce the same
+                                        encrypted pieces, it should only be used for unit tests
+        @param      chunking            None to cut files every *threshold_size* bytes,
+                                        ``'cdc'`` for content defined chunking and deduplication
+        @param      chunk_size          expected chunk size if *chunking* is ``'cdc'``
+        @param      mapping_commit      the mapping and the status file are committed
+                                        every *mapping_commit* files,
+                                        see @see cl TransferAPI_MappingLog
+        @param      max_segments        the mapping is compacted when it holds more
+                                        than *max_segments* segments
         @param      fLOG                logging function
         """
         self._key = key
@@ -113,6 +170,23 @@ class EncryptedBackup:
         self._mapping = None
         self._compress = compression
         self._threshold_size = threshold_size
+        self._iv_random = random.Random(iv_seed)
+        if chunking not in (None, "cdc"):
+            raise ValueError(  # pragma: no cover
+                f"Unexpected value for chunking={chunking!r}.")
+        self._chunking = chunking
+        self._chunk_size = chunk_size
+        self._known_chunks = set()
+        self.chunk_stats = {}
+        self._mapping_commit = mapping_commit
+        self._pending_mapping = {}
+        self._log = TransferAPI_MappingLog(
+            transfer_api,
+            encrypt=lambda data: encrypt_stream(
+                self._key, data, chunksize=None, algo=self._algo),
+            decrypt=lambda data: decrypt_stream(
+                self._key, data, chunksize=None, algo=self._algo),
+            max_segments=max_segments)
         self._root_local = root_local if root_local is not None else (
             file_tree_node.root if file_tree_node else None)
         self._root_remote = root_remote if root_remote is not None else ""
@@ -140,26 +214,47 @@ class EncryptedBackup:
                 if n:
                     yield f
 
-    def update_status(self, file):
+    def update_status(self, file, save=True):
         """
         update the status of a file
 
         @param      file        filename
+        @param      save        save the status file
         @return                 @see cl FileInfo
         """
         r = self._ft.update_copied_file(file)
-        self._ft.save_dates()
+        if save:
+            self._ft.save_dates()
         return r
 
     def update_mapping(self, key, maps):
         """
-        update the status of a file
+        update the status of a file, the mapping is committed
+        every *mapping_commit* files
 
         @param      key         key
         @param      maps        update the mapping
         """
         self.Mapping[key] = maps
-        self.transfer_mapping()
+        self._pending_mapping[key] = maps
+        if len(self._pending_mapping) >= self._mapping_commit:
+            self.commit_mapping()
+
+    def commit_mapping(self):
+        """
+        Uploads the pending changes of the mapping as a new segment
+        (or compacts the mapping), then saves the status file.
+        A file is marked as transferred in the status file
+        only once it is part of a committed segment.
+        """
+        if self._pending_mapping or self._log.needs_compaction():
+            if self._log.needs_compaction():
+                self._log.compact(self.Mapping)
+            else:
+                self._log.append(self._pending_mapping.values())
+            self._pending_mapping = {}
+        if self._ft is not None:
+            self._ft.save_dates()
 
     def load_mapping(self):
         """
@@ -167,18 +262,22 @@ class EncryptedBackup:
 
         @return         dictionary
         """
-        self._mapping = self._api.retrieve_mapping(lambda data: decrypt_stream(
-            self._key, data, chunksize=None, algo=self._algo))
+        self._mapping = self._log.load()
+        self._pending_mapping = {}
+        prefix = self._chunk_path(None)
+        self._known_chunks = set(
+            p for v in self._mapping.values() for p in v.pieces
+            if p.startswith(prefix))
         return self._mapping
 
     def transfer_mapping(self):
         """
-        transfer the mapping
+        commits the mapping and keeps a local copy of it
         """
-        self._api.transfer_mapping(self.Mapping,
-                                   lambda data: encrypt_stream(
-                                       self._key, data, chunksize=None, algo=self._algo),
-                                   self._map)
+        self.commit_mapping()
+        if self._map:
+            with open(self._map, "wb") as f:
+                f.write(TransferAPI.mapping2bytes(self.Mapping))
 
     @property
     def Mapping(self):
@@ -187,31 +286,68 @@ class EncryptedBackup:
         """
         return self._mapping
 
-    def enumerate_read_encrypt(self, fullname):
+    def _next_iv(self):
+        "Returns the initialization vector for the next piece."
+        if self._algo != "AES":
+            return None
+        return bytes([self._iv_random.randint(0, 0xFF) for i in range(16)])
+
+    def _chunk_path(self, data):
         """
-        enumerate pieces of files as bytes
+        Returns the remote path of a chunk, it only depends on its
+        content and the key, the prefix of every chunk if *data* is None.
+        """
+        prefix = (self._root_remote + "/__chunks__/").lstrip("/")
+        if data is None:
+            return prefix
+        key = self._key.encode() if hasattr(self._key, "encode") else self._key
+        h = hashlib.blake2b(data, key=key[:64], digest_size=32).hexdigest()
+        return prefix + h[:2] + "/" + h
+
+    def enumerate_read(self, fullname):
+        """
+        enumerate pieces of files as bytes before they are compressed
 
         @param      fullname        fullname
-        @return                     iterator on chunk of data
+        @return                     iterator on chunk of data,
+                                    an exception if the file cannot be read
         """
         with open(fullname, "rb") as f:
+            if self._chunking == "cdc":
+                try:
+                    for data in enumerate_cdc_chunks(f, self._chunk_size):
+                        yield data
+                except PermissionError as e:  # pragma: no cover
+                    yield e
+                return
             try:
                 data = f.read(self._threshold_size)
-                cont = True
             except PermissionError as e:  # pragma: no cover
                 yield e
-                cont = False
-            if cont:
-                while data and cont:
-                    data = self.compress(data)
-                    enc = encrypt_stream(
-                        self._key, data, chunksize=None, algo=self._algo)
-                    yield enc
-                    try:
-                        data = f.read(self._threshold_size)
-                    except PermissionError as e:  # pragma: no cover
-                        yield e
-                        cont = False
+                return
+            while data:
+                yield data
+                try:
+                    data = f.read(self._threshold_size)
+                except PermissionError as e:  # pragma: no cover
+                    yield e
+                    return
+
+    def enumerate_read_encrypt(self, fullname):
+        """
+        enumerate pieces of files as bytes
+
+        @param      fullname        fullname
+        @return                     iterator on chunk of data
+        """
+        for data in self.enumerate_read(fullname):
+            if isinstance(data, Exception):
+                yield data  # pragma: no cover
+            else:
+                data = self.compress(data)
+                yield encrypt_stream(
+                    self._key, data, chunksize=None, algo=self._algo,
+                    iv=self._next_iv())
 
     def compress(self, data):
         """
@@ -220,20 +356,7 @@ class EncryptedBackup:
         @param      data        binary data
         @return                 binary data
         """
-        if self._compress == "zip":
-            return zlib.compress(data)
-        elif self._compress == "lzma":
-            # delay import
-            try:
-                import lzma
-            except ImportError:  # pragma: no cover
-                import pylzma as lzma
-            return lzma.compress(data)
-        elif self._compress is None:
-            return data
-        else:
-            raise ValueError(  # pragma: no cover
-                f"Unexpected compression algorithm '{self._compress}'.")
+        return compress_data(data, self._compress)
 
     def decompress(self, data):
         """
@@ -257,72 +380,252 @@ class EncryptedBackup:
             raise ValueError(  # pragma: no cover
                 f"Unexpected compression algorithm '{self._compress}'.")
 
-    def start_transfering(self):
+    def _file_remote_path(self, file):
+        "Returns the relative path and the remote folder of a file."
+        relp = os.path.relpath(file.fullname, self._root_local)
+        if ".." in relp:
+            raise ValueError(  # pragma: no cover
+                "The local root is not accurate:\n{0}\nFILE:\n{1}\nRELPATH:\n{2}".format(
+                    self, file.fullname, relp))
+
+        path = self._root_remote + "/" + os.path.split(relp)[0]
+        path = path.replace("\\", "/")
+
+        size = os.stat(file.fullname).st_size
+        self.fLOG("[upload % 8d bytes name=%s -- fullname=%s -- to=%s]" % (
+            size,
+            os.path.split(file.fullname)[-1],
+            file.fullname,
+            path))
+        return relp, path
+
+    def start_transfering(self, processes=None, threads=None, max_pending=16):
         """
         starts transfering files to the remote website
 
+        :param processes: number of processes compressing and encrypting
+            pieces, 0 or None to do it in the main thread
+        :param threads: number of threads uploading pieces,
+            0 or None to do it in the main thread
+        :param max_pending: maximum number of pieces read but not uploaded yet
+            when *processes* or *threads* is specified, it caps the memory
         :return: list of transferred @see cl FileInfo
         :raises FolderTransferFTPException: The class raises an
             exception (@see cl FolderTransferFTPException)
             if more than 5 issues happened.
+
+        If *processes* or *threads* is specified, files go through
+        a pipeline: the main thread reads the pieces, a pool of processes
+        compresses and encrypts them, a pool of threads uploads them.
+        The uploaded pieces, the mapping and the status file are the same
+        as the sequential processing.
+
+        The mapping and the status file are committed every *mapping_commit*
+        files. If the backup is interrupted, the next one only sends
+        the files which are not part of a committed segment.
         """
         self.load_mapping()
+        self.chunk_stats = dict(chunks=0, bytes=0, dedup_chunks=0, dedup_bytes=0)
+        total = list(self.iter_eligible_files())
+        try:
+            if processes or threads:
+                done, issues = self._start_transfering_pipeline(
+                    total, processes, threads, max_pending)
+            else:
+                done, issues = self._start_transfering_sequential(total)
+        except Exception as e:
+            # commits the files entirely transferred,
+            # it may fail if the remote location cannot be reached anymore
+            try:
+                self.commit_mapping()
+            except Exception as ee:  # pylint: disable=W0703
+                self.fLOG("[EncryptedBackup] unable to commit the mapping", ee)
+            raise e
+        self.transfer_mapping()
+        return done, issues
 
+    def _start_transfering_sequential(self, total):
+        "Transfers files one after another, piece after piece."
         issues = []
-        total = list(self.iter_eligible_files())
         sum_bytes = 0
         done = []
         for i, file in enumerate(total):
             if i % 20 == 0:
                 self.fLOG("#### transfering %d/%d (so far %d bytes)" %
                           (i, len(total), sum_bytes))
-            relp = os.path.relpath(file.fullname, self._root_local)
-            if ".." in relp:
-                raise ValueError(  # pragma: no cover
-                    "The local root is not accurate:\n{0}\nFILE:\n{1}\nRELPATH:\n{2}".format(
-                        self, file.fullname, relp))
-
-            path = self._root_remote + "/" + os.path.split(relp)[0]
-            path = path.replace("\\", "/")
-
-            size = os.stat(file.fullname).st_size
-            self.fLOG("[upload % 8d bytes name=%s -- fullname=%s -- to=%s]" % (
-                size,
-                os.path.split(file.fullname)[-1],
-                file.fullname,
-                path))
+            relp, path = self._file_remote_path(file)
 
             maps = TransferAPI_FileInfo(relp, [], datetime.datetime.now())
             r = True
-            for ii, data in enumerate(self.enumerate_read_encrypt(file.fullname)):
+            err = None
+            pieces = (self.enumerate_read(file.fullname) if self._chunking
+                      else self.enumerate_read_encrypt(file.fullname))
+            for ii, data in enumerate(pieces):
                 if data is None or isinstance(data, Exception):
                     # it means something went wrong
                     r = False
                     err = data
                     break
-                to = self._api.get_remote_path(data, relp, ii)
-                to = path + "/" + to
-                to = to.lstrip("/")
+                if self._chunking:
+                    to = self._chunk_path(data)
+                    maps.add_piece(to)
+                    if self._count_chunk(to, len(data)):
+                        continue
+                    data = encrypt_stream(
+                        self._key, self.compress(data), chunksize=None,
+                        algo=self._algo, iv=self._next_iv())
+                else:
+                    to = self._api.get_remote_path(data, relp, ii)
+                    to = path + "/" + to
+                    to = to.lstrip("/")
+                    maps.add_piece(to)
                 r &= self.transfer(to, data)
-                maps.add_piece(to)
                 sum_bytes += len(data)
                 if not r:
+                    self._known_chunks.discard(to)
                     break
 
-            if r:
-                self.update_status(file.fullname)
-                self.update_mapping(relp, maps)
-                done.append(relp)
-            else:
-                self.fLOG("   issue", err)
-                issues.append((relp, err))
+            self._end_file(file, relp, maps, r, err, done, issues)
+        return done, issues
 
-            if len(issues) >= 5:
-                raise EncryptedBackupError(  # pragma: no cover
-                    "Too many issues:\n{0}".format(
-                        "\n".join("{0} -- {1}".format(a, b) for a, b in issues)))
+    def _count_chunk(self, to, size):
+        """
+        Updates *chunk_stats*, returns True if the chunk is
+        already stored or being stored.
+        """
+        known = to in self._known_chunks
+        st = self.chunk_stats
+        key = "dedup_" if known else ""
+        st[key + "chunks"] = st.get(key + "chunks", 0) + 1
+        st[key + "bytes"] = st.get(key + "bytes", 0) + size
+        self._known_chunks.add(to)
+        return known
+
+    def _end_file(self, file, relp, maps, r, err, done, issues, failed=None):
+        "Updates the status and the mapping once every piece is uploaded."
+        if r and failed and any(p in failed for p in maps.pieces):
+            # a shared chunk could not be uploaded
+            r = False
+            err = "a chunk could not be uploaded"
+        if r:
+            self.update_status(file.fullname, save=False)
+            self.update_mapping(relp, maps)
+            done.append(relp)
+        else:
+            self.fLOG("   issue", err)
+            issues.append((relp, err))
 
-        self.transfer_mapping()
+        if len(issues) >= 5:
+            raise EncryptedBackupError(  # pragma: no cover
+                "Too many issues:\n{0}".format(
+                    "\n".join("{0} -- {1}".format(a, b) for a, b in issues)))
+
+    def _upload_piece(self, enc, relp, path, ii, to=None):
+        "Uploads one piece, *enc* is the encrypted data or a future."
+        if not isinstance(enc, bytes):
+            enc = enc.result()
+        if to is None:
+            to = self._api.get_remote_path(enc, relp, ii)
+            to = path + "/" + to
+            to = to.lstrip("/")
+        return to, self.transfer(to, enc), len(enc)
+
+    def _start_transfering_pipeline(self, total, processes, threads, max_pending):
+        """
+        Transfers files through a pipeline, the main thread reads,
+        a pool of processes compresses and encrypts, a pool of threads uploads.
+        The results are consumed in the same order as
+        @see me _start_transfering_sequential.
+        """
+        issues = []
+        done = []
+        # every element is a piece (state, index, future)
+        # or the end of a file (state, None, None),
+        # future is (None, path, 0) for a chunk already stored
+        pending = deque()
+        failed = set()
+        n_pieces = 0
+        sum_bytes = 0
+        max_pending = max(max_pending, 1)
+
+        def consume():
+            nonlocal n_pieces, sum_bytes
+            state, ii, fut = pending.popleft()
+            if ii is None:
+                self._end_file(state["file"], state["relp"], state["maps"],
+                               state["r"], state["err"], done, issues, failed)
+                return
+            n_pieces -= 1
+            if not state["r"]:
+                # a previous piece failed
+                return
+            if isinstance(fut, tuple) and fut[0] is None:
+                to, r, size = fut[1], True, 0
+            elif isinstance(fut, tuple):
+                to, r, size = self._upload_piece(*fut)
+            else:
+                to, r, size = fut.result()
+            state["maps"].add_piece(to)
+            state["r"] &= r
+            sum_bytes += size
+            if not r and self._chunking:
+                failed.add(to)
+                self._known_chunks.discard(to)
+
+        procs = ProcessPoolExecutor(processes) if processes else None
+        uploads = ThreadPoolExecutor(threads) if threads else None
+        try:
+            for i, file in enumerate(total):
+                if i % 20 == 0:
+                    self.fLOG("#### transfering %d/%d (so far %d bytes)" %
+                              (i, len(total), sum_bytes))
+                relp, path = self._file_remote_path(file)
+                state = dict(file=file, relp=relp, r=True, err=None,
+                             maps=TransferAPI_FileInfo(
+                                 relp, [], datetime.datetime.now()))
+                for ii, data in enumerate(self.enumerate_read(file.fullname)):
+                    if isinstance(data, Exception):
+                        state["r"] = False  # pragma: no cover
+                        state["err"] = data  # pragma: no cover
+                        break  # pragma: no cover
+                    to = None
+                    if self._chunking:
+                        to = self._chunk_path(data)
+                        if self._count_chunk(to, len(data)):
+                            pending.append((state, ii, (None, to)))
+                            n_pieces += 1
+                            continue
+                    iv = self._next_iv()
+                    if procs is None:
+                        enc = encrypt_stream(
+                            self._key, self.compress(data), chunksize=None,
+                            algo=self._algo, iv=iv)
+                    else:
+                        enc = procs.submit(
+                            _compress_encrypt, data, self._key, self._algo,
+                            self._compress, iv)
+                    if uploads is None:
+                        fut = (enc, relp, path, ii, to)
+                    else:
+                        fut = uploads.submit(
+                            self._upload_piece, enc, relp, path, ii, to)
+                    pending.append((state, ii, fut))
+                    n_pieces += 1
+                    while n_pieces >= max_pending:
+                        consume()
+                pending.append((state, None, None))
+                while pending and pending[0][1] is None:
+                    consume()
+            while pending:
+                consume()
+        finally:
+            for _, __, fut in pending:
+                if hasattr(fut, "cancel"):
+                    fut.cancel()
+            if uploads is not None:
+                uploads.shutdown()
+            if procs is not None:
+                procs.shutdown()
         return done, issues
 
     def transfer(self, to, data):
@@ -378,17 +681,14 @@ class EncryptedBackup:
                         f.write(data)
                 return filename
             else:
-                if len(info.pieces) == 1:
-                    return self._api.retrieve(info.pieces[0])
-                else:
-                    byt = StreamIO()
-                    for p in info.pieces:
-                        data = self._api.retrieve(p)
-                        data = decrypt_stream(
-                            self._key, data, chunksize=None, algo=self._algo)
-                        data = self.decompress(data)
-                        byt.write(data)
-                    return byt.getvalue()
+                byt = StreamIO()
+                for p in info.pieces:
+                    data = self._api.retrieve(p)
+                    data = decrypt_stream(
+                        self._key, data, chunksize=None, algo=self._algo)
+                    data = self.decompress(data)
+                    byt.write(data)
+                return byt.getvalue()
 
     def retrieve_all(self, dest, regex=None):
         """
@@ -95,7 +95,8 @@ def get_encryptor(key, algo="AES", chunksize=2 ** 24, **params):
     @param      key         key
     @param      algo        AES or fernet
     @param      chunksize   Fernet does not allow streaming
-    @param      params      additional parameters
+    @param      params      additional parameters, *iv* defines the initialization
+                            vector for AES, it is randomly generated if not specified
     @return                 encryptor, origsize
     """
     if algo == "fernet":
@@ -120,7 +121,9 @@ def get_encryptor(key, algo="AES", chunksize=2 ** 24, **params):
             raise EncryptionError(
                 f"len(key)=={len(key)} should be of length {str(ksize)}")
         if "out_stream" in params:
-            iv = bytes([random.randint(0, 0xFF) for i in range(16)])
+            iv = params.get("iv", None)
+            if iv is None:
+                iv = bytes([random.randint(0, 0xFF) for i in range(16)])
             params["out_stream"].write(struct.pack('<Q', params["in_size"]))
             params["out_stream"].write(iv)
             encryptor = AES.new(key, AES.MODE_CBC, iv)
@@ -136,7 +139,8 @@ def get_encryptor(key, algo="AES", chunksize=2 ** 24, **params):
     return encryptor, origsize, chunksize
 
 
-def encrypt_stream(key, filename, out_filename=None, chunksize=2 ** 18, algo="AES"):
+def encrypt_stream(key, filename, out_filename=None, chunksize=2 ** 18, algo="AES",
+                   iv=None):
     """
     Encrypts a file using AES (CBC mode) with the given key.
     The function relies on module :epkg:`pycrypto`, :epkg:`cryptography`,
@@ -157,6 +161,8 @@ def encrypt_stream(key, filename, out_filename=None, chunksize=2 ** 18, algo="AE
                                 chunksize must be divisible by 16.
 
     @param      algo            AES (PyCryptodomex) of or fernet (cryptography)
+    @param      iv              initialization vector (16 bytes) for AES,
+                                randomly generated if None
 
     @return                     filename or bytes
     """
@@ -165,7 +171,8 @@ def encrypt_stream(key, filename, out_filename=None, chunksize=2 ** 18, algo="AE
         filename, out_filename)
 
     encryptor, origsize, chunksize = get_encryptor(
-        key, algo, out_stream=out_stream, in_size=in_size, chunksize=chunksize)
+        key, algo, out_stream=out_stream, in_size=in_size, chunksize=chunksize,
+        iv=iv)
 
     while True:
         chunk = in_stream.read(chunksize)
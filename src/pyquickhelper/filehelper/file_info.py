@@ -3,6 +3,7 @@
 @file
 @brief      Defines class @see cl FileInfo
 """
+import os
 import datetime
 import hashlib
 import re
@@ -24,6 +25,86 @@ def convert_st_date_to_datetime(t):
     return datetime.datetime.fromtimestamp(t)
 
 
+def get_hash_algorithm(algo="md5"):
+    """
+    Returns a function creating a hash object
+    (see :epkg:`*py:hashlib`).
+
+    @param      algo        ``'md5'``, ``'sha1'``, ``'sha256'``, ``'blake2b'``
+                            or ``'xxh64'``, ``'xxh128'`` (requires :epkg:`xxhash`)
+    @return                 function
+    """
+    if algo.startswith("xxh"):
+        try:
+            import xxhash
+        except ImportError as e:  # pragma: no cover
+            raise ImportError(
+                f"Module xxhash is needed for algorithm {algo!r}.") from e
+        if not hasattr(xxhash, algo):
+            raise ValueError(  # pragma: no cover
+                f"Unknown algorithm {algo!r}.")
+        return getattr(xxhash, algo)
+    if algo not in hashlib.algorithms_available:
+        raise ValueError(f"Unknown algorithm {algo!r}.")
+    return lambda: hashlib.new(algo)
+
+
+def split_checksum(value):
+    """
+    Splits a checksum produced by @see fn checksum_file
+    with ``prefix=True`` into the algorithm and the hexadecimal digest.
+    A value without a prefix is assumed to be a :epkg:`MD5` checksum.
+
+    @param      value       string ``<algo>:<digest>``
+    @return                 algorithm, digest
+    """
+    if ":" in value:
+        algo, digest = value.split(":", 1)
+        return algo, digest
+    return "md5", value
+
+
+def checksum_file(filename, algo="md5", partial=None, prefix=False,
+                  buffer_size=2 ** 20):
+    """
+    Computes the hash of a file. The file is read block by block
+    in a reused buffer, the memory does not grow with the file size.
+
+    @param      filename        filename
+    @param      algo            algorithm, see @see fn get_hash_algorithm
+    @param      partial         if not None, the hash only includes the size,
+                                the first and the last *partial* bytes,
+                                it is meant to quickly discard different files
+    @param      prefix          if True, the result starts with the algorithm,
+                                ``'md5:9e107d9d372bb6826bd81d3542a419d6'``,
+                                a prefix ``'p'`` is added if partial is True
+    @param      buffer_size     size of the buffer
+    @return                     hexadecimal digest
+    """
+    h = get_hash_algorithm(algo)()
+    with open(filename, "rb", buffering=0) as fd:
+        if partial is not None:
+            size = os.fstat(fd.fileno()).st_size
+            h.update(size.to_bytes(8, "little"))
+            if size <= 2 * partial:
+                h.update(fd.read())
+            else:
+                h.update(fd.read(partial))
+                fd.seek(-partial, os.SEEK_END)
+                h.update(fd.read(partial))
+        else:
+            buffer = bytearray(buffer_size)
+            view = memoryview(buffer)
+            n = fd.readinto(buffer)
+            while n:
+                h.update(view[:n])
+                n = fd.readinto(buffer)
+    digest = h.hexdigest()
+    if prefix:
+        return f"{'p' if partial is not None else ''}{algo}:{digest}"
+    return digest
+
+
 def checksum_md5(filename):
     """
     Computes MD5 for a file.
@@ -31,16 +112,7 @@ def checksum_md5(filename):
     @param      filename        filename
     @return                     string
     """
-    fname = filename
-    block_size = 0x10000
-    zero = hashlib.md5()
-    with open(fname, "rb") as fd:
-        block = [fd.read(block_size)]
-        while len(block[-1]) > 0:
-            block.append(fd.read(block_size))
-        for el in block:
-            zero.update(el)
-        return zero.hexdigest()
+    return checksum_file(filename, "md5")
 
 
 _allowed = re.compile("^([a-zA-Z]:)?[^:*?\"<>|]+$")
@@ -8,11 +8,12 @@ import re
 import datetime
 import time
 import shutil
-import hashlib
 import warnings
 from ..loghelper.pqh_exception import PQHException
 from ..loghelper.flog import noLOG
 from ..loghelper.pyrepo_helper import SourceRepository
+from .scan_index import ScanEntry
+from .file_info import checksum_file
 
 
 class FileTreeNode:
@@ -75,7 +76,8 @@ class FileTreeNode:
         return ".*[.]" + "|".join([f"({e}$)" for e in ext])
 
     def __init__(self, root, file=None, filter=None, level=0, parent=None,
-                 repository=False, log=False, log1=False, fLOG=noLOG):
+                 repository=False, log=False, log1=False, fLOG=noLOG,
+                 index=None, executor=None, _entry=None, _defer=False):
         """
         Defines a file, relative to a root.
         @param      root            root (it must exist)
@@ -90,6 +92,17 @@ class FileTreeNode:
         @param      log             log every explored folder
         @param      log1            intermediate logs (first level)
         @param      fLOG            logging function to use
+        @param      index           @see cl ScanIndex, the content of a folder
+                                    is retrieved from the index if the folder did not change,
+                                    the hash of the files are stored in it as well
+        @param      executor        :epkg:`*py:concurrent:futures:Executor`, if not None,
+                                    the folders of the same level are listed in parallel
+                                    (a thread pool is recommended, the work is I/O bound)
+        @param      _entry          private, status of the file if already known
+        @param      _defer          private, the folder is filled later by the caller
+
+        Attribute *timings* stores the time spent in every phase
+        of the exploration (see @see me difference as well).
         """
         if root is None:
             raise ValueError(  # pragma: no cover
@@ -106,20 +119,32 @@ class FileTreeNode:
         self._log1 = log1
         self.module = None
         self.fLOG = fLOG
-
-        if not os.path.exists(root):
-            raise PQHException(f"path '{root}' does not exist")
-        if not os.path.isdir(root):
-            raise PQHException(  # pragma: no cover
-                f"path '{root}' is not a folder")
-
-        if self._file is not None:
-            if not self.exists():
+        self._index = index
+        self.timings = {}
+
+        if _entry is not None:
+            # the parent already knows everything about this file
+            self._type = "folder" if _entry.isdir else "file"
+            self._size = _entry.size
+            self._mtime_ns = _entry.mtime_ns
+            self._inode = _entry.inode
+            self._date = FileTreeNode._mtime_to_datetime(_entry.mtime_ns)
+        else:
+            if not os.path.exists(root):
+                raise PQHException(f"path '{root}' does not exist")
+            if not os.path.isdir(root):
                 raise PQHException(  # pragma: no cover
-                    f"{self.get_fullname()} does not exist [{root},{file}]")
+                    f"path '{root}' is not a folder")
 
-        self._fillstat()
-        if self.isdir():
+            if self._file is not None:
+                if not self.exists():
+                    raise PQHException(  # pragma: no cover
+                        f"{self.get_fullname()} does not exist [{root},{file}]")
+
+            self._fillstat()
+        if _defer:
+            return
+        if _entry.isdir if _entry is not None else self.isdir():
             if isinstance(filter, str):
                 # it assumes it is a regular expression instead of a function
                 exp = re.compile(filter)
@@ -128,9 +153,11 @@ class FileTreeNode:
                     "local function"
                     return dir or (e.search(f) is not None)
 
-                self._fill(fil, repository=repository)
-            else:
-                self._fill(filter, repository=repository)
+                filter = fil
+
+            begin = time.perf_counter()
+            self._fill(filter, repository=repository, executor=executor)
+            self.timings["fill"] = time.perf_counter() - begin
 
     @property
     def name(self):
@@ -177,21 +204,24 @@ class FileTreeNode:
     def hash_md5_readfile(self):
         """
         Computes a hash of a file.
+        The hash is retrieved from the index if the node
+        was built with one (see @see cl ScanIndex) and the file
+        did not change.
 
         @return     string
         """
-        filename = self.get_fullname()
-        f = open(filename, 'rb')
-        m = hashlib.md5()
-        readBytes = 1024 ** 2  # read 1024 bytes per time
-        totalBytes = 0
-        while readBytes:
-            readString = f.read(readBytes)
-            m.update(readString)
-            readBytes = len(readString)
-            totalBytes += readBytes
-        f.close()
-        return m.hexdigest()
+        if self._index is not None:
+            h = self._index.get_hash(self.get_fullname(), self._size,
+                                     self._mtime_ns, self._inode)
+            if h is None:
+                h = self._hash_md5_readfile()
+                self._index.set_hash(self.get_fullname(), h, self._size,
+                                     self._mtime_ns, self._inode)
+            return h
+        return self._hash_md5_readfile()
+
+    def _hash_md5_readfile(self, partial=None):
+        return checksum_file(self.get_fullname(), "md5", partial=partial)
 
     def get_content(self, encoding="utf8"):
         """
@@ -232,8 +262,16 @@ class FileTreeNode:
 
         stat = os.stat(self.get_fullname())
         self._size = stat.st_size
-        temp = datetime.datetime.utcfromtimestamp(stat.st_mtime)
-        self._date = temp
+        self._mtime_ns = stat.st_mtime_ns
+        self._inode = stat.st_ino
+        self._date = FileTreeNode._mtime_to_datetime(stat.st_mtime_ns)
+
+    @staticmethod
+    def _mtime_to_datetime(mtime_ns):
+        """
+        Converts a modification time in nanoseconds into a datetime.
+        """
+        return datetime.datetime.utcfromtimestamp(mtime_ns / 1e9)
 
     def isdir(self):
         """
@@ -273,16 +311,24 @@ class FileTreeNode:
             self._repo_ = SourceRepository(True)
         return self._repo_.ls(path)
 
-    def _fill(self, filter, repository):
+    def _fill(self, filter, repository, executor=None):
         """look for subfolders
         @param      filter      boolean function
         @param      repository  use svn or git
+        @param      executor    executor, lists the folders in parallel
         """
         if not self.isdir():
             raise PQHException(  # pragma: no cover
                 "Unable to look into a file %r full %r." % (
                     self._file, self.get_fullname()))
 
+        if self._index is not None and not repository:
+            self._fill_index(filter)
+            return
+        if executor is not None and not repository:
+            self._fill_executor(filter, executor)
+            return
+
         if repository:
             opt = "repo_ls"
             full = self.get_fullname()
@@ -311,7 +357,8 @@ class FileTreeNode:
                 try:
                     n = FileTreeNode(self._root, os.path.join(fi, a), filter, level=self._level + 1,
                                      parent=self, repository=repository, log=self._log,
-                                     log1=self._log1 or self._log, fLOG=self.fLOG)
+                                     log1=self._log1 or self._log, fLOG=self.fLOG,
+                                     index=self._index)
                 except PQHException as e:  # pragma: no cover
                     if "does not exist" in str(e):
                         self.fLOG(
@@ -322,6 +369,92 @@ class FileTreeNode:
                     continue
                 self._children.append(n)
 
+    @staticmethod
+    def _scandir(full):
+        """
+        Lists a folder and retrieves the status of every file,
+        returns a sorted list of @see cl ScanEntry and the time spent.
+        """
+        begin = time.perf_counter()
+        entries = []
+        with os.scandir(full) as it:
+            for d in it:
+                try:
+                    isdir = d.is_dir()
+                    st = d.stat()
+                except FileNotFoundError:  # pragma: no cover
+                    continue
+                entries.append(ScanEntry(d.name, isdir, st.st_size,
+                                         st.st_mtime_ns, st.st_ino))
+        entries.sort()
+        return entries, time.perf_counter() - begin
+
+    def _fill_executor(self, filter, executor):
+        """
+        Same as @see me _fill but all the folders of the same level
+        are listed in parallel with *executor*.
+        """
+        levels = []
+        level = [self]
+        self._children = []
+        n_dirs, scan_time = 0, 0.
+        while level:
+            levels.append(level)
+            futures = [executor.submit(FileTreeNode._scandir, n.get_fullname())
+                       for n in level]
+            next_level = []
+            for node, fut in zip(level, futures):
+                entries, dt = fut.result()
+                n_dirs += 1
+                scan_time += dt
+                fi = "" if node._file is None else node._file
+                for e in entries:
+                    if self._log and e.isdir:
+                        self.fLOG("[FileTreeNode], entering", e.name)
+                    elif self._log1 and node._level <= 0:
+                        self.fLOG("[FileTreeNode], entering", e.name)
+                    if filter is not None and not filter(
+                            self._root, fi, e.name, e.isdir):
+                        continue
+                    n = FileTreeNode(self._root, os.path.join(fi, e.name), filter,
+                                     level=node._level + 1, parent=node,
+                                     log=self._log, log1=self._log1 or self._log,
+                                     fLOG=self.fLOG, _entry=e, _defer=True)
+                    node._children.append(n)
+                    if e.isdir:
+                        next_level.append(n)
+            level = next_level
+
+        # empty folders are removed, starting from the deepest ones
+        for level in reversed(levels):
+            for node in level:
+                node._children = [c for c in node._children
+                                  if c._type != "folder" or c._children]
+        self.timings["fill.n_dirs"] = n_dirs
+        self.timings["fill.scandir"] = scan_time
+
+    def _fill_index(self, filter):
+        """
+        Same as @see me _fill but the content of the folder
+        comes from the index.
+        """
+        full = self.get_fullname()
+        fi = "" if self._file is None else self._file
+        self._children = []
+        for e in self._index.listdir(full):
+            if self._log and e.isdir:
+                self.fLOG("[FileTreeNode], entering", e.name)
+            elif self._log1 and self._level <= 0:
+                self.fLOG("[FileTreeNode], entering", e.name)
+            if filter is None or filter(self._root, fi, e.name, e.isdir):
+                n = FileTreeNode(self._root, os.path.join(fi, e.name), filter,
+                                 level=self._level + 1, parent=self,
+                                 log=self._log, log1=self._log1 or self._log,
+                                 fLOG=self.fLOG, index=self._index, _entry=e)
+                if n._type == "folder" and len(n._children) == 0:
+                    continue
+                self._children.append(n)
+
     def get(self):
         """
         return a dictionary with some values which describe the file
@@ -392,44 +525,85 @@ class FileTreeNode:
                     res[node._file] = node
         return res
 
+    def _quick_sign(self, node, hash_size):
+        """
+        Returns ``==``, ``<`` or ``>`` if the answer does not
+        require to hash the files, None otherwise.
+        """
+        if self._date == node._date:
+            return "=="
+        s = "<" if self._date < node._date else ">"
+        if (self._type == "folder" or self._size != node._size or
+                node._size > hash_size):
+            return s
+        return None
+
     def sign(self, node, hash_size):
         """
         Returns ``==``, ``<`` or ``>`` according the dates
         if the size is not too big, if the sign is ``<`` or ``>``,
         applies the hash method.
         """
-        if self._date == node._date:
-            return "=="
-        elif self._date < node._date:
-            if self.isdir(
-            ) or self._size != node._size or node._size > hash_size:
-                return "<"
-            else:
-                h1 = self.hash_md5_readfile()
-                h2 = node.hash_md5_readfile()
-                if h1 != h2:
-                    return "<"
-                else:
-                    return "=="
-        else:
-            if self.isdir(
-            ) or self._size != node._size or node._size > hash_size:
-                return ">"
+        s = self._quick_sign(node, hash_size)
+        if s is not None:
+            return s
+        h1 = self.hash_md5_readfile()
+        h2 = node.hash_md5_readfile()
+        if h1 != h2:
+            return "<" if self._date < node._date else ">"
+        return "=="
+
+    def _hash_nodes(self, nodes, executor=None, partial=None):
+        """
+        Computes the hash of many nodes, concurrently if *executor*
+        is not None. Hashes already known by the index are not computed.
+
+        @param      nodes       list of nodes
+        @param      executor    executor or None
+        @param      partial     computes a partial hash
+                                (see @see fn checksum_file),
+                                it is not stored in the index
+        @return                 dictionary ``{ id(node): hash }``
+        """
+        res = {}
+        todo = []
+        for n in nodes:
+            h = None
+            if n._index is not None and partial is None:
+                h = n._index.get_hash(n.get_fullname(), n._size,
+                                      n._mtime_ns, n._inode)
+            if h is None:
+                todo.append(n)
             else:
-                h1 = self.hash_md5_readfile()
-                h2 = node.hash_md5_readfile()
-                if h1 != h2:
-                    return ">"
-                else:
-                    return "=="
+                res[id(n)] = h
+
+        def fct(n):
+            return n._hash_md5_readfile(partial=partial)
+
+        hashes = (map(fct, todo) if executor is None
+                  else executor.map(fct, todo))
+        for n, h in zip(todo, hashes):
+            res[id(n)] = h
+            if n._index is not None and partial is None:
+                # the index is updated from this thread only
+                n._index.set_hash(n.get_fullname(), h, n._size,
+                                  n._mtime_ns, n._inode)
+        return res
 
-    def difference(self, node, hash_size=1024 ** 2 * 2, lower=False):
+    def difference(self, node, hash_size=1024 ** 2 * 2, lower=False,
+                   executor=None, partial_hash=None):
         """
         Returns the differences with another folder.
 
         @param      node        other node
         @param      hash_size   above this size, it does not compute the hash key
         @param      lower       if True, every filename is converted into lower case
+        @param      executor    :epkg:`*py:concurrent:futures:Executor`,
+                                if not None, files are hashed concurrently
+        @param      partial_hash if not None, files are first compared with
+                                a hash of their size and their first and last
+                                *partial_hash* bytes, only the files with the same
+                                partial hash are entirely hashed
         @return                 list of [ (``?``, self._file, node (in self), node (in node)) ], see below for the choice of ``?``
 
         The question mark ``?`` means:
@@ -439,35 +613,65 @@ class FileTreeNode:
             - ``>+`` absent in node
             - ``<+`` absent in self
 
+        The time spent in every phase is stored in
+        ``self.timings`` (keys starting with ``difference.``).
         """
-        ti = time.perf_counter()
+        timings = {}
+        begin = time.perf_counter()
         d1 = self.get_dict(lower=lower)
         d2 = node.get_dict(lower=lower)
+        timings["difference.dict"] = time.perf_counter() - begin
+
+        begin = time.perf_counter()
         res = []
-        nb = 0
+        candidates = []
         for k, v in d1.items():
-            ti2 = time.perf_counter()
-            if ti2 - ti > 10:
-                self.fLOG("FileTreeNode.difference: processed files", nb)
-                ti = ti2
             if k not in d2:
                 res.append((k, ">+", v, None))
             else:
-                res.append((k, v.sign(d2[k], hash_size), v, d2[k]))
-            nb += 1
+                s = v._quick_sign(d2[k], hash_size)
+                if s is None:
+                    candidates.append((k, v, d2[k]))
+                else:
+                    res.append((k, s, v, d2[k]))
 
         for k, v in d2.items():
-            ti2 = time.perf_counter()
-            if ti2 - ti > 10:
-                self.fLOG("FileTreeNode.difference: processed files", nb)
-                ti = ti2
             if k not in d1:
                 res.append((k, "<+", None, v))
-            nb += 1
+        timings["difference.compare"] = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        if partial_hash is not None and candidates:
+            hashes = self._hash_nodes(
+                [n for _, v1, v2 in candidates for n in (v1, v2)], executor,
+                partial=partial_hash)
+            same = []
+            for k, v1, v2 in candidates:
+                if hashes[id(v1)] != hashes[id(v2)]:
+                    res.append(
+                        (k, "<" if v1._date < v2._date else ">", v1, v2))
+                else:
+                    same.append((k, v1, v2))
+            timings["difference.n_partial"] = len(candidates)
+            candidates = same
+        hashes = self._hash_nodes(
+            [n for _, v1, v2 in candidates for n in (v1, v2)], executor)
+        for k, v1, v2 in candidates:
+            if hashes[id(v1)] != hashes[id(v2)]:
+                res.append((k, "<" if v1._date < v2._date else ">", v1, v2))
+            else:
+                res.append((k, "==", v1, v2))
+        timings["difference.hash"] = time.perf_counter() - begin
+        timings["difference.n_hashed"] = len(candidates)
 
+        begin = time.perf_counter()
         res.sort()
         zoo = [(v[1], v[0]) + v[2:] for v in res]
+        timings["difference.sort"] = time.perf_counter() - begin
 
+        self.timings.update(timings)
+        self.fLOG("[FileTreeNode.difference] {0} files, {1}".format(
+            len(zoo), ", ".join(f"{k[11:]}={v:g}" for k, v in timings.items())))
         return zoo
 
     def remove(self):
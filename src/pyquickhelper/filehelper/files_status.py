@@ -6,7 +6,9 @@
 import os
 import datetime
 from ..loghelper.flog import noLOG
-from .file_info import convert_st_date_to_datetime, checksum_md5, FileInfo
+from .file_info import (  # pylint: disable=W0611
+    convert_st_date_to_datetime, checksum_file, split_checksum, FileInfo,
+    checksum_md5)
 
 
 class FilesStatus:
@@ -14,15 +16,24 @@ class FilesStatus:
     This class maintains a list of files
     and does some verifications in order to check if a file
     was modified or not (if yes, then it will be updated to the website).
+
+    Checksums are stored with their algorithm, ``blake2b:<digest>``,
+    a checksum without any prefix was computed with :epkg:`MD5`.
+    A file is always checked with the algorithm used to compute
+    its stored checksum.
     """
 
-    def __init__(self, file, fLOG=noLOG):
+    def __init__(self, file, fLOG=noLOG, algo="md5"):
         """
         file which will contains the status
         @param      file            file, if None, fill _children
         @param      fLOG            logging function
+        @param      algo            algorithm used to compute the checksum
+                                    of new or updated files,
+                                    see @see fn get_hash_algorithm
         """
         self._file = file
+        self.algo = algo
         self.copyFiles = {}
         self.fileKeep = file
         self.LOG = fLOG
@@ -136,8 +147,9 @@ class FilesStatus:
                 if d != ld:
                     # dates are different but files might be the same
                     if obj.checksum is not None:
-                        ch = checksum_md5(file)
-                        if ch != obj.checksum:
+                        algo, digest = split_checksum(obj.checksum)
+                        ch = checksum_file(file, algo)
+                        if ch != digest:
                             reason = "date/md5 %s != old date %s  md5 %s != %s" % (
                                 typstr(ld), typstr(d), obj.checksum, ch)
                             res = True
@@ -239,7 +251,7 @@ class FilesStatus:
         size = st.st_size
         mdate = convert_st_date_to_datetime(st.st_mtime)
         date = datetime.datetime.now()
-        md = checksum_md5(file)
+        md = checksum_file(file, self.algo, prefix=self.algo != "md5")
         obj = FileInfo(file, size, date, mdate, md)
         self.copyFiles[file] = obj
         return obj
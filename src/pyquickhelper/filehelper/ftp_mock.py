@@ -19,6 +19,12 @@ class MockTransferFTP(TransferFTP):
         TransferFTP.__init__(self, None, "login", "password", ftps=ftps)
         self._store = {}
 
+    def clone(self):
+        """
+        Returns a new mock.
+        """
+        return MockTransferFTP(ftps=self._ftps_, fLOG=self.LOG)
+
     def run_command(self, command, *args, **kwargs):
         """
         Mock method :meth:`run_command <pyquickhelper.filehelper.ftp_transfer.TransferFTP.run_commnad>`
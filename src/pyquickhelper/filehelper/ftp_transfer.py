@@ -61,12 +61,20 @@ class TransferFTP:
 
     The class may access to a server using :epkg:`SFTP`
     protocol but it relies on :epkg:`pysftp` and :epkg:`paramiko`.
+
+    The class remembers the remote folders it reached
+    (attribute *dir_cache*). A file sent to one of them is stored
+    with a single command instead of changing the current directory
+    for every part of the path. The cache can be shared between
+    sessions connected to the same website.
     """
 
     errorNoDirectory = "Can't change directory"
+    errorNoDirectoryCodes = ("550 ", )
     blockSize = 2 ** 20
 
-    def __init__(self, site, login, password, ftps='FTP', fLOG=noLOG):
+    def __init__(self, site, login, password, ftps='FTP', fLOG=noLOG,
+                 port=None):
         """
         @param      site        website
         @param      login       login
@@ -75,8 +83,10 @@ class TransferFTP:
                                 if ``'FTP'``, use :epkg:`*py:ftplib:TLS`,
                                 if ``'SFTP'``, use :epkg:`pysftp`
         @param      fLOG        logging function
+        @param      port        port, None for the default one
         """
         self._ftps_ = ftps
+        self.dir_cache = set()
         if site is not None:
             if ftps == 'TLS':
                 cls = FTP_TLS
@@ -87,7 +97,7 @@ class TransferFTP:
                 import socket
                 sock = socket.socket()
                 try:
-                    sock.connect((site, 22))
+                    sock.connect((site, port or 22))
                 except socket.gaierror as e:
                     sock.close()
                     raise e
@@ -101,7 +111,8 @@ class TransferFTP:
                 cnopts.hostkeys = hk
 
                 def cls(si, lo, pw, cnopts=cnopts): return pysftp.Connection(
-                    si, username=lo, password=pw, cnopts=cnopts)
+                    si, username=lo, password=pw, cnopts=cnopts,
+                    port=port or 22)
                 self._login_ = lambda si=site, lo=login, pw=password: cls(
                     si, lo, pw)
                 self.is_sftp = True
@@ -113,7 +124,12 @@ class TransferFTP:
                 raise RuntimeError(  # pragma: no cover
                     f"No implementation for '{ftps}'.")
             if not self.is_sftp:
-                self._ftp = cls(site, login, password)
+                if port is None:
+                    self._ftp = cls(site, login, password)
+                else:
+                    self._ftp = cls()
+                    self._ftp.connect(site, port)
+                    self._ftp.login(login, password)
             self._logins = [(datetime.datetime.now(), site)]
         else:
             # mocking
@@ -124,7 +140,27 @@ class TransferFTP:
             self._ftp = FTP(site)
             self.is_sftp = False
         self.LOG = fLOG
-        self._atts = dict(site=site, login=login, password=password)
+        self._atts = dict(site=site, login=login, password=password,
+                          port=port)
+
+    def clone(self):
+        """
+        Opens a new session to the same website
+        with the same credentials.
+
+        @return         @see cl TransferFTP
+        """
+        return self.__class__(
+            self._atts["site"], self._atts["login"], self._atts["password"],
+            ftps=self._ftps_, fLOG=self.LOG, port=self._atts.get("port", None))
+
+    @staticmethod
+    def _is_no_directory(e):
+        "Tells if an exception means a remote folder does not exist."
+        se = str(e)
+        return (TransferFTP.errorNoDirectory in se or
+                (isinstance(e, error_perm) and
+                 se.startswith(TransferFTP.errorNoDirectoryCodes)))
 
     def _check_can_logged(self):
         if self.is_sftp and not hasattr(self, '_ftp'):
@@ -146,7 +182,7 @@ class TransferFTP:
             if self.is_sftp:
                 self._ftp = self._login_()
             else:
-                self._ftp.login()
+                self._ftp.login(self._atts["login"], self._atts["password"])
             self._logins.append((datetime.datetime.now(), self.Site))
         except Exception as e:
             se = str(e)
@@ -185,7 +221,7 @@ class TransferFTP:
             if self.is_sftp and 'No such file' in str(e):
                 raise FileNotFoundError(
                     f"Unable to find {args}.") from e
-            if TransferFTP.errorNoDirectory in str(e):
+            if TransferFTP._is_no_directory(e):
                 raise e
             self.LOG(e)
             self.LOG("    ** run exc ", str(command), str(args))
@@ -238,17 +274,24 @@ class TransferFTP:
             raise EOFError(f"unable to go to: {path}") from e
         except FileNotFoundError as e:  # pragma: no cover
             if create:
-                self.mkd(path)
-                self.cwd(path, create)
+                self._mkd_cwd(path)
             else:
                 raise e
         except Exception as e:  # pragma: no cover
-            if create and TransferFTP.errorNoDirectory in str(e):
-                self.mkd(path)
-                self.cwd(path, create)
+            if create and TransferFTP._is_no_directory(e):
+                self._mkd_cwd(path)
             else:
                 raise e
 
+    def _mkd_cwd(self, path):
+        "Creates a directory and goes there."
+        try:
+            self.mkd(path)
+        except (error_perm, OSError) as e:
+            # another session may have created it
+            self.LOG("[mkd] unable to create", path, e)
+        self.cwd(path, False)
+
     def pwd(self):
         """
         Returns the pathname of the current directory on the server.
@@ -342,6 +385,22 @@ class TransferFTP:
         self._check_can_logged()
         path = to.split("/")
         path = [_ for _ in path if len(_) > 0]
+        bs = blocksize if blocksize else TransferFTP.blockSize
+        key = "/".join(path)
+
+        if key and key in self.dir_cache:
+            # the folder exists, no need to go there
+            remote = ("/" if self.is_sftp else "") + key + "/" + name
+            if hasattr(file, "tell"):
+                pos = file.tell()
+            try:
+                return self._store_file(file, remote, bs, callback)
+            except (error_perm, FileNotFoundError):  # pragma: no cover
+                # the folder may have been removed
+                self.dir_cache.discard(key)
+                if hasattr(file, "seek"):
+                    file.seek(pos)
+
         nb_logins = len(self._logins)
         cpwd = self.pwd()
 
@@ -360,30 +419,11 @@ class TransferFTP:
             raise CannotCompleteWithoutNewLoginException(  # pragma: no cover
                 f"Cannot reach folder '{to}' without new login")
 
-        bs = blocksize if blocksize else TransferFTP.blockSize
-        if not self.is_sftp:
-            def runc(name, f, bs, callback):
-                return self.run_command(
-                    self._ftp.storbinary, 'STOR ' + name, f, bs, callback)
-        else:
-            def runc(name, f, bs, callback):
-                return self.run_command(
-                    self._ftp.putfo, remotepath=name, flo=f, file_size=bs,
-                    callback=None)
         if exc is None:
+            if key:
+                self.dir_cache.add(key)
             try:
-                if isinstance(file, str):
-                    if not os.path.exists(file):
-                        raise FileNotFoundError(file)  # pragma: no cover
-                    with open(file, "rb") as f:
-                        r = runc(name, f, bs, callback)
-                elif isinstance(file, BytesIO):
-                    r = runc(name, file, bs, callback)
-                elif isinstance(file, bytes):
-                    st = BytesIO(file)
-                    r = runc(name, st, bs, callback)
-                else:
-                    r = runc(name, file, bs, callback)
+                r = self._store_file(file, name, bs, callback)
             except Exception as ee:  # pragma: no cover
                 exc = ee
 
@@ -424,6 +464,26 @@ class TransferFTP:
             raise exc  # pragma: no cover
         return r
 
+    def _store_file(self, file, name, bs, callback):
+        "Stores a file in the current directory or *name* if it is a path."
+        if not self.is_sftp:
+            def runc(name, f, bs, callback):
+                return self.run_command(
+                    self._ftp.storbinary, 'STOR ' + name, f, bs, callback)
+        else:
+            def runc(name, f, bs, callback):
+                return self.run_command(
+                    self._ftp.putfo, remotepath=name, flo=f, file_size=bs,
+                    callback=None)
+        if isinstance(file, str):
+            if not os.path.exists(file):
+                raise FileNotFoundError(file)  # pragma: no cover
+            with open(file, "rb") as f:
+                return runc(name, f, bs, callback)
+        if isinstance(file, bytes):
+            return runc(name, BytesIO(file), bs, callback)
+        return runc(name, file, bs, callback)
+
     def retrieve(self, fold, name, file=None, debug=False):
         """
         Downloads a file.
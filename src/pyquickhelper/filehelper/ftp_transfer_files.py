@@ -8,6 +8,8 @@ import os
 import warnings
 import sys
 import ftplib
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from io import BytesIO
 from time import sleep
 from random import random
@@ -16,6 +18,10 @@ from ..loghelper.flog import noLOG
 from .ftp_transfer import CannotCompleteWithoutNewLoginException
 
 
+_retry_exceptions = (TimeoutError, EOFError, ConnectionError, ftplib.error_temp,
+                     CannotCompleteWithoutNewLoginException)
+
+
 class FolderTransferFTPException(Exception):
 
     """
@@ -106,6 +112,11 @@ class FolderTransferFTP:
             fftp.start_transfering()
 
         ftp.close()
+
+    Many small files are faster transferred with several sessions,
+    ``fftp.start_transfering(n_sessions=4, retries=3)`` opens three more
+    sessions with the same credentials, a failing file is sent again
+    up to three times.
     """
 
     def __init__(self, file_tree_node, ftp_transfer, file_status, root_local=None,
@@ -188,15 +199,17 @@ class FolderTransferFTP:
                 if n:
                     yield f
 
-    def update_status(self, file):
+    def update_status(self, file, save=True):
         """
         Updates the status of a file.
 
         @param      file        filename
+        @param      save        saves the status file
         @return                 @see cl FileInfo
         """
         r = self._ft.update_copied_file(file)
-        self._ft.save_dates()
+        if save:
+            self._ft.save_dates()
         return r
 
     def preprocess_before_transfering(self, path, force_binary=False, force_allow=None):
@@ -286,143 +299,227 @@ class FolderTransferFTP:
         else:
             stream.close()
 
-    def start_transfering(self, max_errors=20, delay=None):
+    def _remote_path(self, file):
+        "Returns the remote folder of a file."
+        relp = os.path.relpath(file.fullname, self._root_local)
+        if ".." in relp:
+            raise ValueError(  # pragma: no cover
+                "The local root is not accurate:\n{0}\nFILE:\n{1}"
+                "\nRELPATH:\n{2}".format(self, file.fullname, relp))
+        path = self._root_web + "/" + os.path.split(relp)[0]
+        return path.replace("\\", "/")
+
+    def _transfer_one(self, ftp, file, retries=0, backoff=1., delay=None):
         """
-        Starts transfering files to a remote :epkg:`FTP` website.
-
-        :param max_errors: stops after this number of errors
-        :param delay: delay between two files
-        :return: list of transferred @see cl FileInfo
-        :raises FolderTransferFTPException: the class raises
-            an exception (@see cl FolderTransferFTPException)
-            more than *max_errors* issues happened
+        Transfers one file with one session.
+
+        @param      ftp         @see cl TransferFTP
+        @param      file        @see cl FileTreeNode
+        @param      retries     number of retries after a network error
+        @param      backoff     delay before the first retry, it doubles every time
+        @param      delay       delay after the transfer
+        @return                 *(transferred, size, issue)*, issue is None
+                                or a tuple *(filename, reason, exception)*
         """
-        issues = []
-        done = []
-        total = list(self.iter_eligible_files())
-        sum_bytes = 0
-        for i, file in enumerate(total):
-            if i % 20 == 0:
-                self.fLOG("#### transfering %d/%d (so far %d bytes)" %
-                          (i, len(total), sum_bytes))
-            relp = os.path.relpath(file.fullname, self._root_local)
-            if ".." in relp:
-                raise ValueError(  # pragma: no cover
-                    "The local root is not accurate:\n{0}\nFILE:\n{1}"
-                    "\nRELPATH:\n{2}".format(self, file.fullname, relp))
-            path = self._root_web + "/" + os.path.split(relp)[0]
-            path = path.replace("\\", "/")
-
-            size = os.stat(file.fullname).st_size
-            self.fLOG("[upload % 8d bytes name=%s -- fullname=%s -- to=%s]" % (
-                size, os.path.split(file.fullname)[-1], file.fullname, path))
-
-            if self._exc:
+        path = self._remote_path(file)
+        size = os.stat(file.fullname).st_size
+        self.fLOG("[upload % 8d bytes name=%s -- fullname=%s -- to=%s]" % (
+            size, os.path.split(file.fullname)[-1], file.fullname, path))
+
+        if self._exc:
+            data, size = self.preprocess_before_transfering(
+                file.fullname, force_allow=self._force_allow)
+        else:
+            try:
                 data, size = self.preprocess_before_transfering(
                     file.fullname, force_allow=self._force_allow)
-            else:
-                try:
-                    data, size = self.preprocess_before_transfering(
-                        file.fullname, force_allow=self._force_allow)
-                except FolderTransferFTPException as ex:  # pragma: no cover
-                    stex = str(ex).split("\n")
-                    stex = "\n    ".join(stex)
-                    warnings.warn(
-                        f"Unable to transfer '{file.fullname}' due to [{stex}].", ResourceWarning)
-                    issues.append(
-                        (file.fullname, "FolderTransferFTPException", ex))
-                    continue
-
-            if size > 2**20:
-                blocksize = 2**20
-                transfered = 0
-
-                def callback_function_(*args, **kwargs):
-                    "local function"
-                    private_p = kwargs.get('private_p', None)
-                    if private_p is None:
-                        raise ValueError("private_p cannot be None")
-                    private_p[1] += private_p[0]
-                    private_p[1] = min(private_p[1], size)
-                    self.fLOG("  transferred: %1.3f - %d/%d" %
-                              (1.0 * private_p[1] / private_p[2], private_p[1], private_p[2]))
-
-                tp_ = [blocksize, transfered, size]
-                cb = lambda *args2, **kwargs2: callback_function_(
-                    *args2, private_p=tp_, **kwargs2)
-            else:
-                blocksize = None
-                cb = None
-
-            if self._exc:
-                r = self._ftp.transfer(
-                    data, path, os.path.split(file.fullname)[-1], blocksize=blocksize, callback=cb)
-            else:
+            except FolderTransferFTPException as ex:  # pragma: no cover
+                stex = str(ex).split("\n")
+                stex = "\n    ".join(stex)
+                warnings.warn(
+                    f"Unable to transfer '{file.fullname}' due to [{stex}].", ResourceWarning)
+                return False, 0, (file.fullname, "FolderTransferFTPException", ex)
+
+        if size > 2**20:
+            blocksize = 2**20
+            transfered = 0
+
+            def callback_function_(*args, **kwargs):
+                "local function"
+                private_p = kwargs.get('private_p', None)
+                if private_p is None:
+                    raise ValueError("private_p cannot be None")
+                private_p[1] += private_p[0]
+                private_p[1] = min(private_p[1], size)
+                self.fLOG("  transferred: %1.3f - %d/%d" %
+                          (1.0 * private_p[1] / private_p[2], private_p[1], private_p[2]))
+
+            tp_ = [blocksize, transfered, size]
+            cb = lambda *args2, **kwargs2: callback_function_(
+                *args2, private_p=tp_, **kwargs2)
+        else:
+            blocksize = None
+            cb = None
+
+        name = os.path.split(file.fullname)[-1]
+        issue = None
+        attempt = 0
+        try:
+            while True:
                 try:
-                    r = self._ftp.transfer(
-                        data, path, os.path.split(file.fullname)[-1], blocksize=blocksize, callback=cb)
+                    r = ftp.transfer(data, path, name,
+                                     blocksize=blocksize, callback=cb)
+                    break
+                except _retry_exceptions as e:
+                    if attempt >= retries:
+                        if self._exc:
+                            raise e
+                        r = False
+                        issue = (file.fullname, type(e).__name__, e)
+                        self.fLOG("[FolderTransferFTP] - issue", e)
+                        break
+                    attempt += 1
+                    wait = backoff * 2 ** (attempt - 1) * (0.5 + random())
+                    self.fLOG("[FolderTransferFTP] - retry %d/%d for '%s' in "
+                              "%1.1fs due to %r" % (attempt, retries, name, wait, e))
+                    sleep(wait)
+                    data.seek(0)
                 except FileNotFoundError as e:  # pragma: no cover
+                    if self._exc:
+                        raise e
                     r = False
-                    issues.append((file.fullname, "not found", e))
+                    issue = (file.fullname, "not found", e)
                     self.fLOG("[FolderTransferFTP] - issue", e)
-                except ftplib.error_perm as ee:  # pragma: no cover
-                    r = False
-                    issues.append((file.fullname, str(ee), ee))
-                    self.fLOG("[FolderTransferFTP] - issue", ee)
-                except TimeoutError as eee:  # pragma: no cover
-                    r = False
-                    issues.append((file.fullname, "TimeoutError", eee))
-                    self.fLOG("[FolderTransferFTP] - issue", eee)
-                except EOFError as eeee:  # pragma: no cover
-                    r = False
-                    issues.append((file.fullname, "EOFError", eeee))
-                    self.fLOG("[FolderTransferFTP] - issue", eeee)
-                except ConnectionAbortedError as eeeee:  # pragma: no cover
+                    break
+                except ftplib.error_perm as e:  # pragma: no cover
+                    if self._exc:
+                        raise e
                     r = False
-                    issues.append(
-                        (file.fullname, "ConnectionAbortedError", eeeee))
-                    self.fLOG("    issue", eeeee)
-                except ConnectionResetError as eeeeee:  # pragma: no cover
-                    r = False
-                    issues.append(
-                        (file.fullname, "ConnectionResetError", eeeeee))
-                    self.fLOG("[FolderTransferFTP] - issue", eeeeee)
-                except CannotCompleteWithoutNewLoginException as e8:  # pragma: no cover
-                    r = False
-                    issues.append(
-                        (file.fullname, "CannotCompleteWithoutNewLoginException", e8))
-                    self.fLOG("[FolderTransferFTP] - issue", e8)
+                    issue = (file.fullname, str(e), e)
+                    self.fLOG("[FolderTransferFTP] - issue", e)
+                    break
                 except Exception as e7:  # pragma: no cover
+                    if self._exc:
+                        raise e7
                     try:
                         import paramiko
                     except ImportError:
                         raise e7
                     if isinstance(e7, paramiko.sftp.SFTPError):
                         r = False
-                        issues.append(
-                            (file.fullname, "ConnectionResetError", e7))
+                        issue = (file.fullname, "ConnectionResetError", e7)
                         self.fLOG("[FolderTransferFTP] - issue", e7)
-                    else:
-                        raise e7
-
+                        break
+                    raise e7
+        finally:
             self.close_stream(data)
 
-            sum_bytes += size
+        if delay is not None and delay > 0:
+            h = random()
+            delta = (h - 0.5) * delay * 0.1
+            delay_rnd = delay + delta
+            sleep(delay_rnd)
+        return r, size, issue
 
-            if r:
-                fi = self.update_status(file.fullname)
-                done.append(fi)
+    def start_transfering(self, max_errors=20, delay=None, n_sessions=1,
+                          retries=0, backoff=1., commit_every=1):
+        """
+        Starts transfering files to a remote :epkg:`FTP` website.
+
+        :param max_errors: stops after this number of errors
+        :param delay: delay between two files
+        :param n_sessions: number of sessions uploading files in parallel,
+            the additional sessions are opened with
+            :meth:`TransferFTP.clone <pyquickhelper.filehelper.ftp_transfer.TransferFTP.clone>`
+            and closed at the end, they share the same cache of remote folders
+        :param retries: number of retries for a file after a network error
+            (timeout, connection reset, temporary FTP error)
+        :param backoff: delay before the first retry, it doubles after every retry
+        :param commit_every: the status file is saved every *commit_every*
+            transferred files (after every file by default), an interrupted
+            transfer only sends again the files transferred after the last save
+        :return: list of transferred @see cl FileInfo
+        :raises FolderTransferFTPException: the class raises
+            an exception (@see cl FolderTransferFTPException)
+            more than *max_errors* issues happened
+        """
+        issues = []
+        done = []
+        total = list(self.iter_eligible_files())
+        sum_bytes = 0
+        n_done = 0
 
+        def process(i, r, size, issue):
+            nonlocal sum_bytes, n_done
+            if n_done % 20 == 0:
+                self.fLOG("#### transfering %d/%d (so far %d bytes)" %
+                          (n_done, len(total), sum_bytes))
+            n_done += 1
+            sum_bytes += size
+            if issue is not None:
+                issues.append(issue)
+            if r:
+                if commit_every <= 1:
+                    fi = self.update_status(total[i].fullname)
+                else:
+                    fi = self.update_status(total[i].fullname, save=False)
+                    if (len(done) + 1) % commit_every == 0:
+                        self._ft.save_dates()
+                done.append((i, fi))
             if len(issues) >= max_errors:
                 raise FolderTransferFTPException(  # pragma: no cover
                     "Too many issues:\n{0}".format(
                         "\n".join("{0} -- {1} --- {2}".format(
                             a, b, str(c).replace('\n', ' ')) for a, b, c in issues)))
 
-            if delay is not None and delay > 0:
-                h = random()
-                delta = (h - 0.5) * delay * 0.1
-                delay_rnd = delay + delta
-                sleep(delay_rnd)
-
-        return done
+        try:
+            if n_sessions <= 1 or len(total) <= 1:
+                for i, file in enumerate(total):
+                    process(i, *self._transfer_one(
+                        self._ftp, file, retries=retries, backoff=backoff,
+                        delay=delay))
+            else:
+                self._start_transfering_pool(
+                    total, process, n_sessions, retries, backoff, delay)
+        finally:
+            if done and commit_every > 1:
+                self._ft.save_dates()
+
+        done.sort(key=lambda t: t[0])
+        return [t[1] for t in done]
+
+    def _start_transfering_pool(self, total, process, n_sessions, retries,
+                                backoff, delay):
+        "Transfers files with a pool of sessions."
+        sessions = queue.Queue()
+        sessions.put(self._ftp)
+        opened = []
+        dir_cache = getattr(self._ftp, "dir_cache", set())
+        for _ in range(min(n_sessions, len(total)) - 1):
+            ftp = self._ftp.clone()
+            ftp.dir_cache = dir_cache
+            opened.append(ftp)
+            sessions.put(ftp)
+
+        def work(file):
+            ftp = sessions.get()
+            try:
+                return self._transfer_one(
+                    ftp, file, retries=retries, backoff=backoff, delay=delay)
+            finally:
+                sessions.put(ftp)
+
+        try:
+            with ThreadPoolExecutor(max_workers=sessions.qsize()) as executor:
+                futures = {executor.submit(work, file): i
+                           for i, file in enumerate(total)}
+                try:
+                    for fut in as_completed(futures):
+                        process(futures[fut], *fut.result())
+                except BaseException:
+                    for fut in futures:
+                        fut.cancel()
+                    raise
+        finally:
+            for ftp in opened:
+                ftp.close()
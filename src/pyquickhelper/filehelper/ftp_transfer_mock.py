@@ -13,15 +13,18 @@ class MockTransferFTP (TransferFTP):
     mock @see cl TransferFTP
     """
 
-    def __init__(self, site, login, password, fLOG=noLOG, ftps='FTP'):  # pylint: disable=W0231
+    def __init__(self, site, login, password, fLOG=noLOG, ftps='FTP', port=None):  # pylint: disable=W0231
         """
         same signature as @see cl TransferFTP
         """
         self._logins = []
         self._ftp = FTP(None)
         self.LOG = fLOG
-        self._atts = dict(site=site, login=login, password=password)
+        self._atts = dict(site=site, login=login, password=password,
+                          port=port)
         self.ftps = ftps
+        self._ftps_ = ftps
+        self.dir_cache = set()
 
     def transfer(self, file, to, name, debug=False, blocksize=None, callback=None):
         """
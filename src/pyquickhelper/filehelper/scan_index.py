@@ -0,0 +1,244 @@
+# -*- coding: utf-8 -*-
+"""
+@file
+@brief Persistent index of a folder tree, it avoids listing
+a folder again if it did not change since the previous scan.
+"""
+import os
+import time
+import sqlite3
+from collections import namedtuple
+from .file_info import split_checksum
+
+
+ScanEntry = namedtuple("ScanEntry", ["name", "isdir", "size", "mtime_ns", "inode"])
+
+
+class ScanIndex:
+    """
+    Keeps the result of the exploration of a folder tree
+    in a :epkg:`sqlite3` database: every file or folder is stored
+    with its size, its modification time (in nanoseconds), its inode
+    and a hash of its content once it was computed.
+
+    The content of a folder is retrieved from the index and not from
+    the disk if the folder modification time and inode did not change
+    (a folder is modified when a file is added, removed or renamed).
+    Files are still checked with :epkg:`*py:os:stat` to detect modifications
+    unless *check_files* is False. The hash of a file is reused as long
+    as its size, modification time and inode remain the same.
+
+    @param      filename        database, it is created if it does not exist
+    @param      check_files     check the files of an unchanged folder
+    @param      racy_delay      a folder modified less than *racy_delay* seconds
+                                before the scan is listed again next time, its
+                                modification time may not reflect the last change
+
+    Attributes *n_listed*, *n_skipped*, *n_stat* count the folders listed
+    on disk, the folders retrieved from the index and the calls to
+    :epkg:`*py:os:stat`.
+    """
+
+    def __init__(self, filename, check_files=True, racy_delay=2.):
+        self.filename = filename
+        self.check_files = check_files
+        self.racy_delay = racy_delay
+        self.n_listed = 0
+        self.n_skipped = 0
+        self.n_stat = 0
+        self._con = sqlite3.connect(filename)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("PRAGMA synchronous=NORMAL")
+        self._con.execute("""CREATE TABLE IF NOT EXISTS dirs (
+                             path TEXT PRIMARY KEY,
+                             mtime_ns INTEGER,
+                             inode INTEGER)""")
+        self._con.execute("""CREATE TABLE IF NOT EXISTS entries (
+                             dir TEXT,
+                             name TEXT,
+                             isdir INTEGER,
+                             size INTEGER,
+                             mtime_ns INTEGER,
+                             inode INTEGER,
+                             hash TEXT,
+                             PRIMARY KEY (dir, name))""")
+        self._con.commit()
+
+    def close(self):
+        """
+        Saves the pending changes and closes the database.
+        """
+        if self._con is not None:
+            self._con.commit()
+            self._con.close()
+            self._con = None
+
+    def commit(self):
+        """
+        Saves the pending changes.
+        """
+        self._con.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self._con.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    @staticmethod
+    def _key(path):
+        return os.path.normpath(os.path.abspath(path))
+
+    def _stat(self, path):
+        self.n_stat += 1
+        return os.stat(path)
+
+    def listdir(self, path):
+        """
+        Returns the content of a folder.
+
+        @param      path        folder
+        @return                 sorted list of @see cl ScanEntry
+        """
+        key = self._key(path)
+        st = self._stat(key)
+        row = self._con.execute(
+            "SELECT mtime_ns, inode FROM dirs WHERE path=?", (key, )).fetchone()
+        if row is not None and row[0] == st.st_mtime_ns and row[1] == st.st_ino:
+            self.n_skipped += 1
+            rows = self._con.execute(
+                "SELECT name, isdir, size, mtime_ns, inode FROM entries "
+                "WHERE dir=? ORDER BY name", (key, )).fetchall()
+            entries = [ScanEntry(r[0], bool(r[1]), r[2], r[3], r[4])
+                       for r in rows]
+            if not self.check_files:
+                return entries
+            return self._refresh(key, entries)
+        return self._scan(key, st, row is not None)
+
+    def _refresh(self, key, entries):
+        "Updates the status of every entry of an unchanged folder."
+        res = []
+        updates = []
+        for e in entries:
+            try:
+                st = self._stat(os.path.join(key, e.name))
+            except FileNotFoundError:  # pragma: no cover
+                # removed since the folder was listed
+                continue
+            if (st.st_size != e.size or st.st_mtime_ns != e.mtime_ns or
+                    st.st_ino != e.inode):
+                e = ScanEntry(e.name, e.isdir, st.st_size,
+                              st.st_mtime_ns, st.st_ino)
+                updates.append((e.size, e.mtime_ns, e.inode, key, e.name))
+            res.append(e)
+        if updates:
+            self._con.executemany(
+                "UPDATE entries SET size=?, mtime_ns=?, inode=?, hash=NULL "
+                "WHERE dir=? AND name=?", updates)
+        return res
+
+    def _remove_tree(self, path):
+        """
+        Removes a folder and its subfolders from the index,
+        the subfolders are selected with a range on the path
+        and not with *LIKE* which interprets ``_`` and ``%``.
+        """
+        start = path + os.sep
+        end = path + chr(ord(os.sep) + 1)
+        self._con.execute(
+            "DELETE FROM dirs WHERE path=? OR (path>=? AND path<?)",
+            (path, start, end))
+        self._con.execute(
+            "DELETE FROM entries WHERE dir=? OR (dir>=? AND dir<?)",
+            (path, start, end))
+
+    def _scan(self, key, st, known):
+        "Lists a folder on disk and stores its content."
+        self.n_listed += 1
+        entries = []
+        with os.scandir(key) as it:
+            for d in it:
+                try:
+                    isdir = d.is_dir()
+                    self.n_stat += 1
+                    s = d.stat()
+                except FileNotFoundError:  # pragma: no cover
+                    continue
+                entries.append(ScanEntry(d.name, isdir, s.st_size,
+                                         s.st_mtime_ns, s.st_ino))
+        entries.sort()
+
+        # set_hash may have stored entries for a folder never listed
+        # before, they are replaced as well
+        hashes = {}
+        previous = self._con.execute(
+            "SELECT name, isdir, size, mtime_ns, inode, hash FROM entries "
+            "WHERE dir=?", (key, )).fetchall()
+        if previous:
+            names = set(e.name for e in entries)
+            for r in previous:
+                if known and r[0] not in names and r[1]:
+                    # a removed folder
+                    self._remove_tree(os.path.join(key, r[0]))
+                if r[5] is not None:
+                    hashes[r[0], r[2], r[3], r[4]] = r[5]
+            self._con.execute("DELETE FROM entries WHERE dir=?", (key, ))
+
+        self._con.executemany(
+            "INSERT INTO entries (dir, name, isdir, size, mtime_ns, inode, hash) "
+            "VALUES (?,?,?,?,?,?,?)",
+            [(key, e.name, int(e.isdir), e.size, e.mtime_ns, e.inode,
+              hashes.get((e.name, e.size, e.mtime_ns, e.inode), None))
+             for e in entries])
+
+        mtime_ns = st.st_mtime_ns
+        if time.time_ns() - mtime_ns < self.racy_delay * 1e9:
+            # the folder may be modified again within the same tick
+            mtime_ns = -1
+        self._con.execute(
+            "INSERT OR REPLACE INTO dirs (path, mtime_ns, inode) VALUES (?,?,?)",
+            (key, mtime_ns, st.st_ino))
+        return entries
+
+    def get_hash(self, path, size, mtime_ns, inode, algo="md5"):
+        """
+        Returns the hash stored for a file if the file did not change.
+
+        @param      path        filename
+        @param      size        current size
+        @param      mtime_ns    current modification time
+        @param      inode       current inode
+        @param      algo        algorithm, None is returned if the stored
+                                hash was computed with another one
+        @return                 hash or None
+        """
+        key = self._key(path)
+        row = self._con.execute(
+            "SELECT size, mtime_ns, inode, hash FROM entries WHERE dir=? AND name=?",
+            os.path.split(key)).fetchone()
+        if row is None or row[:3] != (size, mtime_ns, inode) or row[3] is None:
+            return None
+        stored, digest = split_checksum(row[3])
+        return digest if stored == algo else None
+
+    def set_hash(self, path, value, size, mtime_ns, inode, algo="md5"):
+        """
+        Stores the hash of a file, the algorithm is stored with it.
+
+        @param      path        filename
+        @param      value       hash
+        @param      size        size of the file when the hash was computed
+        @param      mtime_ns    modification time when the hash was computed
+        @param      inode       inode when the hash was computed
+        @param      algo        algorithm used to compute the hash
+        """
+        d, name = os.path.split(self._key(path))
+        value = f"{algo}:{value}"
+        self._con.execute(
+            "INSERT OR REPLACE INTO entries (dir, name, isdir, size, mtime_ns, "
+            "inode, hash) VALUES (?,?,0,?,?,?,?)",
+            (d, name, size, mtime_ns, inode, value))
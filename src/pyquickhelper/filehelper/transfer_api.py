@@ -3,10 +3,12 @@
 @brief API to move files
 """
 import json
-import hashlib
+import struct
+import zlib
 from io import StringIO
 from ..loghelper.flog import noLOG
 from ..loghelper.convert_helper import str2datetime, datetime2str
+from .file_info import get_hash_algorithm
 
 
 class TransferAPI_FileInfo:
@@ -59,6 +61,179 @@ class TransferAPI_FileInfo:
         return json.dumps(li)
 
 
+class TransferAPI_MappingLog:
+    """
+    Stores the mapping of a backup as an append-only log.
+    Every commit uploads a segment holding the new or updated files
+    (compressed, binary) and an index listing the committed segments.
+    A segment which is not in the index is ignored, an interrupted
+    backup resumes from the last committed segment. The log is compacted
+    into a single segment when it holds too many segments.
+    Compacted segments are not removed from the remote location.
+
+    The legacy mapping (one file ``__mapping__``) is loaded
+    if the log does not exist, it is replaced by the log on the next commit.
+    """
+
+    _magic = b"PQHMAP1"
+
+    def __init__(self, api, encrypt=None, decrypt=None,
+                 prefix="__mapping_log__", max_segments=64):
+        """
+        @param      api             @see cl TransferAPI
+        @param      encrypt         function encrypting a segment or None
+        @param      decrypt         function decrypting a segment or None
+        @param      prefix          remote folder of the log
+        @param      max_segments    number of segments before compaction
+        """
+        self._api = api
+        self._encrypt = encrypt
+        self._decrypt = decrypt
+        self._prefix = prefix
+        self.max_segments = max_segments
+        self.segments = []
+        self.next_id = 0
+        self._legacy = False
+
+    def _index_path(self):
+        return self._prefix + "/index"
+
+    def _segment_path(self, name):
+        return self._prefix + "/" + name
+
+    @staticmethod
+    def segment2bytes(entries):
+        """
+        Serializes a list of @see cl TransferAPI_FileInfo.
+
+        @param      entries     iterable on @see cl TransferAPI_FileInfo
+        @return                 bytes
+        """
+        rows = []
+        pack_h = struct.Struct("<H").pack
+        for v in entries:
+            name = v.name.encode("utf-8")
+            date = datetime2str(v.last_update).encode("ascii")
+            rows.append(pack_h(len(name)))
+            rows.append(name)
+            rows.append(struct.pack("<BI", len(date), len(v.pieces)))
+            rows.append(date)
+            for p in v.pieces:
+                b = p.encode("utf-8")
+                rows.append(pack_h(len(b)))
+                rows.append(b)
+        return TransferAPI_MappingLog._magic + zlib.compress(b"".join(rows))
+
+    @staticmethod
+    def bytes2segment(data):
+        """
+        Deserializes a segment.
+
+        @param      data        bytes
+        @return                 list of @see cl TransferAPI_FileInfo
+        """
+        magic = TransferAPI_MappingLog._magic
+        if not data.startswith(magic):
+            raise ValueError(  # pragma: no cover
+                "Unexpected segment format.")
+        buf = zlib.decompress(data[len(magic):])
+        unpack_h = struct.Struct("<H").unpack_from
+        unpack_bi = struct.Struct("<BI").unpack_from
+        res = []
+        pos = 0
+        end = len(buf)
+        while pos < end:
+            n, = unpack_h(buf, pos)
+            pos += 2
+            name = buf[pos:pos + n].decode("utf-8")
+            pos += n
+            nd, np = unpack_bi(buf, pos)
+            pos += 5
+            date = str2datetime(buf[pos:pos + nd].decode("ascii"))
+            pos += nd
+            pieces = []
+            for _ in range(np):
+                n, = unpack_h(buf, pos)
+                pos += 2
+                pieces.append(buf[pos:pos + n].decode("utf-8"))
+                pos += n
+            res.append(TransferAPI_FileInfo(name, pieces, date))
+        return res
+
+    def load(self):
+        """
+        Retrieves the mapping, segment after segment.
+
+        @return         dictionary  { str, @see cl TransferAPI_FileInfo }
+        """
+        index = self._api.retrieve(self._index_path(), exc=False)
+        if index is None:
+            mapping = self._api.retrieve_mapping(self._decrypt)
+            self.segments = []
+            self.next_id = 0
+            self._legacy = len(mapping) > 0
+            return mapping
+        index = json.loads(index.decode("utf-8"))
+        self.segments = index["segments"]
+        self.next_id = index["next"]
+        self._legacy = False
+        mapping = {}
+        for name in self.segments:
+            data = self._api.retrieve(self._segment_path(name))
+            if self._decrypt is not None:
+                data = self._decrypt(data)
+            for v in TransferAPI_MappingLog.bytes2segment(data):
+                mapping[v.name] = v
+        return mapping
+
+    def _write_segment(self, entries):
+        name = "segment_%08d" % self.next_id
+        data = TransferAPI_MappingLog.segment2bytes(entries)
+        if self._encrypt is not None:
+            data = self._encrypt(data)
+        if not self._api.transfer(self._segment_path(name), data):
+            raise RuntimeError(  # pragma: no cover
+                f"Unable to upload segment {name!r}.")
+        self.next_id += 1
+        return name
+
+    def _write_index(self, segments):
+        index = json.dumps(dict(segments=segments, next=self.next_id))
+        if not self._api.transfer(self._index_path(), index.encode("utf-8")):
+            raise RuntimeError(  # pragma: no cover
+                "Unable to upload the index of the mapping.")
+        self.segments = segments
+
+    def needs_compaction(self):
+        """
+        Tells if the next commit should compact the log.
+        """
+        return self._legacy or len(self.segments) >= self.max_segments
+
+    def append(self, entries):
+        """
+        Commits a new segment.
+
+        @param      entries     iterable on @see cl TransferAPI_FileInfo
+        @return                 segment name
+        """
+        name = self._write_segment(entries)
+        self._write_index(self.segments + [name])
+        return name
+
+    def compact(self, mapping):
+        """
+        Replaces every segment by a single one holding the whole mapping.
+
+        @param      mapping     dictionary  { str, @see cl TransferAPI_FileInfo }
+        @return                 segment name
+        """
+        name = self._write_segment(v for _, v in sorted(mapping.items()))
+        self._write_index([name])
+        self._legacy = False
+        return name
+
+
 class TransferAPI:
     """
     Defines an API to transfer files over a remote location.
@@ -148,15 +323,26 @@ class TransferAPI:
         return res
 
     @staticmethod
-    def checksum_md5(data):
+    def checksum_md5(data, algo="md5"):
         """
         Computes MD5 for a file.
 
-        @param      data            some data
+        @param      data            some data, bytes or a binary stream,
+                                    a stream is hashed block by block
+        @param      algo            algorithm, see @see fn get_hash_algorithm,
+                                    remote paths are always built with :epkg:`MD5`
         @return                     string
         """
-        zero = hashlib.md5()
-        zero.update(data)
+        zero = get_hash_algorithm(algo)()
+        if hasattr(data, "readinto"):
+            buffer = bytearray(2 ** 20)
+            view = memoryview(buffer)
+            n = data.readinto(buffer)
+            while n:
+                zero.update(view[:n])
+                n = data.readinto(buffer)
+        else:
+            zero.update(data)
         return zero.hexdigest()
 
     def get_remote_path(self, data, name, piece=0):
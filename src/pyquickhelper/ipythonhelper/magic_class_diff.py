@@ -156,6 +156,10 @@ class MagicDiff(MagicClassWithHelpers):
         parser.add_argument(
             '--two', type=bool, default=False,
             help='display on two columns')
+        parser.add_argument(
+            '--strategy', type=str, default='full',
+            help="strategy to match lines, 'full', 'qgram' or 'patience' "
+                 "(faster on long texts)")
         return parser
 
     @line_magic
@@ -173,7 +177,7 @@ class MagicDiff(MagicClassWithHelpers):
                     import edit_distance_text, diff2html)
                 _, aligned, final = edit_distance_text(
                     args.c1, args.c2, threshold=args.threshold,
-                    verbose=args.verbose)
+                    verbose=args.verbose, strategy=args.strategy)
                 ht = diff2html(args.c1, args.c2, aligned, final)
                 display_html(ht)
 
@@ -184,7 +188,7 @@ class MagicDiff(MagicClassWithHelpers):
         if args is not None:
             _, aligned, final = edit_distance_text(  # pylint: disable=W0632
                 args.c1, args.c2, threshold=args.threshold,
-                verbose=args.verbose)
+                verbose=args.verbose, strategy=args.strategy)
             ht = diff2html(args.c1, args.c2, aligned,
                            final, two_columns=args.two)
             return HTML(ht)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+@file
+@brief Asynchronous sink for the logging function @see fn fLOG.
+Messages are queued and written by a background thread.
+"""
+import atexit
+import queue
+import sys
+import threading
+import time
+
+
+class _FlushRequest:
+    "Asks the writer thread to write everything and to flush."
+
+    def __init__(self):
+        self.event = threading.Event()
+
+
+_STOP = object()
+
+
+class AsyncLogSink:
+    """
+    Receives formatted messages and writes them in a background
+    thread. Messages are written by batches, streams are flushed
+    every *flush_interval* seconds or every *flush_size* characters.
+    The queue is drained when the program exits.
+
+    :param write: function receiving one message and writing it into the log file
+    :param flush: function flushing the log file or None
+    :param max_queue: maximum number of pending messages
+    :param batch_size: maximum number of messages written by one batch
+    :param flush_interval: maximum time (seconds) between two flushes
+    :param flush_size: streams are flushed after this number of written characters
+    :param policy: ``'block'`` to wait when the queue is full,
+        ``'drop'`` to drop the message (counted in *n_dropped*)
+
+    Usage:
+
+    ::
+
+        from pyquickhelper.loghelper import fLOG
+        fLOG(AsyncLog=True)  # or AsyncLog=dict(policy='drop')
+        for i in range(10000):
+            fLOG("iteration", i)
+        fLOG(AsyncLog=False)  # waits until every message is written
+    """
+
+    def __init__(self, write, flush=None, max_queue=10000, batch_size=1000,
+                 flush_interval=0.5, flush_size=2 ** 16, policy="block"):
+        if policy not in ("block", "drop"):
+            raise ValueError(
+                f"Unexpected policy={policy!r}, it should be 'block' or 'drop'.")
+        self._write = write
+        self._flush = flush
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self.policy = policy
+        self.n_written = 0
+        self.n_dropped = 0
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run, name="AsyncLogSink", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def closed(self):
+        "Tells if the sink was closed, it does not accept messages anymore."
+        return self._closed
+
+    def put(self, message, display=False, stream=None):
+        """
+        Queues a message.
+
+        :param message: formatted message or @see cl LogRecord
+        :param display: displays the message on *stream* as well
+        :param stream: stream, *sys.stdout* if None
+        :return: False if the message was dropped
+        """
+        if self._closed:
+            raise RuntimeError("The sink is closed.")
+        if display and stream is None:
+            stream = sys.stdout
+        record = message, stream if display else None
+        if self.policy == "drop":
+            try:
+                self._queue.put_nowait(record)
+            except queue.Full:
+                self.n_dropped += 1
+                return False
+        else:
+            self._queue.put(record)
+        return True
+
+    def flush(self, timeout=None):
+        """
+        Waits until every queued message is written and flushed.
+
+        :param timeout: maximum waiting time
+        :return: True if the queue was drained
+        """
+        if self._closed or not self._thread.is_alive():
+            return True
+        req = _FlushRequest()
+        self._queue.put(req)
+        return req.event.wait(timeout)
+
+    def close(self):
+        """
+        Writes every pending message and stops the thread.
+        """
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        atexit.unregister(self.close)
+
+    def _write_batch(self, batch):
+        "Writes a batch of messages, returns the number of written characters."
+        size = 0
+        streams = {}
+        for message, stream in batch:
+            # a LogRecord is rendered here and not by the caller
+            text = str(message)
+            self._write(message)
+            size += len(text)
+            if stream is not None:
+                if not isinstance(message, str):
+                    text = message.render()
+                key = id(stream)
+                if key not in streams:
+                    streams[key] = stream, []
+                streams[key][1].append(text.strip("\r\n"))
+        for stream, lines in streams.values():
+            _write_lines(stream, lines)
+        self.n_written += len(batch)
+        return size, [s for s, _ in streams.values()]
+
+    def _flush_all(self, streams):
+        if self._flush is not None:
+            self._flush()
+        for stream in streams:
+            if hasattr(stream, "flush"):
+                stream.flush()
+
+    def _run(self):
+        "Drains the queue."
+        last_flush = time.perf_counter()
+        unflushed = 0
+        to_flush = {}
+        stop = False
+        while not stop:
+            timeout = max(self.flush_interval -
+                          (time.perf_counter() - last_flush), 0.001)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            batch = []
+            requests = []
+            while item is not None:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, _FlushRequest):
+                    requests.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    item = None
+            try:
+                if batch:
+                    size, streams = self._write_batch(batch)
+                    unflushed += size
+                    for s in streams:
+                        to_flush[id(s)] = s
+                if (unflushed > 0 and (
+                        unflushed >= self.flush_size or stop or requests or
+                        time.perf_counter() - last_flush >= self.flush_interval)):
+                    self._flush_all(to_flush.values())
+                    unflushed = 0
+                    to_flush.clear()
+                    last_flush = time.perf_counter()
+                elif unflushed == 0:
+                    last_flush = time.perf_counter()
+            except Exception as e:  # pragma: no cover
+                # the logging must not stop the program
+                self.last_error = e
+            for req in requests:
+                req.event.set()
+
+
+def _write_lines(stream, lines):
+    "Writes lines, deals with encoding issues like @see fn fLOG."
+    try:
+        stream.write("\n".join(lines) + "\n")
+        return
+    except UnicodeEncodeError:  # pragma: no cover
+        pass
+    for line in lines:  # pragma: no cover
+        mes = "\n".join(repr(line).split("\\n"))
+        try:
+            stream.write(mes + "\n")
+        except UnicodeEncodeError:
+            mes2 = mes.encode("utf-8").decode("cp1252", errors="ignore")
+            stream.write(mes2 + "\n")
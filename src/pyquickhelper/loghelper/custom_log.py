@@ -5,6 +5,8 @@
 """
 import datetime
 import os
+import time
+from .log_record import LogRecord
 
 
 class CustomLog:
@@ -17,9 +19,15 @@ class CustomLog:
 
         clog = CustomLog("folder")
         clog('[fct]', info)
+
+    With ``structured='json'``, every call only stores a
+    @see cl LogRecord *(timestamp_ns, template, args)*,
+    records are rendered and written as :epkg:`json` lines
+    every *buffer_size* records or when @see me flush is called.
     """
 
-    def __init__(self, folder=None, filename=None, create=True, parent=None):
+    def __init__(self, folder=None, filename=None, create=True, parent=None,
+                 structured=None, buffer_size=1000):
         """
         initialisation
 
@@ -27,10 +35,20 @@ class CustomLog:
         @param      filename        new filename
         @param      create          force the creation
         @param      parent          logging function (called after this one if not None)
+        @param      structured      None for the usual format, ``'text'`` or ``'json'``
+                                    to defer the rendering of the messages
+        @param      buffer_size     number of records kept in memory before
+                                    they are written (structured mode)
         """
+        if structured not in (None, "text", "json"):
+            raise ValueError(  # pragma: no cover
+                f"Unexpected value for structured={structured!r}.")
         folder = os.path.abspath(folder)
         self._folder = folder
         self._parent = parent
+        self._structured = structured
+        self._buffer_size = buffer_size
+        self._records = []
         if not os.path.exists(folder):
             os.makedirs(folder)  # pragma: no cover
         typstr = str
@@ -75,9 +93,21 @@ class CustomLog:
         """
         Closes the stream if needed.
         """
+        if self._records:
+            self.flush()
         if self._close:
             self._handle.close()
 
+    def flush(self):
+        """
+        Writes the pending records (structured mode) and flushes the stream.
+        """
+        records = self._records
+        self._records = []
+        if records:
+            self._handle.write("".join(str(r) for r in records))
+        self._handle.flush()
+
     def __call__(self, *args, **kwargs):
         """
         Log anything.
@@ -93,6 +123,12 @@ class CustomLog:
         @param      args    list of fields
         @param      kwargs  dictionary of fields
         """
+        if self._structured:
+            self._records.append(LogRecord.from_call(
+                time.time_ns(), args, kwargs, fmt=self._structured))
+            if len(self._records) >= self._buffer_size:
+                self.flush()
+            return
         dt = datetime.datetime(2009, 1, 1).now()
         typstr = str
         if len(args) > 0:
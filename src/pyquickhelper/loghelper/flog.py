@@ -26,13 +26,14 @@ import datetime
 import decimal
 import math
 import os
-import pprint
 import random
 import sys
 import time
 import re
 import zipfile
 import urllib.request as urllib_request
+from .async_flog import AsyncLogSink
+from .log_record import LogRecord, format_log_message
 from .flog_fake_classes import FlogStatic, LogFakeFileStream, LogFileStream, PQHException
 from .run_cmd import run_cmd
 
@@ -78,6 +79,9 @@ def init(path=None, filename=None, create=True, path_add=None):
 
     if (flog_static.store_log_values["__log_path"] != path or flog_static.store_log_values["__log_file_name"] != filename) \
             and flog_static.store_log_values["__log_file"] is not None:
+        sink = flog_static.store_log_values.get("__log_sink", None)
+        if sink is not None:
+            sink.flush()
         flog_static.store_log_values["__log_file"].close()
         flog_static.store_log_values["__log_file"] = None
     flog_static.store_log_values["__log_path"] = path
@@ -149,6 +153,28 @@ def GetLogFile(physical=False, filename=None):
     return flog_static.store_log_values["__log_file"]
 
 
+def set_async_log(enable=True, **options):
+    """
+    Enables or disables the asynchronous writing of the logs
+    (see @see cl AsyncLogSink). Disabling it waits
+    for every pending message to be written.
+
+    @param      enable      enable or disable
+    @param      options     options for @see cl AsyncLogSink
+    @return                 the sink or None
+    """
+    sink = flog_static.store_log_values.get("__log_sink", None)
+    if sink is not None:
+        flog_static.store_log_values["__log_sink"] = None
+        sink.close()
+    if not enable:
+        return None
+    sink = AsyncLogSink(lambda message: GetLogFile().write(message),
+                        lambda: GetLogFile().flush(), **options)
+    flog_static.store_log_values["__log_sink"] = sink
+    return sink
+
+
 def noLOG(*args, **kwargs):
     """
     does nothing
@@ -176,6 +202,10 @@ def fLOG(*args, **kwargs):
     - if *p* contains *Lock*, it locks option *OutputPrint*
     - if *p* contains *UnLock*, it unlocks option *OutputPrint*
     - if *p* contains *_pp*, it uses :epkg:`*py:pprint`
+    - if *p* contains *AsyncLog*, it calls ``set_async_log(v)``
+      or ``set_async_log(**v)`` if *v* is a dictionary
+    - if *p* contains *LogStructured*, it switches to structured mode
+      (``'text'`` or ``'json'``, False to go back to the default mode)
 
     Example:
 
@@ -200,6 +230,16 @@ def fLOG(*args, **kwargs):
 
     Parameter *OutputStream* allows to print
     the message on a different stream.
+
+    With ``fLOG(AsyncLog=True)``, messages are formatted by the caller
+    but written and displayed by a background thread,
+    see @see cl AsyncLogSink.
+
+    With ``fLOG(LogStructured='json')``, every call creates a
+    @see cl LogRecord *(timestamp_ns, template, args)*. The message
+    is only rendered if it is displayed or written, the log file
+    then receives :epkg:`json` lines (``'text'`` keeps the usual format).
+    Nothing is rendered if the logs are neither displayed nor stored in a file.
     """
     path_add = kwargs.get("LogPathAdd", [])
     outstream = kwargs.get('OutputStream', None)
@@ -226,13 +266,56 @@ def fLOG(*args, **kwargs):
     if "OutputPrint" in kwargs:
         Print(kwargs["OutputPrint"])
 
+    if "AsyncLog" in kwargs:
+        opts = kwargs.pop("AsyncLog")
+        if isinstance(opts, dict):
+            set_async_log(**opts)
+        else:
+            set_async_log(opts)
+
+    if "LogStructured" in kwargs:
+        mode = kwargs.pop("LogStructured")
+        if mode is True:
+            mode = "text"
+        if mode not in (None, False, "text", "json"):
+            raise ValueError(f"Unexpected value for LogStructured={mode!r}.")
+        flog_static.store_log_values["__log_structured"] = mode or None
+
     if "LogFile" in kwargs:
         GetLogFile(True, filename=kwargs["LogFile"])
 
-    message = fLOGFormat(flog_static.store_log_values["__log_file_sep"],
-                         *args, **kwargs)
-    GetLogFile().write(message)
-    if flog_static.store_log_values["__log_display"]:
+    display = flog_static.store_log_values["__log_display"]
+    structured = flog_static.store_log_values.get("__log_structured", None)
+    if structured:
+        message = LogRecord.from_call(
+            time.time_ns(), args, kwargs, fmt=structured,
+            sep=flog_static.store_log_values["__log_file_sep"])
+    else:
+        message = fLOGFormat(flog_static.store_log_values["__log_file_sep"],
+                             *args, **kwargs)
+    sink = flog_static.store_log_values.get("__log_sink", None)
+    if sink is not None and sink.closed:
+        # closed when the program exits, the message is written
+        # by the synchronous path
+        flog_static.store_log_values["__log_sink"] = None
+        sink = None
+    if sink is not None:
+        try:
+            sink.put(message, display=display, stream=outstream)
+            if len(args) > 0:
+                return args[0]
+            return None
+        except RuntimeError:  # pragma: no cover
+            # closed by another thread
+            pass
+
+    log_file = GetLogFile()
+    if not structured or not isinstance(log_file, LogFakeFileStream):
+        # the logger only renders a LogRecord if it is emitted
+        log_file.write(message)
+    if display:
+        if structured:
+            message = message.render()
         try:
             myprint(message.strip("\r\n"))
         except UnicodeEncodeError:  # pragma: no cover
@@ -243,7 +326,7 @@ def fLOG(*args, **kwargs):
                 mes2 = mes.encode("utf-8").decode("cp1252", errors="ignore")
                 myprint(mes2)
 
-    GetLogFile().flush()
+    log_file.flush()
     if len(args) > 0:
         return args[0]
     return None
@@ -260,40 +343,8 @@ def fLOGFormat(sep, *args, **kwargs):
 
     if *_pp* is True, the function uses :epkg:`*py:pprint`.
     """
-    upp = kwargs.get('_pp', False)
     dt = datetime.datetime(2009, 1, 1).now()
-    typstr = str
-    if len(args) > 0:
-        def _str_process(s):
-            if isinstance(s, str):
-                if upp:
-                    return pprint.pformat(s)
-                return s
-            if isinstance(s, bytes):
-                return s.decode("utf8")
-            try:
-                if upp:
-                    return pprint.pformat(s)
-                return typstr(s)
-            except Exception as e:  # pragma: no cover
-                raise RuntimeError(  # pragma: no cover
-                    "unable to convert s into string: type(s)=" + str(type(s))) from e
-
-        message = (str(dt).split(".", maxsplit=1)[0] + " " +
-                   " ".join([_str_process(s) for s in args]) + sep)
-        st = "                    "
-    else:
-        message = typstr(dt).split(".", maxsplit=1)[0] + " "
-        st = "                    "
-
-    messages = [message]
-
-    for k, v in kwargs.items():
-        if k in ("OutputPrint", '_pp') and v:
-            continue
-        message = st + f"{typstr(k)} = {typstr(v)}{sep}"
-        messages.append(message)
-    return sep.join(messages)
+    return format_log_message(dt, sep, args, kwargs)
 
 
 def _this_fLOG(*args, **kwargs):
@@ -32,6 +32,8 @@ class FlogStatic:
         self.store_log_values["__log_file"] = None
         self.store_log_values["__log_file_sep"] = "\n"
         self.store_log_values["__log_display"] = False
+        self.store_log_values["__log_sink"] = None
+        self.store_log_values["__log_structured"] = None
         self.store_log_values["month_date"] = {"jan": 1, "feb": 2, "mar": 3, "apr": 4,
                                                "may": 5, "jun": 6, "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12}
 
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+@file
+@brief Structured log records, the message is only rendered
+when it is written.
+"""
+import datetime
+import json
+import pprint
+
+
+def _str_process(s, upp=False):
+    "Converts one field of a message into a string."
+    if isinstance(s, str):
+        if upp:
+            return pprint.pformat(s)
+        return s
+    if isinstance(s, bytes):
+        return s.decode("utf8")
+    try:
+        if upp:
+            return pprint.pformat(s)
+        return str(s)
+    except Exception as e:  # pragma: no cover
+        raise RuntimeError(  # pragma: no cover
+            "unable to convert s into string: type(s)=" + str(type(s))) from e
+
+
+def format_log_message(dt, sep, args, kwargs):
+    """
+    Formats a message the same way @see fn fLOGFormat does.
+
+    @param      dt      datetime
+    @param      sep     line separator
+    @param      args    list of anything
+    @param      kwargs  dictionary of anything
+    @return             string
+    """
+    upp = kwargs.get('_pp', False)
+    if len(args) > 0:
+        message = (str(dt).split(".", maxsplit=1)[0] + " " +
+                   " ".join([_str_process(s, upp) for s in args]) + sep)
+    else:
+        message = str(dt).split(".", maxsplit=1)[0] + " "
+    st = "                    "
+
+    messages = [message]
+
+    for k, v in kwargs.items():
+        if k in ("OutputPrint", '_pp') and v:
+            continue
+        message = st + f"{str(k)} = {str(v)}{sep}"
+        messages.append(message)
+    return sep.join(messages)
+
+
+def _json_value(v, upp=False):
+    "Returns a value :epkg:`json` can serialize."
+    if v is None or isinstance(v, (str, int, float, bool)):
+        return v
+    if isinstance(v, (list, dict)):
+        try:
+            json.dumps(v)
+            return v
+        except (TypeError, ValueError):
+            pass
+    return _str_process(v, upp)
+
+
+class LogRecord:
+    """
+    Stores what a logging function receives,
+    *(timestamp_ns, template, args)*, the message is rendered
+    when it is converted into a string. The template is
+    the first argument if it is a string.
+
+    :param timestamp_ns: timestamp in nanoseconds (see :epkg:`*py:time:time_ns`)
+    :param template: first argument if it is a string, None otherwise
+    :param args: other arguments
+    :param kwargs: named arguments
+    :param fmt: ``'text'`` or ``'json'``, format returned by ``str(record)``
+    :param sep: line separator
+    """
+
+    __slots__ = ("timestamp_ns", "template", "args", "kwargs",
+                 "fmt", "sep", "_text", "_json")
+
+    def __init__(self, timestamp_ns, template, args, kwargs=None, fmt="text",
+                 sep="\n"):
+        if fmt not in ("text", "json"):
+            raise ValueError(f"Unexpected format {fmt!r}.")
+        self.timestamp_ns = timestamp_ns
+        self.template = template
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.fmt = fmt
+        self.sep = sep
+        self._text = None
+        self._json = None
+
+    @staticmethod
+    def from_call(timestamp_ns, args, kwargs=None, fmt="text", sep="\n"):
+        """
+        Creates a record from the arguments of a logging function.
+        """
+        if len(args) > 0 and isinstance(args[0], str):
+            return LogRecord(timestamp_ns, args[0], args[1:], kwargs, fmt, sep)
+        return LogRecord(timestamp_ns, None, args, kwargs, fmt, sep)
+
+    @property
+    def datetime(self):
+        "Returns the timestamp as a datetime."
+        return datetime.datetime.fromtimestamp(self.timestamp_ns / 1e9)
+
+    @property
+    def fields(self):
+        "Returns all the arguments."
+        if self.template is None:
+            return tuple(self.args)
+        return (self.template, ) + tuple(self.args)
+
+    def render(self):
+        """
+        Renders the message like @see fn fLOGFormat.
+        """
+        if self._text is None:
+            self._text = format_log_message(
+                self.datetime, self.sep, self.fields, self.kwargs)
+        return self._text
+
+    def to_json(self):
+        """
+        Serializes the record into a single line of :epkg:`json`.
+        """
+        if self._json is None:
+            upp = self.kwargs.get('_pp', False)
+            obj = {"ts": self.timestamp_ns, "template": self.template,
+                   "args": [_json_value(a, upp) for a in self.args]}
+            kwargs = {str(k): _json_value(v) for k, v in self.kwargs.items()
+                      if not (k in ("OutputPrint", '_pp') and v)}
+            if kwargs:
+                obj["kwargs"] = kwargs
+            self._json = json.dumps(obj, ensure_ascii=False) + "\n"
+        return self._json
+
+    @staticmethod
+    def from_json(line, fmt="json"):
+        """
+        Restores a record serialized by @see me to_json.
+        """
+        obj = json.loads(line)
+        return LogRecord(obj["ts"], obj["template"], tuple(obj["args"]),
+                         obj.get("kwargs", None), fmt=fmt)
+
+    def __str__(self):
+        "Renders the record in format *fmt*."
+        return self.to_json() if self.fmt == "json" else self.render()
+
+    def __repr__(self):
+        "usual"
+        return (f"{self.__class__.__name__}({self.timestamp_ns!r}, "
+                f"{self.template!r}, {self.args!r}, {self.kwargs!r})")
+
+
+def enumerate_log_records(filename):
+    """
+    Reads a log file written in :epkg:`json` lines
+    (see @see cl LogRecord).
+
+    @param      filename    filename or stream
+    @return                 iterator on @see cl LogRecord
+    """
+    if isinstance(filename, str):
+        with open(filename, "r", encoding="utf-8") as f:
+            for rec in enumerate_log_records(f):
+                yield rec
+        return
+    for line in filename:
+        line = line.strip()
+        if line.startswith("{"):
+            yield LogRecord.from_json(line)
@@ -6,6 +6,8 @@
 import sys
 import os
 import time
+import asyncio
+import selectors
 import subprocess
 import threading
 import warnings
@@ -249,41 +251,38 @@ def run_cmd(cmd, sin="", shell=sys.platform.startswith("win"), wait=False, log_e
 
             begin = time.perf_counter()
             last_update = begin
-            # with threads
-            (stdoutReader, stdoutQueue) = _AsyncLineReader.getForFd(
-                stdout, catch_exit=catch_exit)
-            (stderrReader, stderrQueue) = _AsyncLineReader.getForFd(
-                stderr, catch_exit=catch_exit)
             runloop = True
 
-            while (not stdoutReader.eof() or not stderrReader.eof()) and runloop:
-                while not stdoutQueue.empty():
-                    line = stdoutQueue.get()
-                    decol = decode_outerr(
-                        line, encoding, encerror, cmd)
+            def next_wakeup():
+                # the reader only wakes up on data or for these events
+                now = time.perf_counter()
+                delays = []
+                if tell_if_no_output is not None:
+                    delays.append(last_update + tell_if_no_output - now)
+                if timeout is not None:
+                    delays.append(begin + timeout - now)
+                return max(min(delays), 0) if delays else None
+
+            for kind, line in _enumerate_process_lines(
+                    stdout, stderr, next_wakeup, catch_exit=catch_exit):
+                if kind is not None:
+                    decol = decode_outerr(line, encoding, encerror, cmd)
                     sdecol = decol.strip("\n\r")
                     if fLOG is not None:
                         fLOG(prefix_log + sdecol)
-                    out.append(sdecol)
                     last_update = time.perf_counter()
-                    if stop_running_if is not None and stop_running_if(decol, None):
+                    if kind == 1:
+                        out.append(sdecol)
+                        stop = stop_running_if is not None and stop_running_if(
+                            decol, None)
+                    else:
+                        err.append(sdecol)
+                        stop = stop_running_if is not None and stop_running_if(
+                            None, decol)
+                    if stop:
                         runloop = False
                         break
 
-                while not stderrQueue.empty():
-                    line = stderrQueue.get()
-                    decol = decode_outerr(
-                        line, encoding, encerror, cmd)
-                    sdecol = decol.strip("\n\r")
-                    if fLOG is not None:
-                        fLOG(prefix_log + sdecol)
-                    err.append(sdecol)
-                    last_update = time.perf_counter()
-                    if stop_running_if is not None and stop_running_if(None, decol):
-                        runloop = False
-                        break
-                time.sleep(0.05)
-
                 delta = time.perf_counter() - last_update
                 if tell_if_no_output is not None and delta >= tell_if_no_output:
                     fLOG(  # pragma: no cover
@@ -299,10 +298,6 @@ def run_cmd(cmd, sin="", shell=sys.platform.startswith("win"), wait=False, log_e
                     break  # pragma: no cover
 
             if runloop:
-                # Waiting for async readers to finish...
-                stdoutReader.join()
-                stderrReader.join()
-
                 # Waiting for process to exit...
                 returnCode = pproc.wait()
                 err_read = True
@@ -461,3 +456,278 @@ class _AsyncLineReader(threading.Thread):
             reader.start()
 
         return reader, q
+
+
+def _enumerate_lines_selector(stdout, stderr, next_wakeup):
+    """
+    Reads lines from the standard output and error of a process
+    with a selector, the function only wakes up on data
+    or when *next_wakeup()* seconds have passed.
+    """
+    sel = selectors.DefaultSelector()
+    buffers = {}
+    for kind, pipe in [(1, stdout), (2, stderr)]:
+        sel.register(pipe.fileno(), selectors.EVENT_READ, kind)
+        buffers[kind] = b""
+    try:
+        while sel.get_map():
+            events = sel.select(next_wakeup())
+            if not events:
+                yield None, None
+                continue
+            for key, _ in events:
+                kind = key.data
+                data = os.read(key.fd, 2 ** 16)
+                if not data:
+                    sel.unregister(key.fd)
+                    if buffers[kind]:
+                        yield kind, buffers[kind]
+                        buffers[kind] = b""
+                    continue
+                lines = (buffers[kind] + data).split(b"\n")
+                buffers[kind] = lines.pop()
+                for line in lines:
+                    yield kind, line + b"\n"
+    finally:
+        sel.close()
+
+
+def _enumerate_lines_threads(stdout, stderr, next_wakeup, catch_exit=False):
+    """
+    Reads lines from the standard output and error of a process
+    with two threads feeding the same queue, the function only
+    wakes up on data or when *next_wakeup()* seconds have passed.
+    It is used where selectors do not support pipes (Windows).
+    """
+    q = queue.Queue()
+
+    def reader(kind, fd):
+        try:
+            for line in iter(fd.readline, b''):
+                q.put((kind, line))
+        except SystemExit as e:  # pragma: no cover
+            if not catch_exit:
+                raise
+            q.put((kind, str(e).encode()))
+        finally:
+            q.put((kind, None))
+
+    threads = [threading.Thread(target=reader, args=(kind, fd), daemon=True)
+               for kind, fd in [(1, stdout), (2, stderr)]]
+    for th in threads:
+        th.start()
+    running = len(threads)
+    while running > 0:
+        try:
+            kind, line = q.get(timeout=next_wakeup())
+        except queue.Empty:
+            yield None, None
+            continue
+        if line is None:
+            running -= 1
+        else:
+            yield kind, line
+    for th in threads:
+        th.join()
+
+
+def _enumerate_process_lines(stdout, stderr, next_wakeup, catch_exit=False):
+    """
+    Enumerates the lines written by a process on its standard
+    output (kind=1) and error (kind=2). It yields ``(None, None)``
+    when *next_wakeup()* seconds passed without any data.
+
+    @param      stdout          standard output
+    @param      stderr          standard error
+    @param      next_wakeup     returns the maximum waiting time or None
+    @param      catch_exit      catch *SystemExit* (threads only)
+    @return                     iterator on (kind, bytes)
+    """
+    if sys.platform.startswith("win"):
+        return _enumerate_lines_threads(  # pragma: no cover
+            stdout, stderr, next_wakeup, catch_exit=catch_exit)
+    return _enumerate_lines_selector(stdout, stderr, next_wakeup)
+
+
+async def _read_stream_lines(stream, emit, chunk_size=2 ** 16):
+    """
+    Reads a stream by chunks and calls *emit* for every line,
+    a line can be longer than the limit of *StreamReader.readline*.
+    """
+    pending = []
+    while True:
+        chunk = await stream.read(chunk_size)
+        if not chunk:
+            break
+        parts = chunk.split(b"\n")
+        if len(parts) == 1:
+            pending.append(chunk)
+            continue
+        parts[0] = b"".join(pending) + parts[0]
+        pending = [parts[-1]] if parts[-1] else []
+        for line in parts[:-1]:
+            emit(line)
+    if pending:
+        emit(b"".join(pending))
+
+
+async def _run_cmd_async(cmd, sem, prefix, timeout, shell, preprocess, cwd,
+                         encoding, encerror, fLOG):
+    """
+    Runs one command for @see fn run_cmds, an exception is stored
+    in the result and does not stop the other commands.
+    """
+    async with sem:
+        if fLOG is not None:
+            fLOG(prefix + "[run_cmds] execute",
+                 cmd if isinstance(cmd, str) else " ".join(cmd))
+        begin = time.perf_counter()
+        out, err = [], []
+        timed_out = False
+        error = None
+        proc = None
+
+        def emit(lines):
+            def _emit(line):
+                line = decode_outerr(line, encoding, encerror, cmd).rstrip("\r\n")
+                lines.append(line)
+                if fLOG is not None:
+                    fLOG(prefix + line)
+            return _emit
+
+        try:
+            if shell:
+                proc = await asyncio.create_subprocess_shell(
+                    cmd if isinstance(cmd, str) else " ".join(cmd), cwd=cwd,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            else:
+                args = split_cmp_command(cmd) if preprocess else cmd
+                if isinstance(args, str):
+                    args = [args]
+                proc = await asyncio.create_subprocess_exec(
+                    *args, cwd=cwd,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(_read_stream_lines(proc.stdout, emit(out)),
+                                   _read_stream_lines(proc.stderr, emit(err)),
+                                   proc.wait()),
+                    timeout)
+            except asyncio.TimeoutError:
+                timed_out = True
+                if fLOG is not None:
+                    fLOG(prefix + f"[run_cmds] timeout after {timeout} seconds")
+        except Exception as e:  # pylint: disable=W0703
+            error = e
+            if fLOG is not None:
+                fLOG(prefix + f"[run_cmds] failed due to {e!r}")
+        finally:
+            # the process is killed on a timeout, an error or a cancellation
+            if proc is not None and proc.returncode is None:
+                try:
+                    proc.kill()
+                except ProcessLookupError:  # pragma: no cover
+                    pass
+                await proc.wait()
+        return dict(cmd=cmd,
+                    returncode=None if error is not None else proc.returncode,
+                    out="\n".join(out), err="\n".join(err), timeout=timed_out,
+                    error=error, duration=time.perf_counter() - begin)
+
+
+async def _run_cmds_async(cmds, max_workers, timeouts, prefixes, **kwargs):
+    "Runs all commands for @see fn run_cmds."
+    sem = asyncio.Semaphore(max_workers)
+    return await asyncio.gather(*[
+        _run_cmd_async(cmd, sem, prefix, timeout, **kwargs)
+        for cmd, timeout, prefix in zip(cmds, timeouts, prefixes)])
+
+
+def run_cmds(cmds, max_workers=None, timeout=None, prefixes=None, shell=False,
+             preprocess=True, change_path=None, encoding="utf8", encerror="ignore",
+             raise_exception=False, fLOG=None):
+    """
+    Runs many command lines concurrently, the output of every command
+    is streamed line by line to *fLOG* with a prefix.
+
+    @param      cmds                list of command lines (string or list)
+    @param      max_workers         maximum number of simultaneous processes,
+                                    the number of cores by default
+    @param      timeout             None, a timeout in seconds for every command
+                                    or a list of timeouts (one per command),
+                                    a process is killed after its timeout
+    @param      prefixes            prefixes added to every logged line,
+                                    ``'[i] '`` by default
+    @param      shell               run the command through the shell
+    @param      preprocess          splits the command line if it is a string
+    @param      change_path         working directory of the processes
+    @param      encoding            encoding of the outputs
+    @param      encerror            encoding errors
+    @param      raise_exception     raises @see cl RunCmdException if
+                                    one command fails
+    @param      fLOG                logging function
+    @return                         list of dictionaries (one per command,
+                                    same order) with keys *cmd*, *returncode*,
+                                    *out*, *err*, *timeout*, *error*, *duration*
+
+    A command which cannot be started or fails for any other reason
+    than its return code does not stop the others, its *returncode*
+    is None and *error* contains the exception (None otherwise).
+
+    The processes are handled by :epkg:`asyncio`,
+    no thread is waiting for them.
+
+    ::
+
+        from pyquickhelper.loghelper import run_cmds
+        res = run_cmds(["python -c print(1)", "python -c print(2)"],
+                       max_workers=2, timeout=60, fLOG=print)
+    """
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    if isinstance(timeout, (list, tuple)):
+        if len(timeout) != len(cmds):
+            raise ValueError(
+                f"Mismatch between the number of timeouts {len(timeout)} "
+                f"and the number of commands {len(cmds)}.")
+        timeouts = timeout
+    else:
+        timeouts = [timeout for c in cmds]
+    if prefixes is None:
+        prefixes = [f"[{i}] " for i in range(len(cmds))]
+    elif len(prefixes) != len(cmds):
+        raise ValueError(
+            f"Mismatch between the number of prefixes {len(prefixes)} "
+            f"and the number of commands {len(cmds)}.")
+
+    coro = _run_cmds_async(
+        cmds, max_workers, timeouts, prefixes, shell=shell,
+        preprocess=preprocess, cwd=change_path, encoding=encoding,
+        encerror=encerror, fLOG=fLOG)
+    try:
+        asyncio.get_running_loop()
+        running = True
+    except RuntimeError:
+        running = False
+    if running:
+        # an event loop is already running (notebook)
+        res = []
+        th = threading.Thread(target=lambda: res.append(asyncio.run(coro)))
+        th.start()
+        th.join()
+        if not res:
+            raise RunCmdException(  # pragma: no cover
+                "Unable to run the commands.")
+        res = res[0]
+    else:
+        res = asyncio.run(coro)
+
+    if raise_exception:
+        failed = [r for r in res if r['returncode'] != 0]
+        if failed:
+            mes = "\n".join(
+                f"CMD: {r['cmd']}\nCODE: {r['returncode']}\n"
+                f"#---ERR---#\n{r['err'] or r['error']}" for r in failed)
+            raise RunCmdException(
+                f"{len(failed)} command(s) failed.\n{mes}")
+    return res
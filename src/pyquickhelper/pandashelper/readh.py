@@ -3,11 +3,118 @@
 @file
 @brief Various ways to import data into a dataframe
 """
+import os
+import io
+import mmap
 import zipfile
-from io import StringIO, BytesIO
+from contextlib import contextmanager
 from ..filehelper import read_content_ufs
 
 
+class _MappedFile(io.RawIOBase):
+    """
+    Read-only file-like object on top of a :epkg:`mmap`,
+    *mmap* only implements *seekable* from :epkg:`Python` 3.13.
+    """
+
+    def __init__(self, mm):
+        io.RawIOBase.__init__(self)
+        self._mm = mm
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def read(self, size=-1):
+        return self._mm.read(None if size is None or size < 0 else size)
+
+    def readinto(self, b):
+        data = self._mm.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def seek(self, pos, whence=io.SEEK_SET):
+        self._mm.seek(pos, whence)
+        return self._mm.tell()
+
+    def tell(self):
+        return self._mm.tell()
+
+
+@contextmanager
+def _open_zip(filepath_or_buffer):
+    """
+    Opens a zip file, a local file is mapped in memory,
+    any other source is loaded with @see fn read_content_ufs.
+    """
+    if os.path.isfile(filepath_or_buffer) and os.path.getsize(filepath_or_buffer) > 0:
+        with open(filepath_or_buffer, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                with zipfile.ZipFile(_MappedFile(mm)) as myzip:
+                    yield myzip
+    else:
+        content = read_content_ufs(filepath_or_buffer, asbytes=True)
+        with zipfile.ZipFile(io.BytesIO(content)) as myzip:
+            yield myzip
+
+
+def _read_csv_member(myzip, name, params):
+    "Parses one member of a zip file without loading it in memory."
+    import pandas
+    encoding = params.pop('encoding', 'ascii')
+    try:
+        with myzip.open(name, "r") as f:
+            return pandas.read_csv(f, encoding=encoding, **params)
+    except pandas.errors.ParserError as e:  # pragma: no cover
+        with myzip.open(name, "r") as f:
+            lines = [f.readline().decode(encoding, errors="replace")
+                     for i in range(5)]
+        mes = "Parsing errors in '{0}', first lines:\n{1}".format(
+            name, "".join(lines))
+        raise RuntimeError(mes) from e
+
+
+def enumerate_csv_zip(filepath_or_buffer, fvalid=None, **params):
+    """
+    Enumerates the members of a zip file and parses them
+    with :epkg:`pandas:read_csv` one after the other.
+    The members are streamed to :epkg:`pandas`,
+    a local zip file is mapped in memory.
+
+    @param      filepath_or_buffer      filepath or url
+    @param      fvalid                  this function validates which member must be parsed
+                                        based on its name, the content of the other members
+                                        is returned (bytes)
+    @param      params                  see :epkg:`pandas:read_csv`
+    @return                             iterator on (name, dataframe or reader or bytes)
+
+    If *chunksize* or *iterator* is specified, every reader
+    must be consumed before the next member is requested.
+    """
+    import pandas
+    with _open_zip(filepath_or_buffer) as myzip:
+        infos = myzip.infolist()
+        if not infos:
+            raise FileNotFoundError(  # pragma: no cover
+                "unable to find a file in " + filepath_or_buffer)
+        lazy = params.get('chunksize', None) is not None or params.get(
+            'iterator', False)
+        for info in infos:
+            name = info.filename
+            if fvalid is not None and not fvalid(name):
+                yield name, myzip.read(name)
+            elif lazy:
+                encoding = params.get('encoding', 'ascii')
+                pars = {k: v for k, v in params.items() if k != 'encoding'}
+                with myzip.open(name, "r") as f:
+                    with pandas.read_csv(f, encoding=encoding, **pars) as reader:
+                        yield name, reader
+            else:
+                yield name, _read_csv_member(myzip, name, params.copy())
+
+
 def read_csv(filepath_or_buffer, compression=None, fvalid=None, **params):
     """
     Reads a file from a file, it adds the compression zip
@@ -22,43 +129,23 @@ def read_csv(filepath_or_buffer, compression=None, fvalid=None, **params):
                                         the function returns the content of the file in that case (bytes)
     @return                             dataframe or a dictionary (name, dataframe)
 
+    The members of a zip file are streamed to :epkg:`pandas`,
+    a local file is mapped in memory. If *chunksize* or *iterator*
+    is specified, the function returns an iterator on
+    *(name, reader)* for a zip file (see @see fn enumerate_csv_zip).
+
     See blog post :ref:`blogpost_read_csv`.
     """
     import pandas
     if isinstance(filepath_or_buffer, str) and \
        (compression == "zip" or (compression is None and
                                  filepath_or_buffer.endswith(".zip"))):
-        content = read_content_ufs(filepath_or_buffer, asbytes=True)
-        with zipfile.ZipFile(BytesIO(content)) as myzip:
-            infos = myzip.infolist()
-            if not infos:
-                raise FileNotFoundError(  # pragma: no cover
-                    "unable to find a file in " + filepath_or_buffer)
-            res = {}
-            for info in infos:
-                name = info.filename
-                with myzip.open(name, "r") as f:
-                    text = f.read()
-                if fvalid is not None and not fvalid(name):
-                    res[name] = text
-                else:
-                    if text is None:
-                        raise FileNotFoundError(  # pragma: no cover
-                            f"Empty file '{name}' in '{filepath_or_buffer}'")
-                    text = text.decode(
-                        encoding=params.get('encoding', 'ascii'))
-                    st = StringIO(text)
-                    try:
-                        df = pandas.read_csv(
-                            st, compression=compression, **params)
-                    except pandas.errors.ParserError as e:  # pragma: no cover
-                        lines = text.split("\n")
-                        end = min(len(lines), 5)
-                        mes = "Parsing errors in '{0}', first lines:\n{1}".format(
-                            name, "\n".join(lines[:end]))
-                        raise RuntimeError(mes) from e
-                    res[name] = df
-            return res if len(res) > 1 else list(res.values())[0]
-    else:
-        return pandas.read_csv(  # pragma: no cover
-            filepath_or_buffer, compression=compression, **params)
+        if params.get('chunksize', None) is not None or params.get('iterator', False):
+            return enumerate_csv_zip(filepath_or_buffer, fvalid=fvalid, **params)
+        res = dict(enumerate_csv_zip(filepath_or_buffer, fvalid=fvalid, **params))
+        return res if len(res) > 1 else list(res.values())[0]
+    if isinstance(filepath_or_buffer, str) and os.path.isfile(filepath_or_buffer) and \
+            params.get('engine', 'c') == 'c':
+        params.setdefault('memory_map', True)
+    return pandas.read_csv(
+        filepath_or_buffer, compression=compression, **params)
@@ -44,7 +44,8 @@ def main_wrapper_tests(logfile, skip_list=None, processes=False, add_coverage=Fa
                        coverage_exclude_lines=None, additional_ut_path=None,
                        covtoken=None, stdout=None, stderr=None,
                        filter_warning=None, dump_coverage=None,
-                       add_coverage_folder=None, coverage_root="src", fLOG=None):
+                       add_coverage_folder=None, coverage_root="src",
+                       n_workers=None, fLOG=None):
     """
     Calls function :func:`main <pyquickhelper.unittests.utils_tests.main>`
     and throws an exception if it fails.
@@ -72,6 +73,8 @@ def main_wrapper_tests(logfile, skip_list=None, processes=False, add_coverage=Fa
     @param      dump_coverage           dump or copy the coverage at this location
     @param      add_coverage_folder     additional coverage folder reports
     @param      coverage_root           subfolder for the coverage
+    @param      n_workers               runs the test files in a pool of *n_workers* processes,
+                                        see @see fn main_run_test
     @param      fLOG                    ``function(*l, **p)``, logging function
 
     *covtoken* can be a string ``<token>`` or a
@@ -164,7 +167,7 @@ def main_wrapper_tests(logfile, skip_list=None, processes=False, add_coverage=Fa
             runner, path_test=path, skip=-1, skip_list=skip_list,
             processes=processes, skip_function=skip_function,
             additional_ut_path=additional_ut_path, stdout=stdout, stderr=stderr,
-            filter_warning=filter_warning, fLOG=fLOG)
+            filter_warning=filter_warning, n_workers=n_workers, fLOG=fLOG)
         return res
 
     if "win" not in sys.platform and "DISPLAY" not in os.environ:
@@ -5,10 +5,13 @@
 import os
 import sys
 import glob
+import json
+import pickle
 import re
 import unittest
 import warnings
 from io import StringIO
+from time import perf_counter
 from .utils_tests_stringio import StringIOAndFile
 from .default_filter_warning import default_filter_warning
 from ..filehelper.synchelper import remove_folder
@@ -216,6 +219,116 @@ def import_files(li, additional_ut_path=None, fLOG=noLOG):
     return allsuite
 
 
+def load_test_durations(filename):
+    """
+    Loads the durations of the previous runs stored
+    by @see fn main_run_test.
+
+    @param      filename    json file
+    @return                 dictionary ``{ short name: list of durations }``
+    """
+    if filename is None or not os.path.exists(filename):
+        return {}
+    try:
+        with open(filename, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (ValueError, OSError) as e:  # pragma: no cover
+        warnings.warn(f"Unable to load {filename!r} due to {e}.", UserWarning)
+        return {}
+
+
+def save_test_durations(filename, history, durations, keep=5):
+    """
+    Adds the durations of a run to the history and saves it.
+
+    @param      filename    json file
+    @param      history     history returned by @see fn load_test_durations
+    @param      durations   dictionary ``{ short name: duration }``
+    @param      keep        number of runs to keep for every test
+    @return                 updated history
+    """
+    for k, v in durations.items():
+        history[k] = (history.get(k, []) + [v])[-keep:]
+    tmp = filename + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(history, f, indent=0, sort_keys=True)
+    os.replace(tmp, filename)
+    return history
+
+
+def schedule_longest_first(tasks, estimations):
+    """
+    Sorts tasks by decreasing expected duration.
+    Submitted in that order to a pool of workers,
+    it gives the *Longest Processing Time first* schedule.
+
+    @param      tasks           list of keys
+    @param      estimations     dictionary ``{ key: expected duration }``
+    @return                     sorted list of keys
+    """
+    return [t for _, t in sorted(
+        ((-estimations.get(t, 0), t) for t in tasks), key=lambda x: x[0])]
+
+
+class TestResultSummary:
+    """
+    Summary of a test result which can be sent by a
+    worker process, it behaves like :epkg:`*py:unittest:TestResult`
+    for function @see fn main_run_test.
+    """
+
+    def __init__(self, result):
+        self.testsRun = result.testsRun
+        self.errors = [(str(t), e) for t, e in result.errors]
+        self.failures = [(str(t), e) for t, e in result.failures]
+        self.skipped = [(str(t), e) for t, e in result.skipped]
+
+    def wasSuccessful(self):
+        "Tells if all tests passed."
+        return len(self.errors) == 0 and len(self.failures) == 0
+
+    def __repr__(self):
+        return "<%s run=%i errors=%i failures=%i>" % (
+            self.__class__.__name__, self.testsRun,
+            len(self.errors), len(self.failures))
+
+
+def _picklable_warning(w):
+    w = warnings.WarningMessage(w.message, w.category, w.filename,
+                                w.lineno, None, w.line)
+    try:
+        pickle.loads(pickle.dumps(w))
+        return w
+    except Exception:  # pylint: disable=W0703
+        # the warning class is probably defined in the test file
+        return warnings.WarningMessage(
+            UserWarning(f"{w.category.__name__}: {w.message}"), UserWarning,
+            w.filename, w.lineno, None, w.line)
+
+
+def _run_test_suite_worker(filename, index, additional_ut_path, verbosity):
+    """
+    Runs the *index*-th test suite of a test file in a worker process.
+    The function returns *(result summary, output, stderr, warnings, duration)*.
+    """
+    suite = import_files([filename], additional_ut_path=additional_ut_path)
+    stream = StringIO()
+    runner = unittest.TextTestRunner(verbosity=verbosity, stream=stream)
+    newstdr = StringIOAndFile(filename + ".err")
+    keepstdr = sys.stderr
+    sys.stderr = newstdr
+    try:
+        begin = perf_counter()
+        with warnings.catch_warnings(record=True) as w:
+            warnings.simplefilter("always")
+            r = runner.run(suite[index][0])
+        duration = perf_counter() - begin
+    finally:
+        sys.stderr = keepstdr
+    return (TestResultSummary(r), stream.getvalue(), newstdr.getvalue(),
+            [_picklable_warning(ww) for ww in w], duration)
+
+
 def clean(folder=None, fLOG=noLOG):
     """
     Does the cleaning.
@@ -255,7 +368,7 @@ def clean(folder=None, fLOG=noLOG):
 def main_run_test(runner, path_test=None, limit_max=1e9, log=False, skip=-1, skip_list=None,
                   on_stderr=False, processes=False, skip_function=None,
                   additional_ut_path=None, stdout=None, stderr=None, filter_warning=None,
-                  fLOG=noLOG):
+                  n_workers=None, durations_file=None, fLOG=noLOG):
     """
     Runs all unit tests,
     the function looks into the folder _unittest and extract from all files
@@ -282,6 +395,14 @@ def main_run_test(runner, path_test=None, limit_max=1e9, log=False, skip=-1, ski
                                     if None, the function filters out some recurrent warnings
                                     in jupyter (signature: ``def filter_warning(w: warning) -> bool``),
                                     @see fn default_filter_warning
+    @param      n_workers           if > 1, runs the test files in a pool of processes,
+                                    the longest ones first, the results are reported in the
+                                    same order as the sequential run
+    @param      durations_file      json file which keeps the durations of the last runs,
+                                    they are used to schedule the tests when *n_workers > 1*
+                                    (the ``(time=...s)`` hint is used for unknown tests),
+                                    if None, it is ``.test_durations.json`` in *path_test*
+                                    when *n_workers > 1*
     @param      fLOG                logging function
     @return                         dictionnary: ``{ "err": err, "tests":list of couple (file, test results) }``
     """
@@ -412,137 +533,213 @@ def main_run_test(runner, path_test=None, limit_max=1e9, log=False, skip=-1, ski
     original_stream = runner.stream.stream if isinstance(
         runner.stream.stream, StringIOAndFile) else None
 
+    # durations of the previous runs
+    if durations_file is None and n_workers is not None and n_workers > 1:
+        durations_file = os.path.join(
+            path_test or os.getcwd(), ".test_durations.json")
+    history = load_test_durations(durations_file)
+    measured = {}
+
+    # the tests are started in a pool of processes, longest first
+    futures = None
+    if n_workers is not None and n_workers > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        tasks = {}
+        count = {}
+        for i, s in enumerate(suite):
+            index_in_file = count.get(s[1], 0)
+            count[s[1]] = index_in_file + 1
+            if skip >= 0 and i < skip:
+                continue  # pragma: no cover
+            if i + 1 in skip_list:
+                continue  # pragma: no cover
+            cut = short_name(s[1])
+            if skip_function is not None:
+                with open(s[1], "r") as f:
+                    content = f.read()
+                if skip_function(s[1], content, duration.get(cut, None)):
+                    continue
+            tasks[i] = (s[1], index_in_file, cut)
+        estimations = {}
+        for i, (_, __, cut) in tasks.items():
+            past = history.get(cut, None)
+            estimations[i] = (sum(past) / len(past) if past
+                              else duration.get(cut, 0))
+        fLOG(f"[main_run_test] run {len(tasks)} suites with "
+             f"{n_workers} processes")
+        verbosity = getattr(runner, 'verbosity', 1)
+        executor = ProcessPoolExecutor(max_workers=n_workers)
+        futures = {}
+        try:
+            for i in schedule_longest_first(list(tasks), estimations):
+                futures[i] = executor.submit(
+                    _run_test_suite_worker, tasks[i][0], tasks[i][1],
+                    additional_ut_path, verbosity)
+        except BaseException:  # pragma: no cover
+            for fut in futures.values():
+                fut.cancel()
+            executor.shutdown()
+            raise
+
     # run all tests
     failed_test = {}
     n_runs = 0
     last_s = None
-    for i, s in enumerate(suite):
-        last_s = s
-        if skip >= 0 and i < skip:
-            continue  # pragma: no cover
-        if i + 1 in skip_list:
-            continue  # pragma: no cover
-        cut = os.path.split(s[1])
-        cut = os.path.split(cut[0])[-1] + "/" + cut[-1]
-        if skip_function is not None:
-            with open(s[1], "r") as f:
-                content = f.read()
-            if skip_function(s[1], content, duration.get(cut, None)):
-                continue
-
-        zzz = "running test % 3d, %s" % (i + 1, cut)
-        zzz += (60 - len(zzz)) * " "
-        memout.write(zzz)
-
-        # the errors are logged into a file just beside the test file
-        newstdr = StringIOAndFile(s[1] + ".err")
-        keepstdr = sys.stderr
-        sys.stderr = newstdr
-        list_warn = []
-
-        if processes:
-            cmd = sys.executable.replace("w.exe", ".exe") + " " + li[i]
-            out, err = run_cmd(cmd, wait=True)
-            if len(err) > 0:
-                sys.stderr.write(err)  # pragma: no cover
-        else:
-            with warnings.catch_warnings(record=True) as w:
-                warnings.simplefilter("always")
-                if original_stream is not None:
-                    original_stream.begin_test(s[1])
-                r = runner.run(s[0])
-                out = r.stream.getvalue()
-                if original_stream is not None:
-                    original_stream.end_test(s[1])
-                for ww in w:
-                    list_warn.append((ww, s))
-        n_runs += 1
-
-        ti = exp.findall(out)[-1]
-        # don't modify it, PyCharm does not get it right (ti is a tuple)
-        add = " ran %s tests in %ss" % ti
+    try:
+        for i, s in enumerate(suite):
+            last_s = s
+            if skip >= 0 and i < skip:
+                continue  # pragma: no cover
+            if i + 1 in skip_list:
+                continue  # pragma: no cover
+            cut = os.path.split(s[1])
+            cut = os.path.split(cut[0])[-1] + "/" + cut[-1]
+            if skip_function is not None:
+                with open(s[1], "r") as f:
+                    content = f.read()
+                if skip_function(s[1], content, duration.get(cut, None)):
+                    continue
 
-        sys.stderr = keepstdr
+            zzz = "running test % 3d, %s" % (i + 1, cut)
+            zzz += (60 - len(zzz)) * " "
+            memout.write(zzz)
 
-        memout.write(add)
+            # the errors are logged into a file just beside the test file
+            newstdr = StringIOAndFile(s[1] + ".err")
+            keepstdr = sys.stderr
+            sys.stderr = newstdr
+            list_warn = []
 
-        if not r.wasSuccessful():  # pragma: no cover
-            err = out.split("===========")
-            err = err[-1]
-            memout.write("\n")
-            failed_test[cut] = err
             try:
-                memout.write(err)
-            except UnicodeDecodeError:
-                err_e = err.decode("ascii", errors="ignore")
-                memout.write(err_e)
-            except UnicodeEncodeError:
-                try:
-                    err_e = err.encode("ascii", errors="ignore")
-                    memout.write(err_e)
-                except TypeError:
-                    err_e = err.encode("ascii", errors="ignore").decode(
-                        'ascii', errors='ingore')
-                    memout.write(err_e)
-
-            # stores the output in case of an error
-            with open(s[1] + ".err", "w", encoding="utf-8", errors="ignore") as f:
-                f.write(out)
-
-            fail += 1
-
-            fullstderr.write("\n#-----" + lis[i] + "\n")
-            fullstderr.write("OUT:\n")
-            fullstderr.write(out)
-
-            if err:
-                fullstderr.write("[pyqerror]o:\n")
+                begin = perf_counter()
+                if futures is not None:
+                    r, out, serr, w, dt = futures[i].result()
+                    if original_stream is not None:
+                        original_stream.begin_test(s[1])
+                    runner.stream.write(out)
+                    # same output as runner.run
+                    out = runner.stream.getvalue()
+                    if original_stream is not None:
+                        original_stream.end_test(s[1])
+                    if serr:
+                        sys.stderr.write(serr)
+                    for ww in w:
+                        list_warn.append((ww, s))
+                elif processes:
+                    cmd = sys.executable.replace("w.exe", ".exe") + " " + li[i]
+                    out, err = run_cmd(cmd, wait=True)
+                    if len(err) > 0:
+                        sys.stderr.write(err)  # pragma: no cover
+                else:
+                    with warnings.catch_warnings(record=True) as w:
+                        warnings.simplefilter("always")
+                        if original_stream is not None:
+                            original_stream.begin_test(s[1])
+                        r = runner.run(s[0])
+                        out = r.stream.getvalue()
+                        if original_stream is not None:
+                            original_stream.end_test(s[1])
+                        for ww in w:
+                            list_warn.append((ww, s))
+                if futures is None:
+                    dt = perf_counter() - begin
+                measured[cut] = measured.get(cut, 0) + dt
+                n_runs += 1
+
+                ti = exp.findall(out)[-1]
+                # don't modify it, PyCharm does not get it right (ti is a tuple)
+                add = " ran %s tests in %ss" % ti
+            finally:
+                sys.stderr = keepstdr
+
+            memout.write(add)
+
+            if not r.wasSuccessful():  # pragma: no cover
+                err = out.split("===========")
+                err = err[-1]
+                memout.write("\n")
+                failed_test[cut] = err
                 try:
-                    fullstderr.write(err)
+                    memout.write(err)
                 except UnicodeDecodeError:
                     err_e = err.decode("ascii", errors="ignore")
-                    fullstderr.write(err_e)
+                    memout.write(err_e)
                 except UnicodeEncodeError:
-                    err_e = err.encode("ascii", errors="ignore")
-                    fullstderr.write(err_e)
-
-            list_warn = [(w, s) for w, s in list_warn if filter_warning(w)]
-            if len(list_warn) > 0:
-                fullstderr.write("*[pyqwarning]:\n")
-                warndone = set()
-                for w, slw in list_warn:
-                    sw = str(slw)
-                    if sw not in warndone:
-                        # we display only one time the same warning
-                        fullstderr.write(f"w{i}: {sw}\n")
-                        warndone.add(sw)
-            serr = newstdr.getvalue()
-            if serr.strip(" \n\r\t"):
-                fullstderr.write("ERRs:\n")
-                fullstderr.write(serr)
-        else:
-            list_warn = [(w, s) for w, s in list_warn if filter_warning(w)]
-            allwarn.append((lis[i], list_warn))
-            val = newstdr.getvalue()
-            if val.strip(" \n\r\t"):
-                # Remove most of the Sphinx warnings (sphinx < 1.8)
-                lines = val.strip(" \n\r\t").split("\n")
-                lines = [
-                    _ for _ in lines if _ and "is already registered, it will be overridden" not in _]
-                val = "\n".join(lines)
-            if len(val) > 0 and is_valid_error(val):  # pragma: no cover
-                fullstderr.write("\n*-----" + lis[i] + "\n")
+                    try:
+                        err_e = err.encode("ascii", errors="ignore")
+                        memout.write(err_e)
+                    except TypeError:
+                        err_e = err.encode("ascii", errors="ignore").decode(
+                            'ascii', errors='ingore')
+                        memout.write(err_e)
+
+                # stores the output in case of an error
+                with open(s[1] + ".err", "w", encoding="utf-8", errors="ignore") as f:
+                    f.write(out)
+
+                fail += 1
+
+                fullstderr.write("\n#-----" + lis[i] + "\n")
+                fullstderr.write("OUT:\n")
+                fullstderr.write(out)
+
+                if err:
+                    fullstderr.write("[pyqerror]o:\n")
+                    try:
+                        fullstderr.write(err)
+                    except UnicodeDecodeError:
+                        err_e = err.decode("ascii", errors="ignore")
+                        fullstderr.write(err_e)
+                    except UnicodeEncodeError:
+                        err_e = err.encode("ascii", errors="ignore")
+                        fullstderr.write(err_e)
+
+                list_warn = [(w, s) for w, s in list_warn if filter_warning(w)]
                 if len(list_warn) > 0:
-                    fullstderr.write("[main_run_test] +WARN:\n")
-                    for w, _ in list_warn:
-                        fullstderr.write(
-                            f"[in:{cut}] w{i}: {str(w)}\n")
+                    fullstderr.write("*[pyqwarning]:\n")
+                    warndone = set()
+                    for w, slw in list_warn:
+                        sw = str(slw)
+                        if sw not in warndone:
+                            # we display only one time the same warning
+                            fullstderr.write(f"w{i}: {sw}\n")
+                            warndone.add(sw)
+                serr = newstdr.getvalue()
+                if serr.strip(" \n\r\t"):
+                    fullstderr.write("ERRs:\n")
+                    fullstderr.write(serr)
+            else:
+                list_warn = [(w, s) for w, s in list_warn if filter_warning(w)]
+                allwarn.append((lis[i], list_warn))
+                val = newstdr.getvalue()
                 if val.strip(" \n\r\t"):
-                    fullstderr.write(f"[in:{cut}] ERRv:\n")
-                    fullstderr.write(val)
+                    # Remove most of the Sphinx warnings (sphinx < 1.8)
+                    lines = val.strip(" \n\r\t").split("\n")
+                    lines = [
+                        _ for _ in lines if _ and "is already registered, it will be overridden" not in _]
+                    val = "\n".join(lines)
+                if len(val) > 0 and is_valid_error(val):  # pragma: no cover
+                    fullstderr.write("\n*-----" + lis[i] + "\n")
+                    if len(list_warn) > 0:
+                        fullstderr.write("[main_run_test] +WARN:\n")
+                        for w, _ in list_warn:
+                            fullstderr.write(
+                                f"[in:{cut}] w{i}: {str(w)}\n")
+                    if val.strip(" \n\r\t"):
+                        fullstderr.write(f"[in:{cut}] ERRv:\n")
+                        fullstderr.write(val)
 
-        memout.write("\n")
-        keep.append((last_s[1], r))
+            memout.write("\n")
+            keep.append((last_s[1], r))
+    finally:
+        if futures is not None:
+            # pending suites are cancelled if a test could not be processed
+            for fut in futures.values():
+                fut.cancel()
+            executor.shutdown()
+
+    if durations_file is not None:
+        save_test_durations(durations_file, history, measured)
 
     # displays
     memout.write("[main_run_test] ---- END UT\n")
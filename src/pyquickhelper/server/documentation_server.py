@@ -7,7 +7,11 @@ import sys
 import os
 import subprocess
 import copy
-import datetime
+import gzip
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 try:
     from urllib.parse import urlparse, parse_qs
 except ImportError:  # pragma: no cover
@@ -33,6 +37,135 @@ else:
     from ..loghelper.url_helper import get_url_content
 
 
+class DocumentationCache:
+    """
+    Thread-safe cache for the files served by
+    @see cl DocumentationHandler. It keeps the most recently used
+    files within a budget in bytes. An entry is invalidated as soon as
+    the file changes (modification time, inode or size).
+
+    @param      max_bytes       maximum number of bytes the cache may hold
+    """
+
+    def __init__(self, max_bytes=2 ** 26):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def signature(filename):
+        """
+        Returns what identifies a version of a file:
+        *(modification time in nanoseconds, inode, size)*,
+        None if the file does not exist.
+        """
+        try:
+            st = os.stat(filename)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_ino, st.st_size
+
+    @staticmethod
+    def etag(sig):
+        """
+        Builds an ETag from a signature returned by
+        @see me signature.
+        """
+        return '"%x-%x-%x"' % sig
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, sig):
+        """
+        Retrieves a file from the cache.
+
+        @param      key         key (usually the filename)
+        @param      sig         current signature of the file
+        @return                 content or None if not found or outdated
+        """
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is not None and entry["sig"] != sig:
+                self._remove(key)
+                self.invalidations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            entry["nb"] += 1
+            self.hits += 1
+            return entry["content"]
+
+    def set(self, key, content, sig):
+        """
+        Adds or replaces a file in the cache, removes the least
+        recently used files if the cache becomes too big.
+        A file bigger than the budget is not cached.
+
+        @param      key         key (usually the filename)
+        @param      content     content (str or bytes)
+        @param      sig         signature of the file (see @see me signature)
+        """
+        size = len(content.encode("utf-8") if isinstance(content, str)
+                   else content)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return
+            while self._entries and self.nbytes + size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            self._entries[key] = dict(content=content, sig=sig,
+                                      size=size, nb=1)
+            self.nbytes += size
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self.nbytes -= entry["size"]
+
+    def clear(self):
+        """
+        Empties the cache and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+            self.hits = self.misses = 0
+            self.evictions = self.invalidations = 0
+
+    def most_requested(self, n=20):
+        """
+        Returns the most requested files as a list
+        of tuple *(number of requests, key)*.
+        """
+        with self._lock:
+            al = [(v["nb"], k) for k, v in self._entries.items()]
+        return sorted(al, reverse=True)[:n]
+
+    def stats(self):
+        """
+        Returns the cache statistics as a dictionary.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return dict(entries=len(self._entries), bytes=self.nbytes,
+                        max_bytes=self.max_bytes, hits=self.hits,
+                        misses=self.misses, evictions=self.evictions,
+                        invalidations=self.invalidations,
+                        hit_ratio=self.hits / total if total else 0.)
+
+
 class DocumentationHandler(BaseHTTPRequestHandler):
 
     """
@@ -43,6 +176,7 @@ class DocumentationHandler(BaseHTTPRequestHandler):
 
     mappings = {"__fetchurl__": "http://",
                 "__shutdown__": "shut://",
+                "__stats__": "stats://",
                 }
 
     html_header = """
@@ -59,9 +193,7 @@ class DocumentationHandler(BaseHTTPRequestHandler):
             </html>
             """.replace("            ", "")
 
-    cache = {}
-    cache_attributes = {}
-    cache_refresh = datetime.timedelta(1)
+    cache = DocumentationCache()
 
     def LOG(self, *args, **kwargs):
         """
@@ -144,6 +276,14 @@ class DocumentationHandler(BaseHTTPRequestHandler):
         ".woff": ('application/font-wof', 'rb'),
     }
 
+    # extensions of files modified before being sent
+    converted_extensions = {".html", ".py", ".c", ".cpp", ".hpp", ".h",
+                            ".r", ".sql", ".java", ".cc"}
+    # precompressed variants, by order of preference
+    precompressed = [("br", ".br"), ("gzip", ".gz")]
+    # files bigger than this are not cached but directly sent
+    sendfile_threshold = 2 ** 16
+
     @staticmethod
     def get_ftype(apath):
         """
@@ -160,22 +300,55 @@ class DocumentationHandler(BaseHTTPRequestHandler):
         htype, ftype = DocumentationHandler.media_types.get(ext, ('', ''))
         return htype, ftype
 
-    def send_headers(self, path):
+    def send_headers(self, path, etag=None):
         """
         defines the header to send (type of files) based on path
         @param      path        location (a string)
+        @param      etag        adds header ``ETag`` if not None
         @return                 type (html, css, ...)
         """
         htype, ftype = self.get_ftype(path)
 
         if htype != '':
             self.send_header('Content-type', htype)
-            self.end_headers()
         else:
             self.send_header('Content-type', 'text/plain')
-            self.end_headers()
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
         return ftype
 
+    @staticmethod
+    def _access_path(localpath, ftype, path=None):
+        """
+        Returns the key in the cache and the file to read.
+        """
+        if path is not None:
+            tlocalpath = os.path.join(path, localpath)
+        else:
+            tlocalpath = localpath
+        if not os.path.exists(
+                tlocalpath) and "_static/bootswatch" in tlocalpath:
+            access = tlocalpath.replace("bootswatch", "bootstrap")
+        else:
+            access = tlocalpath
+        return tlocalpath, access
+
+    def get_file_etag(self, localpath, ftype, path=None):
+        """
+        Returns the ETag of a local file, the value changes
+        every time the file is modified.
+
+        @param      localpath       local filename
+        @param      ftype           r or rb
+        @param      path            if != None, the filename will be path/localpath
+        @return                     etag or None if the file does not exist
+        """
+        _, access = self._access_path(localpath, ftype, path)
+        sig = DocumentationCache.signature(access)
+        return None if sig is None else DocumentationCache.etag(sig)
+
     def get_file_content(self, localpath, ftype, path=None):
         """
         Returns the content of a local file.
@@ -185,105 +358,68 @@ class DocumentationHandler(BaseHTTPRequestHandler):
         @param      path            if != None, the filename will be path/localpath
         @return                     content
 
-        This function implements a simple cache mechanism.
+        This function implements a simple cache mechanism,
+        see @see cl DocumentationCache.
         """
-        if path is not None:
-            tlocalpath = os.path.join(path, localpath)
-        else:
-            tlocalpath = localpath
+        tlocalpath, access = self._access_path(localpath, ftype, path)
+        sig = DocumentationCache.signature(access)
+        if sig is None:
+            self.LOG("** w,unable to find: ", access)
+            return None
 
-        content = DocumentationHandler.get_from_cache(tlocalpath)
+        content = DocumentationHandler.get_from_cache(tlocalpath, sig)
         if content is not None:
             self.LOG("serves cached", tlocalpath)
             return content
 
+        self.LOG("reading file ", access)
         if ftype in ("r", "execute"):
-            if not os.path.exists(
-                    tlocalpath) and "_static/bootswatch" in tlocalpath:
-                access = tlocalpath.replace("bootswatch", "bootstrap")
-            else:
-                access = tlocalpath
-
-            if not os.path.exists(access):
-                self.LOG("** w,unable to find: ", access)
-                return None
-
-            self.LOG("reading file ", access)
             with open(access, "r", encoding="utf8") as f:
                 content = f.read()
-                DocumentationHandler.update_cache(tlocalpath, content)
-                return content
         else:  # pragma: no cover
-            if not os.path.exists(
-                    tlocalpath) and "_static/bootswatch" in tlocalpath:
-                access = tlocalpath.replace("bootswatch", "bootstrap")
-            else:
-                access = tlocalpath
-
-            if not os.path.exists(access):
-                self.LOG("** w,unable to find: ", access)
-                return None
-
-            self.LOG("reading file ", access)
-            with open(tlocalpath, "rb") as f:
+            with open(access, "rb") as f:
                 content = f.read()
-                DocumentationHandler.update_cache(tlocalpath, content)
-                return content
+        DocumentationHandler.update_cache(tlocalpath, content, sig)
+        return content
 
     @staticmethod
-    def get_from_cache(key):
+    def get_from_cache(key, sig=None):
         """
-        Retrieves a file from the cache if it was cached,
-        it the file was added later than a day, it returns None.
+        Retrieves a file from the cache if it was cached
+        and if it was not modified since then.
 
         @param      key     key
+        @param      sig     signature of the file (see @see me signature),
+                            if None, it is computed from *key*
         @return             content or None if None found or too old
         """
-        content = DocumentationHandler.cache.get(key, None)
-        if content is None:
-            return content
-
-        att = DocumentationHandler.cache_attributes[key]
-        delta = datetime.datetime.now() - att["date"]
-        if delta > DocumentationHandler.cache_refresh:  # pragma: no cover
-            del DocumentationHandler.cache[key]
-            del DocumentationHandler.cache_attributes[key]
-            return None
-        else:
-            DocumentationHandler.cache_attributes[key]["nb"] += 1
-            return content
+        if sig is None:
+            sig = DocumentationCache.signature(key)
+        return DocumentationHandler.cache.get(key, sig)
 
     @staticmethod
-    def update_cache(key, content):
+    def update_cache(key, content, sig=None):
         """
-        Updates the cache.
+        Updates the cache, the least recently used files are
+        removed if the cache exceeds its budget.
 
         @param      key         key
         @param      content     content to place
+        @param      sig         signature of the file (see @see me signature),
+                                if None, it is computed from *key*
         """
-        if len(DocumentationHandler.cache) < 5000:
-            # we do not clean here as the cache is shared by every session/user
-            # it would not be safe
-            # unless we add protection
-            # self.clean_cache(1000)
-            pass
-
-        # this one first as a document existence is checked by using cache
-        DocumentationHandler.cache_attributes[key] = {"nb": 1,
-                                                      "date": datetime.datetime.now()}
-        DocumentationHandler.cache[key] = content
+        if sig is None:
+            sig = DocumentationCache.signature(key)
+        DocumentationHandler.cache.set(key, content, sig)
 
     @staticmethod
     def _print_cache(n=20):  # pragma: no cover
         """
         Displays the most requested files.
         """
-        al = [(v["nb"], k)
-              for k, v in DocumentationHandler.cache_attributes.items() if v["nb"] > 1]
-        for i, doc in enumerate(sorted(al, reverse=True)):
-            if i >= n:
-                break
-            print("cache: {0} - {1}".format(*doc))
+        for doc in DocumentationHandler.cache.most_requested(n):
+            if doc[0] > 1:
+                print("cache: {0} - {1}".format(*doc))
 
     @staticmethod
     def execute(localpath):  # pragma: no cover
@@ -378,6 +514,12 @@ class DocumentationHandler(BaseHTTPRequestHandler):
                 self.LOG("call shutdown")
                 self.shutdown()
 
+            elif value == "stats://":
+                self.send_response(200)
+                self.send_header('Content-type', 'application/json')
+                self.end_headers()
+                self.feed(json.dumps(DocumentationHandler.cache.stats()))
+
             elif value == "http://":  # pragma: no cover
                 self.send_response(200)
                 self.send_headers("debug.html")
@@ -404,7 +546,6 @@ class DocumentationHandler(BaseHTTPRequestHandler):
                     fullpath = os.path.join(value, localpath)
                     self.LOG("localpath ", fullpath, os.path.isfile(fullpath))
 
-                    self.send_response(200)
                     _, ftype = self.get_ftype(localpath)
 
                     execute = eval(params.get("execute", ["True"])[0])
@@ -412,28 +553,38 @@ class DocumentationHandler(BaseHTTPRequestHandler):
                     # keep = eval(params.get("keep", ["False"])[0])
 
                     if ftype != 'execute' or not execute:
+                        if self.serve_static_file(fullpath, localpath, spath):
+                            return
+                        etag = self.get_file_etag(fullpath, ftype, spath)
+                        if etag is not None and etag == self.headers.get(
+                                'If-None-Match', None):
+                            # the browser already has this version
+                            self.send_response(304)
+                            self.send_header('ETag', etag)
+                            self.end_headers()
+                            return
                         content = self.get_file_content(fullpath, ftype, spath)
                         if content is None:  # pragma: no cover
                             self.LOG("** w,unable to get file for key:", spath)
                             self.send_error(404)
-                            self.feed(
-                                f"Requested resource {localpath} unavailable")
                         else:
+                            self.send_response(200)
                             ext = os.path.splitext(localpath)[-1].lower()
                             if ext in [
                                     ".py", ".c", ".cpp", ".hpp", ".h", ".r", ".sql", ".java", ".cc"]:
-                                self.send_headers(".html")
+                                self.send_headers(".html", etag)
                                 self.feed(
                                     DocumentationHandler.html_code_renderer(localpath, content))
                             elif ext in [".html"]:
                                 content = DocumentationHandler.process_html_path(
                                     project, content)
-                                self.send_headers(localpath)
+                                self.send_headers(localpath, etag)
                                 self.feed(content)
                             else:
-                                self.send_headers(localpath)
+                                self.send_headers(localpath, etag)
                                 self.feed(content)
                     else:  # pragma: no cover
+                        self.send_response(200)
                         self.LOG("execute file ", localpath)
                         out, err = DocumentationHandler.execute(localpath)
                         if len(err) > 0:
@@ -444,6 +595,63 @@ class DocumentationHandler(BaseHTTPRequestHandler):
                             self.send_headers(localpath)
                             self.feed(out)
 
+    def _accepted_encodings(self):
+        accept = self.headers.get('Accept-Encoding', '') or ''
+        return set(e.split(';')[0].strip() for e in accept.split(','))
+
+    def serve_static_file(self, localpath, url, path=None):
+        """
+        Serves a static file without loading it in memory
+        (it uses :epkg:`sendfile` if the platform supports it).
+        That happens if the file is big (more than *sendfile_threshold*
+        bytes) or if a precompressed variant (``.br``, ``.gz``)
+        accepted by the client exists and is not older than the file.
+        Pages converted before being sent (HTML, code) are excluded.
+
+        @param      localpath       local filename
+        @param      url             requested path
+        @param      path            if != None, the filename will be path/localpath
+        @return                     True if the file was served
+        """
+        ext = os.path.splitext(url)[-1].lower()
+        if ext in DocumentationHandler.converted_extensions:
+            return False
+        _, access = self._access_path(localpath, None, path)
+        sig = DocumentationCache.signature(access)
+        if sig is None:
+            return False
+
+        filename, encoding = access, None
+        accepted = self._accepted_encodings()
+        for enc, suffix in DocumentationHandler.precompressed:
+            if enc not in accepted:
+                continue
+            vsig = DocumentationCache.signature(access + suffix)
+            if vsig is not None and vsig[0] >= sig[0]:
+                filename, encoding, sig = access + suffix, enc, vsig
+                break
+        if encoding is None and sig[2] < DocumentationHandler.sendfile_threshold:
+            return False
+
+        etag = DocumentationCache.etag(sig)
+        if etag == self.headers.get('If-None-Match', None):
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return True
+
+        with open(filename, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.send_response(200)
+            if encoding is not None:
+                self.send_header('Content-Encoding', encoding)
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', str(size))
+            self.send_headers(url, etag)
+            self.wfile.flush()
+            self.connection.sendfile(f)
+        return True
+
     @staticmethod
     def process_html_path(project, content):
         """
@@ -506,6 +714,102 @@ class DocumentationHandler(BaseHTTPRequestHandler):
         self.feed(content)
 
 
+class DocumentationPoolServer(HTTPServer):
+
+    """
+    Server which processes the requests with a bounded
+    pool of threads. Unlike :epkg:`ThreadingHTTPServer`,
+    it does not create one thread per connection.
+
+    @param      server_address      address, tuple *(host, port)*
+    @param      handler             handler class
+    @param      max_workers         number of threads
+    """
+
+    daemon_threads = True
+
+    def __init__(self, server_address, handler, max_workers=16):
+        HTTPServer.__init__(self, server_address, handler)
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="DocServer")
+
+    def _process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:  # pylint: disable=W0703
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        """
+        Queues the request, it is processed by the first
+        available thread.
+        """
+        self.executor.submit(self._process_request_thread,
+                             request, client_address)
+
+    def server_close(self):
+        """
+        Closes the server and waits for the pending requests.
+        """
+        HTTPServer.server_close(self)
+        self.executor.shutdown(wait=True)
+
+
+def precompress_folder(folder, extensions=(".js", ".css", ".svg", ".txt", ".json"),
+                       min_size=1024, brotli=True, fLOG=None):
+    """
+    Writes a compressed copy of every static file of a folder
+    (``.gz`` and ``.br`` if :epkg:`brotli` is installed),
+    @see cl DocumentationHandler sends them to clients accepting
+    these encodings. A file is compressed again only if it was
+    modified after its compressed copy.
+
+    @param      folder          folder
+    @param      extensions      extensions to compress
+    @param      min_size        files smaller than this are not compressed
+    @param      brotli          also compresses with :epkg:`brotli` if installed
+    @param      fLOG            logging function
+    @return                     list of created files
+    """
+    brotli_module = None
+    if brotli:
+        try:
+            import brotli as brotli_module  # pylint: disable=E0401
+        except ImportError:  # pragma: no cover
+            brotli_module = None
+
+    created = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if os.path.splitext(name)[-1].lower() not in extensions:
+                continue
+            full = os.path.join(root, name)
+            st = os.stat(full)
+            if st.st_size < min_size:
+                continue
+            codecs = [(".gz", lambda b: gzip.compress(b, mtime=0))]
+            if brotli_module is not None:
+                codecs.append((".br", brotli_module.compress))
+            data = None
+            for suffix, fct in codecs:
+                dest = full + suffix
+                if (os.path.exists(dest) and
+                        os.stat(dest).st_mtime_ns >= st.st_mtime_ns):
+                    continue
+                if data is None:
+                    with open(full, "rb") as f:
+                        data = f.read()
+                with open(dest, "wb") as f:
+                    f.write(fct(data))
+                created.append(dest)
+                if fLOG is not None:
+                    fLOG("[precompress_folder] ", dest)
+    return created
+
+
 class DocumentationThreadServer (Thread):
 
     """
@@ -540,7 +844,8 @@ class DocumentationThreadServer (Thread):
         self.server.server_close()
 
 
-def run_doc_server(server, mappings, thread=False, port=8079):
+def run_doc_server(server, mappings, thread=False, port=8079, cache_size=None,
+                   max_workers=None):
     """
     Runs the server.
 
@@ -550,6 +855,11 @@ def run_doc_server(server, mappings, thread=False, port=8079):
                             and the function returns right away,
                             otherwise, it runs the server.
     @param      port        port to use
+    @param      cache_size  maximum size of the cache in bytes
+                            (see @see cl DocumentationCache), None to keep the current one
+    @param      max_workers if not None, the server processes the requests with that
+                            number of threads (see @see cl DocumentationPoolServer),
+                            otherwise they are processed one by one
     @return                 server if thread is False, the thread otherwise (the thread is started)
 
     .. faqref::
@@ -566,15 +876,27 @@ def run_doc_server(server, mappings, thread=False, port=8079):
 
         The same server can serves more than one project.
         More than one mappings can be sent.
+        Statistics about the cache are available at
+        ``http://localhost:8079/__stats__/``.
+        Parameter *max_workers* processes the requests in parallel,
+        function @see fn precompress_folder creates compressed
+        copies of the static files.
     """
     for k, v in mappings.items():
         DocumentationHandler.add_mapping(k, v)
+    if cache_size is not None:
+        DocumentationHandler.cache = DocumentationCache(cache_size)
+
+    def create_server(host):
+        if max_workers is None:
+            return HTTPServer((host, port), DocumentationHandler)
+        return DocumentationPoolServer(
+            (host, port), DocumentationHandler, max_workers=max_workers)
 
     if server is None:
-        server = HTTPServer(  # pragma: no cover
-            ('localhost', port), DocumentationHandler)
+        server = create_server('localhost')  # pragma: no cover
     elif isinstance(server, str):
-        server = HTTPServer((server, port), DocumentationHandler)
+        server = create_server(server)
     elif not isinstance(server, HTTPServer):  # pragma: no cover
         raise TypeError(  # pragma: no cover
             "unexpected type for server: " + str(type(server)))
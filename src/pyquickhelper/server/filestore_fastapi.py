@@ -5,8 +5,12 @@
 """
 import os
 import io
+import json
+import hashlib
 from typing import Optional
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, Response, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel  # pylint: disable=E0611
 from .filestore_sqlite import SqlLite3FileStore
 
@@ -24,6 +28,8 @@ class Item(BaseModel):
 class Metric(BaseModel):
     name: Optional[str]
     project: Optional[str]
+    cursor: Optional[int]  # pylint: disable=E1136
+    limit: Optional[int]  # pylint: disable=E1136
     password: str
 
 
@@ -32,6 +38,8 @@ class Query(BaseModel):
     team: Optional[str]  # pylint: disable=E1136
     project: Optional[str]  # pylint: disable=E1136
     version: Optional[int]  # pylint: disable=E1136
+    cursor: Optional[int]  # pylint: disable=E1136
+    limit: Optional[int]  # pylint: disable=E1136
     password: str
 
 
@@ -41,72 +49,180 @@ class QueryL(BaseModel):
     project: Optional[str]  # pylint: disable=E1136
     version: Optional[int]  # pylint: disable=E1136
     limit: Optional[int]  # pylint: disable=E1136
+    cursor: Optional[int]  # pylint: disable=E1136
     password: str
 
 
-def create_fast_api_app(db_path, password):
+class QueryCsv(BaseModel):
+    id: int
+    chunksize: Optional[int]  # pylint: disable=E1136
+    password: str
+
+
+def _content_to_json(r):
     """
-    Creates a :epkg:`REST` application based on :epkg:`FastAPI`.
+    Converts the content of a file into something
+    which can be serialized into :epkg:`json`.
+    Dataframes are always sent as CSV.
+    """
+    if "content" in r:
+        content = r['content']
+        if hasattr(content, 'load'):
+            content = content.load()
+        if hasattr(content, 'to_csv'):
+            st = io.StringIO()
+            content.to_csv(st, index=False, encoding="utf-8")
+            content = st.getvalue()
+            r['format'] = 'df'
+        elif isinstance(content, bytes):
+            content = content.decode("utf-8")
+        r['content'] = content
+    return r
+
+
+def _compute_etag(rows):
+    """
+    Computes an :epkg:`ETag` for a list of files.
+    A file is never modified once it is stored,
+    its identifier and its date are enough.
+    """
+    h = hashlib.sha256()
+    for r in rows:
+        h.update(f"{r['id']}|{r.get('date', '')};".encode("utf-8"))
+    return f'"{h.hexdigest()[:32]}"'
+
 
+def create_fast_api_app(db_path, password, batch_size=100):
+    """
+    Creates a :epkg:`REST` application based on :epkg:`FastAPI`.
+    Every call to the database runs in a threadpool and
+    does not block the event loop.
+
+    * ``/query/``, ``/metrics/``, ``/content/`` accept a *cursor*
+      (the last identifier received) and a *limit*, the response
+      header ``X-Next-Cursor`` is set if more results are available,
+    * ``/content/`` returns an :epkg:`ETag`, the server answers
+      with status 304 if header ``If-None-Match`` matches it,
+    * ``/content/stream/`` streams the files as :epkg:`json` lines,
+    * ``/content/csv/`` streams one dataframe as CSV, chunk by chunk.
+
+    :param db_path: database
+    :param password: password
+    :param batch_size: number of files retrieved at once from the
+        database by streaming endpoints
     :return: app
     """
     store = SqlLite3FileStore(db_path)
 
+    def check_password_(query):
+        if query.password != password:
+            raise HTTPException(status_code=401, detail="Wrong password")
+
+    def page_(fct, limit, response, **kwargs):
+        # One more row tells if another page is available.
+        res = list(fct(limit=None if limit is None else limit + 1, **kwargs))
+        if limit is not None and len(res) > limit:
+            res = res[:limit]
+            response.headers["X-Next-Cursor"] = str(res[-1]['id'])
+        return res
+
     async def get_root():
         return {"pyquickhelper": "FastAPI to load and query files"}
 
     async def submit(item: Item, request: Request):
-        if item.password != password:
-            raise HTTPException(status_code=401, detail="Wrong password")
+        check_password_(item)
         kwargs = dict(name=item.name, format=item.format,
                       team=item.team, project=item.project,
                       version=item.version, content=item.content)
         kwargs['metadata'] = dict(client=request.client)
-        res = store.submit(**kwargs)
+        res = await run_in_threadpool(store.submit, **kwargs)
         if 'content' in res:
             del res['content']
         return res
 
-    async def metrics(query: Metric, request: Request):
-        if query.password != password:
-            raise HTTPException(status_code=401, detail="Wrong password")
-        res = list(store.enumerate_data(
-            name=query.name, project=query.project, join=True))
+    async def metrics(query: Metric, request: Request, response: Response):
+        check_password_(query)
+        return await run_in_threadpool(
+            page_, store.enumerate_data, query.limit, response,
+            name=query.name, project=query.project, join=True,
+            after_id=query.cursor)
+
+    async def query(query: Query, request: Request, response: Response):
+        check_password_(query)
+        return await run_in_threadpool(
+            page_, store.enumerate, query.limit, response,
+            name=query.name, team=query.team, project=query.project,
+            version=query.version, after_id=query.cursor)
+
+    async def content(query: QueryL, request: Request, response: Response):
+        check_password_(query)
+        limit = 5 if query.limit is None else query.limit
+
+        def content_():
+            res = page_(store.enumerate_content, limit, response,
+                        name=query.name, team=query.team,
+                        project=query.project, version=query.version,
+                        after_id=query.cursor, lazy=True)
+            etag = _compute_etag(res)
+            response.headers["ETag"] = etag
+            if request.headers.get("If-None-Match", None) == etag:
+                # the client already has the content
+                return None
+            return [_content_to_json(r) for r in res]
+
+        res = await run_in_threadpool(content_)
+        if res is None:
+            return Response(status_code=304,
+                            headers={"ETag": response.headers["ETag"]})
         return res
 
-    async def query(query: Query, request: Request):
-        if query.password != password:
-            raise HTTPException(status_code=401, detail="Wrong password")
-        res = list(store.enumerate(name=query.name, team=query.team,
-                                   project=query.project, version=query.version))
-        return res
-
-    async def content(query: QueryL, request: Request):
-        if query.password != password:
-            raise HTTPException(status_code=401, detail="Wrong password")
-        if query.limit is None:
-            limit = 5
-        else:
-            limit = query.limit
-        res = []
-        for r in store.enumerate_content(
-                name=query.name, team=query.team, project=query.project,
-                version=query.version):
-            if len(res) >= limit:
-                break
-            if "content" in r:
-                content = r['content']
-                if hasattr(content, 'to_csv'):
-                    st = io.StringIO()
-                    content.to_csv(st, index=False, encoding="utf-8")
-                    r['content'] = st.getvalue()
-            res.append(r)
-        return res
+    async def content_stream(query: QueryL, request: Request):
+        check_password_(query)
+
+        def iterate_():
+            # Every call to next runs in a thread of the threadpool,
+            # a batch is entirely retrieved before anything is yielded.
+            after_id, n = query.cursor, 0
+            while query.limit is None or n < query.limit:
+                size = batch_size if query.limit is None else min(
+                    batch_size, query.limit - n)
+                batch = list(store.enumerate_content(
+                    name=query.name, team=query.team, project=query.project,
+                    version=query.version, after_id=after_id, limit=size))
+                for r in batch:
+                    yield json.dumps(_content_to_json(r)) + "\n"
+                n += len(batch)
+                if len(batch) < size:
+                    break
+                after_id = batch[-1]['id']
+
+        return StreamingResponse(iterate_(), media_type="application/x-ndjson")
+
+    async def content_csv(query: QueryCsv, request: Request):
+        check_password_(query)
+        chunksize = query.chunksize or 10000
+        df = await run_in_threadpool(store.get_content, query.id)
+        if df is None:
+            raise HTTPException(status_code=404, detail="Unknown file")
+        if not hasattr(df, 'to_csv'):
+            raise HTTPException(
+                status_code=400, detail="The file is not a dataframe")
+
+        def iterate_():
+            for i in range(0, max(df.shape[0], 1), chunksize):
+                st = io.StringIO()
+                df.iloc[i: i + chunksize].to_csv(
+                    st, index=False, header=i == 0, encoding="utf-8")
+                yield st.getvalue()
+
+        return StreamingResponse(iterate_(), media_type="text/csv")
 
     app = FastAPI()
     app.get("/")(get_root)
     app.post("/submit/")(submit)
     app.post("/content/")(content)
+    app.post("/content/stream/")(content_stream)
+    app.post("/content/csv/")(content_csv)
     app.post("/metrics/")(metrics)
     app.post("/query/")(query)
     return app
@@ -169,16 +285,16 @@ def _get_password(password, env="PYQUICKHELPER_FASTAPI_PWD"):
     return password
 
 
-def _post_request(client, url, data, suffix, timeout=None):
+def _post_request(client, url, data, suffix, timeout=None, headers=None):
     if client is None:
         import requests
         resp = requests.post(f"{url.strip('/')}/{suffix}", data=data,
-                             timeout=timeout)
+                             timeout=timeout, headers=headers)
     else:
-        resp = client.post(f"/{suffix}/", json=data)
-    if resp.status_code != 200:
-        del data['content']
-        del data['password']
+        resp = client.post(f"/{suffix}/", json=data, headers=headers)
+    if resp.status_code not in (200, 304):
+        data.pop('content', None)
+        data.pop('password', None)
         raise RuntimeError(
             f"Post request failed due to {resp!r}\ndata={data!r}.")
     return resp
@@ -210,7 +326,7 @@ def fast_api_submit(df, client=None, url=None, name=None, team=None,
 
 def fast_api_query(client=None, url=None, name=None, team=None,
                    project=None, version=None, password=None,
-                   as_df=False):
+                   as_df=False, cursor=None, limit=None):
     """
     Retrieves the list of dataframe based on partial information.
 
@@ -221,21 +337,31 @@ def fast_api_query(client=None, url=None, name=None, team=None,
     :param project: project
     :param version: version
     :param password: password for the submission
+    :param as_df: returns the result as a dataframe
+    :param cursor: returns only files added after this one,
+        (identifier of the last file received)
+    :param limit: maximum number of results, the function
+        then returns a tuple *(results, next cursor)*,
+        the next cursor is None if there is no more results
     :return: response
     """
     password = _get_password(password)
     data = dict(team=team, project=project, version=version,
-                password=password, name=name)
+                password=password, name=name, cursor=cursor, limit=limit)
     resp = _post_request(client, url, data, "query")
+    res = resp.json()
     if as_df:
         import pandas
-        return pandas.DataFrame(resp.json())
-    return resp.json()
+        res = pandas.DataFrame(res)
+    if limit is None:
+        return res
+    cursor = resp.headers.get("X-Next-Cursor", None)
+    return res, None if cursor is None else int(cursor)
 
 
 def fast_api_content(client=None, url=None, name=None, team=None,
                      project=None, version=None, limit=5,
-                     password=None, as_df=True):
+                     password=None, as_df=True, cache=None):
     """
     Retrieves the dataframes based on partial information.
     Enumerates a list of dataframes.
@@ -249,12 +375,23 @@ def fast_api_content(client=None, url=None, name=None, team=None,
     :param limit: maximum number of dataframes to retrieve
     :param as_df: returns the content as a dataframe
     :param password: password for the submission
+    :param cache: dictionary, stores the last results and
+        their :epkg:`ETag`, the server does not send the content again
+        if it did not change since the previous call
     :return: list of dictionary, content is a dataframe
     """
     password = _get_password(password)
     data = dict(team=team, project=project, version=version,
                 password=password, name=name, limit=limit)
-    resp = _post_request(client, url, data, "content")
+    key = None
+    headers = None
+    if cache is not None:
+        key = (url, team, project, version, name, limit, as_df)
+        if key in cache:
+            headers = {"If-None-Match": cache[key][0]}
+    resp = _post_request(client, url, data, "content", headers=headers)
+    if resp.status_code == 304:
+        return cache[key][1]
     res = resp.json()
     if as_df:
         import pandas
@@ -267,4 +404,50 @@ def fast_api_content(client=None, url=None, name=None, team=None,
                 st = io.StringIO(r['content'])
                 df = pandas.read_csv(st, encoding="utf-8")
                 r['content'] = df
+    if cache is not None and "ETag" in resp.headers:
+        cache[key] = (resp.headers["ETag"], res)
     return res
+
+
+def fast_api_content_stream(client=None, url=None, name=None, team=None,
+                            project=None, version=None, limit=None,
+                            password=None, as_df=True, timeout=None):
+    """
+    Retrieves the dataframes based on partial information.
+    The server streams them one by one as :epkg:`json` lines.
+
+    :param client: for unittest purpose
+    :param url: API url (can be None if client is not)
+    :param name: name
+    :param team: team
+    :param project: project
+    :param version: version
+    :param limit: maximum number of dataframes to retrieve, None for all
+    :param as_df: returns the content as a dataframe
+    :param password: password for the submission
+    :param timeout: timeout
+    :return: iterator on dictionaries, content is a dataframe
+    """
+    password = _get_password(password)
+    data = dict(team=team, project=project, version=version,
+                password=password, name=name, limit=limit)
+    if client is None:
+        import requests
+        resp = requests.post(f"{url.strip('/')}/content/stream", json=data,
+                             timeout=timeout, stream=True)
+        lines = resp.iter_lines()
+    else:
+        resp = client.post("/content/stream/", json=data)
+        lines = resp.iter_lines()
+    if resp.status_code != 200:
+        raise RuntimeError(
+            f"Post request failed due to {resp!r}.")
+    for line in lines:
+        if not line:
+            continue
+        r = json.loads(line)
+        if as_df and r.get('format', None) == 'df':
+            import pandas
+            r['content'] = pandas.read_csv(
+                io.StringIO(r['content']), encoding="utf-8")
+        yield r
@@ -7,15 +7,163 @@ import os
 import io
 import sqlite3
 import json
+import threading
+import pickle
+import zlib
 from datetime import datetime
 import pandas
 
 
+def _get_compressor(name):
+    """
+    Returns functions *(compress, decompress)* for a compression name,
+    ``'zstd'`` (:epkg:`zstandard`), ``'lz4'`` (:epkg:`lz4`) or
+    ``'zlib'``, None if the module is not installed.
+    """
+    if name == 'zstd':
+        try:
+            import zstandard
+        except ImportError:  # pragma: no cover
+            return None
+        return (lambda b: zstandard.ZstdCompressor().compress(b),
+                lambda b: zstandard.ZstdDecompressor().decompress(b))
+    if name == 'lz4':
+        try:
+            import lz4.frame
+        except ImportError:  # pragma: no cover
+            return None
+        return lz4.frame.compress, lz4.frame.decompress
+    if name == 'zlib':
+        return (lambda b: zlib.compress(b, 6)), zlib.decompress
+    raise ValueError(  # pragma: no cover
+        f"Unknown compression {name!r}.")
+
+
+def default_dataframe_codec():
+    """
+    Returns the best available format to store a dataframe:
+    ``'df-parquet'`` if :epkg:`pyarrow` is installed,
+    a compressed pickle (``'df-pickle-zstd'``, ``'df-pickle-lz4'``,
+    ``'df-pickle-zlib'``) otherwise.
+    """
+    try:
+        import pyarrow  # pylint: disable=W0611
+        return 'df-parquet'
+    except ImportError:  # pragma: no cover
+        pass
+    for name in ['zstd', 'lz4', 'zlib']:  # pragma: no cover
+        if _get_compressor(name) is not None:
+            return f'df-pickle-{name}'
+    return 'df'  # pragma: no cover
+
+
+def encode_dataframe(df, format):
+    """
+    Serializes a dataframe.
+
+    :param df: dataframe
+    :param format: ``'df'`` (CSV text), ``'df-parquet'``,
+        ``'df-pickle-<compression>'``
+    :return: str or bytes
+    """
+    if format == 'df':
+        st = io.StringIO()
+        df.to_csv(st, index=False, encoding="utf-8")
+        return st.getvalue()
+    if format == 'df-parquet':
+        st = io.BytesIO()
+        df.to_parquet(st)
+        return st.getvalue()
+    if format.startswith('df-pickle-'):
+        fcts = _get_compressor(format[len('df-pickle-'):])
+        if fcts is None:
+            raise ImportError(  # pragma: no cover
+                f"Compression for format {format!r} is not installed.")
+        return fcts[0](pickle.dumps(df, protocol=5))
+    raise ValueError(f"Unknown format {format!r} for a dataframe.")
+
+
+def decode_content(format, content):
+    """
+    Restores a content stored by @see fn encode_dataframe,
+    any other content is returned unchanged.
+
+    :param format: format
+    :param content: content
+    :return: decoded content
+    """
+    if format == 'df' and isinstance(content, str):
+        st = io.StringIO(content)
+        return pandas.read_csv(st, encoding="utf-8")
+    if not isinstance(content, bytes):
+        # Binary formats are only stored as bytes, a string sent
+        # by a client claiming to be one of them is left untouched.
+        return content
+    if format == 'df-parquet':
+        return pandas.read_parquet(io.BytesIO(content))
+    if format is not None and format.startswith('df-pickle-'):
+        fcts = _get_compressor(format[len('df-pickle-'):])
+        if fcts is None:
+            raise ImportError(  # pragma: no cover
+                f"Compression for format {format!r} is not installed.")
+        return pickle.loads(fcts[1](content))
+    return content
+
+
+class LazyContent:
+    """
+    Content of a file stored in @see cl SqlLite3FileStore,
+    it is retrieved and decoded when method *load* is called.
+
+    :param store: @see cl SqlLite3FileStore
+    :param idfile: file identifier
+    :param format: format
+    """
+
+    def __init__(self, store, idfile, format):
+        self.store = store
+        self.idfile = idfile
+        self.format = format
+        self._value = None
+        self._loaded = False
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({self.idfile!r}, {self.format!r})"
+
+    def load(self):
+        """
+        Retrieves and decodes the content.
+        """
+        if not self._loaded:
+            con = self.store._get_connexion()
+            res = con.execute(
+                "SELECT content FROM files WHERE id=?", (self.idfile, ))
+            row = res.fetchone()
+            if row is None:
+                raise KeyError(  # pragma: no cover
+                    f"Unable to find file id={self.idfile!r}.")
+            self._value = decode_content(self.format, row[0])
+            self._loaded = True
+        return self._value
+
+
 class SqlLite3FileStore:
     """
     Simple file storage implemented with :epkg:`python:sqlite3`.
 
     :param path: location of the database.
+    :param wal: enables the write-ahead log (faster concurrent reads and writes)
+    :param df_format: format used to store dataframes, ``'df'`` for CSV,
+        ``'df-parquet'``, ``'df-pickle-zstd'``, ``'df-pickle-lz4'``,
+        ``'df-pickle-zlib'``, None for the best available one
+        (see @see fn default_dataframe_codec)
+
+    Every thread keeps its own connection to the database,
+    the connection is created the first time the thread needs it.
+    Every query is parameterised.
+    The format of every file is stored in column *format*,
+    dataframes stored as CSV by previous versions (format ``'df'``)
+    are still loaded.
     """
     @staticmethod
     def v2s(value, s="'"):
@@ -23,19 +171,24 @@ class SqlLite3FileStore:
             return f"{s}{value}{s}"
         return str(value)
 
-    def __init__(self, path="_file_store_.db3"):
+    _files_columns = ["name", "format", "metadata", "team", "project",
+                      "version", "date", "content"]
+    _data_columns = ["idfile", "date", "name", "value", "comment"]
+
+    def __init__(self, path="_file_store_.db3", wal=True, df_format=None):
         self.path_ = path
+        self.wal_ = wal
+        self.df_format_ = (default_dataframe_codec() if df_format is None
+                           else df_format)
+        self._local = threading.local()
         self._create()
 
     def _get_column_table(self, table, con=None):
-        close = con is None
         if con is None:
             con = self._get_connexion()
         cur = con.cursor()
         res = cur.execute(f"PRAGMA table_info({table});")
         res = cur.fetchall()
-        if close:
-            con.close()
         return res
 
     def _check_same_column(self, table, columns, con=None):
@@ -44,7 +197,27 @@ class SqlLite3FileStore:
         return names == columns
 
     def _get_connexion(self):
-        return sqlite3.connect(self.path_)
+        """
+        Returns the connection of the current thread,
+        creates it if it does not exist.
+        """
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path_)
+            if self.wal_:
+                con.execute("PRAGMA journal_mode=WAL;")
+                con.execute("PRAGMA synchronous=NORMAL;")
+            self._local.con = con
+        return con
+
+    def close(self):
+        """
+        Closes the connection of the current thread.
+        """
+        con = getattr(self._local, "con", None)
+        if con is not None:
+            con.close()
+            self._local.con = None
 
     def _create(self):
         """
@@ -54,14 +227,12 @@ class SqlLite3FileStore:
         cur = con.cursor()
         cur.execute("SELECT name FROM sqlite_master WHERE type='table';")
         res = cur.fetchall()
-        commit = False
         if ('files',) not in res:
             cur.execute(
                 '''CREATE TABLE files
                    (id INTEGER PRIMARY KEY, date TEXT, name TEXT,
                     format TEXT, metadata TEXT, team TEXT,
                     project TEXT, version INT, content BLOB)''')
-            commit = True
 
         if (('data',) in res and not self._check_same_column(
                 "data", ["id", "idfile", "name", "value", "date", "comment"],
@@ -76,25 +247,19 @@ class SqlLite3FileStore:
                 '''CREATE TABLE data
                    (id INTEGER PRIMARY KEY, idfile INTEGER,
                     name TEXT, value REAL, date TEXT, comment TEXT)''')
-            commit = True
-        if commit:
-            con.commit()
-        con.close()
 
-    def submit(self, name, content, format=None, date=None, metadata=None,
-               team=None, project=None, version=None):
-        """
-        Submits a file to the database.
+        for table, column in [('files', 'name'), ('files', 'project'),
+                              ('files', 'team'), ('files', 'version'),
+                              ('data', 'idfile'), ('data', 'name')]:
+            cur.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{table}_{column} "
+                f"ON {table} ({column});")
+        con.commit()
 
-        :param name: filename
-        :param content: file content (it can be a dataframe)
-        :param format: format
-        :param date: date, by default now
-        :param metadata: addition information
-        :param team: another name
-        :param project: another name
-        :param version: version
-        :return: added data as a dictionary (no content)
+    def _files_record(self, name, content, format=None, date=None, metadata=None,
+                      team=None, project=None, version=None):
+        """
+        Converts the arguments of method *submit* into a record.
         """
         if date is None:
             date = datetime.now()
@@ -105,38 +270,58 @@ class SqlLite3FileStore:
             raise TypeError(
                 "metadata must be None or a dictionary.")
         if isinstance(content, pandas.DataFrame):
-            st = io.StringIO()
-            content.to_csv(st, index=False, encoding="utf-8")
-            content = st.getvalue()
             if format is None:
-                format = "df"
+                format = self.df_format_
+            content = encode_dataframe(content, format)
         if format is None:
             format = os.path.splitext(name)[-1]
-        record = dict(name=name, content=content, format=format,
-                      metadata=metadata, team=team, project=project,
-                      version=version, date=date)
-        fields = []
-        values = []
-        for k, n in record.items():
-            if n is None:
-                continue
-            fields.append(k)
-            if isinstance(n, str):
-                values.append(n.replace("\\", "\\\\").replace("'", "''"))
-            else:
-                values.append(n)
-        sqlite_insert_blob_query = """
-            INSERT INTO files (%s) VALUES (%s)""" % (
-            ",".join(fields), ",".join(map(SqlLite3FileStore.v2s, values)))
+        return dict(name=name, format=format,
+                    metadata=metadata, team=team, project=project,
+                    version=version, date=date, content=content)
+
+    def submit(self, name, content, format=None, date=None, metadata=None,
+               team=None, project=None, version=None):
+        """
+        Submits a file to the database.
+
+        :param name: filename
+        :param content: file content (it can be a dataframe)
+        :param format: format, dataframes are stored with the format
+            given to the constructor if None, ``'df'`` always means CSV
+        :param date: date, by default now
+        :param metadata: addition information
+        :param team: another name
+        :param project: another name
+        :param version: version
+        :return: added data as a dictionary (no content)
+        """
+        return self.submit_many([dict(
+            name=name, content=content, format=format, date=date,
+            metadata=metadata, team=team, project=project,
+            version=version)])[0]
+
+    def submit_many(self, records):
+        """
+        Submits many files to the database in a single transaction.
+
+        :param records: list of dictionaries, every dictionary
+            contains the parameters of method @see me submit
+        :return: list of added data as dictionaries (no content)
+        """
+        rows = [self._files_record(**r) for r in records]
+        query = "INSERT INTO files (%s) VALUES (%s)" % (
+            ",".join(self._files_columns),
+            ",".join("?" for _ in self._files_columns))
         con = self._get_connexion()
-        cur = con.cursor()
-        cur.execute(sqlite_insert_blob_query)
-        con.commit()
-        con.close()
-        output = dict(name=name, format=format,
-                      metadata=metadata, team=team, project=project,
-                      version=version, date=date)
-        return {k: v for k, v in output.items() if v is not None}
+        with con:
+            con.executemany(
+                query, [tuple(r[k] for k in self._files_columns)
+                        for r in rows])
+        outputs = []
+        for r in rows:
+            del r['content']
+            outputs.append({k: v for k, v in r.items() if v is not None})
+        return outputs
 
     def submit_data(self, idfile, name, value, date=None, comment=None):
         """
@@ -149,45 +334,94 @@ class SqlLite3FileStore:
         :param comment: additional comment
         :return: added data
         """
-        if date is None:
-            date = datetime.now()
-        date = date.isoformat()
-        if comment is None:
-            comment = ""
-
-        fields = ['idfile', 'date', 'name', 'value', 'comment']
-        values = [idfile, date, name, value, comment]
-        sqlite_insert_blob_query = """
-            INSERT INTO data (%s) VALUES (%s)""" % (
-            ",".join(fields), ",".join("%r" % v for v in values))
+        self.submit_data_many([dict(idfile=idfile, name=name, value=value,
+                                    date=date, comment=comment)])
+
+    def submit_data_many(self, records):
+        """
+        Submits many data to the database in a single transaction.
+
+        :param records: list of dictionaries, every dictionary
+            contains the parameters of method @see me submit_data
+        """
+        rows = []
+        for r in records:
+            date = r.get('date', None)
+            if date is None:
+                date = datetime.now()
+            comment = r.get('comment', None)
+            rows.append((r['idfile'], date.isoformat(), r['name'], r['value'],
+                         "" if comment is None else comment))
+        query = "INSERT INTO data (%s) VALUES (%s)" % (
+            ",".join(self._data_columns),
+            ",".join("?" for _ in self._data_columns))
         con = self._get_connexion()
-        cur = con.cursor()
-        cur.execute(sqlite_insert_blob_query)
-        con.commit()
-        con.close()
+        with con:
+            con.executemany(query, rows)
 
-    def _enumerate(self, condition, fields):
+    @staticmethod
+    def _conditions(record, prefix=""):
+        """
+        Converts a dictionary into a list of conditions
+        and a list of parameters, None values are skipped.
+        """
+        cond = []
+        params = []
+        for k, v in record.items():
+            if v is None:
+                continue
+            if isinstance(v, datetime):
+                v = v.isoformat()
+            elif isinstance(v, dict):
+                v = json.dumps(v)
+            cond.append(f'{prefix}{k}=?')
+            params.append(v)
+        return cond, params
+
+    @staticmethod
+    def _paginate(cond, params, after_id=None, limit=None, column="id"):
+        """
+        Adds the conditions to return only rows after a given
+        identifier, returns the end of the query.
+        """
+        if after_id is not None:
+            cond.append(f"{column}>?")
+            params.append(after_id)
+        if limit is None:
+            return f" ORDER BY {column}"
+        params.append(limit)
+        return f" ORDER BY {column} LIMIT ?"
+
+    def _enumerate(self, condition, fields, params=None, lazy=False,
+                   after_id=None, limit=None):
         con = self._get_connexion()
         cur = con.cursor()
-        query = '''SELECT %s FROM files %s %s''' % (
+        if lazy and 'content' in fields:
+            fields = [f for f in fields if f != 'content']
+        else:
+            lazy = False
+        params = list(params or [])
+        end = self._paginate(condition, params, after_id, limit)
+        query = '''SELECT %s FROM files %s %s%s''' % (
             ",".join(fields),
             "WHERE" if len(condition) > 0 else "",
-            " AND ".join(condition))
-        res = cur.execute(query)
+            " AND ".join(condition), end)
+        res = cur.execute(query, params)
 
         for line in res:
             res = {k: v for k, v in zip(fields, line)}  # pylint: disable=R1721
-            if 'format' in res and 'content' in res and res['format'] == 'df':
-                st = io.StringIO(res['content'])
-                df = pandas.read_csv(st, encoding="utf-8")
-                res['content'] = df
+            if lazy:
+                res['content'] = LazyContent(self, res['id'], res['format'])
+            elif 'content' in res:
+                res['content'] = decode_content(
+                    res.get('format', None), res['content'])
             if 'metadata' in res and res['metadata']:
                 res['metadata'] = json.loads(res['metadata'])
             yield res
-        con.close()
 
     def enumerate_content(self, name=None, format=None, date=None, metadata=None,
-                          team=None, project=None, version=None):
+                          team=None, project=None, version=None, lazy=False,
+                          after_id=None, limit=None):
         """
         Queries the database, enumerates the results,
         returns the content as well.
@@ -199,23 +433,41 @@ class SqlLite3FileStore:
         :param team: another name
         :param project: another name
         :param version: version
-        :return: results
+        :param lazy: if True, the content is not retrieved,
+            it is replaced by an instance of @see cl LazyContent,
+            method *load* retrieves and decodes it
+        :param after_id: only returns files with an identifier
+            strictly greater than this one (pagination)
+        :param limit: maximum number of results
+        :return: results sorted by identifier
         """
         record = dict(name=name, format=format,
                       metadata=metadata, team=team, project=project,
                       version=version, date=date)
-        cond = []
-        for k, v in record.items():
-            if v is None:
-                continue
-            cond.append('%s=%s' % (k, SqlLite3FileStore.v2s(v, '"')))
+        cond, params = self._conditions(record)
         fields = ["id", "name", "format", "date", "metadata",
                   "team", "project", "version", "content"]
-        for it in self._enumerate(cond, fields):
+        for it in self._enumerate(cond, fields, params, lazy=lazy,
+                                  after_id=after_id, limit=limit):
             yield it
 
+    def get_content(self, idfile):
+        """
+        Returns the decoded content of one file.
+
+        :param idfile: file identifier
+        :return: content or None if the file does not exist
+        """
+        con = self._get_connexion()
+        row = con.execute("SELECT format, content FROM files WHERE id=?",
+                          (idfile, )).fetchone()
+        if row is None:
+            return None
+        return decode_content(row[0], row[1])
+
     def enumerate(self, name=None, format=None, date=None, metadata=None,
-                  team=None, project=None, version=None):
+                  team=None, project=None, version=None, after_id=None,
+                  limit=None):
         """
         Queries the database, enumerates the results.
 
@@ -226,23 +478,23 @@ class SqlLite3FileStore:
         :param team: another name
         :param project: another name
         :param version: version
-        :return: results
+        :param after_id: only returns files with an identifier
+            strictly greater than this one (pagination)
+        :param limit: maximum number of results
+        :return: results sorted by identifier
         """
         record = dict(name=name, format=format,
                       metadata=metadata, team=team, project=project,
                       version=version, date=date)
-        cond = []
-        for k, v in record.items():
-            if v is None:
-                continue
-            cond.append('%s=%s' % (k, SqlLite3FileStore.v2s(v, '"')))
+        cond, params = self._conditions(record)
         fields = ["id", "name", "format", "date", "metadata",
                   "team", "project", "version"]
-        for it in self._enumerate(cond, fields):
+        for it in self._enumerate(cond, fields, params,
+                                  after_id=after_id, limit=limit):
             yield it
 
     def enumerate_data(self, idfile=None, name=None, join=False,
-                       project=None):
+                       project=None, after_id=None, limit=None):
         """
         Queries the database, enumerates the results.
 
@@ -250,27 +502,28 @@ class SqlLite3FileStore:
         :param name: value name, None if not specified
         :param join: join with the table *files*
         :param project: filter by project
-        :return: results
+        :param after_id: only returns data with an identifier
+            strictly greater than this one (pagination)
+        :param limit: maximum number of results
+        :return: results sorted by identifier
         """
         fields2 = ['name', 'project', 'team', 'version']
 
-        record = dict(name=name, idfile=idfile, project=project)
-        cond = []
-        for k, v in record.items():
-            if v is None:
-                continue
-            if join:
-                if k in fields2:
-                    if not join:
-                        raise RuntimeError(
-                            "join must be true if metrics are "
-                            "filtered by project.")
-                    cond.append(f'B.{k}="{v}"')
-                else:
-                    cond.append(f'data.{k}="{v}"')
-            else:
-                cond.append('%s=%s' % (k, SqlLite3FileStore.v2s(v, '"')))
+        if project is not None and not join:
+            raise RuntimeError(
+                "join must be true if metrics are filtered by project.")
+        if join:
+            # name and project refer to the table files
+            cond, params = self._conditions(
+                dict(name=name, project=project), "B.")
+            cond2, params2 = self._conditions(dict(idfile=idfile), "data.")
+            cond.extend(cond2)
+            params.extend(params2)
+        else:
+            cond, params = self._conditions(dict(name=name, idfile=idfile))
 
+        end = self._paginate(cond, params, after_id, limit,
+                             column="data.id" if join else "id")
         con = self._get_connexion()
         cur = con.cursor()
         if join:
@@ -279,17 +532,17 @@ class SqlLite3FileStore:
             query = '''
                 SELECT %s, %s
                 FROM data INNER JOIN files AS B on B.id = idfile
-                %s %s''' % (
+                %s %s%s''' % (
                 ",".join(fields),
                 ",".join(map(lambda s: "B.%s" % s, fields2)),
                 "WHERE" if len(cond) > 0 else "",
-                " AND ".join(cond))
+                " AND ".join(cond), end)
         else:
             fields = ["id", "idfile", "name", "date", "value", "comment"]
-            query = '''SELECT %s FROM data %s %s''' % (
+            query = '''SELECT %s FROM data %s %s%s''' % (
                 ",".join(fields), "WHERE" if len(cond) > 0 else "",
-                " AND ".join(cond))
-        res = cur.execute(query)
+                " AND ".join(cond), end)
+        res = cur.execute(query, params)
 
         if join:
             fields = ([s.replace('data.', '') for s in fields] +
@@ -298,4 +551,3 @@ class SqlLite3FileStore:
             res = {k: v for k, v in zip(fields, line)  # pylint: disable=R1721
                    if v is not None}
             yield res
-        con.close()
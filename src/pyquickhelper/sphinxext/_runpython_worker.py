@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""
+@file
+@brief Worker started by @see cl RunPythonWorkerPool.
+It receives scripts as :epkg:`json` lines on its standard input,
+runs them one after the other and sends back the standard output
+and error. The script must not import anything outside the standard
+library, it is executed as a script (``python _runpython_worker.py``).
+"""
+import builtins
+import json
+import os
+import sys
+import tempfile
+import traceback
+import warnings
+
+
+def _exit_code(e):
+    "Mimics the interpreter when *SystemExit* is raised."
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def _open_output(name):
+    "Opens a file receiving an output, a temporary file if *name* is None."
+    if name is None:
+        return tempfile.TemporaryFile()
+    return open(name, "w+b")
+
+
+def run_script(script, filename=None, chdir=None, out_file=None, err_file=None):
+    """
+    Runs a script in a new namespace, the state of the interpreter
+    (*sys.path*, *sys.argv*, members of *sys*, current directory,
+    warnings filters) is restored after the execution.
+
+    @param      script      script
+    @param      filename    file the script comes from or None (stdin)
+    @param      chdir       current directory while running the script
+    @param      out_file    file receiving the standard output, a temporary
+                            file if None
+    @param      err_file    file receiving the standard error, a temporary
+                            file if None
+    @return                 dictionary with keys *out*, *err*, *code*
+    """
+    saved_path = list(sys.path)
+    saved_argv = list(sys.argv)
+    saved_sys = set(sys.__dict__)
+    saved_cwd = os.getcwd()
+    saved_filters = list(warnings.filters)
+    code = 0
+    with _open_output(out_file) as fout, _open_output(err_file) as ferr:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        old_out = os.dup(1)
+        old_err = os.dup(2)
+        os.dup2(fout.fileno(), 1)
+        os.dup2(ferr.fileno(), 2)
+        try:
+            if chdir is not None:
+                os.chdir(chdir)
+            glob = {"__name__": "__main__", "__builtins__": builtins}
+            if filename is not None:
+                glob["__file__"] = filename
+            sys.argv = [filename or "-"]
+            try:
+                obj = compile(script, filename or "<stdin>", "exec")
+                exec(obj, glob)  # pylint: disable=W0122
+            except SystemExit as e:
+                code = _exit_code(e)
+            except BaseException:  # pylint: disable=W0703
+                exc_type, exc_value, exc_tb = sys.exc_info()
+                # the first frame belongs to this function
+                traceback.print_exception(
+                    exc_type, exc_value, exc_tb.tb_next, file=sys.stderr)
+                code = 1
+            del glob
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os.dup2(old_out, 1)
+            os.dup2(old_err, 2)
+            os.close(old_out)
+            os.close(old_err)
+            os.chdir(saved_cwd)
+            sys.path[:] = saved_path
+            sys.argv = saved_argv
+            for k in set(sys.__dict__) - saved_sys:
+                del sys.__dict__[k]
+            warnings.filters[:] = saved_filters
+        fout.seek(0)
+        ferr.seek(0)
+        out = fout.read().decode("utf-8", errors="ignore")
+        err = ferr.read().decode("utf-8", errors="ignore")
+    return dict(out=out, err=err, code=code)
+
+
+def main():
+    """
+    Reads requests from the standard input until it is closed.
+    The standard input and output are only used by the protocol,
+    the scripts see an empty input and their output is captured.
+    The worker acknowledges every request before running the script.
+    """
+    # same as a script read from the standard input
+    sys.path[0] = ""
+    proto_in = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    proto_out = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+    os.close(devnull)
+    for line in proto_in:
+        req = json.loads(line)
+        # the caller knows the script started if the worker stops now
+        proto_out.write(json.dumps(dict(started=True)) + "\n")
+        proto_out.flush()
+        res = run_script(req["script"], filename=req.get("filename", None),
+                         chdir=req.get("chdir", None),
+                         out_file=req.get("out_file", None),
+                         err_file=req.get("err_file", None))
+        if req.get("out_file", None) is not None:
+            # the caller reads the outputs from the files
+            res = dict(code=res["code"])
+        proto_out.write(json.dumps(res) + "\n")
+        proto_out.flush()
+
+
+if __name__ == "__main__":
+    main()
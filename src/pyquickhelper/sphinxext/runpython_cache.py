@@ -0,0 +1,352 @@
+# -*- coding: utf-8 -*-
+"""
+@file
+@brief On-disk cache for the outputs of directive ``runpython``.
+"""
+import ast
+import filecmp
+import hashlib
+import importlib.machinery
+import importlib.util
+import json
+import os
+import shutil
+import sys
+import time
+import uuid
+
+
+def _is_sys_path_call(node):
+    "Tells if a node is ``sys.path.append('...')`` or ``sys.path.insert(i, '...')``."
+    if not isinstance(node, ast.Call) or not node.args:
+        return False
+    func = node.func
+    if not isinstance(func, ast.Attribute) or func.attr not in ("append", "insert"):
+        return False
+    obj = func.value
+    if (not isinstance(obj, ast.Attribute) or obj.attr != "path" or
+            not isinstance(obj.value, ast.Name) or obj.value.id != "sys"):
+        return False
+    arg = node.args[-1]
+    return isinstance(arg, ast.Constant) and isinstance(arg.value, str)
+
+
+class RunPythonCache:
+    """
+    Stores the standard output, the standard error and the files
+    generated by the scripts of directive ``runpython``.
+    An entry is identified by a hash of the script,
+    the parameters of the directive and a fingerprint of the
+    modules the script imports (see @see me fingerprint_modules).
+    Entries are removed after *max_age* seconds without being used,
+    the least recently used entries are removed as well
+    when the cache is bigger than *max_size* bytes.
+
+    :param folder: cache location
+    :param max_size: maximum size of the cache in bytes
+    :param max_age: maximum time (seconds) an unused entry is kept
+
+    Attributes *n_hits*, *n_misses*, *n_stored*, *n_evicted*,
+    *n_uncacheable* count what happened since the cache was created,
+    @see me report summarizes them.
+    """
+
+    def __init__(self, folder, max_size=2 ** 28, max_age=30 * 24 * 3600):
+        self.folder = folder
+        self.max_size = max_size
+        self.max_age = max_age
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_stored = 0
+        self.n_evicted = 0
+        self.n_uncacheable = 0
+        self._fingerprints = {}
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def _find_locations(name, paths):
+        """
+        Returns the files or folders a top-level module may be imported
+        from, with the additional *paths* first and the current
+        *sys.path* then, both are kept as the script may use any of them.
+        """
+        specs = []
+        if paths:
+            try:
+                specs.append(importlib.machinery.PathFinder.find_spec(
+                    name, [os.path.abspath(p) for p in paths]))
+            except (ImportError, ValueError):  # pragma: no cover
+                pass
+        try:
+            specs.append(importlib.util.find_spec(name))
+        except (ImportError, ValueError):
+            pass
+        locations = []
+        for spec in specs:
+            if spec is None:
+                continue
+            if spec.submodule_search_locations:
+                locations.extend(spec.submodule_search_locations)
+            elif spec.origin and os.path.isfile(spec.origin):
+                locations.append(spec.origin)
+        return sorted(set(locations))
+
+    def _module_fingerprint(self, name, paths=None):
+        """
+        Fingerprints a top-level module, every file of a package
+        contributes with its name, size and modification time.
+        The fingerprint is computed once per build
+        (see @see me clear_fingerprints), the imported code is not
+        expected to change during a build.
+        Returns None if the module cannot be found.
+        """
+        memo = name, tuple(paths or [])
+        if memo in self._fingerprints:
+            return self._fingerprints[memo]
+        locations = self._find_locations(name, paths)
+        if not locations:
+            self._fingerprints[memo] = None
+            return None
+        items = []
+        for loc in locations:
+            if os.path.isfile(loc):
+                st = os.stat(loc)
+                items.append((loc, st.st_size, st.st_mtime_ns))
+                continue
+            for root, dirs, files in os.walk(loc):
+                dirs[:] = sorted(d for d in dirs if d != "__pycache__")
+                for f in sorted(files):
+                    if f.endswith((".pyc", ".pyo")):
+                        continue
+                    full = os.path.join(root, f)
+                    try:
+                        st = os.stat(full)
+                    except OSError:  # pragma: no cover
+                        continue
+                    items.append((full, st.st_size, st.st_mtime_ns))
+        res = hashlib.sha256(json.dumps(items).encode("utf-8")).hexdigest()
+        self._fingerprints[memo] = res
+        return res
+
+    def fingerprint_modules(self, script, paths=None):
+        """
+        Returns a fingerprint of the modules imported by a script
+        (statements *import* and *from ... import*). Modules of the
+        standard library are ignored, the key already contains
+        the version of :epkg:`Python`. Modules are searched in *paths*,
+        in the paths the script adds with ``sys.path.append`` or
+        ``sys.path.insert`` and in *sys.path*.
+
+        :param script: script
+        :param paths: additional paths the script imports modules from
+            (its working directory for example)
+        :return: dictionary *{ module: fingerprint }* or None
+            if one module cannot be found, the script cannot be cached
+        """
+        try:
+            tree = ast.parse(script)
+        except SyntaxError:
+            return {}
+        names = set()
+        paths = list(paths or [])
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names.update(a.name.split(".")[0] for a in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+                names.add(node.module.split(".")[0])
+            elif _is_sys_path_call(node):
+                paths.append(node.args[-1].value)
+        std = getattr(sys, "stdlib_module_names", set())
+        res = {}
+        for n in sorted(names):
+            if n in std or n in sys.builtin_module_names:
+                continue
+            fp = self._module_fingerprint(n, paths)
+            if fp is None:
+                return None
+            res[n] = fp
+        return res
+
+    def key(self, script, params=None, paths=None):
+        """
+        Computes the key of a script.
+
+        :param script: script
+        :param params: parameters changing the output (json serializable)
+        :param paths: additional paths the script imports modules from,
+            see @see me fingerprint_modules
+        :return: hexadecimal string or None if the script cannot be cached
+        """
+        modules = self.fingerprint_modules(script, paths=paths)
+        if modules is None:
+            self.n_uncacheable += 1
+            return None
+        desc = dict(script=script, params=params or {}, modules=modules,
+                    python=[sys.executable, sys.version])
+        data = json.dumps(desc, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def clear_fingerprints(self):
+        """
+        Forgets the fingerprints of the modules, it is called
+        when a new build starts in the same process.
+        """
+        self._fingerprints.clear()
+
+    def get(self, key, output_dir=None):
+        """
+        Returns the cached output of a script, the generated files
+        are copied into *output_dir* if they are missing or different.
+
+        :param key: key returned by @see me key
+        :param output_dir: where to restore the generated files
+        :return: *(out, err)* or None if the key is not in the cache
+        """
+        entry = os.path.join(self.folder, key)
+        name = os.path.join(entry, "entry.json")
+        try:
+            with open(name, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            self.n_misses += 1
+            return None
+        for fn in data["files"]:
+            src = os.path.join(entry, "files", fn)
+            dest = os.path.join(output_dir or os.getcwd(), fn)
+            if not os.path.exists(dest) or not filecmp.cmp(src, dest, shallow=False):
+                shutil.copy2(src, dest)
+        try:
+            # the modification time tells when the entry was last used
+            os.utime(name)
+        except OSError:  # pragma: no cover
+            pass
+        self.n_hits += 1
+        return data["out"], data["err"]
+
+    def put(self, key, out, err, files=None, output_dir=None):
+        """
+        Stores the output of a script.
+
+        :param key: key returned by @see me key
+        :param out: standard output
+        :param err: standard error
+        :param files: files generated by the script (names relative to *output_dir*)
+        :param output_dir: folder containing the generated files
+        """
+        entry = os.path.join(self.folder, key)
+        if os.path.exists(entry):
+            return
+        # the entry is written in a temporary folder and renamed,
+        # another process building the documentation may read it
+        tmp = os.path.join(self.folder, f"tmp-{uuid.uuid4().hex}")
+        os.makedirs(os.path.join(tmp, "files"))
+        files = sorted(files or [])
+        for fn in files:
+            shutil.copy2(os.path.join(output_dir or os.getcwd(), fn),
+                         os.path.join(tmp, "files", fn))
+        with open(os.path.join(tmp, "entry.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(out=out, err=err, files=files), f)
+        try:
+            os.rename(tmp, entry)
+            self.n_stored += 1
+        except OSError:  # pragma: no cover
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def evict(self, now=None):
+        """
+        Removes the entries older than *max_age* and the least recently
+        used entries until the cache is smaller than *max_size*.
+
+        :param now: current time, *time.time()* if None
+        :return: number of removed entries
+        """
+        if now is None:
+            now = time.time()
+        entries = []
+        removed = 0
+        for name in os.listdir(self.folder):
+            entry = os.path.join(self.folder, name)
+            if not os.path.isdir(entry):
+                continue
+            try:
+                used = os.stat(os.path.join(entry, "entry.json")).st_mtime
+            except OSError:
+                # unfinished entry, removed if it is old enough
+                used = os.stat(entry).st_mtime
+                if now - used > 3600:
+                    shutil.rmtree(entry, ignore_errors=True)
+                continue
+            if now - used > self.max_age:
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+                continue
+            size = 0
+            for root, _, files in os.walk(entry):
+                for f in files:
+                    size += os.path.getsize(os.path.join(root, f))
+            entries.append((used, size, entry))
+        total = sum(e[1] for e in entries)
+        entries.sort()
+        for _, size, entry in entries:
+            if total <= self.max_size:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+            removed += 1
+        self.n_evicted += removed
+        return removed
+
+    def report(self):
+        """
+        Returns a short summary of the cache activity.
+        """
+        total = self.n_hits + self.n_misses
+        ratio = self.n_hits * 100. / total if total else 0.
+        return (f"hits={self.n_hits} misses={self.n_misses} "
+                f"hit_rate={ratio:1.1f}% stored={self.n_stored} "
+                f"evicted={self.n_evicted} uncacheable={self.n_uncacheable}")
+
+
+def snapshot_folder(folder):
+    """
+    Returns the size and the modification time of every file
+    in a folder (not recursive), used to detect the files
+    a script generates.
+
+    @param      folder      folder
+    @return                 dictionary *{ name: (size, mtime) }*
+    """
+    res = {}
+    try:
+        it = os.scandir(folder)
+    except OSError:  # pragma: no cover
+        return res
+    with it:
+        for e in it:
+            if e.is_file():
+                st = e.stat()
+                res[e.name] = st.st_size, st.st_mtime_ns
+    return res
+
+
+_caches = {}
+
+
+def get_runpython_cache(folder, max_size=2 ** 28, max_age=30 * 24 * 3600):
+    """
+    Returns the cache used by directive ``runpython``
+    for a given folder, it creates it if it does not exist.
+    A process created by *fork* creates its own cache.
+
+    :param folder: cache location
+    :param max_size: maximum size of the cache in bytes
+    :param max_age: maximum time (seconds) an unused entry is kept
+    :return: @see cl RunPythonCache
+    """
+    key = os.getpid(), os.path.abspath(folder)
+    cache = _caches.get(key, None)
+    if cache is None:
+        cache = RunPythonCache(folder, max_size=max_size, max_age=max_age)
+        _caches[key] = cache
+    return cache
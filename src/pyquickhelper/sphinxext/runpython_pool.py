@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+@file
+@brief Pool of long-lived interpreters running the scripts
+of directive ``runpython`` when option ``:process:`` is enabled.
+"""
+import atexit
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+class RunPythonWorkerCrash(Exception):
+    """
+    Raised when a worker stops while running a script.
+    Attribute *started* tells if the script started,
+    *out* and *err* contain what the script wrote before the crash.
+    """
+
+    def __init__(self, message, started=False, out="", err=""):
+        Exception.__init__(self, message)
+        self.started = started
+        self.out = out
+        self.err = err
+
+
+class _RunPythonWorker:
+    """
+    One interpreter running @see fn main from
+    module *_runpython_worker*.
+    """
+
+    def __init__(self):
+        worker = os.path.join(os.path.dirname(__file__), "_runpython_worker.py")
+        self.proc = subprocess.Popen(
+            [sys.executable, worker], stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, encoding="utf-8")
+        self.n_runs = 0
+        # outputs are written in files to retrieve them after a crash
+        self.folder = tempfile.mkdtemp(prefix="runpython_")
+        self.out_file = os.path.join(self.folder, "out.txt")
+        self.err_file = os.path.join(self.folder, "err.txt")
+
+    def _read_outputs(self):
+        "Reads the outputs of the last script."
+        res = []
+        for name in [self.out_file, self.err_file]:
+            try:
+                with open(name, "rb") as f:
+                    res.append(f.read().decode("utf-8", errors="ignore"))
+            except OSError:
+                res.append("")
+        return res
+
+    def _readline(self, started):
+        try:
+            line = self.proc.stdout.readline()
+        except (OSError, ValueError) as e:  # pragma: no cover
+            line = ""
+            cause = e
+        else:
+            cause = None
+        if line:
+            return line
+        out, err = self._read_outputs() if started else ("", "")
+        raise RunPythonWorkerCrash(
+            f"Worker {self.proc.pid} stopped with code {self.proc.wait()}.",
+            started=started, out=out, err=err) from cause
+
+    def run(self, script, filename=None, chdir=None):
+        """
+        Sends a script and waits for the result.
+        """
+        req = json.dumps(dict(script=script, filename=filename, chdir=chdir,
+                              out_file=self.out_file, err_file=self.err_file))
+        self.n_runs += 1
+        try:
+            self.proc.stdin.write(req + "\n")
+            self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise RunPythonWorkerCrash(
+                f"Worker {self.proc.pid} stopped.") from e
+        # acknowledgement, the script starts after it
+        self._readline(False)
+        res = json.loads(self._readline(True))
+        out, err = self._read_outputs()
+        return dict(out=out, err=err, code=res["code"])
+
+    def close(self, kill=False):
+        "Stops the worker."
+        if kill:
+            self.proc.kill()
+        else:
+            try:
+                self.proc.stdin.close()
+            except OSError:  # pragma: no cover
+                pass
+        self.proc.wait()
+        self.proc.stdout.close()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+class RunPythonWorkerPool:
+    """
+    Keeps interpreters alive to run many scripts, it saves the time
+    spent to start an interpreter and to import the same packages again.
+    Every script runs in its own namespace, its standard output and error
+    are captured, the worker restores *sys.path*, *sys.argv*, the current
+    directory and the members added to *sys* after every script.
+    A worker is replaced after *max_runs* scripts or if it crashes.
+
+    :param max_runs: number of scripts a worker runs before being replaced
+    :param n_workers: maximum number of workers (only useful if
+        the pool is shared between threads)
+
+    Attributes *n_started* and *n_crashes* count the started workers
+    and the crashes.
+    """
+
+    def __init__(self, max_runs=50, n_workers=1):
+        self.max_runs = max_runs
+        self.n_workers = n_workers
+        self.n_started = 0
+        self.n_crashes = 0
+        self._idle = []
+        self._busy = 0
+        self._cond = threading.Condition()
+        self._pid = os.getpid()
+
+    def _acquire(self):
+        with self._cond:
+            while not self._idle and self._busy >= self.n_workers:
+                self._cond.wait()
+            self._busy += 1
+            if self._idle:
+                return self._idle.pop()
+            self.n_started += 1
+        try:
+            return _RunPythonWorker()
+        except Exception:  # pragma: no cover
+            self._release(None)
+            raise
+
+    def _release(self, worker):
+        with self._cond:
+            self._busy -= 1
+            if worker is not None:
+                self._idle.append(worker)
+            self._cond.notify()
+
+    def run(self, script, filename=None, chdir=None):
+        """
+        Runs a script in one worker.
+
+        :param script: script
+        :param filename: file the script is stored in or None
+        :param chdir: current directory while running the script
+        :return: out, err, exit code
+        :raises RunPythonWorkerCrash: if the worker stopped,
+            the worker is replaced by a new one for the next script,
+            attribute *started* tells if the script started
+        """
+        worker = self._acquire()
+        try:
+            res = worker.run(script, filename=filename, chdir=chdir)
+        except RunPythonWorkerCrash:
+            self.n_crashes += 1
+            worker.close(kill=True)
+            self._release(None)
+            raise
+        except BaseException:  # pragma: no cover
+            worker.close(kill=True)
+            self._release(None)
+            raise
+        if worker.n_runs >= self.max_runs:
+            worker.close()
+            worker = None
+        self._release(worker)
+        return res["out"], res["err"], res["code"]
+
+    def close(self):
+        """
+        Stops all idle workers.
+        """
+        with self._cond:
+            idle = self._idle
+            self._idle = []
+        if os.getpid() != self._pid:
+            # workers belong to the parent process
+            return
+        for worker in idle:
+            worker.close()
+
+
+_pools = {}
+
+
+def get_runpython_pool(max_runs=50):
+    """
+    Returns the pool used by @see fn run_python_script
+    for a given *max_runs*, it creates it if it does not exist.
+    A process created by *fork* creates its own pool.
+
+    :param max_runs: number of scripts a worker runs before being replaced
+    :return: @see cl RunPythonWorkerPool
+    """
+    key = os.getpid(), max_runs
+    pool = _pools.get(key, None)
+    if pool is None:
+        pool = RunPythonWorkerPool(max_runs=max_runs)
+        _pools[key] = pool
+    return pool
+
+
+def _close_pools():
+    for pool in _pools.values():
+        pool.close()
+    _pools.clear()
+
+
+atexit.register(_close_pools)
@@ -21,6 +21,8 @@ from ..loghelper.flog import run_cmd
 from ..texthelper.texts_language import TITLES
 from ..pycode.code_helper import remove_extra_spaces_and_pep8
 from .sphinx_collapse_extension import collapse_node
+from .runpython_pool import get_runpython_pool, RunPythonWorkerCrash
+from .runpython_cache import get_runpython_cache, snapshot_folder
 
 
 class RunPythonCompileError(Exception):
@@ -41,7 +43,7 @@ class RunPythonExecutionError(Exception):
 
 def run_python_script(script, params=None, comment=None, setsysvar=None, process=False,
                       exception=False, warningout=None, chdir=None, context=None,
-                      store_in_file=None):
+                      store_in_file=None, pool=None):
     """
     Executes a script :epkg:`python` as a string.
 
@@ -63,6 +65,12 @@ def run_python_script(script, params=None, comment=None, setsysvar=None, process
                                 that is useful is the script is using module
                                 ``inspect`` to retrieve the source which are not
                                 stored in memory
+    @param  pool                if *process* is True, the script runs in one
+                                of the interpreters of this @see cl RunPythonWorkerPool
+                                instead of a new one, it falls back to a new
+                                interpreter if the worker fails before the script
+                                starts, a crash during the script is reported
+                                like an exception
     @return                     stdout, stderr, context
 
     If the execution throws an exception such as
@@ -173,6 +181,28 @@ def run_python_script(script, params=None, comment=None, setsysvar=None, process
         else:
             script_arg = script
 
+        if pool is not None:
+            try:
+                out, err, _ = pool.run(script, filename=store_in_file,
+                                       chdir=chdir)
+                return out, err.replace("\r\n", "\n").strip("\n\r\t "), None
+            except Exception as e:  # pylint: disable=W0703
+                if isinstance(e, RunPythonWorkerCrash) and e.started:
+                    # the script must not run twice
+                    err = e.err.replace("\r\n", "\n").strip("\n\r\t ")
+                    err = (err + "\n" + str(e)).strip("\n")
+                    if not exception:
+                        message = ("--SCRIPT--\n{0}\n--PARAMS--\n{1}\n--COMMENT--\n"
+                                   "{2}\n--ERR--\n{3}\n--OUT--\n{4}\n--EXC--\n{5}"
+                                   "").format(script, params, comment, err,
+                                              e.out, e)
+                        raise RunPythonExecutionError(message) from e
+                    return e.out, err, None
+                logger = logging.getLogger(__name__)
+                logger.warning(
+                    "[runpython] the worker failed (%s), "
+                    "the script runs in a new process.", e)
+
         try:
             out, err = run_cmd(cmd, script_arg, wait=True, change_path=chdir)
             return out, err, None
@@ -266,6 +296,28 @@ def run_python_script(script, params=None, comment=None, setsysvar=None, process
         return gout, gerr, context
 
 
+# options of the directive which change the output of a script
+_cache_params = ('process', 'exception', 'setsysvar', 'warningout',
+                 'current', 'store_in_file')
+
+
+def _get_runpython_cache(env):
+    """
+    Returns the cache defined by the configuration value
+    ``runpython_cache`` or None if it is not enabled,
+    a relative path is relative to the source folder.
+    """
+    config = getattr(env, "config", None)
+    folder = getattr(config, "runpython_cache", None)
+    if not folder:
+        return None
+    if not os.path.isabs(folder):
+        folder = os.path.join(getattr(env, "srcdir", None) or ".", folder)
+    return get_runpython_cache(
+        folder, max_size=config.runpython_cache_max_size,
+        max_age=config.runpython_cache_max_age)
+
+
 class runpython_node(nodes.Structural, nodes.Element):
 
     """
@@ -316,7 +368,12 @@ class RunPythonDirective(Directive):
       see @see fn remove_extra_spaces_and_pep8.
     * ``:numpy_precision: <precision>``, run ``numpy.set_printoptions(precision=...)``,
       precision is 3 by default
-    * ``:process:`` run the script in an another process
+    * ``:process:`` run the script in an another process,
+      if the configuration value ``runpython_pool`` is not null,
+      the script runs in a long-lived interpreter replaced after
+      ``runpython_pool`` scripts (see @see cl RunPythonWorkerPool)
+    * ``:nocache:`` the script runs even if its output is stored
+      in the cache (see below)
     * ``:restore:`` restore the local context stored in :epkg:`sphinx` application
       by the previous call to *runpython*
     * ``:rst:`` to interpret the output, otherwise, it is considered as raw text
@@ -385,6 +442,17 @@ class RunPythonDirective(Directive):
         :showcode:
 
         print("Hide or unhide this output.")
+
+    If the configuration value ``runpython_cache`` is a folder,
+    the outputs and the files a script creates in its working directory
+    are stored in that folder (see @see cl RunPythonCache) and
+    the script only runs again if its content, its options or
+    the code of the modules it imports changed. Scripts using
+    options ``:store:``, ``:restore:`` or ``:nocache:`` are not cached,
+    neither are the ones failing with an exception or importing
+    a module the cache cannot locate.
+    Values ``runpython_cache_max_size`` (bytes) and
+    ``runpython_cache_max_age`` (seconds) limit the size of the cache.
     """
     required_arguments = 0
     optional_arguments = 0
@@ -412,6 +480,7 @@ class RunPythonDirective(Directive):
         'numpy_precision': directives.unchanged,
         'store_in_file': directives.unchanged,
         'linenos': directives.unchanged,
+        'nocache': directives.unchanged,
     }
     has_content = True
     runpython_class = runpython_node
@@ -468,6 +537,7 @@ class RunPythonDirective(Directive):
             'numpy_precision': self.options.get('numpy_precision', '3').strip(),
             'store': 'store' in self.options and self.options['store'] in bool_set_,
             'restore': 'restore' in self.options and self.options['restore'] in bool_set_,
+            'nocache': 'nocache' in self.options and self.options['nocache'] in bool_set_,
         }
 
         if p['setsysvar'] is not None and len(p['setsysvar']) == 0:
@@ -565,11 +635,43 @@ class RunPythonDirective(Directive):
         script = script.replace(
             '## __WD__ ##', f"__WD__ = '{cs_source_dir}'")
 
-        out, err, context = run_python_script(script, comment=comment, setsysvar=p['setsysvar'],
-                                              process=p["process"], exception=p['exception'],
-                                              warningout=p['warningout'],
-                                              chdir=cs_source_dir if p['current'] else None,
-                                              context=context, store_in_file=p['store_in_file'])
+        # The cache ignores scripts sharing their context with others.
+        cache = None
+        if not (p['store'] or p['restore'] or p['nocache']):
+            cache = _get_runpython_cache(env)
+        cached = None
+        if cache is not None:
+            out_dir = (cs_source_dir if p['current'] else None) or os.getcwd()
+            # the name of the function changes with every call
+            key = cache.key(script.replace(name, "run_python_script"),
+                            {k: p[k] for k in _cache_params}, paths=[out_dir])
+            if key is None:
+                # one imported module cannot be found
+                cache = None
+            else:
+                cached = cache.get(key, output_dir=out_dir)
+
+        if cached is not None:
+            out, err = cached
+            context = {}
+        else:
+            if cache is not None:
+                before = snapshot_folder(out_dir)
+            max_runs = getattr(getattr(env, "config", None), "runpython_pool", 0)
+            pool = get_runpython_pool(max_runs) if max_runs and p['process'] else None
+            out, err, context = run_python_script(script, comment=comment, setsysvar=p['setsysvar'],
+                                                  process=p["process"], exception=p['exception'],
+                                                  warningout=p['warningout'],
+                                                  chdir=cs_source_dir if p['current'] else None,
+                                                  context=context, store_in_file=p['store_in_file'],
+                                                  pool=pool)
+            if cache is not None and "Traceback (most recent call last)" not in err:
+                # a failure may not happen again (network, ...)
+                after = snapshot_folder(out_dir)
+                skip = os.path.basename(p['store_in_file'] or '')
+                files = [k for k, v in after.items()
+                         if before.get(k, None) != v and k != skip]
+                cache.put(key, out, err, files=files, output_dir=out_dir)
 
         if p['store']:
             # Stores modified local context.
@@ -751,11 +853,43 @@ def depart_runpython_node(self, node):
     pass
 
 
+def init_runpython_cache(app):
+    """
+    Forgets the fingerprints of the imported modules computed by
+    a previous build in the same process (see @see cl RunPythonCache).
+    """
+    cache = _get_runpython_cache(getattr(app, "env", None))
+    if cache is not None:
+        cache.clear_fingerprints()
+
+
+def report_runpython_cache(app, exception):
+    """
+    Removes old entries from the cache of directive ``runpython``
+    (see configuration value ``runpython_cache``) and logs
+    the number of hits and misses at the end of the build.
+    With a parallel build, only the documents read by the
+    main process are counted.
+    """
+    cache = _get_runpython_cache(app.env)
+    if cache is None:
+        return
+    cache.evict()
+    logger = logging.getLogger(__name__)
+    logger.info("[runpython] cache %s", cache.report())
+
+
 def setup(app):
     """
     setup for ``runpython`` (sphinx)
     """
     app.add_config_value('out_runpythonlist', [], 'env')
+    app.add_config_value('runpython_pool', 0, 'env')
+    app.add_config_value('runpython_cache', None, 'env')
+    app.add_config_value('runpython_cache_max_size', 2 ** 28, 'env')
+    app.add_config_value('runpython_cache_max_age', 30 * 24 * 3600, 'env')
+    app.connect('builder-inited', init_runpython_cache)
+    app.connect('build-finished', report_runpython_cache)
     if hasattr(app, "add_mapping"):
         app.add_mapping('runpython', runpython_node)
 
@@ -3,6 +3,8 @@
 @file
 @brief Improves text comparison.
 """
+import math
+from bisect import bisect_left
 import numpy
 try:
     from cpyquickhelper.algorithms.edit_distance import (
@@ -11,17 +13,17 @@ except ImportError:
     edit_distance_string_fast = None
 
 
-def edit_distance_string(s1, s2, cmp_cost=1.):
+def edit_distance_string_loop(s1, s2, cmp_cost=1.):
     """
     Computes the edit distance between strings *s1* and *s2*.
+    This is the reference implementation, every cell of the
+    matrix is computed in python, see @see fn edit_distance_string
+    for a faster version.
 
     :param s1: first string
     :param s2: second string
     :return: dist, list of tuples of aligned characters
 
-    Another version is implemented in module :epkg:`cpyquickhelper`.
-    It uses C++ to make it around 25 times faster than the python
-    implementation.
     """
     n1 = len(s1) + 1
     n2 = len(s2) + 1
@@ -78,9 +80,224 @@ def edit_distance_string(s1, s2, cmp_cost=1.):
     return d, list(reversed(equals))
 
 
+def _string_codes(s1, s2):
+    """
+    Converts two strings or two sequences of hashable objects
+    into arrays of integers, equal elements get the same integer.
+    """
+    if isinstance(s1, str) and isinstance(s2, str):
+        return (numpy.frombuffer(s1.encode("utf-32-le"), dtype=numpy.uint32),
+                numpy.frombuffer(s2.encode("utf-32-le"), dtype=numpy.uint32))
+    codes = {}
+    return tuple(numpy.array([codes.setdefault(c, len(codes)) for c in s],
+                             dtype=numpy.int64)
+                 for s in [s1, s2])
+
+
+def edit_distance_string(s1, s2, cmp_cost=1., max_distance=None):
+    """
+    Computes the edit distance between strings *s1* and *s2*.
+
+    :param s1: first string
+    :param s2: second string
+    :param cmp_cost: cost of a substitution
+    :param max_distance: if not None, the function stops as soon as
+        the distance is known to be greater than this value and returns
+        ``(numpy.inf, [])``
+    :return: dist, list of tuples of aligned characters
+
+    The matrix is filled one anti-diagonal at a time, every cell
+    of the same anti-diagonal is computed with :epkg:`numpy`
+    (small matrices are still computed in python).
+    The result and the alignment are the same as
+    @see fn edit_distance_string_loop. When *max_distance* is specified,
+    only the cells in the band ``|i - j| <= max_distance`` are computed,
+    the other ones cannot be on a path with a lower cost.
+
+    Another version is implemented in module :epkg:`cpyquickhelper`.
+    It uses C++ to make it around 25 times faster than the python
+    implementation.
+    """
+    n1 = len(s1) + 1
+    n2 = len(s2) + 1
+    if max_distance is not None and abs(n1 - n2) > max_distance:
+        return numpy.inf, []
+    if n1 * n2 <= 256:
+        # numpy is slower than python on small matrices
+        d, equals = edit_distance_string_loop(s1, s2, cmp_cost=cmp_cost)
+        if max_distance is not None and d > max_distance:
+            return numpy.inf, []
+        return d, equals
+
+    dist = numpy.full((n1, n2), n1 * n2, dtype=numpy.float64)
+    pred = numpy.full(dist.shape, 0, dtype=numpy.int32)
+    dist[:, 0] = numpy.arange(n1)
+    pred[:, 0] = 1
+    dist[0, :] = numpy.arange(n2)
+    pred[0, 1:] = 2
+    pred[0, 0] = -1
+
+    if n1 > 1 and n2 > 1:
+        c1, c2 = _string_codes(s1, s2)
+        cost = numpy.where(c1[:, numpy.newaxis] == c2[numpy.newaxis, :],
+                           0., cmp_cost)
+        fdist = dist.ravel()
+        fpred = pred.ravel()
+        prev_min = 1
+
+        # cells (i, k - i) of an anti-diagonal only depend
+        # on the two previous anti-diagonals
+        for k in range(2, n1 + n2 - 1):
+            imin = max(1, k - n2 + 1)
+            imax = min(n1 - 1, k - 1)
+            if max_distance is not None:
+                imin = max(imin, math.ceil((k - max_distance) / 2))
+                imax = min(imax, math.floor((k + max_distance) / 2))
+                if imin > imax:
+                    prev_min = numpy.inf
+                    continue
+            i = numpy.arange(imin, imax + 1)
+            j = k - i
+            idx = i * n2 + j
+            up = fdist[idx - n2] + 1
+            left = fdist[idx - 1] + 1
+            diag = fdist[idx - n2 - 1] + cost[i - 1, j - 1]
+
+            # same preference as the loop: up, then left, then diagonal,
+            # a candidate is chosen only if it is strictly better
+            p = numpy.where(left < up, 2, 1).astype(numpy.int32)
+            c = numpy.minimum(up, left)
+            better = diag < c
+            p[better] = 3
+            c = numpy.where(better, diag, c)
+            fdist[idx] = c
+            fpred[idx] = p
+            if max_distance is not None:
+                # a path goes through one of two consecutive anti-diagonals
+                cmin = c.min()
+                if cmin > max_distance and prev_min > max_distance:
+                    return numpy.inf, []
+                prev_min = cmin
+
+    d = dist[len(s1), len(s2)]
+    if max_distance is not None and d > max_distance:
+        return numpy.inf, []
+    equals = []
+    i, j = len(s1), len(s2)
+    p = pred[i, j]
+    while p != -1:
+        if p == 3:
+            equals.append((i - 1, j - 1))
+            i -= 1
+            j -= 1
+        elif p == 2:
+            j -= 1
+        elif p == 1:
+            i -= 1
+        else:
+            raise RuntimeError(  # pragma: no cover
+                "Unexpected value for p=%d at position=%r." % (p, (i, j)))
+        p = pred[i, j]
+    return d, list(reversed(equals))
+
+
+def _qgram_profile(s, q):
+    """
+    Returns the q-grams of a string as a dictionary ``{q-gram: count}``.
+    """
+    profile = {}
+    for k in range(len(s) - q + 1):
+        g = s[k:k + q]
+        profile[g] = profile.get(g, 0) + 1
+    return profile
+
+
+def _qgram_lower_bound(p1, p2, q):
+    """
+    Returns a lower bound of the number of edit operations
+    to go from one string to the other given their q-gram profiles.
+    Every operation changes at most *q* q-grams in each string.
+    """
+    diff = 0
+    for g, c in p1.items():
+        diff += abs(c - p2.get(g, 0))
+    for g, c in p2.items():
+        if g not in p1:
+            diff += c
+    return diff / (2. * q)
+
+
+def _patience_anchors(rows1, rows2):
+    """
+    Returns pairs of identical lines which can be aligned
+    without looking at the other lines. The anchors are the lines
+    which appear only once in both texts, the longest increasing
+    subsequence of these pairs is kept (patience diff), then
+    the anchors are extended to the identical neighbouring lines.
+
+    :param rows1: first set of rows
+    :param rows2: second set of rows
+    :return: sorted list of pairs *(i, j)*
+    """
+    count1 = {}
+    for i, r in enumerate(rows1):
+        if r.strip("\t "):
+            count1[r] = (count1[r][0] + 1, i) if r in count1 else (1, i)
+    count2 = {}
+    for j, r in enumerate(rows2):
+        if r in count1:
+            count2[r] = (count2[r][0] + 1, j) if r in count2 else (1, j)
+    pairs = [(count1[r][1], j) for r, (c, j) in count2.items()
+             if c == 1 and count1[r][0] == 1]
+    pairs.sort()
+
+    # longest increasing subsequence on j (patience sorting)
+    tails = []
+    tails_pos = []
+    back = [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tails_pos.append(k)
+        else:
+            tails[pos] = j
+            tails_pos[pos] = k
+        back[k] = tails_pos[pos - 1] if pos > 0 else None
+    lis = []
+    k = tails_pos[-1] if tails_pos else None
+    while k is not None:
+        lis.append(pairs[k])
+        k = back[k]
+    lis.reverse()
+
+    # extension to identical neighbours
+    anchors = set(lis)
+    for i, j in lis:
+        a, b = i - 1, j - 1
+        while a >= 0 and b >= 0 and rows1[a] == rows2[b] and (a, b) not in anchors:
+            anchors.add((a, b))
+            a -= 1
+            b -= 1
+        a, b = i + 1, j + 1
+        while (a < len(rows1) and b < len(rows2) and rows1[a] == rows2[b] and
+               (a, b) not in anchors):
+            anchors.add((a, b))
+            a += 1
+            b += 1
+    anchors = sorted(anchors)
+
+    # extensions may cross each other, keeps an increasing sequence
+    res = []
+    for i, j in anchors:
+        if not res or (i > res[-1][0] and j > res[-1][1]):
+            res.append((i, j))
+    return res
+
+
 def edit_distance_text(rows1, rows2, strategy="full",
                        verbose=False, return_matrices=False,
-                       **thresholds):
+                       return_stats=False, **thresholds):
     """
     Computes an edit distance between lines of a text.
 
@@ -89,7 +306,9 @@ def edit_distance_text(rows1, rows2, strategy="full",
     :param strategy: strategy to match lines (see below)
     :param verbose: if True, show progress with tqdm
     :param return_matrices: return distances and predecessor
-        matrices as well
+        matrices as well (None for strategy `'patience'`)
+    :param return_stats: return statistics about the number of
+        compared pairs of lines as well
     :param thresholds: see below
     :return: distance, list of tuples of aligned lines, distance and
         alignment for each aligned lines, and finally an array
@@ -97,6 +316,13 @@ def edit_distance_text(rows1, rows2, strategy="full",
 
     Strategies:
     * `'full'`: computes all edit distances between all lines
+    * `'qgram'`: same result as `'full'` but a pair of lines is not
+        compared if the q-grams of both lines show the distance
+        is too high for the pair to be aligned
+    * `'patience'`: identical lines appearing only once in both texts
+        are aligned first (patience diff), strategy `'qgram'`
+        is then applied on every window between two anchors,
+        the cost is no longer quadratic in the number of lines
 
     Thresholds:
     * `'threshold'`: two lines can match if the edit distance is not too big,
@@ -105,6 +331,13 @@ def edit_distance_text(rows1, rows2, strategy="full",
     * `'insert_cst'`: fixed cost of insertion (default is 1.)
     * `'weight_cmp'`: weight for comparison cost (default is 2.)
     * '`cmp_cost'`: cost of a bad comparison, default is `2 * insert_len`
+    * `'qgram'`: size of the q-grams (default is 2)
+
+    Statistics (if *return_stats* is True) are returned as a dictionary:
+    `pairs` is the number of pairs of lines, `computed` the number of
+    edit distances computed between two lines, `skipped` the difference,
+    `pruned` the number of pairs discarded by the q-grams,
+    `anchors` the number of anchors.
 
     .. note::
 
@@ -114,24 +347,36 @@ def edit_distance_text(rows1, rows2, strategy="full",
         enough, this function will use this version as it is 25 times
         faster. The version in :epkg:`cpyquickhelper` is using C++.
     """
-    if strategy != 'full':
-        raise NotImplementedError(  # pragma: no cover
-            "No other strategy than 'full' was implemented.")
+    if strategy not in ('full', 'qgram', 'patience'):
+        raise ValueError(
+            f"Unknown strategy {strategy!r}, it should be 'full', "
+            f"'qgram' or 'patience'.")
     cached_distances = {}
+    prune = strategy != 'full'
 
     insert_len = thresholds.get('insert_len', 1.)
     insert_cst = thresholds.get('insert_cst', 1.)
     threshold = thresholds.get('threshold', 0.5)
     weight_cmp = thresholds.get('weight_cmp', 2.)
     cmp_cost = thresholds.get('cmp_cost', 2. * insert_len)
+    qgram = thresholds.get('qgram', 2)
 
     fct_cmp = edit_distance_string_fast or edit_distance_string
+    stats = dict(strategy=strategy, computed=0, pruned=0, anchors=0)
+    profiles = {}
 
     def cost_insert(row):
         s = row.strip("\t ")
         return (len(s) + insert_cst) * insert_len
 
-    def cost_cmp(i, j, row1, row2, bypass=True):
+    def lower_bound(row1, row2):
+        for r in (row1, row2):
+            if r not in profiles:
+                profiles[r] = _qgram_profile(r, qgram)
+        lb = _qgram_lower_bound(profiles[row1], profiles[row2], qgram)
+        return max(abs(len(row1) - len(row2)), lb * min(1., cmp_cost))
+
+    def cost_cmp(i, j, row1, row2, bypass=True, upper=None):
         s1 = row1.strip('\t ')
         s2 = row2.strip('\t ')
         c1 = cost_insert(s1)
@@ -143,93 +388,140 @@ def edit_distance_text(rows1, rows2, strategy="full",
             return cost_insert(row1[len(row2):]), []
         if (i, j) in cached_distances:
             return cached_distances[i, j]
-        ed, equals = fct_cmp(row1, row2, cmp_cost=cmp_cost)
+        if (prune and upper is not None and
+                lower_bound(row1, row2) * weight_cmp > upper * (1 + 1e-7) + 1e-7):
+            # the pair cannot be aligned
+            stats['pruned'] += 1
+            return numpy.inf, []
+        stats['computed'] += 1
+        if (upper is not None and weight_cmp > 0 and
+                edit_distance_string_fast is None):
+            # The alignment is useless if the cost is above *upper*,
+            # the computation stops early (a small margin avoids
+            # any rounding issue).
+            ed, equals = edit_distance_string(
+                row1, row2, cmp_cost=cmp_cost,
+                max_distance=upper / weight_cmp * (1 + 1e-7) + 1e-7)
+            if ed == numpy.inf:
+                return ed, equals
+        else:
+            ed, equals = fct_cmp(row1, row2, cmp_cost=cmp_cost)
         ed *= weight_cmp
         cached_distances[i, j] = ed, equals
         return ed, equals
 
-    if isinstance(rows1, str):
-        rows1 = rows1.split("\n")
-    if isinstance(rows2, str):
-        rows2 = rows2.split("\n")
-
-    n1 = len(rows1) + 1
-    n2 = len(rows2) + 1
-    t1 = sum(map(len, rows1)) + 1
-    t2 = sum(map(len, rows2)) + 1
-    dist = numpy.full((n1, n2), t1 * t2 + t1 + t2 + 10, dtype=numpy.float64)
-    pred = numpy.full(dist.shape, 0, dtype=numpy.int32)
-
-    dist[0, 0] = 0
-    for i in range(1, n1):
-        dist[i, 0] = cost_insert(rows1[i - 1]) + dist[i - 1, 0]
-        pred[i, 0] = 1
-    for j in range(1, n2):
-        dist[0, j] = cost_insert(rows2[j - 1]) + dist[0, j - 1]
-        pred[0, j] = 2
-    pred[0, 0] = -1
-
-    if verbose:
-        from tqdm import tqdm  # pragma: no cover
-        loop = tqdm(range(1, n1))  # pragma: no cover
-    else:
-        loop = range(1, n1)
-    for i in loop:
+    def dp_(rows1, rows2, offset1=0, offset2=0):
+        "local function, aligns two sets of rows, returns global indices"
+        cached_distances.clear()
+        n1 = len(rows1) + 1
+        n2 = len(rows2) + 1
+        t1 = sum(map(len, rows1)) + 1
+        t2 = sum(map(len, rows2)) + 1
+        dist = numpy.full((n1, n2), t1 * t2 + t1 + t2 + 10,
+                          dtype=numpy.float64)
+        pred = numpy.full(dist.shape, 0, dtype=numpy.int32)
+
+        dist[0, 0] = 0
+        for i in range(1, n1):
+            dist[i, 0] = cost_insert(rows1[i - 1]) + dist[i - 1, 0]
+            pred[i, 0] = 1
         for j in range(1, n2):
-            c = dist[i, j]
+            dist[0, j] = cost_insert(rows2[j - 1]) + dist[0, j - 1]
+            pred[0, j] = 2
+        pred[0, 0] = -1
+
+        if verbose:
+            from tqdm import tqdm  # pragma: no cover
+            loop = tqdm(range(1, n1))  # pragma: no cover
+        else:
+            loop = range(1, n1)
+        for i in loop:
+            for j in range(1, n2):
+                c = dist[i, j]
+
+                p = 0
+                d = dist[i - 1, j] + cost_insert(rows1[i - 1])
+                if d < c:
+                    c = d
+                    p = 1
+                d = dist[i, j - 1] + cost_insert(rows2[j - 1])
+                if d < c:
+                    c = d
+                    p = 2
+                if c < dist[i - 1, j - 1]:
+                    dist[i, j] = c
+                    pred[i, j] = p
+                    continue
+                d = (dist[i - 1, j - 1] +
+                     cost_cmp(i - 1, j - 1, rows1[i - 1], rows2[j - 1],
+                              upper=c - dist[i - 1, j - 1])[0])
+                if d < c:
+                    c = d
+                    p = 3
+                if p == 0:
+                    raise RuntimeError(  # pragma: no cover
+                        "Unexpected value for p=%d at position=%r, c=%d, "
+                        "dist[i, j]=%d, dist=\n%r." % (
+                            p, (i, j), c, dist[i, j],
+                            dist[i - 1:i + 1, j - 1: j + 1]))
 
-            p = 0
-            d = dist[i - 1, j] + cost_insert(rows1[i - 1])
-            if d < c:
-                c = d
-                p = 1
-            d = dist[i, j - 1] + cost_insert(rows2[j - 1])
-            if d < c:
-                c = d
-                p = 2
-            if c < dist[i - 1, j - 1]:
                 dist[i, j] = c
                 pred[i, j] = p
-                continue
-            d = (dist[i - 1, j - 1] +
-                 cost_cmp(i - 1, j - 1, rows1[i - 1], rows2[j - 1])[0])
-            if d < c:
-                c = d
-                p = 3
-            if p == 0:
+
+        cached_distances.clear()
+        d = dist[n1 - 1, n2 - 1]
+        equals = []
+        i, j = n1 - 1, n2 - 1
+        p = pred[i, j]
+        while p != -1:
+            if p == 3:
+                cd = cost_cmp(i - 1, j - 1, rows1[i - 1],
+                              rows2[j - 1], bypass=False)
+                equals.append((i - 1 + offset1, j - 1 + offset2) + cd)
+                i -= 1
+                j -= 1
+            elif p == 2:
+                j -= 1
+            elif p == 1:
+                i -= 1
+            else:
                 raise RuntimeError(  # pragma: no cover
-                    "Unexpected value for p=%d at position=%r, c=%d, "
-                    "dist[i, j]=%d, dist=\n%r." % (
-                        p, (i, j), c, dist[i, j],
-                        dist[i - 1:i + 1, j - 1: j + 1]))
+                    "Unexpected value for p=%d at position=%r." % (p, (i, j)))
+            p = pred[i, j]
+        return d, list(reversed(equals)), (dist, pred)
 
-            dist[i, j] = c
-            pred[i, j] = p
+    if isinstance(rows1, str):
+        rows1 = rows1.split("\n")
+    if isinstance(rows2, str):
+        rows2 = rows2.split("\n")
+    stats['pairs'] = len(rows1) * len(rows2)
+
+    if strategy == 'patience':
+        anchors = _patience_anchors(rows1, rows2)
+        stats['anchors'] = len(anchors)
+        d = 0.
+        equals = []
+        i0, j0 = 0, 0
+        for i1, j1 in anchors + [(len(rows1), len(rows2))]:
+            if i1 > i0 or j1 > j0:
+                dw, eqw, _ = dp_(rows1[i0:i1], rows2[j0:j1], i0, j0)
+                d += dw
+                equals.extend(eqw)
+            if i1 < len(rows1):
+                # identical lines, the distance is null
+                equals.append((i1, j1, 0., [(k, k)
+                                           for k in range(len(rows1[i1]))]))
+            i0, j0 = i1 + 1, j1 + 1
+        matrices = None
+    else:
+        d, equals, matrices = dp_(rows1, rows2)
+    stats['skipped'] = stats['pairs'] - stats['computed']
 
-    cached_distances.clear()
-    d = dist[n1 - 1, n2 - 1]
-    equals = []
-    i, j = n1 - 1, n2 - 1
     lines1 = {}
     lines2 = {}
-    p = pred[i, j]
-    while p != -1:
-        if p == 3:
-            cd = cost_cmp(i - 1, j - 1, rows1[i - 1],
-                          rows2[j - 1], bypass=False)
-            lines1[i - 1] = j - 1
-            lines2[j - 1] = i - 1
-            equals.append((i - 1, j - 1) + cd)
-            i -= 1
-            j -= 1
-        elif p == 2:
-            j -= 1
-        elif p == 1:
-            i -= 1
-        else:
-            raise RuntimeError(  # pragma: no cover
-                "Unexpected value for p=%d at position=%r." % (p, (i, j)))
-        p = pred[i, j]
+    for i, j, _, __ in equals:
+        lines1[i] = j
+        lines2[j] = i
 
     # final alignment
     aligned = []
@@ -246,9 +538,12 @@ def edit_distance_text(rows1, rows2, strategy="full",
         while lb not in lines2 and lb < len(rows2):
             aligned.append((None, lb))
             lb += 1
+    res = (d, equals, aligned)
     if return_matrices:
-        return d, list(reversed(equals)), aligned, (dist, pred)
-    return d, list(reversed(equals)), aligned
+        res += (matrices, )
+    if return_stats:
+        res += (stats, )
+    return res
 
 
 def diff2html(rows1, rows2, equals, aligned, two_columns=False):